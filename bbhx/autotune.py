@@ -0,0 +1,462 @@
+# Search for the fastest settings that meet an accuracy target
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import itertools
+import os
+import platform
+import time
+
+import numpy as np
+
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+from lisatools.sensitivity import SensitivityMatrix, AET1SensitivityMatrix
+
+from .waveformbuild import BBHWaveformFD
+from .likelihood import HeterodynedLikelihood
+from .utils.profile import PROFILE_VERSION, load_profile
+
+# profile group of each setting that can be tuned
+SETTING_GROUPS = {
+    "length": "waveform_kwargs",
+    "modes": "waveform_kwargs",
+    "mf_min": "amp_phase_kwargs",
+    "mf_max": "amp_phase_kwargs",
+    "order_fresnel_stencil": "response_kwargs",
+    "mixed_precision": "interp_kwargs",
+    "blocked": "interp_kwargs",
+    "length_f_het": "heterodyne_kwargs",
+    "order": "heterodyne_kwargs",
+}
+
+
+class Autotuner:
+    """Find the fastest settings that meet an accuracy target
+
+    Test binaries are drawn uniformly from a box in the parameters of
+    :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`. Each candidate
+    setting is compared against a reference computed without interpolation
+    on the data frequencies. Candidates that meet the tolerance are timed on
+    this machine, and the fastest is stored in :attr:`profile`. The profile
+    can be saved with :func:`save_profile <bbhx.utils.profile.save_profile>`
+    and passed to :meth:`BBHWaveformFD.from_profile <bbhx.waveformbuild.BBHWaveformFD.from_profile>`
+    and :meth:`HeterodynedLikelihood.from_profile <bbhx.likelihood.HeterodynedLikelihood.from_profile>`.
+
+    The thread count of the CPU code is fixed by OpenMP when the extensions
+    are loaded, so it cannot be tuned here. It is recorded in the profile
+    metadata to show which setup the timings belong to.
+
+    Args:
+        lower (double array-like): Lower bounds for the 12 parameters of
+            :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`.
+        upper (double array-like): Upper bounds for the 12 parameters.
+        data_freqs (double xp.ndarray): Evenly spaced data frequencies.
+        sens_mat (SensitivityMatrix, optional): :class:`SensitivityMatrix` object representing the AET channels.
+            If ``None``, defaults to class:`AET1SensitivityMatrix`. (Default: ``None``)
+        num_test (int, optional): Number of test binaries. (Default: ``8``)
+        generator_kwargs (dict, optional): Fixed keyword arguments for the
+            initialization of :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`
+            (``amp_phase_kwargs``, ``response_kwargs``, ``interp_kwargs``).
+            Tuned settings are added to these. (Default: ``{}``)
+        waveform_kwargs (dict, optional): Fixed keyword arguments for waveform
+            calls (e.g. ``t_obs_start``). (Default: ``{}``)
+        number (int, optional): Each timing is the best of ``number`` calls.
+            (Default: ``3``)
+        use_gpu (bool, optional): If ``True``, use GPU. (Default: ``False``)
+        seed (int, optional): Seed for drawing the test binaries. (Default: ``None``)
+
+    Attributes:
+        data_freqs (double xp.ndarray): Data frequencies.
+        df (double): Frequency spacing of the data.
+        generator_kwargs (dict): Fixed keyword arguments for the waveform generator.
+        number (int): Each timing is the best of ``number`` calls.
+        profile (dict): Best settings found so far. See :func:`load_profile <bbhx.utils.profile.load_profile>`.
+        psd (double xp.ndarray): PSD of the AET channels with shape ``(3, len(data_freqs))``.
+        results (dict): For ``"waveform"`` and ``"heterodyne"``, a list with one
+            dictionary per candidate holding its ``settings``, accuracy, ``time``,
+            and whether it was ``accepted``.
+        test_params (double np.ndarray): Test binaries with shape ``(12, num_test)``.
+        use_gpu (bool): If ``True``, use GPU.
+        waveform_kwargs (dict): Fixed keyword arguments for waveform calls.
+        xp (obj): Numpy or Cupy.
+
+    Raises:
+        ValueError: The bounds do not have 12 entries.
+
+    """
+
+    def __init__(
+        self,
+        lower,
+        upper,
+        data_freqs,
+        sens_mat=None,
+        num_test=8,
+        generator_kwargs={},
+        waveform_kwargs={},
+        number=3,
+        use_gpu=False,
+        seed=None,
+    ):
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+        if lower.shape != (12,) or upper.shape != (12,):
+            raise ValueError("lower and upper must have 12 entries.")
+
+        self.use_gpu = use_gpu
+        self.xp = xp if use_gpu else np
+
+        try:
+            data_freqs_host = data_freqs.get()
+        except AttributeError:
+            data_freqs_host = np.asarray(data_freqs)
+
+        self.data_freqs = self.xp.asarray(data_freqs_host)
+        self.df = data_freqs_host[1] - data_freqs_host[0]
+
+        if sens_mat is None:
+            sens_mat = AET1SensitivityMatrix(data_freqs_host)
+        assert isinstance(sens_mat, SensitivityMatrix)
+        sens_mat.update_frequency_arr(data_freqs_host)
+        self.psd = self.xp.asarray([sens_mat[0], sens_mat[1], sens_mat[2]])
+
+        rng = np.random.default_rng(seed)
+        self.test_params = lower[:, np.newaxis] + (upper - lower)[
+            :, np.newaxis
+        ] * rng.random((12, num_test))
+
+        self.generator_kwargs = generator_kwargs
+        self.waveform_kwargs = waveform_kwargs
+        self.number = number
+
+        self.results = {"waveform": [], "heterodyne": []}
+        self.profile = load_profile({"profile_version": PROFILE_VERSION})
+        self.profile["metadata"] = {
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "omp_num_threads": os.environ.get("OMP_NUM_THREADS"),
+            "use_gpu": use_gpu,
+        }
+
+    def _inner(self, a, b):
+        """Noise-weighted inner product for each binary
+
+        Args:
+            a (complex xp.ndarray): Shape ``(num_bin_all, 3, len(data_freqs))``.
+            b (complex xp.ndarray): Same shape as ``a``.
+
+        Returns:
+            double np.ndarray: :math:`\\langle a|b\\rangle` with shape ``(num_bin_all,)``.
+
+        """
+        out = 4 * self.df * self.xp.sum((a.conj() * b).real / self.psd, axis=(1, 2))
+        try:
+            out = out.get()
+        except AttributeError:
+            pass
+        return out
+
+    def _time(self, func):
+        """Best wall time of ``number`` calls after one warm-up call"""
+        func()
+        best = np.inf
+        for _ in range(self.number):
+            if self.use_gpu:
+                xp.cuda.runtime.deviceSynchronize()
+            st = time.perf_counter()
+            func()
+            if self.use_gpu:
+                xp.cuda.runtime.deviceSynchronize()
+            best = min(best, time.perf_counter() - st)
+        return best
+
+    def _settings(self, settings):
+        """Split candidate settings into the profile groups
+
+        Args:
+            settings (dict): Candidate settings. Keys must be in ``SETTING_GROUPS``.
+
+        Returns:
+            dict: Profile groups starting from the current :attr:`profile`.
+
+        Raises:
+            ValueError: A setting cannot be tuned.
+
+        """
+        groups = {
+            "amp_phase_kwargs": {
+                **self.generator_kwargs.get("amp_phase_kwargs", {}),
+                **self.profile["amp_phase_kwargs"],
+            },
+            "response_kwargs": {
+                **self.generator_kwargs.get("response_kwargs", {}),
+                **self.profile["response_kwargs"],
+            },
+            "interp_kwargs": {
+                **self.generator_kwargs.get("interp_kwargs", {}),
+                **self.profile["interp_kwargs"],
+            },
+            "waveform_kwargs": dict(self.profile["waveform_kwargs"]),
+            "heterodyne_kwargs": dict(self.profile["heterodyne_kwargs"]),
+        }
+        for key, val in settings.items():
+            if key not in SETTING_GROUPS:
+                raise ValueError(
+                    f"{key} cannot be tuned. Available settings are {list(SETTING_GROUPS)}."
+                )
+            groups[SETTING_GROUPS[key]][key] = val
+
+        return groups
+
+    def _generator(self, groups):
+        return BBHWaveformFD(
+            amp_phase_kwargs=groups["amp_phase_kwargs"],
+            response_kwargs=groups["response_kwargs"],
+            interp_kwargs=groups["interp_kwargs"],
+            use_gpu=self.use_gpu,
+        )
+
+    def _candidates(self, candidates):
+        keys = list(candidates.keys())
+        for vals in itertools.product(*[candidates[key] for key in keys]):
+            yield dict(zip(keys, vals))
+
+    def _select(self, kind, groups_all, times):
+        """Store the fastest accepted candidate in :attr:`profile`"""
+        accepted = [i for i, res in enumerate(self.results[kind]) if res["accepted"]]
+        if len(accepted) == 0:
+            return None
+
+        best = min(accepted, key=lambda i: times[i])
+        for group in groups_all[best]:
+            self.profile[group] = groups_all[best][group]
+        self.profile[kind + "_result"] = self.results[kind][best]
+        return self.results[kind][best]
+
+    def tune_waveform(
+        self,
+        candidates={"length": [256, 512, 1024, 2048, 4096]},
+        max_mismatch=1e-4,
+        max_ll_error=None,
+        reference_modes=None,
+    ):
+        """Tune the settings of the interpolated waveform
+
+        All combinations of the candidate settings are tried. For each test
+        binary, the interpolated waveform :math:`h` is compared with the
+        reference :math:`h_\\text{ref}` through the mismatch,
+        :math:`1-\\langle h|h_\\text{ref}\\rangle/\\sqrt{\\langle h|h\\rangle\\langle h_\\text{ref}|h_\\text{ref}\\rangle}`,
+        and the log-Likelihood error,
+        :math:`\\frac{1}{2}\\langle h-h_\\text{ref}|h-h_\\text{ref}\\rangle`.
+        The timing is for the ``fill=False`` call used by
+        :class:`Likelihood <bbhx.likelihood.Likelihood>`.
+
+        Args:
+            candidates (dict, optional): Keys are settings (see ``SETTING_GROUPS``)
+                and values are lists of values to try.
+                (Default: ``{"length": [256, 512, 1024, 2048, 4096]}``)
+            max_mismatch (double, optional): Maximum mismatch over the test binaries.
+                (Default: ``1e-4``)
+            max_ll_error (double, optional): Maximum log-Likelihood error over
+                the test binaries. If ``None``, it is not checked. (Default: ``None``)
+            reference_modes (list, optional): Harmonic modes of the reference.
+                They are also used for candidates that do not set ``modes``.
+                If ``None``, use all available modes. (Default: ``None``)
+
+        Returns:
+            dict or None: Result of the fastest accepted candidate or ``None``
+                if no candidate meets the tolerance.
+
+        """
+        ref_gen = self._generator(self._settings({}))
+        h_ref = ref_gen(
+            *self.test_params,
+            freqs=self.data_freqs,
+            direct=True,
+            fill=True,
+            modes=reference_modes,
+            **self.waveform_kwargs,
+        )
+        ref_ref = self._inner(h_ref, h_ref)
+
+        self.results["waveform"] = []
+        groups_all = []
+        times = []
+        for settings in self._candidates(candidates):
+            groups = self._settings(settings)
+            if reference_modes is not None:
+                groups["waveform_kwargs"].setdefault("modes", reference_modes)
+
+            result = dict(settings=settings, accepted=False)
+            self.results["waveform"].append(result)
+            groups_all.append(groups)
+            times.append(np.inf)
+
+            try:
+                wave_gen = self._generator(groups)
+            except (NotImplementedError, ValueError) as e:
+                # setting not supported by this build
+                result["error"] = repr(e)
+                continue
+
+            call_kwargs = {**self.waveform_kwargs, **groups["waveform_kwargs"]}
+            h = wave_gen(
+                *self.test_params, freqs=self.data_freqs, fill=True, **call_kwargs
+            )
+            h_h = self._inner(h, h)
+            h_ref_h = self._inner(h_ref, h)
+
+            mismatch = 1.0 - h_ref_h / np.sqrt(h_h * ref_ref)
+            ll_error = 0.5 * (h_h + ref_ref - 2 * h_ref_h)
+            del h
+
+            result["mismatch"] = float(np.max(mismatch))
+            result["ll_error"] = float(np.max(ll_error))
+            result["accepted"] = result["mismatch"] <= max_mismatch and (
+                max_ll_error is None or result["ll_error"] <= max_ll_error
+            )
+
+            if not result["accepted"]:
+                continue
+
+            result["time"] = self._time(
+                lambda: wave_gen(
+                    *self.test_params,
+                    freqs=self.data_freqs,
+                    fill=False,
+                    **call_kwargs,
+                )
+            )
+            times[-1] = result["time"]
+
+        self.profile["waveform_tolerance"] = dict(
+            max_mismatch=max_mismatch, max_ll_error=max_ll_error
+        )
+        return self._select("waveform", groups_all, times)
+
+    def tune_heterodyne(
+        self,
+        reference_params,
+        candidates={"length_f_het": [33, 65, 129, 257], "order": [1, 2]},
+        max_ll_error=0.1,
+        reference_gen_kwargs={},
+    ):
+        """Tune the settings of :class:`HeterodynedLikelihood <bbhx.likelihood.HeterodynedLikelihood>`
+
+        The data is the reference waveform at ``reference_params`` without
+        noise. The heterodyned log-Likelihood of each test binary is compared
+        with the log-Likelihood computed directly on the data frequencies.
+        The harmonic modes are taken from the waveform settings in :attr:`profile`.
+        Combinations where ``length_f_het - 1`` is not divisible by ``order``
+        are skipped.
+
+        Args:
+            reference_params (double array-like): Parameters of the reference template.
+            candidates (dict, optional): Keys are settings (see ``SETTING_GROUPS``)
+                and values are lists of values to try.
+                (Default: ``{"length_f_het": [33, 65, 129, 257], "order": [1, 2]}``)
+            max_ll_error (double, optional): Maximum absolute log-Likelihood
+                error over the test binaries. (Default: ``0.1``)
+            reference_gen_kwargs (dict, optional): Keyword arguments for the
+                reference template. See :class:`HeterodynedLikelihood <bbhx.likelihood.HeterodynedLikelihood>`.
+                (Default: ``{}``)
+
+        Returns:
+            dict or None: Result of the fastest accepted candidate or ``None``
+                if no candidate meets the tolerance.
+
+        """
+        base = self._settings({})
+        modes = base["waveform_kwargs"].get("modes", None)
+        gen_kwargs = {**self.waveform_kwargs, **base["waveform_kwargs"]}
+        gen_kwargs.pop("length", None)
+
+        wave_gen = self._generator(base)
+        data = wave_gen(
+            *np.asarray(reference_params)[:, np.newaxis],
+            freqs=self.data_freqs,
+            direct=True,
+            fill=True,
+            **gen_kwargs,
+        )[0]
+
+        # exact log-Likelihood for each test binary
+        h = wave_gen(
+            *self.test_params,
+            freqs=self.data_freqs,
+            direct=True,
+            fill=True,
+            **gen_kwargs,
+        )
+        diff = data[self.xp.newaxis] - h
+        ll_exact = -0.5 * self._inner(diff, diff)
+        del h, diff
+
+        try:
+            data_freqs_host = self.data_freqs.get()
+            data_host = data.get()
+        except AttributeError:
+            data_freqs_host = self.data_freqs
+            data_host = data
+
+        reference_gen_kwargs = {**gen_kwargs, **reference_gen_kwargs}
+
+        self.results["heterodyne"] = []
+        groups_all = []
+        times = []
+        for settings in self._candidates(candidates):
+            groups = self._settings(settings)
+            het = groups["heterodyne_kwargs"]
+            het["modes"] = modes
+            result = dict(settings=settings, accepted=False)
+            self.results["heterodyne"].append(result)
+            groups_all.append(groups)
+            times.append(np.inf)
+
+            try:
+                like = HeterodynedLikelihood(
+                    wave_gen,
+                    data_freqs_host,
+                    data_host,
+                    reference_params,
+                    het.get("length_f_het", 129),
+                    order=het.get("order", 1),
+                    template_gen_kwargs=dict(gen_kwargs),
+                    reference_gen_kwargs=dict(reference_gen_kwargs),
+                    use_gpu=self.use_gpu,
+                )
+            except ValueError as e:
+                # e.g. length_f_het - 1 is not divisible by order
+                result["error"] = repr(e)
+                continue
+
+            ll_het = like.get_ll(self.test_params)
+            result["ll_error"] = float(np.max(np.abs(ll_het - ll_exact)))
+            result["accepted"] = result["ll_error"] <= max_ll_error
+
+            if not result["accepted"]:
+                continue
+
+            result["time"] = self._time(lambda: like.get_ll(self.test_params))
+            times[-1] = result["time"]
+
+        self.profile["heterodyne_tolerance"] = dict(max_ll_error=max_ll_error)
+        return self._select("heterodyne", groups_all, times)
@@ -0,0 +1,369 @@
+# Batched Fisher matrices and numerical gradients
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+from lisatools.sensitivity import SensitivityMatrix, AET1SensitivityMatrix
+
+from .utils.constants import *
+from .utils.citations import *
+
+# default finite-difference information for the inputs to BBHWaveformFD:
+# m1, m2, chi1z, chi2z, distance, phi_ref, f_ref, inc, lam, beta, psi, t_ref
+DEFAULT_STEP_SIZES = np.array(
+    [1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 0.0, 1e-6, 1e-6, 1e-6, 1e-6, 1e-3]
+)
+DEFAULT_RELATIVE_STEPS = np.array(
+    [True, True, False, False, True, False, False, False, False, False, False, False]
+)
+DEFAULT_PARAM_INDS = np.array([0, 1, 2, 3, 4, 5, 7, 8, 9, 10, 11])
+DEFAULT_PERIODIC = {5: 2 * np.pi, 8: 2 * np.pi, 10: np.pi}
+
+
+class FisherMatrixFD:
+    """Batched Fisher matrices and log-Likelihood gradients for MBHBs
+
+    Central finite differences are used for all derivatives. All perturbed
+    parameter sets for all points are stacked into one batch of binaries
+    so that the waveforms (or log-Likelihoods) are computed with a single
+    call rather than :math:`2N_\\text{dim}` calls per point.
+
+    Waveform derivatives of each harmonic are computed without interpolation
+    (``direct=True``) on a shared sparse frequency grid. The Fisher matrix,
+    :math:`F_{ij}=\\sum_{lm}\\langle\\partial_i h_{lm}|\\partial_j h_{lm}\\rangle`,
+    is then computed for all points in one vectorized pass. The integrand of
+    each harmonic does not oscillate, so a sparse grid is sufficient. The
+    cross terms between harmonics oscillate with the phase difference of
+    the harmonics and are neglected, because they cannot be resolved on a
+    sparse grid and average out over the signal. For waveforms with only
+    the (2,2) harmonic, this is the full Fisher matrix.
+
+    With ``cross_terms=True``, the derivatives of the summed harmonics
+    (``compress=True``) are used instead, so the cross terms are included.
+    This requires ``freqs`` to resolve the phase differences between the
+    harmonics, e.g. the dense data frequencies.
+
+    This class has GPU capabilities.
+
+    Args:
+        template_gen (obj): :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>` object.
+        freqs (double xp.ndarray): Sparse frequency grid on which to compute
+            the waveform derivatives. Must be sorted.
+        sens_mat (SensitivityMatrix, optional): :class:`SensitivityMatrix` object representing the AET channels.
+            If ``None``, defaults to class:`AET1SensitivityMatrix`. (Default: ``None``)
+        param_inds (int np.ndarray, optional): Indices of the parameters in the input
+            to ``template_gen`` to differentiate with respect to. If ``None``, all
+            parameters except ``f_ref`` are used. (Default: ``None``)
+        step_sizes (double np.ndarray, optional): Finite-difference step size for each
+            of the 12 ``template_gen`` parameters. If ``None``, use ``DEFAULT_STEP_SIZES``.
+            (Default: ``None``)
+        relative_steps (bool np.ndarray, optional): For each of the 12 ``template_gen``
+            parameters, if ``True``, the step size is relative to the parameter value.
+            If ``None``, use ``DEFAULT_RELATIVE_STEPS``. (Default: ``None``)
+        periodic (dict, optional): Keys are parameter indices and values are
+            their periods. Perturbed values of these parameters are wrapped.
+            If ``None``, use ``DEFAULT_PERIODIC``. (Default: ``None``)
+        batch_size (int, optional): Maximum number of binaries generated at once.
+            (Default: ``2000``)
+        use_gpu (bool, optional): If ``True``, use GPU. (Default: ``False``)
+
+    Attributes:
+        batch_size (int): Maximum number of binaries generated at once.
+        freqs (double xp.ndarray): Sparse frequency grid.
+        ndim (int): Number of parameters differentiated.
+        param_inds (int np.ndarray): Indices of the differentiated parameters.
+        periodic (dict): Periods of periodic parameters.
+        relative_steps (bool np.ndarray): Which step sizes are relative.
+        step_sizes (double np.ndarray): Step size for each ``template_gen`` parameter.
+        template_gen (obj): Waveform generator.
+        use_gpu (bool): If True, using GPU.
+        weights (double xp.ndarray): :math:`4\\Delta f/S_n(f)` with shape ``(3, len(freqs))``.
+        xp (obj): Either numpy or cupy.
+
+    """
+
+    def __init__(
+        self,
+        template_gen,
+        freqs,
+        sens_mat=None,
+        param_inds=None,
+        step_sizes=None,
+        relative_steps=None,
+        periodic=None,
+        batch_size=2000,
+        use_gpu=False,
+    ):
+
+        self.use_gpu = use_gpu
+        self.template_gen = template_gen
+        self.batch_size = batch_size
+
+        self.param_inds = np.asarray(
+            DEFAULT_PARAM_INDS if param_inds is None else param_inds, dtype=int
+        )
+        self.ndim = len(self.param_inds)
+
+        self.step_sizes = np.asarray(
+            DEFAULT_STEP_SIZES if step_sizes is None else step_sizes, dtype=float
+        )
+        self.relative_steps = np.asarray(
+            DEFAULT_RELATIVE_STEPS if relative_steps is None else relative_steps,
+            dtype=bool,
+        )
+        self.periodic = DEFAULT_PERIODIC if periodic is None else periodic
+
+        if np.any(self.step_sizes[self.param_inds] <= 0.0):
+            raise ValueError(
+                "All differentiated parameters must have positive step sizes."
+            )
+
+        self.freqs = self.xp.asarray(freqs)
+
+        try:
+            freqs_host = self.freqs.get()
+        except AttributeError:
+            freqs_host = self.freqs
+
+        if sens_mat is None:
+            sens_mat = AET1SensitivityMatrix(freqs_host)
+        else:
+            assert isinstance(sens_mat, SensitivityMatrix)
+            sens_mat.update_frequency_arr(freqs_host)
+
+        S_n = np.asarray([sens_mat[0], sens_mat[1], sens_mat[2]])
+
+        # trapezoidal weights on the (non-uniform) sparse grid
+        delta_f = np.gradient(freqs_host)
+        self.weights = self.xp.asarray(4 * delta_f / S_n)
+
+    @property
+    def xp(self):
+        """Numpy or Cupy"""
+        return xp if self.use_gpu else np
+
+    @property
+    def citation(self):
+        """Citations for this class"""
+        return self.template_gen.citation
+
+    def _check_points(self, points):
+        """Make sure ``points`` has shape ``(12, num_points)``."""
+        points = np.asarray(points, dtype=float)
+        if points.ndim == 1:
+            points = points[:, np.newaxis]
+
+        if points.ndim != 2:
+            raise ValueError("points must have shape (num_params, num_points).")
+
+        return points
+
+    def get_step_sizes(self, points):
+        """Get the finite-difference step sizes for each point
+
+        Args:
+            points (double np.ndarray): Parameters with shape ``(12, num_points)``.
+
+        Returns:
+            double np.ndarray: Step sizes with shape ``(ndim, num_points)``.
+
+        """
+        points = self._check_points(points)
+        steps = np.repeat(
+            self.step_sizes[self.param_inds, np.newaxis], points.shape[1], axis=1
+        )
+
+        relative = self.relative_steps[self.param_inds]
+        values = np.abs(points[self.param_inds])
+
+        # fall back to absolute steps for parameters that are zero
+        scale = np.where(relative[:, np.newaxis] & (values > 0.0), values, 1.0)
+        return steps * scale
+
+    def get_perturbed_params(self, points):
+        """Stack all perturbed parameter sets into one batch
+
+        Args:
+            points (double np.ndarray): Parameters with shape ``(12, num_points)``.
+
+        Returns:
+            tuple: (params, steps). ``params`` has shape
+                ``(12, num_points * ndim * 2)`` ordered as ``(point, dim, sign)``
+                with ``sign`` being ``(+, -)``. ``steps`` has shape ``(ndim, num_points)``.
+
+        """
+        points = self._check_points(points)
+        num_params, num_points = points.shape
+
+        steps = self.get_step_sizes(points)
+
+        params = np.repeat(points[:, :, np.newaxis, np.newaxis], self.ndim, axis=2)
+        params = np.repeat(params, 2, axis=3).copy()
+
+        dims = np.arange(self.ndim)
+        params[self.param_inds, :, dims, 0] += steps
+        params[self.param_inds, :, dims, 1] -= steps
+
+        for ind, period in self.periodic.items():
+            params[ind] %= period
+
+        return params.reshape(num_params, -1), steps
+
+    def get_derivatives(self, points, compress=False, **waveform_kwargs):
+        """Compute waveform derivatives for all points in one batch
+
+        Args:
+            points (double np.ndarray): Parameters with shape ``(12, num_points)``.
+            compress (bool, optional): If ``True``, differentiate the sum of the
+                harmonics instead of each harmonic. (Default: ``False``)
+            **waveform_kwargs (dict, optional): Keyword arguments for ``template_gen``.
+                ``freqs``, ``direct``, ``compress``, ``squeeze``, and ``fill`` are set internally.
+
+        Returns:
+            complex128 xp.ndarray: Derivatives with shape
+                ``(num_points, ndim, 3, num_modes, len(freqs))``. ``num_modes``
+                is 1 if ``compress`` is ``True``.
+
+        """
+        points = self._check_points(points)
+        num_points = points.shape[1]
+
+        params, steps = self.get_perturbed_params(points)
+        num_bin_all = params.shape[1]
+
+        waveform_kwargs["freqs"] = self.freqs
+        waveform_kwargs["direct"] = True
+        # harmonics are kept separate unless cross terms are needed
+        # (see the class docstring)
+        waveform_kwargs["compress"] = compress
+        waveform_kwargs["squeeze"] = False
+        waveform_kwargs["fill"] = False
+
+        h = None
+        for start in range(0, num_bin_all, self.batch_size):
+            end = min(start + self.batch_size, num_bin_all)
+            h_batch = self.template_gen(*params[:, start:end], **waveform_kwargs)
+            if compress:
+                h_batch = h_batch[:, :, np.newaxis]
+
+            if h is None:
+                h = self.xp.zeros(
+                    (num_bin_all,) + h_batch.shape[1:], dtype=self.xp.complex128
+                )
+            h[start:end] = h_batch
+
+        h = h.reshape((num_points, self.ndim, 2) + h.shape[1:])
+        steps = self.xp.asarray(steps.T)[:, :, np.newaxis, np.newaxis, np.newaxis]
+
+        return (h[:, :, 0] - h[:, :, 1]) / (2 * steps)
+
+    def get_fisher(self, points, cross_terms=False, **waveform_kwargs):
+        """Compute Fisher matrices for all points
+
+        Args:
+            points (double np.ndarray): Parameters with shape ``(12, num_points)``
+                or ``(12,)`` for a single point.
+            cross_terms (bool, optional): If ``True``, include the cross terms
+                between harmonics. ``freqs`` must then resolve the phase
+                differences between the harmonics (see the class docstring).
+                (Default: ``False``)
+            **waveform_kwargs (dict, optional): Keyword arguments for ``template_gen``.
+
+        Returns:
+            double np.ndarray: Fisher matrices with shape ``(num_points, ndim, ndim)``.
+
+        """
+        dh = self.get_derivatives(points, compress=cross_terms, **waveform_kwargs)
+
+        fisher = self.xp.einsum(
+            "picms,pjcms,cs->pij", dh.conj(), dh, self.weights, optimize=True
+        ).real
+
+        try:
+            fisher = fisher.get()
+        except AttributeError:
+            pass
+
+        return fisher
+
+    def get_covariance(self, points, cross_terms=False, **waveform_kwargs):
+        """Compute covariance matrices (inverse Fisher) for all points
+
+        Args:
+            points (double np.ndarray): Parameters with shape ``(12, num_points)``
+                or ``(12,)`` for a single point.
+            cross_terms (bool, optional): If ``True``, include the cross terms
+                between harmonics (see :meth:`get_fisher`). (Default: ``False``)
+            **waveform_kwargs (dict, optional): Keyword arguments for ``template_gen``.
+
+        Returns:
+            double np.ndarray: Covariance matrices with shape ``(num_points, ndim, ndim)``.
+
+        Raises:
+            ValueError: A diagonal entry of a Fisher matrix is not positive,
+                i.e. the waveform does not depend on that parameter.
+
+        """
+        fisher = self.get_fisher(points, cross_terms=cross_terms, **waveform_kwargs)
+
+        diag = np.diagonal(fisher, axis1=1, axis2=2)
+        if np.any(~(diag > 0.0)):
+            point_i, dim_i = np.argwhere(~(diag > 0.0))[0]
+            raise ValueError(
+                f"Fisher matrix of point {point_i} has a diagonal entry of {diag[point_i, dim_i]} for parameter index {self.param_inds[dim_i]}."
+            )
+
+        # scale to unit diagonal for numerical stability
+        scale = 1.0 / np.sqrt(diag)
+        fisher_scaled = fisher * scale[:, :, np.newaxis] * scale[:, np.newaxis, :]
+
+        cov = np.linalg.pinv(fisher_scaled, hermitian=True)
+        return cov * scale[:, :, np.newaxis] * scale[:, np.newaxis, :]
+
+    def get_gradient(self, like, points, **waveform_kwargs):
+        """Compute log-Likelihood gradients for all points in one batch
+
+        All perturbed parameter sets are evaluated with a single call to
+        ``like.get_ll``. This works with
+        :class:`Likelihood <bbhx.likelihood.Likelihood>` and
+        :class:`HeterodynedLikelihood <bbhx.likelihood.HeterodynedLikelihood>`.
+
+        Args:
+            like (obj): Likelihood object with a ``get_ll`` method.
+            points (double np.ndarray): Parameters with shape ``(12, num_points)``
+                or ``(12,)`` for a single point.
+            **waveform_kwargs (dict, optional): Keyword arguments for ``like.get_ll``.
+
+        Returns:
+            double np.ndarray: Gradients with shape ``(num_points, ndim)``.
+
+        """
+        points = self._check_points(points)
+        num_points = points.shape[1]
+
+        params, steps = self.get_perturbed_params(points)
+
+        ll = np.asarray(like.get_ll(params, **waveform_kwargs))
+        ll = ll.reshape(num_points, self.ndim, 2)
+
+        return (ll[:, :, 0] - ll[:, :, 1]) / (2 * steps.T)
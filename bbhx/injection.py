@@ -0,0 +1,226 @@
+# Catalog injection into LISA data streams
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+
+import numpy as np
+
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+from .utils.citations import *
+
+
+class CatalogInjectionFD:
+    """Inject a catalog of MBHBs into a single frequency-domain data stream
+
+    The catalog is streamed through ``template_gen`` in batches of at most
+    ``batch_size`` binaries. After each batch is generated on the sparse
+    grid and interpolated to the data frequencies, the templates are
+    scatter-added into the output buffer in C/CUDA so that sources that
+    overlap in frequency accumulate properly. Memory usage is therefore
+    bounded by the batch size rather than the size of the catalog.
+
+    The output buffer can be an array in memory, an ``np.memmap`` opened
+    in a writeable mode, or any object supporting slice reads and writes
+    with a ``shape`` attribute (e.g. an ``h5py`` dataset). For the last case,
+    and for host buffers when running on the GPU, each batch is added into
+    the part of the data stream that it covers in slabs of at most
+    ``slab_size`` frequencies, which are read, added to, and written back
+    one at a time.
+
+    This class has GPU capabilities.
+
+    Args:
+        template_gen (obj): :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>` object.
+        data_freqs (double xp.ndarray): Frequencies of the data stream.
+        batch_size (int, optional): Maximum number of binaries generated at once.
+            (Default: ``1000``)
+        slab_size (int, optional): Maximum number of data frequencies held at
+            once when adding into the output buffer in slabs. (Default: ``2**20``)
+        verbose (bool, optional): If ``True``, print progress after each batch.
+            (Default: ``False``)
+
+    Attributes:
+        batch_size (int): Maximum number of binaries generated at once.
+        data_freqs (double xp.ndarray): Frequencies of the data stream.
+        data_length (int): Length of the data stream.
+        slab_size (int): Maximum number of data frequencies held at once
+            when adding into the output buffer in slabs.
+        stats (dict): Progress and throughput information from the last call.
+            Keys are ``num_binaries``, ``num_batches``, ``generate_time``,
+            ``inject_time``, ``total_time``, and ``binaries_per_sec``.
+        template_gen (obj): Waveform generator.
+        use_gpu (bool): If ``True``, using GPU.
+        verbose (bool): If ``True``, print progress after each batch.
+        xp (obj): Either numpy or cupy.
+
+    """
+
+    def __init__(
+        self, template_gen, data_freqs, batch_size=1000, slab_size=2**20, verbose=False
+    ):
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer.")
+
+        if slab_size < 1:
+            raise ValueError("slab_size must be a positive integer.")
+
+        self.template_gen = template_gen
+        self.use_gpu = template_gen.use_gpu
+        self.xp = xp if self.use_gpu else np
+
+        self.data_freqs = self.xp.asarray(data_freqs)
+        self.data_length = len(self.data_freqs)
+        self.batch_size = batch_size
+        self.slab_size = slab_size
+        self.verbose = verbose
+
+        self.stats = {}
+
+    @property
+    def citation(self):
+        """Citations for this class"""
+        return self.template_gen.citation
+
+    def _is_direct_buffer(self, data_out):
+        """Determine if the kernel can add directly into ``data_out``."""
+        if self.use_gpu:
+            return isinstance(data_out, xp.ndarray)
+        return isinstance(data_out, np.ndarray)
+
+    def _check_output(self, data_out):
+        """Make sure the output buffer has the right properties."""
+        if tuple(data_out.shape) != (3, self.data_length):
+            raise ValueError(
+                f"data_out must have shape (3, {self.data_length}). Current shape is {data_out.shape}."
+            )
+
+        if np.dtype(data_out.dtype) != np.complex128:
+            raise ValueError("data_out must have dtype complex128.")
+
+        if isinstance(data_out, np.memmap) and data_out.mode == "r":
+            raise ValueError("np.memmap output must be opened in a writeable mode.")
+
+    def __call__(self, params, data_out=None, **waveform_kwargs):
+        """Inject all binaries into the data stream
+
+        Args:
+            params (double np.ndarray): Parameters for ``template_gen`` with shape
+                ``(num_params, num_bin_all)``. This is the same ordering as
+                the input to :meth:`Likelihood.get_ll <bbhx.likelihood.Likelihood.get_ll>`.
+            data_out (complex128 array-like, optional): Buffer with shape
+                ``(3, data_length)`` that the catalog is added into. If ``None``,
+                a zero-initialized xp.ndarray is created. (Default: ``None``)
+            **waveform_kwargs (dict, optional): Keyword arguments for ``template_gen``.
+                ``freqs``, ``direct``, and ``fill`` are set internally.
+                ``length`` must be given.
+
+        Returns:
+            array-like: ``data_out`` with the catalog added in.
+
+        Raises:
+            ValueError: Inputs are not correct.
+
+        """
+
+        params = np.atleast_2d(params)
+        num_bin_all = params.shape[1]
+
+        if data_out is None:
+            data_out = self.xp.zeros((3, self.data_length), dtype=self.xp.complex128)
+
+        self._check_output(data_out)
+        direct_buffer = self._is_direct_buffer(data_out)
+
+        if direct_buffer and not data_out.flags.c_contiguous:
+            raise ValueError("data_out must be C-contiguous.")
+
+        waveform_kwargs["freqs"] = self.data_freqs
+        waveform_kwargs["direct"] = False
+        waveform_kwargs["fill"] = False
+
+        interp_response = self.template_gen.interp_response
+
+        num_batches = int(np.ceil(num_bin_all / self.batch_size))
+        generate_time = 0.0
+        inject_time = 0.0
+        st_all = time.perf_counter()
+        for batch_i in range(num_batches):
+            start = batch_i * self.batch_size
+            end = min(start + self.batch_size, num_bin_all)
+
+            st = time.perf_counter()
+            self.template_gen(*params[:, start:end], **waveform_kwargs)
+            generate_time += time.perf_counter() - st
+
+            st = time.perf_counter()
+            if direct_buffer:
+                interp_response.inject(data_out)
+
+            else:
+                # part of the data stream covered by this batch
+                batch_start = int(interp_response.start_inds.min())
+                batch_end = int(
+                    (interp_response.start_inds + interp_response.lengths).max()
+                )
+
+                # one slab at a time to bound the memory
+                for slab_start in range(batch_start, batch_end, self.slab_size):
+                    slab_end = min(slab_start + self.slab_size, batch_end)
+                    slab = self.xp.ascontiguousarray(
+                        self.xp.asarray(data_out[:, slab_start:slab_end])
+                    )
+                    interp_response.inject(slab, start_offset=slab_start)
+
+                    try:
+                        slab = slab.get()
+                    except AttributeError:
+                        pass
+
+                    data_out[:, slab_start:slab_end] = slab
+
+            if self.use_gpu:
+                xp.cuda.runtime.deviceSynchronize()
+
+            inject_time += time.perf_counter() - st
+
+            if self.verbose:
+                elapsed = time.perf_counter() - st_all
+                print(
+                    f"Batch {batch_i + 1}/{num_batches}: {end}/{num_bin_all} binaries, {end / elapsed:.2f} binaries/sec"
+                )
+
+        total_time = time.perf_counter() - st_all
+
+        if isinstance(data_out, np.memmap):
+            data_out.flush()
+
+        self.stats = dict(
+            num_binaries=num_bin_all,
+            num_batches=num_batches,
+            generate_time=generate_time,
+            inject_time=inject_time,
+            total_time=total_time,
+            binaries_per_sec=num_bin_all / total_time if total_time > 0.0 else np.inf,
+        )
+
+        return data_out
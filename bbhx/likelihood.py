@@ -20,8 +20,13 @@ import numpy as np
 try:
     import cupy as cp
     from pyLikelihood import hdyn_wrap as hdyn_wrap_gpu
+    from pyLikelihood import hdyn_modes_wrap as hdyn_modes_wrap_gpu
+    from pyLikelihood import hdyn_order_wrap as hdyn_order_wrap_gpu
     from pyLikelihood import direct_like_wrap as direct_like_wrap_gpu
+    from pyLikelihood import direct_like_bands_wrap as direct_like_bands_wrap_gpu
     from pyLikelihood import prep_hdyn as prep_hdyn_gpu
+    from pyLikelihood import update_residual_wrap as update_residual_wrap_gpu
+    from pyLikelihood import cross_terms_wrap as cross_terms_wrap_gpu
 
 except (ImportError, ModuleNotFoundError) as e:
     print("No CuPy")
@@ -29,9 +34,18 @@ except (ImportError, ModuleNotFoundError) as e:
 
 from pyLikelihood_cpu import prep_hdyn as prep_hdyn_cpu
 from pyLikelihood_cpu import hdyn_wrap as hdyn_wrap_cpu
+from pyLikelihood_cpu import hdyn_modes_wrap as hdyn_modes_wrap_cpu
+from pyLikelihood_cpu import hdyn_order_wrap as hdyn_order_wrap_cpu
 from pyLikelihood_cpu import direct_like_wrap as direct_like_wrap_cpu
+from pyLikelihood_cpu import direct_like_bands_wrap as direct_like_bands_wrap_cpu
+from pyLikelihood_cpu import update_residual_wrap as update_residual_wrap_cpu
+from pyLikelihood_cpu import cross_terms_wrap as cross_terms_wrap_cpu
 
 from bbhx.utils.constants import *
+from bbhx.utils.utility import load_array, pointer_array, MemoryTracker
+from bbhx.utils.cache import DiskCache, cache_key
+from bbhx.utils.profile import load_profile
+from bbhx.utils.transform import apply_param_transform
 
 from lisatools.sensitivity import SensitivityMatrix, AET1SensitivityMatrix
 
@@ -57,11 +71,28 @@ class Likelihood:
         data_channels (complex128 xp.ndarray): Data stream. 2D array of shape: ``(3, len(data_freqs))``.
             It is assumed there are 3 channels. ``data_channels``
             should be a numpy (cupy) array if running on the CPU (GPU).
+            It can also be an ``np.memmap`` or a path to a ``.npy`` file,
+            which is memory-mapped and read in chunks.
         psd (double xp.ndarray): Power Spectral Density in the noise:math:`S_n(f)`.
             2D array of shape: ``(3, len(data_freqs))``.
             It is assumed there are 3 channels. ``psd``
             should be a numpy (cupy) array if running on the CPU (GPU).
+            It can also be an ``np.memmap`` or a path to a ``.npy`` file.
         use_gpu (bool, optional): If ``True``, use GPU.
+        chunk_size (int, optional): Number of frequencies processed at once
+            when computing the noise weights and :math:`\\langle d|d\\rangle`.
+            (Default: ``2**20``)
+        param_transform (obj, optional): Transformation applied to ``params`` in
+            :meth:`get_ll` before generating templates, e.g.
+            :class:`SamplerTransform <bbhx.utils.transform.SamplerTransform>`.
+            If ``None``, ``params`` are passed directly. (Default: ``None``)
+        memory_budget (int, optional): Approximate memory in bytes for the
+            waveform buffers in :meth:`get_ll`. Larger batches are split
+            into chunks (see :meth:`get_batch_size`). If ``None``, all
+            binaries are generated at once. (Default: ``None``)
+        track_memory (bool, optional): If ``True``, record the peak host memory
+            of the setup in :attr:`peak_memory` with :mod:`tracemalloc`. This
+            is process-wide and does not include GPU memory. (Default: ``False``)
 
     Attributes:
         use_gpu (bool): If True, using GPU.
@@ -73,10 +104,12 @@ class Likelihood:
         data_freqs (double np.ndarray): Frequencies for the data stream (1D).
         data_stream_length (int): Length of data.
         like_gen (obj): C/CUDA implementation of likelihood compuation.
+        memory_budget (int): Approximate memory in bytes for the waveform buffers.
         noise_factors (double xp.ndarray): :math:`\\sqrt{\\frac{\\Delta f}{S_n(f)}}`.
             1D flattened array of shape: ``(3, len(data_freqs))``.
-        psd (double xp.ndarray): Power Spectral Density in the noise:math:`S_n(f)`.
-            1D flattened array of shape: ``(3, len(data_freqs))``.
+        param_transform (obj): Transformation applied to ``params`` in :meth:`get_ll`.
+        peak_memory (int): Peak host memory in bytes allocated while setting up
+            the class. ``None`` if ``track_memory`` is ``False``.
         template_gen (obj): Waveform generation class that returns a tuple of
             (list of template arrays, start indices, lengths). See
             :class:`bbhx.waveform.BBHWaveformFD` for more information on this
@@ -95,45 +128,85 @@ class Likelihood:
         data_channels,
         psd,
         use_gpu=False,
+        chunk_size=2**20,
+        param_transform=None,
+        memory_budget=None,
+        track_memory=False,
     ):
 
         self.use_gpu = use_gpu
+        self.chunk_size = chunk_size
+        self.param_transform = param_transform
+        self.memory_budget = memory_budget
+
+        data_freqs = load_array(data_freqs)
+        data_channels = load_array(data_channels)
+        psd = load_array(psd)
 
         # store required information
-        self.data_freqs = data_freqs
+        self.data_freqs = self.xp.asarray(data_freqs)
 
         try:
             data_freqs_cpu = data_freqs.get()
         except AttributeError:
             data_freqs_cpu = data_freqs
 
-        # will not store psd or delta_f on GPU if being used
-        try:
-            psd = psd.get()
-        except AttributeError:
-            pass
+        self.waveform_gen = template_gen
+        self.data_stream_length = len(data_freqs)
 
-        self.psd = np.asarray(psd)
-        self.delta_f = np.zeros_like(self.psd)
-        self.delta_f[:, 1:] = np.diff(data_freqs_cpu)
-        self.delta_f[:, 0] = self.delta_f[:, 1]
+        with MemoryTracker(enabled=track_memory) as tracker:
+            self.noise_factors, self.data_channels, self.d_d = self._prepare_data(
+                data_freqs_cpu, data_channels, psd
+            )
 
-        self.noise_factors = self.xp.asarray(
-            np.sqrt(1.0 / psd * self.delta_f)
-        ).flatten()
+        self.peak_memory = tracker.peak
 
-        # store and adjust data_channels
-        self.data_channels = self.noise_factors * self.xp.asarray(
-            data_channels.flatten()
-        )
+    def _prepare_data(self, data_freqs_cpu, data_channels, psd):
+        """Compute noise weights and the weighted data stream in chunks
 
-        self.waveform_gen = template_gen
-        self.data_stream_length = len(data_freqs)
+        The inputs are only read one chunk at a time, so memory-mapped
+        inputs are never fully loaded into memory.
 
-        # assumes data_channels is already factored by psd
-        self.d_d = (
-            4 * self.xp.sum((self.data_channels.conj() * self.data_channels)).real
-        ).item()
+        Args:
+            data_freqs_cpu (double np.ndarray): Frequencies for the data stream.
+            data_channels (complex128 array-like): Data stream with shape ``(3, len(data_freqs))``.
+            psd (double array-like): PSD with shape ``(3, len(data_freqs))``.
+
+        Returns:
+            tuple: (noise_factors, weighted data_channels, d_d).
+
+        """
+        N = self.data_stream_length
+
+        noise_factors = self.xp.empty((3, N), dtype=self.xp.float64)
+        data_out = self.xp.empty((3, N), dtype=self.xp.complex128)
+
+        d_d = 0.0
+        for start in range(0, N, self.chunk_size):
+            end = min(start + self.chunk_size, N)
+
+            # delta_f[0] is set to delta_f[1]
+            f_chunk = np.asarray(data_freqs_cpu[max(start - 1, 0) : end])
+            delta_f = np.diff(f_chunk)
+            if start == 0:
+                delta_f = np.concatenate([delta_f[:1], delta_f])
+
+            psd_chunk = psd[:, start:end]
+            try:
+                psd_chunk = psd_chunk.get()
+            except AttributeError:
+                psd_chunk = np.asarray(psd_chunk)
+
+            nf = self.xp.asarray(np.sqrt(delta_f / psd_chunk))
+            noise_factors[:, start:end] = nf
+
+            # assumes data_channels is already factored by psd
+            data_chunk = nf * self.xp.asarray(data_channels[:, start:end])
+            data_out[:, start:end] = data_chunk
+
+            d_d += (4 * self.xp.sum(data_chunk.conj() * data_chunk).real).item()
+
+        return noise_factors.reshape(-1), data_out.reshape(-1), d_d
 
     @property
     def like_gen(self):
@@ -151,6 +224,94 @@ class Likelihood:
     def citation(self):
         return katz_citations
 
+    def get_batch_size(self, num_bin_all, length=None, modes=None):
+        """Number of binaries generated at once in :meth:`get_ll`
+
+        The memory of one binary is estimated from the sparse buffers
+        (waveform, response, and spline coefficients) and the worst case of a
+        template that covers the whole data stream. Each chunk is made as
+        large as ``memory_budget`` allows, because the throughput per binary
+        increases with the batch size until the device is saturated. The
+        batch is then split evenly, so the chunks have the same size and the
+        sparse buffers of the waveform generator are reused.
+
+        Args:
+            num_bin_all (int): Number of binaries.
+            length (int, optional): ``length`` of the sparse frequency grid.
+                (Default: ``None``)
+            modes (list, optional): Harmonic modes. If ``None``, all modes
+                of the waveform model are assumed. (Default: ``None``)
+
+        Returns:
+            int: Number of binaries per chunk.
+
+        """
+        if self.memory_budget is None:
+            return num_bin_all
+
+        if modes is None:
+            amp_phase_gen = getattr(self.waveform_gen, "amp_phase_gen", None)
+            num_modes = len(getattr(amp_phase_gen, "allowable_modes", [None] * 6))
+        else:
+            num_modes = len(modes)
+
+        length = 0 if length is None else length
+
+        # 9 interpolated quantities: buffer, spline coefficients, and blocked layout
+        sparse_bytes = 10 * 9 * length * num_modes * 8
+
+        # 3 complex channels (48 bytes per frequency) plus window indices and
+        # temporaries during the interpolation (measured peak of ~96 bytes)
+        dense_bytes = 96 * self.data_stream_length
+
+        max_batch = max(int(self.memory_budget // (sparse_bytes + dense_bytes)), 1)
+        num_chunks = -(-num_bin_all // max_batch)
+        return -(-num_bin_all // num_chunks)
+
+    def _generate_batches(self, params, **waveform_kwargs):
+        """Generate templates for the likelihood functions in chunks
+
+        Args:
+            params (double np.ndarray): Parameters with shape ``(num_params,)``
+                or ``(num_params, num_bin_all)``.
+            **waveform_kwargs (dict, optional): Keyword arguments for waveform generator.
+
+        Yields:
+            tuple: (slice of the binaries, template pointers, start indices, lengths).
+                The templates stay valid until the next chunk is generated.
+
+        """
+        waveform_kwargs["freqs"] = self.data_freqs
+        waveform_kwargs["fill"] = False
+        waveform_kwargs["direct"] = False
+
+        params = np.asarray(apply_param_transform(self.param_transform, params))
+        if params.ndim == 1:
+            params = params[:, np.newaxis]
+
+        num_bin_all = params.shape[1]
+        batch_size = self.get_batch_size(
+            num_bin_all,
+            length=waveform_kwargs.get("length", None),
+            modes=waveform_kwargs.get("modes", None),
+        )
+
+        for start in range(0, num_bin_all, batch_size):
+            end = min(start + batch_size, num_bin_all)
+
+            # get information from waveform generators
+            templateChannels, inds_start, ind_lengths = self.waveform_gen(
+                *params[:, start:end], **waveform_kwargs
+            )
+
+            # copies, because the likelihood kernels noise-weight the templates in place
+            # and these are views of the generator's template buffer
+            templateChannels = [tc.flatten() for tc in templateChannels]
+
+            yield slice(start, end), pointer_array(
+                templateChannels
+            ), inds_start, ind_lengths
+
     def get_ll(
         self,
         params,
@@ -183,379 +344,1538 @@ class Likelihood:
         self.phase_marginalize = phase_marginalize
         self.return_extracted_snr = return_extracted_snr
 
-        # setup kwargs properly
+        num_bin_all = 1 if np.ndim(params) == 1 else np.shape(params)[1]
+
+        # initialize inner product info
+        self.d_h = np.zeros(num_bin_all, dtype=self.xp.complex128)
+        self.h_h = np.zeros(num_bin_all, dtype=self.xp.complex128)
+
+        for inds, templateChannels_ptrs, inds_start, ind_lengths in self._generate_batches(
+            params, **waveform_kwargs
+        ):
+            self.like_gen(
+                self.d_h[inds],
+                self.h_h[inds],
+                self.data_channels,
+                self.noise_factors,
+                templateChannels_ptrs,
+                inds_start,
+                ind_lengths,
+                self.data_stream_length,
+                inds.stop - inds.start,
+            )
+
+        # phase marginalize in d_h term
+        d_h_temp = self.d_h if not self.phase_marginalize else self.xp.abs(self.d_h)
+        out = -1 / 2 * (self.d_d + self.h_h - 2 * d_h_temp).real
+        # get out of cupy if needed
+        try:
+            out = out.get()
+
+        except AttributeError:
+            pass
+
+        if self.return_extracted_snr:
+            return np.array([out, d_h_temp.real / np.sqrt(self.h_h.real)]).T
+        else:
+            return out
+
+
+class ResidualLikelihood(Likelihood):
+    """Direct Likelihood against a residual that is updated in place
+
+    For global-fit style (Gibbs) updates, individual MBHB templates are
+    swapped in and out of the residual data stream
+    :math:`r = d - \\sum_i h_i`. The noise-weighted residual is kept in place
+    and each source is added or subtracted only over its support
+    ``[start_ind, start_ind + length)`` given by the sparse output of
+    :class:`TemplateInterpFD <bbhx.waveformbuild.TemplateInterpFD>`.
+    :math:`\\langle r|r\\rangle` is updated from the touched bins. Therefore,
+    the cost of an update scales with the bandwidth of the source, not the
+    length of the data stream.
+
+    :meth:`get_ll <Likelihood.get_ll>` computes the log-Likelihood of test
+    templates against the current residual.
+
+    This class has GPU capability.
+
+    Args:
+        *args (tuple): Arguments for :class:`Likelihood`.
+        **kwargs (dict): Keyword arguments for :class:`Likelihood`.
+
+    Attributes:
+        d_d (double): :math:`\\langle r|r\\rangle` for the current residual.
+        sources (dict): Sources currently subtracted from the residual. Keys are
+            the source keys. Values are tuples of (params, waveform_kwargs).
+        update_gen (obj): C/CUDA implementation of the residual update.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sources = {}
+        self._next_key = 0
+
+    @property
+    def update_gen(self):
+        """Residual update for either GPU or CPU."""
+        update_gen = (
+            update_residual_wrap_gpu if self.use_gpu else update_residual_wrap_cpu
+        )
+        return update_gen
+
+    @property
+    def residual(self):
+        """Noise-weighted residual with shape ``(3, data_stream_length)``."""
+        return self.data_channels.reshape(3, self.data_stream_length)
+
+    def _update_residual(self, params, factors, **waveform_kwargs):
+        """Add ``factors * h`` into the residual for each binary in ``params``."""
+        params = apply_param_transform(self.param_transform, params)
+
         waveform_kwargs["freqs"] = self.data_freqs
         waveform_kwargs["fill"] = False
         waveform_kwargs["direct"] = False
 
-        # get information from waveform generators
         templateChannels, inds_start, ind_lengths = self.waveform_gen(
             *params, **waveform_kwargs
         )
 
-        # get flattened templates to remove channel dimension
         templateChannels = [tc.flatten() for tc in templateChannels]
 
-        # adjust for cupy vs numpy
-        try:
-            templateChannels_ptrs = np.asarray(
-                [tc.data.ptr for tc in templateChannels], dtype=np.int64
-            )
-        except AttributeError:
-            templateChannels_ptrs = np.asarray(
-                [tc.__array_interface__["data"][0] for tc in templateChannels],
-                dtype=np.int64,
-            )
+        templateChannels_ptrs = pointer_array(templateChannels)
 
-        # initialize inner product info
-        self.d_h = np.zeros(self.waveform_gen.num_bin_all, dtype=self.xp.complex128)
-        self.h_h = np.zeros(self.waveform_gen.num_bin_all, dtype=self.xp.complex128)
+        d_d_change = self.xp.zeros(1, dtype=self.xp.float64)
 
-        self.like_gen(
-            self.d_h,
-            self.h_h,
+        self.update_gen(
             self.data_channels,
             self.noise_factors,
             templateChannels_ptrs,
             inds_start,
             ind_lengths,
+            np.asarray(factors, dtype=np.float64),
+            d_d_change,
             self.data_stream_length,
             self.waveform_gen.num_bin_all,
+            3,
         )
 
-        # phase marginalize in d_h term
-        d_h_temp = self.d_h if not self.phase_marginalize else self.xp.abs(self.d_h)
-        out = -1 / 2 * (self.d_d + self.h_h - 2 * d_h_temp).real
-        # get out of cupy if needed
-        try:
-            out = out.get()
+        d_d_change = d_d_change[0].item()
+        self.d_d += d_d_change
+        return d_d_change
 
-        except AttributeError:
-            pass
+    def add_source(self, params, key=None, **waveform_kwargs):
+        """Subtract a source from the residual
 
-        if self.return_extracted_snr:
-            return np.array([out, d_h_temp.real / np.sqrt(self.h_h.real)]).T
-        else:
-            return out
+        Args:
+            params (double np.ndarray): Parameters of a single source with
+                shape ``(num_params,)``.
+            key (hashable, optional): Key to refer to the source. If ``None``,
+                an integer key is assigned. (Default: ``None``)
+            **waveform_kwargs (dict, optional): Keyword arguments for the waveform
+                generator. They are stored to regenerate the source when it is
+                removed. ``length`` must be given.
 
+        Returns:
+            hashable: Key of the source.
 
-class HeterodynedLikelihood:
-    """Compute the Heterodyned log-Likelihood
+        Raises:
+            ValueError: ``key`` is already used.
 
-    Heterdyning involves separating the fast and slow evolutions when comparing
-    signals. This involves comparing a reference template to the data stream and determining
-    various quantities at the full frequency resolution of the data stream. Then, during
-    online computation, the log-Likelihood is determined by computing a new waveform
-    on a sparse frequency grid and comparing it to the reference waveform on the same
-    sparse grid. The practical aspect is the computation of a smaller number of frequency
-    points which lowers the required  memory and increases the speed of the computation.
-    More information on the general method can be found in
-    `arXiv:2109.02728 <https://arxiv.org/abs/2109.02728>`_. We implement the method
-    as described in `arXiv:1806.08792 <https://arxiv.org/abs/1806.08792>`_.
+        """
+        params = np.array(params, dtype=np.float64)
 
-    This class also works with higher order harmonic modes, but it has not been tested extensivally.
-    It only does a direct summation over the modes rather than heterodyning per mode. So, it is less reliable,
-    but in practice it produces a solid posterior distribution.
+        if key is None:
+            while self._next_key in self.sources:
+                self._next_key += 1
+            key = self._next_key
 
-    This class has GPU capabilities.
+        if key in self.sources:
+            raise ValueError(f"A source with key {key} is already in the residual.")
 
-    Args:
-        template_gen (obj): Waveform generation class that returns a tuple of
-            (list of template arrays, start indices, lengths). See
-            :class:`bbhx.waveform.BBHWaveformFD` for more information on this
-            return type.
-        data_freqs (double xp.ndarray): Frequencies for the data stream. ``data_freqs``
-            should be a numpy (cupy) array if running on the CPU (GPU).
-        data_channels (complex128 xp.ndarray): Data stream. 2D array of shape: ``(3, len(data_freqs))``.
-            It is assumed there are 3 channels. ``data_channels``
-            should be a numpy (cupy) array if running on the CPU (GPU).
-        reference_template_params (np.ndarray): Parameters for the reference template for
-            ``template_gen``.
-        template_gen_kwargs (dict, optional): Keywords arguments for generating the
-            template with ``template_gen``. It will automatically add/change ``direct``
-            and ``compress`` keyword arguments to ``True``. The keyword argument
-            ``squeeze`` is automatically set to ``True`` for the initial setup and then
-            automatically set to ``False`` for online computations. If you so choose (not
-            recomended), you can change these kwargs for online running using the
-            ``**waveform_kwargs`` setup in the ``self.get_ll`` method. However,
-            if you include in this adjustment ``direct``, ``compress``, or ``squeeze``
-            will still automatically be overwritten.
-            (Default: ``{}``)
-        reference_gen_kwargs (dict, optional): Keywords arguments for generating the
-            reference template with ``template_gen``. It will automatically add/change
-            ``fill``, ``compress``, and ``squeeze`` keyword arguments to ``True``.
-            These waveforms can be produced without interpolation with ``direct = True``.
-            If ``length`` keyword argument is given and ``direct=False``, the
-            waveform will be interpolated. If ``length`` and ``direct`` are not given,
-            it will interpolate the signal with ``length=8096``.
-            (Default: ``{}``)
-        sens_mat (SensitivityMatrix, optional): :class:`SensitivityMatrix` object representing the AET channels.
-            If ``None``, defaults to class:`AET1SensitivityMatrix`. (default: ``None``)
-        use_gpu (bool, optional): If ``True``, use GPU.
+        self._update_residual(params[:, np.newaxis], [-1.0], **waveform_kwargs.copy())
+        self.sources[key] = (params, waveform_kwargs)
+        return key
 
-    Attributes:
-        reference_d_d (double): :math:`\langle d|d\\rangle` inner product value.
-        reference_h_h(double): :math:`\langle h|h\\rangle` inner product value
-            for the reference template.
-        reference_d_h (double): :math:`\langle d|h\\rangle` inner product value
-            for the reference template.
-        reference_ll (double): log-Likelihood value for the reference template.
-        hdyn_d_h (complex128 xp.ndarray): Heterodyned :math:`\langle d|h\\rangle`
-            inner product values for the test templates.
-        hdyn_h_h (complex128 xp.ndarray): Heterodyned :math:`\langle d|h\\rangle`
-            inner product values for the test templates.
-        h0_sparse (xp.ndarray): Array with sparse waveform for reference parameters.
-        h_sparse (xp.ndarray): Array with sparse waveform for test parameters.
-        d (complex128 xp.ndarray): Data stream. 1D flattened array
-            of shape: ``(3, len(data_freqs))``.
-        data_stream_length (int): Length of data.
-        data_constants (xp.ndarray): Flattened array container holding all heterodyning
-            constants needed: A0, A1, B0, B1.
-        f_dense (xp.ndarray): Frequencies for the data stream (1D).
-        freqs (xp.ndarray): Frequencies for sparse arrays.
-        f_m (xp.ndarray): Frequency of mid-point in each sparse bin.
-        length_f_het (int): Length of sparse array.
-        like_gen (obj): C/CUDA implementation of likelihood compuation.
-        psd (double xp.ndarray): :math:`\\sqrt{\\frac{\\Delta f}{S_n(f)}}`.
-            1D flattened array of shape: ``(3, len(data_freqs))``.
-        template_gen (obj): Waveform generation class that returns a tuple of
-            (list of template arrays, start indices, lengths). See
-            :class:`bbhx.waveform.BBHWaveformFD` for more information on this
-            return type.
-        return_extracted_snr (bool): Return the snr in addition to the Likeilihood.
-        phase_marginalize (bool): If ``True``, compute the phase-marginalized
-            log-Likelihood (and snr if ``return_extracted_snr==True``).
-        use_gpu (bool): If True, using GPU.
-        xp (obj): Either numpy or cupy.
+    def remove_source(self, key):
+        """Add a source back into the residual
 
+        Args:
+            key (hashable): Key of the source.
 
+        Returns:
+            tuple: (params, waveform_kwargs) of the removed source.
 
-    """
+        """
+        params, waveform_kwargs = self.sources.pop(key)
+        self._update_residual(
+            params[:, np.newaxis], [1.0], **waveform_kwargs.copy()
+        )
+        return params, waveform_kwargs
 
-    def __init__(
-        self,
-        template_gen,
-        data_freqs,
-        data_channels,
-        reference_template_params,
-        length_f_het,
-        template_gen_kwargs={},
-        reference_gen_kwargs={},
-        sens_mat=None,
-        use_gpu=False,
-    ):
+    def swap_source(self, key, params):
+        """Replace the parameters of a source in the residual
 
-        # store all input information
-        self.template_gen = template_gen
-        self.f_dense = data_freqs
-        self.d = data_channels
-        self.length_f_het = length_f_het
+        The old and new templates are generated together with the stored
+        waveform keyword arguments and applied in one residual update.
 
-        # direct based on GPU usage
-        self.use_gpu = use_gpu
+        Args:
+            key (hashable): Key of the source.
+            params (double np.ndarray): New parameters of the source with
+                shape ``(num_params,)``.
 
-        self.sens_mat = sens_mat
+        """
+        params_old, waveform_kwargs = self.sources[key]
+        params = np.array(params, dtype=np.float64)
 
-        # calculate all quantites related to the reference template
-        self.init_heterodyne_info(
-            reference_template_params,
-            template_gen_kwargs=template_gen_kwargs,
-            reference_gen_kwargs=reference_gen_kwargs,
+        self._update_residual(
+            np.array([params_old, params]).T, [1.0, -1.0], **waveform_kwargs.copy()
         )
+        self.sources[key] = (params, waveform_kwargs)
 
-    @property
-    def sens_mat(self):
-        """Sensitivity Matrix"""
-        return self._sens_mat
+    def recompute_d_d(self):
+        """Recompute :math:`\\langle r|r\\rangle` over the full data stream
 
-    @sens_mat.setter
-    def sens_mat(self, sens_mat):
-        if sens_mat is None:
-            _f_not_needed = np.logspace(-5, -1, 1000)
-            sens_mat = AET1SensitivityMatrix(_f_not_needed)
-        assert isinstance(sens_mat, SensitivityMatrix)
-        self._sens_mat = sens_mat
+        Incremental updates accumulate rounding error over many updates.
+        This resets ``d_d`` from the current residual.
 
-    @property
-    def like_gen(self):
-        """C function on GPU/CPU"""
-        like_gen = hdyn_wrap_gpu if self.use_gpu else hdyn_wrap_cpu
-        return like_gen
+        Returns:
+            double: :math:`\\langle r|r\\rangle`.
 
-    @property
-    def xp(self):
-        """Numpy or Cupy"""
-        xp = cp if self.use_gpu else np
-        return xp
+        """
+        self.d_d = (
+            4 * self.xp.sum(self.data_channels.conj() * self.data_channels).real
+        ).item()
+        return self.d_d
 
-    @property
-    def citation(self):
-        """Citations for this class"""
-        return katz_citations + Cornish_Heterodyning + Rel_Bin_citation
 
-    def init_heterodyne_info(
+class MultiSourceLikelihood(Likelihood):
+    """Joint Likelihood for walkers carrying multiple overlapping sources
+
+    Each walker carries ``num_sources`` MBHBs and the log-Likelihood is
+    :math:`-1/2\\langle d - \\sum_i h_i|d - \\sum_i h_i\\rangle`. This is
+    expanded into :math:`\\langle d|h_i\\rangle`, :math:`\\langle h_i|h_i\\rangle`,
+    and the cross terms :math:`\\langle h_i|h_j\\rangle`. Cross terms are only
+    computed over the intersection of the ``start_inds``/``lengths`` supports
+    of the two templates, so sources that do not overlap in frequency cost
+    nothing and no dense templates are filled.
+
+    The noise-weighted templates and all per-source terms from the last call
+    to :meth:`get_ll` are cached. :meth:`update_source` then regenerates only
+    one source for each walker and recomputes its row of the cross-term matrix.
+
+    This class has GPU capability.
+
+    Args:
+        *args (tuple): Arguments for :class:`Likelihood`.
+        **kwargs (dict): Keyword arguments for :class:`Likelihood`.
+
+    Attributes:
+        d_h (complex128 np.ndarray): :math:`\\langle d|h_i\\rangle` with shape
+            ``(num_walkers, num_sources)``.
+        h_h (complex128 np.ndarray): :math:`\\langle h_i|h_i\\rangle` with shape
+            ``(num_walkers, num_sources)``.
+        h_i_h_j (complex128 np.ndarray): :math:`\\langle h_i|h_j\\rangle` with shape
+            ``(num_walkers, num_sources, num_sources)``. The diagonal is zero.
+        num_sources (int): Number of sources per walker.
+        num_walkers (int): Number of walkers.
+        params (double np.ndarray): Cached parameters with shape
+            ``(num_params, num_walkers, num_sources)``.
+        waveform_kwargs (dict): Keyword arguments for the waveform generator
+            from the last call to :meth:`get_ll`.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.params = None
+
+    @property
+    def cross_terms_gen(self):
+        """Cross-term computation for either GPU or CPU."""
+        cross_terms_gen = cross_terms_wrap_gpu if self.use_gpu else cross_terms_wrap_cpu
+        return cross_terms_gen
+
+    def _generate(self, params, **waveform_kwargs):
+        """Generate noise-weighted templates and their direct inner products
+
+        Args:
+            params (double np.ndarray): Parameters with shape ``(num_params, num_bin_all)``.
+            **waveform_kwargs (dict, optional): Keyword arguments for waveform generator.
+
+        Returns:
+            tuple: (templates, pointers, start indices, lengths, d_h, h_h).
+
+        """
+        params = apply_param_transform(self.param_transform, params)
+
+        waveform_kwargs["freqs"] = self.data_freqs
+        waveform_kwargs["fill"] = False
+        waveform_kwargs["direct"] = False
+
+        templateChannels, inds_start, ind_lengths = self.waveform_gen(
+            *params, **waveform_kwargs
+        )
+
+        # copies that stay valid after the next generation
+        templateChannels = [tc.flatten() for tc in templateChannels]
+
+        templateChannels_ptrs = pointer_array(templateChannels)
+
+        num_bin_all = self.waveform_gen.num_bin_all
+        d_h = np.zeros(num_bin_all, dtype=np.complex128)
+        h_h = np.zeros(num_bin_all, dtype=np.complex128)
+
+        # also noise-weights the templates in place
+        self.like_gen(
+            d_h,
+            h_h,
+            self.data_channels,
+            self.noise_factors,
+            templateChannels_ptrs,
+            inds_start,
+            ind_lengths,
+            self.data_stream_length,
+            num_bin_all,
+        )
+
+        return (
+            templateChannels,
+            templateChannels_ptrs,
+            np.asarray(inds_start, dtype=np.int32),
+            np.asarray(ind_lengths, dtype=np.int32),
+            d_h,
+            h_h,
+        )
+
+    def _cross_terms(self, inds_i, inds_j):
+        """Compute cross terms between cached templates (flattened indices)."""
+        num_pairs = len(inds_i)
+        h_i_h_j = self.xp.zeros(num_pairs, dtype=self.xp.complex128)
+
+        ptrs = self._ptrs.reshape(-1)
+        starts = self._inds_start.reshape(-1)
+        lengths = self._ind_lengths.reshape(-1)
+
+        self.cross_terms_gen(
+            h_i_h_j,
+            self.xp.asarray(ptrs[inds_i]),
+            self.xp.asarray(ptrs[inds_j]),
+            self.xp.asarray(starts[inds_i]),
+            self.xp.asarray(lengths[inds_i]),
+            self.xp.asarray(starts[inds_j]),
+            self.xp.asarray(lengths[inds_j]),
+            num_pairs,
+            3,
+        )
+
+        try:
+            h_i_h_j = h_i_h_j.get()
+        except AttributeError:
+            pass
+
+        return h_i_h_j
+
+    def _joint_ll(self):
+        """Combine the cached terms into the joint log-Likelihood."""
+        return -1 / 2 * (
+            self.d_d
+            + self.h_h.real.sum(axis=-1)
+            + self.h_i_h_j.real.sum(axis=(-2, -1))
+            - 2 * self.d_h.real.sum(axis=-1)
+        )
+
+    def get_ll(self, params, **waveform_kwargs):
+        """Compute the joint log-Likelihood
+
+        Args:
+            params (double np.ndarray): Parameters with shape
+                ``(num_params, num_walkers, num_sources)``. A 2D array is
+                treated as a single walker with shape ``(num_params, num_sources)``.
+            **waveform_kwargs (dict, optional): Keyword arguments for waveform
+                generator. They are stored for :meth:`update_source`.
+
+        Returns:
+            np.ndarray: log-Likelihoods with shape ``(num_walkers,)``.
+
+        """
+        params = np.asarray(params, dtype=np.float64)
+        if params.ndim == 2:
+            params = params[:, np.newaxis, :]
+
+        num_params, self.num_walkers, self.num_sources = params.shape
+        self.params = params.copy()
+        self.waveform_kwargs = waveform_kwargs.copy()
+
+        (
+            self._templates,
+            ptrs,
+            inds_start,
+            ind_lengths,
+            d_h,
+            h_h,
+        ) = self._generate(
+            params.reshape(num_params, -1), **waveform_kwargs
+        )
+
+        shape = (self.num_walkers, self.num_sources)
+        self._ptrs = ptrs.reshape(shape)
+        self._inds_start = inds_start.reshape(shape)
+        self._ind_lengths = ind_lengths.reshape(shape)
+        self.d_h = d_h.reshape(shape)
+        self.h_h = h_h.reshape(shape)
+
+        # all pairs i < j for every walker
+        self.h_i_h_j = np.zeros(shape + (self.num_sources,), dtype=np.complex128)
+        src_i, src_j = np.triu_indices(self.num_sources, k=1)
+        walker = np.repeat(np.arange(self.num_walkers), len(src_i))
+        src_i = np.tile(src_i, self.num_walkers)
+        src_j = np.tile(src_j, self.num_walkers)
+
+        h_i_h_j = self._cross_terms(
+            walker * self.num_sources + src_i, walker * self.num_sources + src_j
+        )
+        self.h_i_h_j[walker, src_i, src_j] = h_i_h_j
+        self.h_i_h_j[walker, src_j, src_i] = h_i_h_j.conj()
+
+        return self._joint_ll()
+
+    def update_source(self, params_source, source_ind):
+        """Change one source for every walker and recompute its terms
+
+        Only this source is regenerated. Its :math:`\\langle d|h_i\\rangle`,
+        :math:`\\langle h_i|h_i\\rangle`, and its row of cross terms are
+        recomputed. The other cached terms are reused.
+
+        Args:
+            params_source (double np.ndarray): New parameters of the source with
+                shape ``(num_params, num_walkers)``.
+            source_ind (int): Index of the source to change.
+
+        Returns:
+            np.ndarray: log-Likelihoods with shape ``(num_walkers,)``.
+
+        Raises:
+            ValueError: :meth:`get_ll` has not been called.
+
+        """
+        if self.params is None:
+            raise ValueError("get_ll must be called before update_source.")
+
+        params_source = np.asarray(params_source, dtype=np.float64).reshape(
+            -1, self.num_walkers
+        )
+
+        templates, ptrs, inds_start, ind_lengths, d_h, h_h = self._generate(
+            params_source, **self.waveform_kwargs.copy()
+        )
+
+        for walker_i in range(self.num_walkers):
+            self._templates[walker_i * self.num_sources + source_ind] = templates[
+                walker_i
+            ]
+
+        self._ptrs[:, source_ind] = ptrs
+        self._inds_start[:, source_ind] = inds_start
+        self._ind_lengths[:, source_ind] = ind_lengths
+        self.d_h[:, source_ind] = d_h
+        self.h_h[:, source_ind] = h_h
+        self.params[:, :, source_ind] = params_source
+
+        # row of cross terms with every other source
+        others = np.delete(np.arange(self.num_sources), source_ind)
+        walker = np.repeat(np.arange(self.num_walkers), len(others))
+        src_j = np.tile(others, self.num_walkers)
+
+        h_i_h_j = self._cross_terms(
+            walker * self.num_sources + source_ind, walker * self.num_sources + src_j
+        )
+        self.h_i_h_j[walker, source_ind, src_j] = h_i_h_j
+        self.h_i_h_j[walker, src_j, source_ind] = h_i_h_j.conj()
+
+        return self._joint_ll()
+
+
+class BandedLikelihood(Likelihood):
+    """Direct Likelihood with inner products split into frequency bands
+
+    :math:`\\langle d|h\\rangle`, :math:`\\langle h|h\\rangle`, and
+    :math:`\\langle d|d\\rangle` are stored for each channel and frequency band
+    with respect to the PSD given at initialization, :math:`S_{n,0}(f)`. For a
+    new PSD :math:`S_n(f)=s_{c,b}S_{n,0}(f)` that is a constant multiple of
+    :math:`S_{n,0}` in each channel :math:`c` and band :math:`b`, the inner
+    products are :math:`\\langle a|b\\rangle=\\sum_{c,b}\\langle a|b\\rangle_{c,b}/s_{c,b}`.
+    Therefore, noise parameters can be updated (e.g. in a Gibbs step) in
+    :math:`O(N_\\text{bands})` without regenerating or reweighting the templates
+    with :meth:`get_noise_ll`. Smooth changes in the PSD are represented
+    by using enough bands.
+
+    This class has GPU capability.
+
+    Args:
+        template_gen (obj): Waveform generation class. See :class:`Likelihood`.
+        data_freqs (double xp.ndarray): Frequencies for the data stream.
+        data_channels (complex128 xp.ndarray): Data stream. See :class:`Likelihood`.
+        psd (double xp.ndarray): Reference PSD :math:`S_{n,0}(f)`. See :class:`Likelihood`.
+        band_edges (double array-like): Increasing frequencies separating the bands.
+            Band ``b`` holds frequencies ``band_edges[b] <= f < band_edges[b + 1]``.
+            Frequencies below ``band_edges[0]`` (above ``band_edges[-1]``) are added to
+            the first (last) band.
+        **kwargs (dict, optional): Keyword arguments for :class:`Likelihood`.
+
+    Attributes:
+        band_edges (double np.ndarray): Frequencies separating the bands.
+        band_inds (int32 np.ndarray): Index ranges of the bands in the data stream with
+            shape ``(num_bands + 1,)``.
+        d_d_bands (double np.ndarray): :math:`\\langle d|d\\rangle` for each channel and band
+            with shape ``(3, num_bands)``.
+        d_h_bands (complex128 np.ndarray): :math:`\\langle d|h\\rangle` for each binary,
+            channel, and band from the last call to :meth:`get_ll` with shape
+            ``(num_bin_all, 3, num_bands)``.
+        h_h_bands (complex128 np.ndarray): :math:`\\langle h|h\\rangle` with the same shape
+            as ``d_h_bands``.
+        num_bands (int): Number of bands.
+        num_freqs_bands (int np.ndarray): Number of data frequencies in each band.
+
+    Raises:
+        ValueError: ``band_edges`` is not increasing.
+
+    """
+
+    def __init__(
+        self, template_gen, data_freqs, data_channels, psd, band_edges, **kwargs
+    ):
+        super().__init__(template_gen, data_freqs, data_channels, psd, **kwargs)
+
+        band_edges = np.atleast_1d(np.asarray(band_edges, dtype=np.float64))
+        if len(band_edges) < 2 or np.any(np.diff(band_edges) <= 0.0):
+            raise ValueError("band_edges must have at least 2 increasing entries.")
+
+        self.band_edges = band_edges
+        self.num_bands = len(band_edges) - 1
+
+        try:
+            data_freqs_cpu = self.data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = self.data_freqs
+
+        # interior edges split the data stream into contiguous ranges
+        self.band_inds = np.concatenate(
+            [
+                [0],
+                np.searchsorted(data_freqs_cpu, band_edges[1:-1], "left"),
+                [self.data_stream_length],
+            ]
+        ).astype(np.int32)
+        self.num_freqs_bands = np.diff(self.band_inds)
+
+        data = self.data_channels.reshape(3, self.data_stream_length)
+        self.d_d_bands = np.zeros((3, self.num_bands))
+        for band in range(self.num_bands):
+            data_band = data[:, self.band_inds[band] : self.band_inds[band + 1]]
+            d_d_band = 4 * self.xp.sum(data_band.conj() * data_band, axis=-1).real
+            try:
+                d_d_band = d_d_band.get()
+            except AttributeError:
+                pass
+            self.d_d_bands[:, band] = d_d_band
+
+    @property
+    def like_gen(self):
+        """Banded Likelihood for either GPU or CPU."""
+        like_gen = (
+            direct_like_bands_wrap_gpu if self.use_gpu else direct_like_bands_wrap_cpu
+        )
+        return like_gen
+
+    def get_ll(
         self,
+        params,
+        psd_scale=None,
+        return_extracted_snr=False,
+        phase_marginalize=False,
+        normalize=True,
+        **waveform_kwargs
+    ):
+        """Compute the log-Likelihood and store the banded inner products
+
+        Args:
+            params (double np.ndarray): Parameters. See :meth:`Likelihood.get_ll`.
+            psd_scale (double array-like, optional): Scaling of the PSD. See
+                :meth:`get_noise_ll`. (Default: ``None``)
+            return_extracted_snr (bool, optional): See :meth:`Likelihood.get_ll`.
+            phase_marginalize (bool, optional): See :meth:`Likelihood.get_ll`.
+            normalize (bool, optional): See :meth:`get_noise_ll`. (Default: ``True``)
+            **waveform_kwargs (dict, optional): Keyword arguments for waveform
+                generator.
+
+        Returns:
+            np.ndarray: log-Likelihoods or ``np.array([log-Likelihoods, snr]).T``
+
+        """
+        num_bin_all = 1 if np.ndim(params) == 1 else np.shape(params)[1]
+        self.d_h_bands = np.zeros((num_bin_all, 3, self.num_bands), dtype=np.complex128)
+        self.h_h_bands = np.zeros((num_bin_all, 3, self.num_bands), dtype=np.complex128)
+
+        for inds, templateChannels_ptrs, inds_start, ind_lengths in self._generate_batches(
+            params, **waveform_kwargs
+        ):
+            self.like_gen(
+                self.d_h_bands[inds],
+                self.h_h_bands[inds],
+                self.data_channels,
+                self.noise_factors,
+                templateChannels_ptrs,
+                inds_start,
+                ind_lengths,
+                self.band_inds,
+                self.data_stream_length,
+                inds.stop - inds.start,
+                self.num_bands,
+            )
+
+        return self.get_noise_ll(
+            psd_scale=psd_scale,
+            return_extracted_snr=return_extracted_snr,
+            phase_marginalize=phase_marginalize,
+            normalize=normalize,
+        )
+
+    def recombine(self, psd_scale=None):
+        """Inner products for a scaled PSD
+
+        Args:
+            psd_scale (double array-like, optional): :math:`s_{c,b}` with shape
+                ``(num_bands,)``, ``(3, num_bands)``, or ``(num_bin_all, 3, num_bands)``
+                for a separate PSD for each binary. If ``None``, the reference PSD
+                is used. (Default: ``None``)
+
+        Returns:
+            tuple: (d_d, d_h, h_h). ``d_h`` and ``h_h`` have shape ``(num_bin_all,)``.
+                ``d_d`` is a double or has shape ``(num_bin_all,)`` if ``psd_scale``
+                is given for each binary.
+
+        """
+        if psd_scale is None:
+            weight = np.ones((3, self.num_bands))
+        else:
+            weight = 1.0 / np.broadcast_to(
+                np.asarray(psd_scale, dtype=np.float64),
+                np.broadcast_shapes(np.shape(psd_scale), (3, self.num_bands)),
+            )
+
+        d_d = np.sum(weight * self.d_d_bands, axis=(-2, -1))
+        d_h = np.sum(weight * self.d_h_bands, axis=(-2, -1))
+        h_h = np.sum(weight * self.h_h_bands, axis=(-2, -1))
+        return d_d, d_h, h_h
+
+    def log_det_change(self, psd_scale):
+        """Change in the noise normalization of the log-Likelihood
+
+        Args:
+            psd_scale (double array-like): :math:`s_{c,b}`. See :meth:`recombine`.
+
+        Returns:
+            double or np.ndarray: :math:`-\\sum_{c,b}N_b\\log s_{c,b}`, where :math:`N_b`
+                is the number of frequencies in band :math:`b`.
+
+        """
+        log_scale = np.log(
+            np.broadcast_to(
+                np.asarray(psd_scale, dtype=np.float64),
+                np.broadcast_shapes(np.shape(psd_scale), (3, self.num_bands)),
+            )
+        )
+        return -np.sum(self.num_freqs_bands * log_scale, axis=(-2, -1))
+
+    def get_noise_ll(
+        self,
+        psd_scale=None,
+        return_extracted_snr=False,
+        phase_marginalize=False,
+        normalize=True,
+    ):
+        """Recompute the log-Likelihood for a scaled PSD without the templates
+
+        Uses the banded inner products from the last call to :meth:`get_ll`.
+
+        Args:
+            psd_scale (double array-like, optional): :math:`s_{c,b}`. See :meth:`recombine`.
+                (Default: ``None``)
+            return_extracted_snr (bool, optional): See :meth:`Likelihood.get_ll`.
+            phase_marginalize (bool, optional): See :meth:`Likelihood.get_ll`.
+            normalize (bool, optional): If ``True``, add :meth:`log_det_change` so
+                log-Likelihoods for different PSDs can be compared. (Default: ``True``)
+
+        Returns:
+            np.ndarray: log-Likelihoods or ``np.array([log-Likelihoods, snr]).T``
+
+        """
+        self.phase_marginalize = phase_marginalize
+        self.return_extracted_snr = return_extracted_snr
+
+        d_d, d_h, h_h = self.recombine(psd_scale)
+
+        d_h_temp = d_h if not phase_marginalize else np.abs(d_h)
+        out = -1 / 2 * (d_d + h_h - 2 * d_h_temp).real
+
+        if normalize and psd_scale is not None:
+            out = out + self.log_det_change(psd_scale)
+
+        if return_extracted_snr:
+            return np.array([out, d_h_temp.real / np.sqrt(h_h.real)]).T
+        else:
+            return out
+
+
+class HeterodynedLikelihood:
+    """Compute the Heterodyned log-Likelihood
+
+    Heterdyning involves separating the fast and slow evolutions when comparing
+    signals. This involves comparing a reference template to the data stream and determining
+    various quantities at the full frequency resolution of the data stream. Then, during
+    online computation, the log-Likelihood is determined by computing a new waveform
+    on a sparse frequency grid and comparing it to the reference waveform on the same
+    sparse grid. The practical aspect is the computation of a smaller number of frequency
+    points which lowers the required  memory and increases the speed of the computation.
+    More information on the general method can be found in
+    `arXiv:2109.02728 <https://arxiv.org/abs/2109.02728>`_. We implement the method
+    as described in `arXiv:1806.08792 <https://arxiv.org/abs/1806.08792>`_.
+
+    This class also works with higher order harmonic modes, but it has not been tested extensivally.
+    It only does a direct summation over the modes rather than heterodyning per mode. So, it is less reliable,
+    but in practice it produces a solid posterior distribution.
+    For templates with higher harmonics, :class:`HarmonicHeterodynedLikelihood` is much more accurate
+    for the same ``length_f_het``.
+
+    By default, the ratio :math:`r=h/h_0` is linear in each bin between two sparse frequencies.
+    With ``order > 1``, each bin spans ``order`` sparse intervals and :math:`r` is the
+    polynomial of degree ``order`` through the ``order + 1`` sparse points in the bin.
+    The moments :math:`\\sum_f A(f) u^k` (:math:`k\\leq` ``order``) and :math:`\\sum_f B(f) u^k`
+    (:math:`k\\leq 2` ``order``) with :math:`u=(f-f_m)/\\Delta f_\\text{bin}` are computed
+    for each bin. Because the polynomial coefficients are linear in :math:`r` at the sparse
+    points, they are folded into weights for the sparse points, so the online computation
+    stays a weighted sum. The error in each bin falls faster with the bin width, so
+    fewer sparse frequencies are needed for the same accuracy.
+
+    This class has GPU capabilities.
+
+    Args:
+        template_gen (obj): Waveform generation class that returns a tuple of
+            (list of template arrays, start indices, lengths). See
+            :class:`bbhx.waveform.BBHWaveformFD` for more information on this
+            return type.
+        data_freqs (double xp.ndarray): Frequencies for the data stream. ``data_freqs``
+            should be a numpy (cupy) array if running on the CPU (GPU).
+        data_channels (complex128 xp.ndarray): Data stream. 2D array of shape: ``(3, len(data_freqs))``.
+            It is assumed there are 3 channels. ``data_channels``
+            should be a numpy (cupy) array if running on the CPU (GPU).
+            It can also be an ``np.memmap`` or a path to a ``.npy`` file,
+            which is memory-mapped and read in chunks.
+        reference_template_params (np.ndarray): Parameters for the reference template for
+            ``template_gen``.
+        template_gen_kwargs (dict, optional): Keywords arguments for generating the
+            template with ``template_gen``. It will automatically add/change ``direct``
+            and ``compress`` keyword arguments to ``True``. The keyword argument
+            ``squeeze`` is automatically set to ``True`` for the initial setup and then
+            automatically set to ``False`` for online computations. If you so choose (not
+            recomended), you can change these kwargs for online running using the
+            ``**waveform_kwargs`` setup in the ``self.get_ll`` method. However,
+            if you include in this adjustment ``direct``, ``compress``, or ``squeeze``
+            will still automatically be overwritten.
+            (Default: ``{}``)
+        reference_gen_kwargs (dict, optional): Keywords arguments for generating the
+            reference template with ``template_gen``. It will automatically add/change
+            ``fill``, ``compress``, and ``squeeze`` keyword arguments to ``True``.
+            These waveforms can be produced without interpolation with ``direct = True``.
+            If ``length`` keyword argument is given and ``direct=False``, the
+            waveform will be interpolated. If ``length`` and ``direct`` are not given,
+            it will interpolate the signal with ``length=8096``.
+            (Default: ``{}``)
+        sens_mat (SensitivityMatrix, optional): :class:`SensitivityMatrix` object representing the AET channels.
+            If ``None``, defaults to class:`AET1SensitivityMatrix`. (default: ``None``)
+        use_gpu (bool, optional): If ``True``, use GPU.
+        chunk_size (int, optional): Number of dense frequencies processed at once
+            when computing the heterodyning constants. (Default: ``2**20``)
+        param_transform (obj, optional): Transformation applied to ``params`` in
+            :meth:`get_ll` before generating templates, e.g.
+            :class:`SamplerTransform <bbhx.utils.transform.SamplerTransform>`.
+            If ``None``, ``params`` are passed directly. (Default: ``None``)
+        order (int, optional): Degree of the polynomial for the ratio in each bin
+            (1 to 4). ``length_f_het - 1`` must be divisible by ``order``. (Default: ``1``)
+        cache (str or :class:`DiskCache <bbhx.utils.cache.DiskCache>`, optional): On-disk
+            cache for the heterodyning information. If a directory is given, a
+            :class:`DiskCache <bbhx.utils.cache.DiskCache>` is created there. The key
+            is a hash of the data, the frequencies, the sensitivity evaluated on a fixed
+            grid, the reference parameters and its sparse template, ``length_f_het``,
+            ``order``, and the keyword arguments. On a hit, the dense reference template
+            is not generated. If ``None``, nothing is cached. (Default: ``None``)
+        track_memory (bool, optional): If ``True``, record the peak host memory
+            of computing the heterodyning information in :attr:`peak_memory`
+            with :mod:`tracemalloc`. This is process-wide and does not include
+            GPU memory. (Default: ``False``)
+
+    Attributes:
+        reference_d_d (double): :math:`\langle d|d\\rangle` inner product value.
+        reference_h_h(double): :math:`\langle h|h\\rangle` inner product value
+            for the reference template.
+        reference_d_h (double): :math:`\langle d|h\\rangle` inner product value
+            for the reference template.
+        reference_ll (double): log-Likelihood value for the reference template.
+        hdyn_d_h (complex128 xp.ndarray): Heterodyned :math:`\langle d|h\\rangle`
+            inner product values for the test templates.
+        hdyn_h_h (complex128 xp.ndarray): Heterodyned :math:`\langle d|h\\rangle`
+            inner product values for the test templates.
+        h0_sparse (xp.ndarray): Array with sparse waveform for reference parameters.
+        h_sparse (xp.ndarray): Array with sparse waveform for test parameters.
+        d (complex128 xp.ndarray): Data stream narrowed to the frequencies
+            covered by the sparse grid. This is a view of the input (no copy).
+        data_stream_length (int): Length of data.
+        data_constants (xp.ndarray): Flattened array container holding all heterodyning
+            constants needed: A0, A1, B0, B1. For ``order > 1``, it holds the weights of
+            the sparse points for :math:`\\langle d|h\\rangle` with shape
+            ``(3, num_bins, order + 1)`` and for :math:`\\langle h|h\\rangle` with shape
+            ``(3, num_bins, (order + 1) * (order + 2) / 2)`` for all pairs of points ``(i, j)``
+            with ``i <= j``.
+        f_dense (xp.ndarray): Frequencies for the data stream (1D) narrowed
+            to the frequencies covered by the sparse grid.
+        freqs (xp.ndarray): Frequencies for sparse arrays.
+        f_m (xp.ndarray): Frequency of mid-point in each sparse bin.
+        length_f_het (int): Length of sparse array.
+        like_gen (obj): C/CUDA implementation of likelihood compuation.
+        order (int): Degree of the polynomial for the ratio in each bin.
+        cache (obj): :class:`DiskCache <bbhx.utils.cache.DiskCache>` or ``None``.
+        cache_hit (bool): If ``True``, the heterodyning information was loaded from ``cache``.
+        peak_memory (int): Peak host memory in bytes allocated while computing
+            the heterodyning information. It is 0 if it was loaded from ``cache``
+            and ``None`` if ``track_memory`` is ``False``.
+        track_memory (bool): If ``True``, :attr:`peak_memory` is recorded.
+        param_transform (obj): Transformation applied to ``params`` in :meth:`get_ll`.
+        template_gen (obj): Waveform generation class that returns a tuple of
+            (list of template arrays, start indices, lengths). See
+            :class:`bbhx.waveform.BBHWaveformFD` for more information on this
+            return type.
+        return_extracted_snr (bool): Return the snr in addition to the Likeilihood.
+        phase_marginalize (bool): If ``True``, compute the phase-marginalized
+            log-Likelihood (and snr if ``return_extracted_snr==True``).
+        use_gpu (bool): If True, using GPU.
+        xp (obj): Either numpy or cupy.
+
+
+
+    """
+
+    def __init__(
+        self,
+        template_gen,
+        data_freqs,
+        data_channels,
         reference_template_params,
+        length_f_het,
         template_gen_kwargs={},
         reference_gen_kwargs={},
+        sens_mat=None,
+        use_gpu=False,
+        chunk_size=2**20,
+        param_transform=None,
+        order=1,
+        cache=None,
+        track_memory=False,
+    ):
+
+        if order not in [1, 2, 3, 4]:
+            raise ValueError("order must be 1, 2, 3, or 4.")
+
+        if (length_f_het - 1) % order != 0:
+            raise ValueError(
+                f"length_f_het - 1 must be divisible by order. Current values are {length_f_het} and {order}."
+            )
+
+        # store all input information
+        self.template_gen = template_gen
+        self.param_transform = param_transform
+        self.f_dense = load_array(data_freqs)
+        self.d = load_array(data_channels)
+        self.length_f_het = length_f_het
+        self.chunk_size = chunk_size
+        self.order = order
+        self.track_memory = track_memory
+
+        if isinstance(cache, str):
+            cache = DiskCache(cache)
+        self.cache = cache
+
+        # direct based on GPU usage
+        self.use_gpu = use_gpu
+
+        self.sens_mat = sens_mat
+
+        # calculate all quantites related to the reference template
+        self.init_heterodyne_info(
+            reference_template_params,
+            template_gen_kwargs=template_gen_kwargs,
+            reference_gen_kwargs=reference_gen_kwargs,
+        )
+
+    @classmethod
+    def from_profile(
+        cls,
+        profile,
+        template_gen,
+        data_freqs,
+        data_channels,
+        reference_template_params,
+        template_gen_kwargs={},
+        reference_gen_kwargs={},
+        **kwargs
+    ):
+        """Initialize from a settings profile
+
+        ``length_f_het`` and ``order`` are taken from the profile. Its harmonic
+        modes are used for the templates and the reference template unless
+        ``modes`` is given in ``template_gen_kwargs`` or ``reference_gen_kwargs``.
+
+        Args:
+            profile (str or dict): Path to a profile or a profile dictionary
+                (see :class:`Autotuner <bbhx.autotune.Autotuner>`).
+            template_gen (obj): Waveform generation class.
+            data_freqs (double xp.ndarray): Frequencies for the data stream.
+            data_channels (complex128 xp.ndarray): Data stream.
+            reference_template_params (np.ndarray): Parameters of the reference template.
+            template_gen_kwargs (dict, optional): Keyword arguments for the
+                templates. (Default: ``{}``)
+            reference_gen_kwargs (dict, optional): Keyword arguments for the
+                reference template. (Default: ``{}``)
+            **kwargs (dict, optional): Other keyword arguments for the initialization.
+
+        Returns:
+            :class:`HeterodynedLikelihood`: Likelihood object.
+
+        Raises:
+            ValueError: The profile does not contain ``length_f_het`` (e.g. the
+                heterodyning settings were not tuned).
+
+        """
+        het = load_profile(profile)["heterodyne_kwargs"]
+
+        if "length_f_het" not in het:
+            raise ValueError(
+                "The profile does not contain heterodyne settings (length_f_het). Run Autotuner.tune_heterodyne or use the constructor."
+            )
+
+        template_gen_kwargs = dict(template_gen_kwargs)
+        reference_gen_kwargs = dict(reference_gen_kwargs)
+        if het.get("modes", None) is not None:
+            template_gen_kwargs.setdefault("modes", het["modes"])
+            reference_gen_kwargs.setdefault("modes", het["modes"])
+
+        kwargs.setdefault("order", het.get("order", 1))
+
+        return cls(
+            template_gen,
+            data_freqs,
+            data_channels,
+            reference_template_params,
+            het["length_f_het"],
+            template_gen_kwargs=template_gen_kwargs,
+            reference_gen_kwargs=reference_gen_kwargs,
+            **kwargs
+        )
+
+    @property
+    def sens_mat(self):
+        """Sensitivity Matrix"""
+        return self._sens_mat
+
+    @sens_mat.setter
+    def sens_mat(self, sens_mat):
+        if sens_mat is None:
+            _f_not_needed = np.logspace(-5, -1, 1000)
+            sens_mat = AET1SensitivityMatrix(_f_not_needed)
+        assert isinstance(sens_mat, SensitivityMatrix)
+        self._sens_mat = sens_mat
+
+    @property
+    def like_gen(self):
+        """C function on GPU/CPU"""
+        if self.order > 1:
+            return hdyn_order_wrap_gpu if self.use_gpu else hdyn_order_wrap_cpu
+
+        like_gen = hdyn_wrap_gpu if self.use_gpu else hdyn_wrap_cpu
+        return like_gen
+
+    @property
+    def xp(self):
+        """Numpy or Cupy"""
+        xp = cp if self.use_gpu else np
+        return xp
+
+    @property
+    def citation(self):
+        """Citations for this class"""
+        return katz_citations + Cornish_Heterodyning + Rel_Bin_citation
+
+    def init_heterodyne_info(
+        self,
+        reference_template_params,
+        template_gen_kwargs={},
+        reference_gen_kwargs={},
+    ):
+        """Prepare all information for Heterdyning
+
+        Args:
+            reference_template_params (np.ndarray): Parameters for the reference template for
+                ``template_gen``.
+            template_gen_kwargs (dict, optional): Keywords arguments for generating the
+                template with ``template_gen``. It will automatically add/change ``direct``
+                and ``compress`` keyword arguments to ``True``. The keyword argument
+                ``squeeze`` is automatically set to ``True`` for the initial setup and then
+                automatically set to ``False`` for online computations. If you so choose (not
+                recomended), you can change these kwargs for online running using the
+                ``**waveform_kwargs`` setup in the ``self.get_ll`` method. However,
+                if you include in this adjustment ``direct``, ``compress``, or ``squeeze``
+                will still automatically be overwritten.
+                (Default: ``{}``)
+            reference_gen_kwargs (dict, optional): Keywords arguments for generating the
+                reference template with ``template_gen``. It will automatically add/change
+                ``fill``, ``compress``, and ``squeeze`` keyword arguments to ``True``.
+                These waveforms can be produced without interpolation with ``direct = True``.
+                If ``length`` keyword argument is given and ``direct=False``, the
+                waveform will be interpolated. If ``length`` and ``direct`` are not given,
+                it will interpolate the signal with ``length=8096``.
+                (Default: ``{}``)
+
+        """
+
+        # add the necessary kwargs for the initial template generation process.
+        template_gen_kwargs["squeeze"] = True
+        template_gen_kwargs["compress"] = True
+        template_gen_kwargs["direct"] = True
+
+        # need to be just outside the values of the waveform
+        minF = self.f_dense.min() * 0.999999999999
+        maxF = self.f_dense.max() * 1.000000000001
+
+        if minF == 0.0:
+            minF = 1e-6
+
+        reference_gen_kwargs["squeeze"] = True
+        reference_gen_kwargs["compress"] = True
+        reference_gen_kwargs["fill"] = True
+
+        # setup for reference template generation
+        if "direct" in reference_gen_kwargs and reference_gen_kwargs["direct"] is True:
+            pass
+        else:
+            reference_gen_kwargs["direct"] = False
+            if "length" not in reference_gen_kwargs:
+                reference_gen_kwargs["length"] = 8096
+
+        # Heterodyning grid
+        freqs = self.xp.logspace(
+            self.xp.log10(minF), self.xp.log10(maxF), self.length_f_het
+        )
+
+        # generate sparse reference template
+        h0_temp = self.template_gen(
+            *reference_template_params, freqs=freqs, **template_gen_kwargs
+        )[0]
+
+        # get rid of places where freqs are zero and narrow boundaries
+        freqs_keep = freqs[~(self.xp.abs(h0_temp) == 0.0)]
+
+        freqs = self.xp.logspace(
+            self.xp.log10(freqs_keep[0]),
+            self.xp.log10(freqs_keep[-1]),
+            self.length_f_het,
+        )
+
+        # reuse the information from an identical setup
+        self.cache_hit = False
+        if self.cache is not None:
+            key = self._cache_key(
+                reference_template_params,
+                template_gen_kwargs,
+                reference_gen_kwargs,
+                h0_temp,
+            )
+            cached = self.cache.load(key)
+            if cached is not None:
+                self._load_heterodyne_info(cached, template_gen_kwargs)
+                return
+
+        # regenerate at only non-zero values of the waveform
+        self.h0_sparse = self._get_sparse_reference(
+            reference_template_params, freqs, template_gen_kwargs
+        )
+
+        try:
+            freqs_host = freqs.get()
+        except AttributeError:
+            freqs_host = freqs
+
+        # find which frequencies in the dense array are contained in the sparse array
+        # dense frequencies are sorted so this is a contiguous range
+        try:
+            f_dense_host = self.f_dense.get()
+        except AttributeError:
+            f_dense_host = self.f_dense
+
+        ind_start = np.searchsorted(f_dense_host, freqs_host[0], "left")
+        ind_end = np.searchsorted(f_dense_host, freqs_host[-1], "right")
+
+        # narrow the dense arrays to these indices (views, not copies)
+        self.f_dense = self.f_dense[ind_start:ind_end]
+        self.d = self.d[:, ind_start:ind_end]
+        f_dense_host = f_dense_host[ind_start:ind_end]
+
+        # get frequency at middle of the bin
+        f_m = (freqs[1:] + freqs[:-1]) / 2
+
+        df = float(f_dense_host[1] - f_dense_host[0])
+
+        with MemoryTracker(enabled=self.track_memory) as tracker:
+            (
+                A_in,
+                B_in,
+                self.reference_d_d,
+                self.reference_h_h,
+                self.reference_d_h,
+            ) = self._accumulate_heterodyne_constants(
+                reference_template_params,
+                reference_gen_kwargs,
+                f_dense_host,
+                freqs,
+                df,
+            )
+
+        self.peak_memory = tracker.peak
+
+        # compute stored array of all coefficients
+        if self.order == 1:
+            self.data_constants = self.xp.concatenate(
+                [A_in[0].flatten(), A_in[1].flatten(), B_in[0].flatten(), B_in[1].flatten()]
+            )
+
+        else:
+            self.data_constants = self._fold_constants(A_in, B_in, freqs)
+
+        self.reference_ll = (
+            -1 / 2 * (self.reference_d_d + self.reference_h_h - 2 * self.reference_d_h)
+        )
+
+        # sparse frequencies
+        self.freqs = freqs
+
+        # middle bin frequencies
+        self.f_m = f_m
+
+        if self.cache is not None:
+            self.cache.save(
+                key,
+                data_constants=self.data_constants,
+                freqs=self.freqs,
+                f_m=self.f_m,
+                h0_sparse=self.h0_sparse,
+                reference_d_d=self.reference_d_d,
+                reference_h_h=self.reference_h_h,
+                reference_d_h=self.reference_d_h,
+                ind_start=ind_start,
+                ind_end=ind_end,
+            )
+
+        # prepare kwargs for online evaluation
+        template_gen_kwargs["squeeze"] = False
+        self.template_gen_kwargs = template_gen_kwargs
+
+    def _cache_key(
+        self, reference_template_params, template_gen_kwargs, reference_gen_kwargs, h0_temp
+    ):
+        """Key of the heterodyning information in ``cache``
+
+        Must be called before the dense arrays are narrowed.
+
+        """
+        # the sensitivity configuration is represented by its values on a fixed grid
+        f_sens = np.logspace(-5, 0, 200)
+        self.sens_mat.update_frequency_arr(f_sens)
+        sens = [self.sens_mat[0], self.sens_mat[1], self.sens_mat[2]]
+
+        return cache_key(
+            type(self).__name__,
+            self.length_f_het,
+            self.order,
+            self.f_dense,
+            self.d,
+            sens,
+            np.asarray(reference_template_params),
+            template_gen_kwargs,
+            reference_gen_kwargs,
+            h0_temp,
+        )
+
+    def _load_heterodyne_info(self, cached, template_gen_kwargs):
+        """Set the heterodyning information from a ``cache`` entry"""
+        ind_start = int(cached["ind_start"])
+        ind_end = int(cached["ind_end"])
+
+        # narrow the dense arrays to these indices (views, not copies)
+        self.f_dense = self.f_dense[ind_start:ind_end]
+        self.d = self.d[:, ind_start:ind_end]
+
+        self.data_constants = self.xp.asarray(cached["data_constants"])
+        self.freqs = self.xp.asarray(cached["freqs"])
+        self.f_m = self.xp.asarray(cached["f_m"])
+        self.h0_sparse = self.xp.asarray(cached["h0_sparse"])
+
+        self.reference_d_d = float(cached["reference_d_d"])
+        self.reference_h_h = float(cached["reference_h_h"])
+        self.reference_d_h = float(cached["reference_d_h"])
+        self.reference_ll = (
+            -1 / 2 * (self.reference_d_d + self.reference_h_h - 2 * self.reference_d_h)
+        )
+
+        self.peak_memory = 0 if self.track_memory else None
+        self.cache_hit = True
+
+        # prepare kwargs for online evaluation
+        template_gen_kwargs["squeeze"] = False
+        self.template_gen_kwargs = template_gen_kwargs
+
+    def _get_sparse_reference(self, reference_template_params, freqs, template_gen_kwargs):
+        """Generate the reference template on the sparse grid
+
+        Args:
+            reference_template_params (np.ndarray): Parameters for the reference template.
+            freqs (double xp.ndarray): Sparse frequencies.
+            template_gen_kwargs (dict): Keywords arguments for generating the template.
+
+        Returns:
+            complex128 xp.ndarray: Reference template with shape ``(1, 3, length_f_het)``.
+
+        """
+        return self.template_gen(
+            *reference_template_params, freqs=freqs, **template_gen_kwargs
+        )[self.xp.newaxis, :, :]
+
+    def _prepare_dense_reference(self, reference_template_params, reference_gen_kwargs):
+        """Generate the splines of the reference template once for all chunks
+
+        Args:
+            reference_template_params (np.ndarray): Parameters for the reference template.
+            reference_gen_kwargs (dict): Keywords arguments for generating the
+                reference template.
+
+        Returns:
+            tuple or None: Spline container, start times, end times, sparse length,
+                and number of harmonics. ``None`` if the reference is evaluated
+                directly (``direct=True``), which is done for each chunk.
+
+        """
+        if reference_gen_kwargs.get("direct", False):
+            return None
+
+        kwargs = {**reference_gen_kwargs, "direct": False, "freqs": None}
+        container, t_start, t_end = self.template_gen(
+            *reference_template_params, **kwargs
+        )
+        return (
+            container,
+            t_start,
+            t_end,
+            self.template_gen.length,
+            self.template_gen.num_modes,
+        )
+
+    def _interp_dense_reference(self, reference, f_chunk, mode_mask=None):
+        """Interpolate the prepared reference splines to a chunk of dense frequencies
+
+        Args:
+            reference (tuple): Output of :meth:`_prepare_dense_reference`.
+            f_chunk (double xp.ndarray): Dense frequencies.
+            mode_mask (bool array-like, optional): Harmonics to include with shape
+                ``(1, num_modes)``. If ``None``, all are included. (Default: ``None``)
+
+        Returns:
+            complex128 xp.ndarray: Reference template with shape ``(3, len(f_chunk))``.
+
+        """
+        container, t_start, t_end, length, num_modes = reference
+        interp = self.template_gen.interp_response
+        interp(
+            f_chunk,
+            container,
+            t_start,
+            t_end,
+            length,
+            num_modes,
+            3,
+            mode_mask=mode_mask,
+        )
+
+        out = self.xp.zeros((3, len(f_chunk)), dtype=self.xp.complex128)
+        interp.inject(out)
+        return out
+
+    def _get_dense_reference(
+        self, reference, reference_template_params, reference_gen_kwargs, f_chunk
     ):
-        """Prepare all information for Heterdyning
+        """Get the reference template on a chunk of dense frequencies
 
         Args:
-            reference_template_params (np.ndarray): Parameters for the reference template for
-                ``template_gen``.
-            template_gen_kwargs (dict, optional): Keywords arguments for generating the
-                template with ``template_gen``. It will automatically add/change ``direct``
-                and ``compress`` keyword arguments to ``True``. The keyword argument
-                ``squeeze`` is automatically set to ``True`` for the initial setup and then
-                automatically set to ``False`` for online computations. If you so choose (not
-                recomended), you can change these kwargs for online running using the
-                ``**waveform_kwargs`` setup in the ``self.get_ll`` method. However,
-                if you include in this adjustment ``direct``, ``compress``, or ``squeeze``
-                will still automatically be overwritten.
-                (Default: ``{}``)
-            reference_gen_kwargs (dict, optional): Keywords arguments for generating the
-                reference template with ``template_gen``. It will automatically add/change
-                ``fill``, ``compress``, and ``squeeze`` keyword arguments to ``True``.
-                These waveforms can be produced without interpolation with ``direct = True``.
-                If ``length`` keyword argument is given and ``direct=False``, the
-                waveform will be interpolated. If ``length`` and ``direct`` are not given,
-                it will interpolate the signal with ``length=8096``.
-                (Default: ``{}``)
+            reference (tuple or None): Output of :meth:`_prepare_dense_reference`.
+            reference_template_params (np.ndarray): Parameters for the reference template.
+            reference_gen_kwargs (dict): Keywords arguments for generating the
+                reference template.
+            f_chunk (double xp.ndarray): Dense frequencies.
+
+        Returns:
+            complex128 xp.ndarray: Reference template with shape ``(1, 3, len(f_chunk))``.
 
         """
+        if reference is not None:
+            return self._interp_dense_reference(reference, f_chunk)[self.xp.newaxis]
 
-        # add the necessary kwargs for the initial template generation process.
-        template_gen_kwargs["squeeze"] = True
-        template_gen_kwargs["compress"] = True
-        template_gen_kwargs["direct"] = True
+        return self.template_gen(
+            *reference_template_params, freqs=f_chunk, **reference_gen_kwargs
+        )[0][self.xp.newaxis]
 
-        # need to be just outside the values of the waveform
-        minF = self.f_dense.min() * 0.999999999999
-        maxF = self.f_dense.max() * 1.000000000001
+    def _bin_sum(self, vals, bins):
+        """Sum dense values into sparse bins
 
-        if minF == 0.0:
-            minF = 1e-6
+        Args:
+            vals (complex128 xp.ndarray): Values with shape ``(..., num_dense)``.
+            bins (int xp.ndarray): Sparse bin index for each dense value.
 
-        reference_gen_kwargs["squeeze"] = True
-        reference_gen_kwargs["compress"] = True
-        reference_gen_kwargs["fill"] = True
+        Returns:
+            complex128 xp.ndarray: Sums with shape ``(..., length_f_het)``.
 
-        # setup for reference template generation
-        if "direct" in reference_gen_kwargs and reference_gen_kwargs["direct"] is True:
-            pass
-        else:
-            reference_gen_kwargs["direct"] = False
-            if "length" not in reference_gen_kwargs:
-                reference_gen_kwargs["length"] = 8096
+        """
+        vals_flat = vals.reshape(-1, vals.shape[-1])
+
+        # +1 allows for zero as the first entry (for C compatibility)
+        out = self.xp.zeros((len(vals_flat), self.length_f_het), dtype=np.complex128)
+        for i in range(len(vals_flat)):
+            out[i] = self.xp.bincount(
+                bins + 1, weights=vals_flat[i].real, minlength=self.length_f_het
+            ) + 1j * self.xp.bincount(
+                bins + 1, weights=vals_flat[i].imag, minlength=self.length_f_het
+            )
+        return out.reshape(vals.shape[:-1] + (self.length_f_het,))
 
-        # Heterodyning grid
-        freqs = self.xp.logspace(
-            self.xp.log10(minF), self.xp.log10(maxF), self.length_f_het
-        )
+    def _accumulate_heterodyne_constants(
+        self, reference_template_params, reference_gen_kwargs, f_dense_host, freqs, df
+    ):
+        """Compute the moments A_k, B_k and reference inner products in chunks
 
-        # generate dense reference template
-        h0 = self.template_gen(
-            *reference_template_params, freqs=self.f_dense, **reference_gen_kwargs
-        )[0]
+        The dense reference template, data, and sensitivity are only held
+        for one chunk of dense frequencies at a time. The reference can be
+        split into ``num_ref`` parts (e.g. harmonics). A_k are computed
+        for each part and B_k for each pair of parts ``(i, j)`` with
+        ``i <= j``.
 
-        # generate sparse reference template
-        h0_temp = self.template_gen(
-            *reference_template_params, freqs=freqs, **template_gen_kwargs
-        )[0]
+        Each bin spans ``order`` sparse intervals. For ``order == 1``, the moments
+        are in :math:`f-f_m` and only A0, A1, B0, B1 are computed. Otherwise, the
+        moments are in :math:`(f-f_m)/\\Delta f_\\text{bin}` up to ``order`` for A
+        and ``2 * order`` for B.
 
-        # get rid of places where freqs are zero and narrow boundaries
-        freqs_keep = freqs[~(self.xp.abs(h0_temp) == 0.0)]
+        Args:
+            reference_template_params (np.ndarray): Parameters for the reference template.
+            reference_gen_kwargs (dict): Keywords arguments for generating the
+                reference template.
+            f_dense_host (double np.ndarray): Narrowed dense frequencies on the host.
+            freqs (double xp.ndarray): Sparse frequencies.
+            df (double): Dense frequency spacing.
 
-        freqs = self.xp.logspace(
-            self.xp.log10(freqs_keep[0]),
-            self.xp.log10(freqs_keep[-1]),
-            self.length_f_het,
+        Returns:
+            tuple: (A, B, reference_d_d, reference_h_h, reference_d_h).
+                A has shape ``(num_moments_A, num_ref, 3, length_f_het)``. B
+                has shape ``(num_moments_B, num_pairs, 3, length_f_het)``. Entry
+                ``b + 1`` on the last axis belongs to bin ``b``.
+
+        """
+        num_dense = len(f_dense_host)
+
+        num_ref = self.h0_sparse.shape[2] if self.h0_sparse.ndim == 4 else 1
+        pairs = [(i, j) for i in range(num_ref) for j in range(i, num_ref)]
+
+        # bins spanning ``order`` sparse intervals
+        bin_edges = freqs[:: self.order]
+        bin_mid = (bin_edges[1:] + bin_edges[:-1]) / 2
+        if self.order == 1:
+            bin_scale = self.xp.ones_like(bin_mid)
+            num_moments_A = 2
+            num_moments_B = 2
+        else:
+            bin_scale = (bin_edges[1:] - bin_edges[:-1]) / 2
+            num_moments_A = self.order + 1
+            num_moments_B = 2 * self.order + 1
+
+        A_in = self.xp.zeros(
+            (num_moments_A, num_ref, 3, self.length_f_het), dtype=np.complex128
+        )
+        B_in = self.xp.zeros(
+            (num_moments_B, len(pairs), 3, self.length_f_het), dtype=np.complex128
         )
 
-        # regenerate at only non-zero values of the waveform
-        self.h0_sparse = self.template_gen(
-            *reference_template_params, freqs=freqs, **template_gen_kwargs
-        )[self.xp.newaxis, :, :]
+        reference_d_d = 0.0
+        reference_h_h = 0.0
+        reference_d_h = 0.0
 
-        # find which frequencies in the dense array in contained in the sparse array
-        inds = (self.f_dense >= freqs[0]) & (self.f_dense <= freqs[-1])
+        # the reference is generated once and only interpolated for each chunk
+        reference = self._prepare_dense_reference(
+            reference_template_params, reference_gen_kwargs
+        )
 
-        # narrow the dense arrays to these indices
-        self.f_dense = self.f_dense[inds]
-        self.d = self.d[:, inds]
-        h0 = h0[:, inds]
+        # keep at least two frequencies per chunk so ``squeeze`` keeps the axes
+        chunk_size = max(self.chunk_size, 2)
+        start = 0
+        while start < num_dense:
+            end = min(start + chunk_size, num_dense)
+            if num_dense - end == 1:
+                end = num_dense
 
-        # find which sparse array bins the dense frequencies fit into
-        bins = self.xp.searchsorted(freqs, self.f_dense, "right") - 1
+            f_host = np.ascontiguousarray(f_dense_host[start:end])
+            f_chunk = self.xp.asarray(f_host)
 
-        # get frequency at middle of the bin
-        f_m = (freqs[1:] + freqs[:-1]) / 2
+            # generate dense reference template for this chunk
+            h0 = self._get_dense_reference(
+                reference, reference_template_params, reference_gen_kwargs, f_chunk
+            )
 
-        df = self.f_dense[1] - self.f_dense[0]
+            d = self.xp.asarray(self.d[:, start:end])
 
-        # should be on CPU for sensitivity computation
-        try:
-            f_n_host = self.f_dense.get()
-        except AttributeError:
-            f_n_host = self.f_dense
+            # compute sensitivity at dense frequencies
+            self.sens_mat.update_frequency_arr(f_host)
+            S_n = self.xp.asarray(
+                [self.sens_mat[0], self.sens_mat[1], self.sens_mat[2]]
+            )
 
-        self.sens_mat.update_frequency_arr(f_n_host)
+            # find which bins the dense frequencies fit into
+            bins = self.xp.searchsorted(bin_edges, f_chunk, "right") - 1
+
+            # compute the individual frequency contributions to A0, A1, B0, B1 (see paper)
+            A0_flat = 4 * (h0.conj() * d) / S_n * df
+
+            h0_sum = h0.sum(axis=0)
+            reference_d_d += (self.xp.sum(4 * (d.conj() * d) / S_n * df).real).item()
+            reference_h_h += (
+                self.xp.sum(4 * (h0_sum.conj() * h0_sum) / S_n * df).real
+            ).item()
+            reference_d_h += (self.xp.sum(A0_flat).real).item()
+
+            # the last dense frequency is not included in the sparse sums
+            keep = slice(None, -1) if end == num_dense else slice(None)
+            A0_flat = A0_flat[:, :, keep]
+            bins = bins[keep]
+            f_diff = (f_chunk[keep] - bin_mid[bins]) / bin_scale[bins]
+
+            A_k = A0_flat
+            for k in range(num_moments_A):
+                if k > 0:
+                    A_k = A_k * f_diff
+                A_in[k] += self._bin_sum(A_k, bins)
+
+            # one pair at a time to limit memory
+            for pair_i, (i, j) in enumerate(pairs):
+                B_k = (4 * (h0[j].conj() * h0[i]) / S_n * df)[:, keep]
+                for k in range(num_moments_B):
+                    if k > 0:
+                        B_k = B_k * f_diff
+                    B_in[k, pair_i] += self._bin_sum(B_k, bins)
+
+            start = end
+
+        return A_in, B_in, reference_d_d, reference_h_h, reference_d_h
+
+    def _fold_constants(self, A_in, B_in, freqs):
+        """Fold the moments into weights of the sparse points for ``order > 1``
+
+        In bin ``b``, the ratio is :math:`r(u)=\\sum_p c_p u^p` with :math:`c=V^{-1}r_i`,
+        where :math:`V_{ip}=u_i^p` for the sparse points :math:`u_i` of the bin. So
+        :math:`\\langle d|h\\rangle=\\sum_i\\tilde{A}_i r^*_i` with
+        :math:`\\tilde{A}_i=\\sum_p A_p V^{-1}_{pi}` and
+        :math:`\\langle h|h\\rangle=\\sum_{ij}\\tilde{B}_{ij}r_ir^*_j` with
+        :math:`\\tilde{B}_{ij}=\\sum_{pq}B_{p+q}V^{-1}_{pi}V^{-1}_{qj}`.
 
-        # compute sensitivity at dense frequencies
-        S_n = self.xp.asarray([self.sens_mat[0], self.sens_mat[1], self.sens_mat[2]])
+        Args:
+            A_in (complex128 xp.ndarray): Moments of A from :meth:`_accumulate_heterodyne_constants`.
+            B_in (complex128 xp.ndarray): Moments of B from :meth:`_accumulate_heterodyne_constants`.
+            freqs (double xp.ndarray): Sparse frequencies.
 
-        # compute the individual frequency contributions to A0, A1 (see paper)
-        A0_flat = 4 * (h0.conj() * self.d) / S_n * df
-        A1_flat = 4 * (h0.conj() * self.d) / S_n * df * (self.f_dense - f_m[bins])
+        Returns:
+            complex128 xp.ndarray: Flattened weights for the C/CUDA code.
 
-        # compute the individual frequency contributions to B0, B1 (see paper)
-        B0_flat = 4 * (h0.conj() * h0) / S_n * df
-        B1_flat = 4 * (h0.conj() * h0) / S_n * df * (self.f_dense - f_m[bins])
+        """
+        order = self.order
+        num_bins = (self.length_f_het - 1) // order
 
-        # initialize containers for sparse sums of A0, A1, B0, B1
-        A0_in = self.xp.zeros((3, self.length_f_het), dtype=np.complex128)
-        A1_in = self.xp.zeros_like(A0_in)
-        B0_in = self.xp.zeros_like(A0_in)
-        B1_in = self.xp.zeros_like(A0_in)
+        # (moment, channel, bin) for the single reference
+        A = A_in[:, 0, :, 1 : num_bins + 1]
+        B = B_in[:, 0, :, 1 : num_bins + 1]
 
-        for ind in self.xp.unique(bins[:-1]):
-            inds_keep = bins == ind
+        bin_edges = freqs[::order]
+        bin_mid = (bin_edges[1:] + bin_edges[:-1]) / 2
+        bin_scale = (bin_edges[1:] - bin_edges[:-1]) / 2
 
-            # TODO: check this
-            inds_keep[-1] = False
+        # sparse points of each bin in scaled coordinates
+        points = self.xp.arange(num_bins)[:, None] * order + self.xp.arange(order + 1)
+        u = (freqs[points] - bin_mid[:, None]) / bin_scale[:, None]
 
-            # +1 allows for zero as the first entry (for C compatibility)
-            A0_in[:, ind + 1] = self.xp.sum(A0_flat[:, inds_keep], axis=1)
-            A1_in[:, ind + 1] = self.xp.sum(A1_flat[:, inds_keep], axis=1)
-            B0_in[:, ind + 1] = self.xp.sum(B0_flat[:, inds_keep], axis=1)
-            B1_in[:, ind + 1] = self.xp.sum(B1_flat[:, inds_keep], axis=1)
+        # V[b, i, p] = u_i^p -> V_inv[b, p, i]
+        V = u[:, :, None] ** self.xp.arange(order + 1)
+        V_inv = self.xp.linalg.inv(V)
 
-        # compute stored array of all coefficients
-        self.data_constants = self.xp.concatenate(
-            [A0_in.flatten(), A1_in.flatten(), B0_in.flatten(), B1_in.flatten()]
-        )
+        A_weights = self.xp.einsum("pcb,bpi->cbi", A, V_inv)
 
-        # reference quantities
-        self.reference_d_d = self.xp.sum(4 * (self.d.conj() * self.d) / S_n * df).real
+        moment = self.xp.arange(order + 1)[:, None] + self.xp.arange(order + 1)
+        B_weights = self.xp.einsum("pqcb,bpi,bqj->cbij", B[moment], V_inv, V_inv)
 
-        self.reference_h_h = self.xp.sum(B0_flat).real
+        upper = self.xp.triu_indices(order + 1)
+        B_weights = B_weights[:, :, upper[0], upper[1]]
 
-        self.reference_d_h = self.xp.sum(A0_flat).real
+        return self.xp.concatenate([A_weights.flatten(), B_weights.flatten()])
 
-        self.reference_ll = (
-            -1 / 2 * (self.reference_d_d + self.reference_h_h - 2 * self.reference_d_h)
+    def _compute_hdyn(self):
+        """Fill ``hdyn_d_h`` and ``hdyn_h_h`` for the templates in ``h_sparse``"""
+
+        # compute complex residual
+        r = self.h_sparse / self.h0_sparse
+
+        # initialize container for inner products term
+        self.hdyn_d_h = self.xp.zeros(
+            self.template_gen.num_bin_all, dtype=self.xp.complex128
+        )
+        self.hdyn_h_h = self.xp.zeros(
+            self.template_gen.num_bin_all, dtype=self.xp.complex128
         )
 
-        # sparse frequencies
-        self.freqs = freqs
+        # adjust the residuals for entry into C
+        residuals_in = r.transpose((2, 1, 0)).flatten()
 
-        # middle bin frequencies
-        self.f_m = f_m
+        if self.order > 1:
+            self.like_gen(
+                self.hdyn_d_h,
+                self.hdyn_h_h,
+                residuals_in,
+                self.data_constants,
+                self.template_gen.num_bin_all,
+                len(self.freqs),
+                3,
+                self.order,
+            )
+            return
 
-        # prepare kwargs for online evaluation
-        template_gen_kwargs["squeeze"] = False
-        self.template_gen_kwargs = template_gen_kwargs
+        self.like_gen(
+            self.hdyn_d_h,
+            self.hdyn_h_h,
+            residuals_in,
+            self.data_constants,
+            self.freqs,
+            self.template_gen.num_bin_all,
+            len(self.freqs),
+            3,
+        )
 
     def get_ll(
         self,
@@ -606,13 +1926,169 @@ class HeterodynedLikelihood:
         # set the frequencies at which the waveform is evaluated
         waveform_kwargs["freqs"] = self.freqs
 
+        params = apply_param_transform(self.param_transform, params)
+
         # compute the new sparse template
         self.h_sparse = self.template_gen(*params, **waveform_kwargs)
 
-        # compute complex residual
-        r = self.h_sparse / self.h0_sparse
+        # heterodyned inner products
+        self._compute_hdyn()
+
+        # if phase marginalize
+        d_h_temp = (
+            self.hdyn_d_h if not self.phase_marginalize else self.xp.abs(self.hdyn_d_h)
+        )
+
+        # log-Likelihood
+        out = -1 / 2.0 * (self.reference_d_d + self.hdyn_h_h - 2 * d_h_temp).real
+
+        # move to CPU if needed
+        try:
+            self.hdyn_h_h = self.hdyn_h_h.get()
+            self.hdyn_d_h = self.hdyn_d_h.get()
+            d_h_temp = d_h_temp.get()
+            out = out.get()
+
+        except AttributeError:
+            pass
+
+        if self.return_extracted_snr:
+            return np.array([out, d_h_temp.real / np.sqrt(self.hdyn_h_h.real)]).T
+        else:
+            return out
+
+
+class HarmonicHeterodynedLikelihood(HeterodynedLikelihood):
+    """Compute the Heterodyned log-Likelihood with a reference for each harmonic
+
+    :class:`HeterodynedLikelihood` heterodynes the template summed over harmonics.
+    With higher harmonics, the ratio of the summed templates oscillates because of the
+    beating between harmonics, so a large ``length_f_het`` is needed. Here, the
+    ratio :math:`r_{\\ell m}=h_{\\ell m}/h_{0,\\ell m}` is formed separately for each
+    harmonic. These ratios are smooth, so far fewer sparse frequencies are needed.
+
+    :math:`A_0` and :math:`A_1` are computed for each harmonic, and :math:`B_0` and
+    :math:`B_1` for each pair of harmonics :math:`(\\ell m, \\ell' m')` including the
+    cross terms, so that
+
+    .. math:: \\langle h|h\\rangle = \\sum_{\\ell m}\\sum_{\\ell' m'}\\sum_b B_{0,b}^{\\ell m,\\ell' m'}r_{0,\\ell m}r^*_{0,\\ell' m'} + B_{1,b}^{\\ell m,\\ell' m'}\\left(r_{1,\\ell m}r^*_{0,\\ell' m'} + r_{0,\\ell m}r^*_{1,\\ell' m'}\\right).
+
+    The dense reference is generated once for each harmonic with ``modes=[(l, m)]``.
+    Templates are evaluated on the sparse grid with ``compress=False``.
+    Where the reference harmonic is zero on the sparse grid, the ratio is set to zero.
+
+    The arguments are the same as for :class:`HeterodynedLikelihood`. The harmonics
+    are given by ``modes`` in ``template_gen_kwargs``. If not given, all harmonics
+    available in ``template_gen.amp_phase_gen`` are used. At most 6 harmonics are allowed.
+
+    This class has GPU capabilities.
+
+    Attributes:
+        modes (list): Harmonics that are heterodyned separately.
+        num_modes (int): Number of harmonics.
+        data_constants (xp.ndarray): Flattened array container holding all heterodyning
+            constants needed: A0 and A1 with shape ``(num_modes, 3, length_f_het)`` and
+            B0 and B1 with shape ``(num_modes * (num_modes + 1) / 2, 3, length_f_het)``
+            for all pairs of harmonics ``(i, j)`` with ``i <= j``.
+        h0_sparse (xp.ndarray): Sparse reference template with shape
+            ``(1, 3, num_modes, length_f_het)``.
+        h_sparse (xp.ndarray): Sparse test templates with shape
+            ``(num_bin_all, 3, num_modes, length_f_het)``.
+
+    """
+
+    @property
+    def like_gen(self):
+        """C function on GPU/CPU"""
+        like_gen = hdyn_modes_wrap_gpu if self.use_gpu else hdyn_modes_wrap_cpu
+        return like_gen
+
+    def init_heterodyne_info(
+        self,
+        reference_template_params,
+        template_gen_kwargs={},
+        reference_gen_kwargs={},
+    ):
+        """Prepare all information for Heterdyning
+
+        See :meth:`HeterodynedLikelihood.init_heterodyne_info`.
+
+        Raises:
+            ValueError: More than 6 harmonics or ``order > 1``.
+
+        """
+        if self.order != 1:
+            raise ValueError("HarmonicHeterodynedLikelihood only supports order=1.")
+
+        template_gen_kwargs = template_gen_kwargs.copy()
+        reference_gen_kwargs = reference_gen_kwargs.copy()
+
+        modes = template_gen_kwargs.get("modes", None)
+        if modes is None:
+            modes = self.template_gen.amp_phase_gen.allowable_modes
+
+        if len(modes) > 6:
+            raise ValueError("At most 6 harmonics can be heterodyned separately.")
+
+        self.modes = list(modes)
+        self.num_modes = len(self.modes)
+        template_gen_kwargs["modes"] = self.modes
+
+        super().init_heterodyne_info(
+            reference_template_params,
+            template_gen_kwargs=template_gen_kwargs,
+            reference_gen_kwargs=reference_gen_kwargs,
+        )
+
+        # keep harmonics and binaries separate for online evaluation
+        self.template_gen_kwargs["compress"] = False
+        self.template_gen_kwargs["squeeze"] = False
+
+    def _get_sparse_reference(self, reference_template_params, freqs, template_gen_kwargs):
+        """Generate each harmonic of the reference template on the sparse grid"""
+        kwargs = {**template_gen_kwargs, "compress": False, "squeeze": False}
+        return self.template_gen(*reference_template_params, freqs=freqs, **kwargs)
+
+    def _prepare_dense_reference(self, reference_template_params, reference_gen_kwargs):
+        """Generate the splines of all reference harmonics once for all chunks"""
+        return super()._prepare_dense_reference(
+            reference_template_params, {**reference_gen_kwargs, "modes": self.modes}
+        )
+
+    def _get_dense_reference(
+        self, reference, reference_template_params, reference_gen_kwargs, f_chunk
+    ):
+        """Get each harmonic of the reference template on a chunk of dense frequencies"""
+        if reference is not None:
+            # select one harmonic at a time from the prepared splines
+            mode_masks = np.eye(self.num_modes, dtype=bool)[:, np.newaxis]
+            return self.xp.asarray(
+                [
+                    self._interp_dense_reference(reference, f_chunk, mode_mask=mask)
+                    for mask in mode_masks
+                ]
+            )
+
+        return self.xp.asarray(
+            [
+                self.template_gen(
+                    *reference_template_params,
+                    freqs=f_chunk,
+                    **{**reference_gen_kwargs, "modes": [mode], "squeeze": False},
+                )[0]
+                for mode in self.modes
+            ]
+        )
+
+    def _compute_hdyn(self):
+        """Fill ``hdyn_d_h`` and ``hdyn_h_h`` for the templates in ``h_sparse``"""
+
+        # complex ratio for each harmonic
+        nonzero = self.h0_sparse != 0.0
+        r = self.xp.where(
+            nonzero, self.h_sparse / self.xp.where(nonzero, self.h0_sparse, 1.0), 0.0
+        )
 
-        # initialize container for inner products term
         self.hdyn_d_h = self.xp.zeros(
             self.template_gen.num_bin_all, dtype=self.xp.complex128
         )
@@ -620,8 +2096,8 @@ class HeterodynedLikelihood:
             self.template_gen.num_bin_all, dtype=self.xp.complex128
         )
 
-        # adjust the residuals for entry into C
-        residuals_in = r.transpose((2, 1, 0)).flatten()
+        # (length_f_het, 3, num_modes, num_bin_all) for entry into C
+        residuals_in = r.transpose((3, 1, 2, 0)).flatten()
 
         self.like_gen(
             self.hdyn_d_h,
@@ -632,27 +2108,151 @@ class HeterodynedLikelihood:
             self.template_gen.num_bin_all,
             len(self.freqs),
             3,
+            self.num_modes,
         )
 
-        # if phase marginalize
-        d_h_temp = (
-            self.hdyn_d_h if not self.phase_marginalize else self.xp.abs(self.hdyn_d_h)
+
+class DelayedAcceptanceLikelihood:
+    """Two-stage delayed-acceptance log-Likelihood evaluation
+
+    Proposals are first screened with a cheap approximate log-Likelihood
+    (e.g. :class:`HeterodynedLikelihood` with a small ``length_f_het``, PhenomD
+    only with ``run_phenomd=True``, or fewer harmonics). Only the walkers that pass
+    this first stage are evaluated with the full-accuracy log-Likelihood. This
+    is the delayed-acceptance Metropolis-Hastings method of
+    `Christen & Fox (2005) <https://doi.org/10.1198/106186005X76983>`_:
+
+    - stage 1: accept with probability
+      :math:`\\min\\left(1, e^{\\Delta\\ln\\mathcal{L}_c + \\ln r}\\right)`, where
+      :math:`\\Delta\\ln\\mathcal{L}_c` is the change in the coarse log-Likelihood and
+      :math:`\\ln r` contains the prior and proposal ratios;
+    - stage 2: accept with probability
+      :math:`\\min\\left(1, e^{\\Delta\\ln\\mathcal{L}_f - \\Delta\\ln\\mathcal{L}_c}\\right)`.
+
+    The correction :math:`-\\Delta\\ln\\mathcal{L}_c` in the second stage keeps the
+    full-accuracy posterior as the stationary distribution, so samplers remain exact.
+    Most rejected proposals never reach the expensive evaluation.
+
+    Args:
+        coarse_like (obj): Cheap log-Likelihood with a ``get_ll(params, **kwargs)``
+            method.
+        fine_like (obj): Full-accuracy log-Likelihood with a
+            ``get_ll(params, **kwargs)`` method.
+        coarse_kwargs (dict, optional): Keyword arguments for ``coarse_like.get_ll``.
+            (Default: ``{}``)
+        fine_kwargs (dict, optional): Keyword arguments for ``fine_like.get_ll``.
+            (Default: ``{}``)
+        seed (int, optional): Seed for the random numbers of the acceptance tests.
+            (Default: ``None``)
+
+    Attributes:
+        coarse_kwargs (dict): Keyword arguments for ``coarse_like.get_ll``.
+        coarse_like (obj): Cheap log-Likelihood.
+        correction (double np.ndarray): Stage 2 correction
+            :math:`-\\Delta\\ln\\mathcal{L}_c` of the last :meth:`step`.
+        fine_kwargs (dict): Keyword arguments for ``fine_like.get_ll``.
+        fine_like (obj): Full-accuracy log-Likelihood.
+        ll_coarse_prop (double np.ndarray): Coarse log-Likelihood of the proposals
+            in the last :meth:`step`.
+        ll_prop (double np.ndarray): Full-accuracy log-Likelihood of the proposals
+            in the last :meth:`step`. ``-inf`` for walkers that were not escalated.
+        num_escalated (int): Total number of full-accuracy evaluations in :meth:`step`.
+        num_proposed (int): Total number of proposals in :meth:`step`.
+        rng (obj): Random number generator.
+
+    """
+
+    def __init__(
+        self, coarse_like, fine_like, coarse_kwargs={}, fine_kwargs={}, seed=None
+    ):
+        self.coarse_like = coarse_like
+        self.fine_like = fine_like
+        self.coarse_kwargs = coarse_kwargs
+        self.fine_kwargs = fine_kwargs
+        self.rng = np.random.default_rng(seed)
+
+        self.num_proposed = 0
+        self.num_escalated = 0
+
+    @property
+    def escalation_fraction(self):
+        """Fraction of proposals evaluated with the full-accuracy log-Likelihood."""
+        return self.num_escalated / max(self.num_proposed, 1)
+
+    def get_ll(self, params):
+        """Compute both log-Likelihoods, e.g. for the initial walker positions
+
+        Args:
+            params (double np.ndarray): Parameters with shape
+                ``(num_params, num_walkers)``.
+
+        Returns:
+            tuple: ``(ll, ll_coarse)`` with shape ``(num_walkers,)`` each.
+
+        """
+        ll = np.asarray(self.fine_like.get_ll(params, **self.fine_kwargs))
+        ll_coarse = np.asarray(self.coarse_like.get_ll(params, **self.coarse_kwargs))
+        return ll, ll_coarse
+
+    def step(
+        self, params_prop, ll_current, ll_coarse_current, log_ratio=0.0, log_u=None
+    ):
+        """Delayed-acceptance test for a batch of proposals
+
+        Args:
+            params_prop (double np.ndarray): Proposed parameters with shape
+                ``(num_params, num_walkers)``.
+            ll_current (double np.ndarray): Full-accuracy log-Likelihood of the
+                current positions.
+            ll_coarse_current (double np.ndarray): Coarse log-Likelihood of the
+                current positions.
+            log_ratio (double or np.ndarray, optional): Log of the prior ratio
+                times the proposal ratio for each walker. (Default: ``0.0``)
+            log_u (double np.ndarray, optional): Log of uniform random numbers
+                for the two stages with shape ``(2, num_walkers)``. If ``None``,
+                draw them from ``rng``. (Default: ``None``)
+
+        Returns:
+            tuple: ``(accepted, ll, ll_coarse, escalated, correction)``.
+                ``accepted`` and ``escalated`` are boolean arrays indicating which
+                proposals were accepted and which were evaluated with the
+                full-accuracy log-Likelihood. ``ll`` and ``ll_coarse`` are the
+                log-Likelihoods of the new positions (proposal if accepted,
+                current otherwise). ``correction`` is the stage 2 correction
+                :math:`-\\Delta\\ln\\mathcal{L}_c`.
+
+        """
+        params_prop = np.asarray(params_prop)
+        ll_current = np.asarray(ll_current)
+        ll_coarse_current = np.asarray(ll_coarse_current)
+        num_walkers = params_prop.shape[1]
+
+        if log_u is None:
+            log_u = np.log(self.rng.random((2, num_walkers)))
+
+        # stage 1: cheap screen
+        self.ll_coarse_prop = np.asarray(
+            self.coarse_like.get_ll(params_prop, **self.coarse_kwargs)
         )
+        self.correction = ll_coarse_current - self.ll_coarse_prop
 
-        # log-Likelihood
-        out = -1 / 2.0 * (self.reference_d_d + self.hdyn_h_h - 2 * d_h_temp).real
+        log_alpha_1 = np.minimum(0.0, -self.correction + log_ratio)
+        escalated = log_u[0] < log_alpha_1
 
-        # move to CPU if needed
-        try:
-            self.hdyn_h_h = self.hdyn_h_h.get()
-            self.hdyn_d_h = self.hdyn_d_h.get()
-            d_h_temp = d_h_temp.get()
-            out = out.get()
+        # stage 2: full accuracy only for walkers that passed
+        self.ll_prop = np.full(num_walkers, -np.inf)
+        if np.any(escalated):
+            self.ll_prop[escalated] = self.fine_like.get_ll(
+                params_prop[:, escalated], **self.fine_kwargs
+            )
 
-        except AttributeError:
-            pass
+        log_alpha_2 = np.minimum(0.0, self.ll_prop - ll_current + self.correction)
+        accepted = escalated & (log_u[1] < log_alpha_2)
 
-        if self.return_extracted_snr:
-            return np.array([out, d_h_temp.real / np.sqrt(self.hdyn_h_h.real)]).T
-        else:
-            return out
+        ll = np.where(accepted, self.ll_prop, ll_current)
+        ll_coarse = np.where(accepted, self.ll_coarse_prop, ll_coarse_current)
+
+        self.num_proposed += num_walkers
+        self.num_escalated += int(escalated.sum())
+
+        return accepted, ll, ll_coarse, escalated, self.correction
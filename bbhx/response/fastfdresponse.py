@@ -16,6 +16,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import os
+
 import numpy as np
 
 try:
@@ -28,6 +30,8 @@ except (ImportError, ModuleNotFoundError) as e:
 
 from pyFDResponse_cpu import LISA_response_wrap as LISA_response_wrap_cpu
 from bbhx.utils.constants import *
+from bbhx.response.orbits import TabulatedOrbits, load_orbits
+from bbhx.utils.modeselect import prepare_mode_mask
 
 
 class LISATDIResponse:
@@ -39,6 +43,11 @@ class LISATDIResponse:
     these papers if this class is used. This response assumes a fixed,
     non-breathing armlength for the LISA constellation.
 
+    By default, the analytic equal-arm orbits are evaluated for every sample.
+    Numerical orbits can be given as a :class:`TabulatedOrbits <bbhx.response.orbits.TabulatedOrbits>`
+    object or an orbit file. In this case, the spacecraft positions and link
+    vectors are found with a spline lookup at each :math:`t_f`.
+
     This class has GPU capability.
 
     Args:
@@ -48,6 +57,10 @@ class LISATDIResponse:
         order_fresnel_stencil (int, optional): Order of the Fresnel stencil in the
             response. Currently, anything above 0 is not implemented. This is left
             in for future compatibility. (Default: ``0``)
+        orbits (str or obj, optional): Tabulated orbits. Either a
+            :class:`TabulatedOrbits <bbhx.response.orbits.TabulatedOrbits>` object
+            or a path to an orbit file loaded with :func:`load_orbits <bbhx.response.orbits.load_orbits>`.
+            If ``None``, use the analytic equal-arm orbits. (Default: ``None``)
         use_gpu (bool, optional): If ``True``, use a GPU. (Default: ``False``)
 
     Attributes:
@@ -60,6 +73,8 @@ class LISATDIResponse:
         order_fresnel_stencil (int): Order of the Fresnel stencil in the
             response. Currently, anything above 0 is not implemented. This is left
             in for future compatibility.
+        orbits (obj): :class:`TabulatedOrbits <bbhx.response.orbits.TabulatedOrbits>`
+            object or ``None`` for analytic orbits.
         response_gen (obj): Respones generator in C/C++.
         TDItag (str): TDI channels to generate. Either ``"XYZ"`` or ``"AET"``.
         use_gpu (bool): A GPU is being used if ``use_gpu==True``.
@@ -68,8 +83,11 @@ class LISATDIResponse:
 
     """
 
-    def __init__(self, TDItag="AET", order_fresnel_stencil=0, use_gpu=False):
+    def __init__(
+        self, TDItag="AET", order_fresnel_stencil=0, orbits=None, use_gpu=False
+    ):
         # gpu setup
+        self.use_gpu = use_gpu
         if use_gpu:
             self.response_gen = LISA_response_wrap_gpu
             self.xp = xp
@@ -83,6 +101,20 @@ class LISATDIResponse:
 
         self.order_fresnel_stencil = order_fresnel_stencil
 
+        # orbit setup
+        if isinstance(orbits, (str, os.PathLike)):
+            orbits = load_orbits(os.fspath(orbits), use_gpu=use_gpu)
+
+        elif orbits is not None:
+            if not isinstance(orbits, TabulatedOrbits):
+                raise ValueError(
+                    "orbits must be None, a path to an orbit file, or a TabulatedOrbits object."
+                )
+            if orbits.use_gpu != use_gpu:
+                raise ValueError("orbits and response must use the same device.")
+
+        self.orbits = orbits
+
         # TDI setup
         self.TDItag = TDItag
         if TDItag == "XYZ":
@@ -103,6 +135,14 @@ class LISATDIResponse:
         """Return citations for this class"""
         return katz_citations + marsat_1 + marsat_2
 
+    @property
+    def orbit_args(self):
+        """Orbit arguments for the C/CUDA response function"""
+        if self.orbits is None:
+            # analytic orbits
+            return (0, 0.0, 0.0, 0)
+        return self.orbits.args
+
     def _sanity_check_modes(self, ells, mms):
         """Make sure modes are allowed"""
         for ell, mm in zip(ells, mms):
@@ -213,6 +253,7 @@ class LISATDIResponse:
         tf=None,
         out_buffer=None,
         adjust_phase=True,
+        mode_mask=None,
     ):
         """Evaluate respones function
 
@@ -258,6 +299,10 @@ class LISATDIResponse:
             adjust_phase (bool, optional): If ``True`` adjust the phase array in-place
                 inside the response code. **Note**: This only applies when
                 inputing ``phase`` and ``tf``. (Default: ``True``)
+            mode_mask (bool array-like, optional): Per-binary mask with shape
+                ``(num_bin_all, num_modes)``. The response is not computed for
+                harmonics where the mask is ``False``. See :mod:`bbhx.utils.modeselect`.
+                If ``None``, all harmonics are computed. (Default: ``None``)
 
         Raises:
             ValueError: Incorrect dimensions for the arrays.
@@ -416,6 +461,8 @@ class LISATDIResponse:
             length,
             num_bin_all,
             includes_amps,
+            *self.orbit_args,
+            prepare_mode_mask(mode_mask, num_bin_all, num_modes, self.xp),
         )
 
         # adjust input phase arrays in-place
@@ -0,0 +1,208 @@
+# Tabulated LISA orbits for the response function
+
+# Copyright (C) 2021 Michael L. Katz, Sylvain Marsat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+from bbhx.utils.constants import *
+
+# p0, p1L, p2L, p3L, n1, n2, n3 (3 components each)
+NUM_ORBIT_COMPONENTS = 21
+
+# compiled orbits shared across instances
+_orbit_cache = {}
+
+
+class TabulatedOrbits:
+    """Spline representation of tabulated LISA spacecraft orbits
+
+    Spacecraft positions sampled on a uniform time grid are converted once
+    into cubic-spline coefficients for the quantities needed by the response:
+    the constellation center :math:`p_0`, the spacecraft positions relative to
+    the center :math:`p_{iL}`, and the link unit vectors
+    :math:`n_1=(p_3-p_2)/|p_3-p_2|`, :math:`n_2=(p_1-p_3)/|p_1-p_3|`, and
+    :math:`n_3=(p_2-p_1)/|p_2-p_1|`. These match the conventions of the
+    analytic equal-arm orbits in the response code.
+
+    The coefficients are packed by time interval so that a lookup reads one
+    contiguous block. Times outside the table are held at the first or last
+    entry, so the table should cover the time span of the signals. The response still uses the nominal armlength ``L_SI`` in the
+    transfer function prefactors.
+
+    Args:
+        t (double np.ndarray): Uniformly spaced times in seconds (SSB frame).
+        x (double np.ndarray): Spacecraft positions in meters in the SSB frame
+            with shape ``(len(t), 3, 3)`` (time, spacecraft, coordinate).
+        use_gpu (bool, optional): If ``True``, store coefficients on the GPU.
+            (Default: ``False``)
+
+    Attributes:
+        coeffs (double xp.ndarray): Packed spline coefficients with shape
+            ``(num_t - 1, NUM_ORBIT_COMPONENTS, 4)`` in increasing polynomial order.
+        dt (double): Time spacing in seconds.
+        num_t (int): Number of times in the table.
+        t0 (double): First time in the table in seconds.
+        use_gpu (bool): If ``True``, coefficients are on the GPU.
+        xp (obj): Either numpy or cupy.
+
+    Raises:
+        ValueError: Inputs are not correct.
+
+    """
+
+    def __init__(self, t, x, use_gpu=False):
+
+        self.use_gpu = use_gpu
+        self.xp = xp if use_gpu else np
+
+        t = np.asarray(t, dtype=np.float64)
+        x = np.asarray(x, dtype=np.float64)
+
+        if t.ndim != 1 or len(t) < 4:
+            raise ValueError("t must be a 1D array with at least 4 entries.")
+
+        if x.shape != (len(t), 3, 3):
+            raise ValueError(
+                f"x must have shape (len(t), 3, 3). Current shape is {x.shape}."
+            )
+
+        dt_all = np.diff(t)
+        if not np.allclose(dt_all, dt_all[0], rtol=1e-10, atol=0.0):
+            raise ValueError("t must be uniformly spaced.")
+
+        self.t0 = float(t[0])
+        self.dt = float(dt_all[0])
+        self.num_t = len(t)
+
+        # constellation center and positions relative to it
+        p0 = x.mean(axis=1)
+        pL = x - p0[:, np.newaxis, :]
+
+        # link unit vectors
+        def unit(vec):
+            return vec / np.linalg.norm(vec, axis=-1, keepdims=True)
+
+        n1 = unit(x[:, 2] - x[:, 1])
+        n2 = unit(x[:, 0] - x[:, 2])
+        n3 = unit(x[:, 1] - x[:, 0])
+
+        components = np.concatenate(
+            [p0, pL[:, 0], pL[:, 1], pL[:, 2], n1, n2, n3], axis=1
+        )
+
+        # scipy gives highest order first with shape (4, num_t - 1, ncomp)
+        spline = CubicSpline(t, components, axis=0)
+        coeffs = np.ascontiguousarray(spline.c[::-1].transpose(1, 2, 0))
+
+        self.coeffs = self.xp.asarray(coeffs)
+
+    @classmethod
+    def from_file(cls, filename, use_gpu=False):
+        """Load orbits from a file
+
+        ``.npz`` files must contain ``t`` and ``x`` arrays as described in the
+        class docstring. Any other file is read as an HDF5 orbit file in the
+        format of LISA Orbits (attributes ``t0``, ``dt``, and ``size`` and
+        the dataset ``tcb/x``). This requires ``h5py``.
+
+        Args:
+            filename (str): Path to the orbit file.
+            use_gpu (bool, optional): If ``True``, store coefficients on the GPU.
+                (Default: ``False``)
+
+        Returns:
+            :class:`TabulatedOrbits`: Orbits object.
+
+        """
+        if filename.endswith(".npz"):
+            with np.load(filename) as f:
+                t = f["t"]
+                x = f["x"]
+
+        else:
+            import h5py
+
+            with h5py.File(filename, "r") as f:
+                t = f.attrs["t0"] + np.arange(f.attrs["size"]) * f.attrs["dt"]
+                x = f["tcb"]["x"][:]
+
+        return cls(t, x, use_gpu=use_gpu)
+
+    @property
+    def args(self):
+        """Arguments for the C/CUDA response function."""
+        return (self.coeffs, self.t0, self.dt, self.num_t)
+
+    def __call__(self, t):
+        """Evaluate the orbit quantities with the spline coefficients
+
+        Args:
+            t (double np.ndarray): Times in seconds.
+
+        Returns:
+            double np.ndarray: Orbit components with shape ``(len(t), NUM_ORBIT_COMPONENTS)``.
+
+        """
+        coeffs = self.coeffs
+        try:
+            coeffs = coeffs.get()
+        except AttributeError:
+            pass
+
+        t = np.clip(
+            np.atleast_1d(t), self.t0, self.t0 + (self.num_t - 1) * self.dt
+        )
+        ind = np.clip(
+            np.floor((t - self.t0) / self.dt).astype(int), 0, self.num_t - 2
+        )
+        x = (t - (self.t0 + ind * self.dt))[:, np.newaxis]
+
+        c = coeffs[ind]
+        return c[:, :, 0] + c[:, :, 1] * x + c[:, :, 2] * x**2 + c[:, :, 3] * x**3
+
+
+def load_orbits(filename, use_gpu=False):
+    """Load tabulated orbits with caching
+
+    Orbits are converted into spline coefficients only once per file (and
+    device). The same :class:`TabulatedOrbits` object is returned for
+    subsequent calls as long as the file is not modified.
+
+    Args:
+        filename (str): Path to the orbit file. See :meth:`TabulatedOrbits.from_file`.
+        use_gpu (bool, optional): If ``True``, store coefficients on the GPU.
+            (Default: ``False``)
+
+    Returns:
+        :class:`TabulatedOrbits`: Orbits object.
+
+    """
+    path = os.path.abspath(filename)
+    key = (path, os.path.getmtime(path), use_gpu)
+
+    if key not in _orbit_cache:
+        _orbit_cache[key] = TabulatedOrbits.from_file(path, use_gpu=use_gpu)
+
+    return _orbit_cache[key]
@@ -0,0 +1,476 @@
+# Matched-filter search over template banks
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import itertools
+import time
+
+import numpy as np
+
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+from .utils.citations import *
+from .utils.transform import apply_param_transform
+
+
+class MatchedFilterSearch:
+    """Matched-filter search of a template bank with analytic extrinsic maximization
+
+    Each template is generated once at the reference time of the bank. Its
+    complex overlap with the data,
+    :math:`z(\\tau)=4\\sum_f \\tilde{d}^*(f)\\tilde{h}(f)e^{-2\\pi i f\\tau}\\Delta f/S_n(f)`,
+    is computed for all time shifts :math:`\\tau` at once with a batched
+    FFT. The overall phase and the distance are maximized
+    analytically: the SNR is :math:`|z(\\tau)|/\\sqrt{\\langle h|h\\rangle}`,
+    the maximized log-Likelihood ratio is :math:`\\rho^2/2`, and the best
+    distance is :math:`D_\\text{template}\\langle h|h\\rangle/|z|`.
+
+    The time shift moves the waveform but not the LISA response, so it is
+    accurate for shifts that are short compared to the orbital period. Candidates
+    can be refined with a search at their time (see :meth:`hierarchical_search`).
+
+    The data grid, noise weights, and weighted data are taken from a
+    :class:`Likelihood <bbhx.likelihood.Likelihood>` object. The data frequencies
+    must be evenly spaced (e.g. from ``np.fft.rfftfreq``). If the likelihood
+    has a ``param_transform``, the bank is given in its input coordinates, and
+    the distance and time are maximized in the waveform parameters it returns.
+    Candidates are returned and refined in the waveform parameters.
+
+    This class has GPU capabilities.
+
+    Args:
+        likelihood (obj): :class:`Likelihood <bbhx.likelihood.Likelihood>` object
+            holding the data and the waveform generator.
+        batch_size (int, optional): Number of templates generated and filtered
+            at once. Memory usage is about ``32 * num_fft`` bytes per template.
+            (Default: ``32``)
+        time_resolution (double, optional): Maximum spacing in seconds of the
+            time shifts. If ``None``, the FFT covers the data frequencies only
+            and the spacing is about twice the sampling interval. (Default: ``None``)
+        intrinsic_inds (tuple, optional): Indices of the intrinsic waveform
+            parameters refined by :meth:`hierarchical_search`.
+            (Default: ``(0, 1, 2, 3)`` for ``m1, m2, chi1, chi2``)
+        dist_ind (int, optional): Index of the luminosity distance in the
+            waveform parameters. (Default: ``4``)
+        t_ref_ind (int, optional): Index of the reference time in the waveform
+            parameters. (Default: ``11``)
+        verbose (bool, optional): If ``True``, print progress after each batch.
+            (Default: ``False``)
+
+    Attributes:
+        batch_size (int): Number of templates generated and filtered at once.
+        df (double): Frequency spacing of the data.
+        dist_ind (int): Index of the luminosity distance.
+        intrinsic_inds (tuple): Indices of the refined intrinsic parameters.
+        likelihood (obj): Likelihood holding the data.
+        num_fft (int): Length of the FFT.
+        start_ind (int): Index of the first data frequency in units of ``df``.
+        stats (dict): Throughput information from the last search. Keys are
+            ``num_templates``, ``generate_time``, ``filter_time``,
+            ``total_time``, and ``templates_per_sec``.
+        t_ref_ind (int): Index of the reference time.
+        time_shifts (double xp.ndarray): Time shifts of the SNR time series in seconds.
+        use_gpu (bool): If ``True``, use GPU.
+        verbose (bool): If ``True``, print progress after each batch.
+        xp (obj): Numpy or Cupy.
+
+    Raises:
+        ValueError: The data frequencies are not evenly spaced.
+
+    """
+
+    def __init__(
+        self,
+        likelihood,
+        batch_size=32,
+        time_resolution=None,
+        intrinsic_inds=(0, 1, 2, 3),
+        dist_ind=4,
+        t_ref_ind=11,
+        verbose=False,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer.")
+
+        self.likelihood = likelihood
+        self.use_gpu = likelihood.use_gpu
+        self.xp = xp if self.use_gpu else np
+        self.batch_size = batch_size
+        self.intrinsic_inds = tuple(intrinsic_inds)
+        self.dist_ind = dist_ind
+        self.t_ref_ind = t_ref_ind
+        self.verbose = verbose
+
+        data_freqs = likelihood.data_freqs
+        try:
+            data_freqs = data_freqs.get()
+        except AttributeError:
+            pass
+
+        delta_f = np.diff(data_freqs)
+        self.df = df = delta_f.mean()
+        if not np.allclose(delta_f, df, rtol=1e-8, atol=0.0):
+            raise ValueError("MatchedFilterSearch requires evenly spaced data_freqs.")
+
+        self.start_ind = int(np.round(data_freqs[0] / df))
+        if not np.isclose(self.start_ind * df, data_freqs[0], rtol=1e-8, atol=0.0):
+            raise ValueError("data_freqs must lie on a grid of integer multiples of df.")
+
+        num_fft = self.start_ind + len(data_freqs)
+        if time_resolution is not None:
+            num_fft = max(num_fft, int(np.ceil(1.0 / (df * time_resolution))))
+        self.num_fft = num_fft
+
+        # shifts in [-T/2, T/2) for the periodic time series
+        self.time_shifts = self.xp.fft.fftfreq(num_fft, df)
+
+        # conj(d) * noise weight, so that z = sum(dw * h) (flattened (3, N))
+        self._dw = likelihood.data_channels.conj() * likelihood.noise_factors
+
+        self.stats = {}
+
+    @property
+    def citation(self):
+        """Citations for this class"""
+        return katz_citations
+
+    def snr_time_series(self, params, **waveform_kwargs):
+        """SNR time series of templates
+
+        Args:
+            params (double np.ndarray): Template parameters with shape
+                ``(num_params, num_templates)``.
+            **waveform_kwargs (dict, optional): Keyword arguments for the waveform
+                generator. ``freqs``, ``direct``, and ``fill`` are set internally.
+                ``length`` must be given.
+
+        Returns:
+            tuple: Complex overlaps :math:`z(\\tau)/\\sqrt{\\langle h|h\\rangle}`
+                with shape ``(num_templates, num_fft)`` on :attr:`time_shifts`
+                and :math:`\\langle h|h\\rangle` with shape ``(num_templates,)``.
+
+        """
+        params = np.atleast_2d(
+            apply_param_transform(self.likelihood.param_transform, params)
+        )
+        num_templates = params.shape[1]
+
+        out = self.xp.empty((num_templates, self.num_fft), dtype=self.xp.complex128)
+        h_h = self.xp.empty(num_templates)
+        for inds, z, h_h_batch in self._filter_batches(params, **waveform_kwargs):
+            out[inds] = z / self.xp.sqrt(h_h_batch)[:, None]
+            h_h[inds] = h_h_batch
+
+        return out, h_h
+
+    def _filter_batches(self, params, **waveform_kwargs):
+        """Generate and filter templates in batches
+
+        ``params`` are waveform parameters, i.e. ``param_transform`` has
+        already been applied.
+
+        Yields:
+            tuple: (slice of the templates, complex overlaps
+                ``(num_bin, num_fft)``, :math:`\\langle h|h\\rangle`).
+
+        """
+        waveform_kwargs["freqs"] = self.likelihood.data_freqs
+        waveform_kwargs["direct"] = False
+        waveform_kwargs["fill"] = False
+
+        num_templates = params.shape[1]
+        data_length = self.likelihood.data_stream_length
+        dw = self._dw.reshape(3, data_length)
+        nf = self.likelihood.noise_factors.reshape(3, data_length)
+
+        self._generate_time = 0.0
+        self._filter_time = 0.0
+        for start in range(0, num_templates, self.batch_size):
+            end = min(start + self.batch_size, num_templates)
+
+            st = time.perf_counter()
+            templates, start_inds, lengths = self.likelihood.waveform_gen(
+                *params[:, start:end], **waveform_kwargs
+            )
+            if self.use_gpu:
+                xp.cuda.runtime.deviceSynchronize()
+            self._generate_time += time.perf_counter() - st
+
+            st = time.perf_counter()
+            integrand = self.xp.zeros(
+                (end - start, self.num_fft), dtype=self.xp.complex128
+            )
+            h_h = self.xp.empty(end - start)
+            for bin_i, (temp, s, n) in enumerate(zip(templates, start_inds, lengths)):
+                s = int(s)
+                n = int(n)
+                sl = slice(s, s + n)
+                integrand[bin_i, self.start_ind + s : self.start_ind + s + n] = (
+                    dw[:, sl] * temp
+                ).sum(axis=0)
+                h_h[bin_i] = 4 * self.xp.sum(self.xp.abs(nf[:, sl] * temp) ** 2)
+
+            # z(tau) = 4 sum_k integrand_k exp(-2 pi i k df tau)
+            z = 4 * self.xp.fft.fft(integrand, axis=-1)
+            if self.use_gpu:
+                xp.cuda.runtime.deviceSynchronize()
+            self._filter_time += time.perf_counter() - st
+
+            if self.verbose:
+                print(f"Filtered templates {end}/{num_templates}")
+
+            yield slice(start, end), z, h_h
+
+    def search(
+        self,
+        params,
+        num_keep=10,
+        snr_threshold=None,
+        max_time_shift=None,
+        **waveform_kwargs
+    ):
+        """Filter a bank and return the loudest templates
+
+        Args:
+            params (double np.ndarray): Bank parameters with shape
+                ``(num_params, num_templates)``. The extrinsic parameters are the
+                same for all templates in a typical bank. These are the input
+                coordinates of the likelihood's ``param_transform`` if it has one.
+            num_keep (int, optional): Number of candidates returned. (Default: ``10``)
+            snr_threshold (double, optional): Only return candidates above this SNR.
+                (Default: ``None``)
+            max_time_shift (double, optional): Maximum absolute time shift in
+                seconds. If ``None``, all shifts are searched. (Default: ``None``)
+            **waveform_kwargs (dict, optional): Keyword arguments for the waveform
+                generator. ``length`` must be given.
+
+        Returns:
+            dict: Candidates sorted by SNR. ``params`` are the waveform
+                parameters (after ``param_transform``) with shape
+                ``(num_params, num_candidates)``, the maximized distance, and the
+                shifted reference time. ``snr``, ``log_like_ratio``,
+                ``time_shift``, ``phase`` (overall phase applied to the template),
+                and ``index`` (template in the bank) have shape ``(num_candidates,)``.
+
+        """
+        params = np.atleast_2d(
+            apply_param_transform(self.likelihood.param_transform, params)
+        )
+        return self._search(
+            params,
+            num_keep=num_keep,
+            snr_threshold=snr_threshold,
+            max_time_shift=max_time_shift,
+            **waveform_kwargs,
+        )
+
+    def _search(
+        self,
+        params,
+        num_keep=10,
+        snr_threshold=None,
+        max_time_shift=None,
+        **waveform_kwargs
+    ):
+        """:meth:`search` over waveform parameters"""
+        params = np.asarray(params, dtype=np.float64)
+        num_templates = params.shape[1]
+
+        if max_time_shift is None:
+            time_mask = None
+        else:
+            time_mask = self.xp.abs(self.time_shifts) <= max_time_shift
+
+        best_snr = np.empty(num_templates)
+        best_z = np.empty(num_templates, dtype=np.complex128)
+        best_h_h = np.empty(num_templates)
+        best_shift = np.empty(num_templates)
+
+        st_all = time.perf_counter()
+        for inds, z, h_h in self._filter_batches(params, **waveform_kwargs):
+            abs_z = self.xp.abs(z)
+            if time_mask is not None:
+                abs_z[:, ~time_mask] = -1.0
+
+            # phase: maximize |z|, distance: snr = |z| / sqrt(h_h)
+            max_ind = self.xp.argmax(abs_z, axis=-1)
+            rows = self.xp.arange(len(max_ind))
+            z_max = z[rows, max_ind]
+            snr = self.xp.abs(z_max) / self.xp.sqrt(h_h)
+            shift = self.time_shifts[max_ind]
+
+            try:
+                snr, z_max, h_h, shift = snr.get(), z_max.get(), h_h.get(), shift.get()
+            except AttributeError:
+                pass
+
+            best_snr[inds] = snr
+            best_z[inds] = z_max
+            best_h_h[inds] = h_h
+            best_shift[inds] = shift
+
+        total_time = time.perf_counter() - st_all
+        self.stats = dict(
+            num_templates=num_templates,
+            generate_time=self._generate_time,
+            filter_time=self._filter_time,
+            total_time=total_time,
+            templates_per_sec=num_templates / total_time if total_time > 0.0 else np.inf,
+        )
+
+        order = np.argsort(best_snr)[::-1]
+        if snr_threshold is not None:
+            order = order[best_snr[order] >= snr_threshold]
+        order = order[:num_keep]
+
+        out_params = params[:, order].copy()
+        out_params[self.dist_ind] *= best_h_h[order] / np.abs(best_z[order])
+        out_params[self.t_ref_ind] += best_shift[order]
+
+        return dict(
+            params=out_params,
+            snr=best_snr[order],
+            log_like_ratio=best_snr[order] ** 2 / 2.0,
+            time_shift=best_shift[order],
+            phase=-np.angle(best_z[order]),
+            index=order,
+        )
+
+    def hierarchical_search(
+        self,
+        params,
+        step,
+        num_levels=2,
+        num_keep=10,
+        snr_threshold=None,
+        shrink=0.5,
+        bounds=None,
+        max_time_shift=None,
+        **waveform_kwargs
+    ):
+        """Coarse-to-fine search
+
+        The coarse bank ``params`` is searched first. At each following level,
+        the candidates are refined on a local grid with offsets of
+        ``(-step, 0, step)`` in each parameter of :attr:`intrinsic_inds`,
+        centered at the time of the candidate. Regions of the bank below
+        ``snr_threshold`` or outside the ``num_keep`` loudest candidates are
+        pruned. ``step`` is multiplied by ``shrink`` after each level.
+
+        Args:
+            params (double np.ndarray): Coarse bank with shape
+                ``(num_params, num_templates)`` in the input coordinates of
+                :meth:`search`. The refinement is done in the waveform parameters.
+            step (double array-like): Grid step of each intrinsic parameter
+                at the first refinement level.
+            num_levels (int, optional): Number of levels including the coarse
+                bank. (Default: ``2``)
+            num_keep (int, optional): Number of candidates kept at each level.
+                (Default: ``10``)
+            snr_threshold (double, optional): Only keep candidates above this SNR.
+                (Default: ``None``)
+            shrink (double, optional): Factor applied to ``step`` after each
+                level. (Default: ``0.5``)
+            bounds (list, optional): ``(lower, upper)`` limits of each intrinsic
+                parameter. Refined points are clipped to them. (Default: ``None``)
+            max_time_shift (double, optional): Maximum absolute time shift in
+                seconds. (Default: ``None``)
+            **waveform_kwargs (dict, optional): Keyword arguments for the waveform
+                generator. ``length`` must be given.
+
+        Returns:
+            dict: Candidates in the format of :meth:`search`. ``index`` refers
+                to the coarse bank for candidates that were not refined and is
+                ``-1`` otherwise. ``level`` gives the level that found each
+                candidate.
+
+        Raises:
+            ValueError: ``step`` does not match :attr:`intrinsic_inds`.
+
+        """
+        step = np.asarray(step, dtype=np.float64)
+        if step.shape != (len(self.intrinsic_inds),):
+            raise ValueError("step must have one entry per intrinsic parameter.")
+
+        candidates = self.search(
+            params,
+            num_keep=num_keep,
+            snr_threshold=snr_threshold,
+            max_time_shift=max_time_shift,
+            **waveform_kwargs,
+        )
+        candidates["level"] = np.zeros(len(candidates["snr"]), dtype=int)
+        total_templates = self.stats["num_templates"]
+        total_time = self.stats["total_time"]
+
+        # the center of each grid is already a candidate
+        offsets = np.array(
+            list(itertools.product([-1.0, 0.0, 1.0], repeat=len(self.intrinsic_inds)))
+        )
+        offsets = offsets[np.any(offsets != 0.0, axis=1)]
+        for level in range(1, num_levels):
+            if len(candidates["snr"]) == 0:
+                break
+
+            # local grids around each candidate at its reference time
+            centers = candidates["params"].T
+            refined = np.repeat(centers, len(offsets), axis=0)
+            refined[:, self.intrinsic_inds] += np.tile(offsets * step, (len(centers), 1))
+            if bounds is not None:
+                for i, (low, high) in zip(self.intrinsic_inds, bounds):
+                    refined[:, i] = np.clip(refined[:, i], low, high)
+
+            # neighboring grids overlap
+            refined = np.unique(refined, axis=0)
+
+            new = self._search(
+                refined.T,
+                num_keep=num_keep,
+                snr_threshold=snr_threshold,
+                max_time_shift=max_time_shift,
+                **waveform_kwargs,
+            )
+            new["index"] = np.full(len(new["snr"]), -1)
+            new["level"] = np.full(len(new["snr"]), level)
+            total_templates += self.stats["num_templates"]
+            total_time += self.stats["total_time"]
+
+            candidates = _merge_candidates(candidates, new, num_keep)
+            step = step * shrink
+
+        self.stats = dict(
+            num_templates=total_templates,
+            total_time=total_time,
+            templates_per_sec=total_templates / total_time if total_time > 0.0 else np.inf,
+        )
+        return candidates
+
+
+def _merge_candidates(old, new, num_keep):
+    """Keep the loudest candidates of two searches."""
+    snr = np.concatenate([old["snr"], new["snr"]])
+    order = np.argsort(snr)[::-1][:num_keep]
+
+    merged = {}
+    for key in old:
+        axis = 1 if key == "params" else 0
+        merged[key] = np.take(np.concatenate([old[key], new[key]], axis=axis), order, axis=axis)
+
+    return merged
@@ -16,14 +16,42 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import functools
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
 import unittest
 import numpy as np
 
-from bbhx.waveformbuild import BBHWaveformFD
+from bbhx.waveformbuild import BBHWaveformFD, TemplateInterpFD
 from bbhx.waveforms.phenomhm import PhenomHMAmpPhase
+from bbhx.waveforms.external import ExternalAmpPhase
 from bbhx.response.fastfdresponse import LISATDIResponse
-from bbhx.likelihood import Likelihood, HeterodynedLikelihood
+from bbhx.response.orbits import load_orbits
+from bbhx.likelihood import (
+    Likelihood,
+    HeterodynedLikelihood,
+    HarmonicHeterodynedLikelihood,
+    ResidualLikelihood,
+    MultiSourceLikelihood,
+    BandedLikelihood,
+    DelayedAcceptanceLikelihood,
+)
+from bbhx.injection import CatalogInjectionFD
+from bbhx.fisher import FisherMatrixFD
+from bbhx.search import MatchedFilterSearch
+from bbhx.timedomain import BBHWaveformTD
+from bbhx.autotune import Autotuner
+from bbhx.utils.bankpipeline import BankPipeline
+from bbhx.utils.cache import DiskCache
 from bbhx.utils.constants import *
+from bbhx.utils.interpolate import CubicSplineInterpolant
+from bbhx.utils.modeselect import mode_mask_from_params, mode_mask_from_power
+from bbhx.utils.profile import save_profile, load_profile
+from bbhx.utils.splinebank import SplineBank
+from bbhx.utils.utility import PreparedCall, MemoryTracker
 from bbhx.utils.transform import *
 
 from lisatools.sensitivity import get_sensitivity
@@ -87,6 +115,76 @@ class WaveformTest(unittest.TestCase):
 
         self.assertTrue(np.all(~np.isnan(wave)))
 
+    def test_catalog_injection(self):
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        num_bin = 5
+        f_ref = 0.0
+        params = np.array(
+            [
+                1e6 * (1 + 0.5 * np.random.rand(num_bin)),
+                5e5 * (1 + 0.5 * np.random.rand(num_bin)),
+                np.full(num_bin, 0.2),
+                np.full(num_bin, 0.4),
+                np.full(num_bin, 18e3 * PC_SI * 1e6),
+                np.random.uniform(0.0, 2 * np.pi, num_bin),
+                np.full(num_bin, f_ref),
+                np.random.uniform(0.1, np.pi - 0.1, num_bin),
+                np.random.uniform(0.0, 2 * np.pi, num_bin),
+                np.random.uniform(-np.pi / 2 + 0.1, np.pi / 2 - 0.1, num_bin),
+                np.random.uniform(0.0, np.pi, num_bin),
+                np.full(num_bin, 1.0 * YRSID_SI),
+            ]
+        )
+
+        freq_new = xp.logspace(-4, 0, 10000)
+        waveform_kwargs = dict(length=1024)
+
+        separate = wave_gen(
+            *params, freqs=freq_new, fill=True, combine=False, **waveform_kwargs
+        )
+        combined = wave_gen(
+            *params, freqs=freq_new, fill=True, combine=True, **waveform_kwargs
+        )
+
+        # overlapping sources need to be added rather than overwritten
+        self.assertTrue(xp.allclose(combined, separate.sum(axis=0)))
+
+        injector = CatalogInjectionFD(wave_gen, freq_new, batch_size=2)
+        injected = injector(params, **waveform_kwargs)
+
+        self.assertTrue(xp.allclose(injected, combined))
+        self.assertEqual(injector.stats["num_batches"], 3)
+
+        # an output buffer that is added to in slabs (like an h5py dataset)
+        class SlabBuffer:
+            def __init__(self, arr):
+                self.arr = arr
+                self.shape = arr.shape
+                self.dtype = arr.dtype
+                self.max_slab = 0
+
+            def __getitem__(self, key):
+                out = self.arr[key]
+                self.max_slab = max(self.max_slab, out.shape[-1])
+                return out
+
+            def __setitem__(self, key, value):
+                self.arr[key] = value
+
+        data_out = SlabBuffer(np.zeros((3, len(freq_new)), dtype=np.complex128))
+        injector = CatalogInjectionFD(wave_gen, freq_new, batch_size=2, slab_size=1000)
+        injector(params, data_out=data_out, **waveform_kwargs)
+
+        try:
+            combined_host = combined.get()
+        except AttributeError:
+            combined_host = combined
+        self.assertTrue(np.allclose(data_out.arr, combined_host))
+        self.assertEqual(data_out.max_slab, 1000)
+
     def test_phenom_hm(self):
         phenomhm = PhenomHMAmpPhase(use_gpu=gpu_available, run_phenomd=False)
         f_ref = 0.0  # let phenom codes set f_ref -> fmax = max(f^2A(f))
@@ -350,3 +448,1871 @@ class WaveformTest(unittest.TestCase):
         ll_het = like_het.get_ll(params_in.T, **waveform_kwargs)
 
         self.assertTrue(np.all(~np.isnan(ll)))
+
+    def test_memmap_likelihood(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        # set parameters
+        params = np.array(
+            [
+                1e6,
+                5e5,
+                0.2,
+                0.4,
+                18e3 * PC_SI * 1e6,
+                0.0,
+                0.0,
+                np.pi / 3.0,
+                np.pi / 5.0,
+                np.pi / 4.0,
+                np.pi / 6.0,
+                1.0 * YRSID_SI,
+            ]
+        )
+
+        T_obs = 1.2  # years
+        dt = 10.0
+
+        n = int(T_obs * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]  # remove DC
+
+        modes = [(2, 2), (3, 3)]
+        waveform_kwargs = dict(
+            modes=modes, direct=False, fill=True, squeeze=True, length=1024
+        )
+
+        data_channels = wave_gen(*params, freqs=data_freqs, **waveform_kwargs)[0]
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+            data_channels_cpu = data_channels.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+            data_channels_cpu = data_channels
+
+        psd = np.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        params_in = np.tile(params, (4, 1))
+        params_in[:, 0] *= 1 + 1e-5 * np.arange(4)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = os.path.join(tmpdir, "data.npy")
+            psd_path = os.path.join(tmpdir, "psd.npy")
+            np.save(data_path, data_channels_cpu)
+            np.save(psd_path, psd)
+
+            like = Likelihood(
+                wave_gen, data_freqs, data_channels, xp.asarray(psd), use_gpu=gpu_available
+            )
+            like_mmap = Likelihood(
+                wave_gen,
+                data_freqs,
+                data_path,
+                psd_path,
+                use_gpu=gpu_available,
+                chunk_size=100000,
+                track_memory=True,
+            )
+
+            self.assertTrue(np.allclose(like.d_d, like_mmap.d_d, rtol=1e-12))
+            self.assertTrue(like_mmap.peak_memory > 0)
+            self.assertIsNone(like.peak_memory)
+            with MemoryTracker(enabled=False) as tracker:
+                self.assertFalse(tracemalloc.is_tracing())
+            self.assertIsNone(tracker.peak)
+
+            # an outer tracemalloc session keeps its peak
+            tracemalloc.start()
+            try:
+                tmp = np.ones(2**20)
+                del tmp
+                outer_peak = tracemalloc.get_traced_memory()[1]
+                with MemoryTracker() as tracker:
+                    tmp = np.ones(2**16)
+                    del tmp
+                self.assertEqual(tracemalloc.get_traced_memory()[1], outer_peak)
+                self.assertTrue(tracker.peak >= 0)
+            finally:
+                tracemalloc.stop()
+            self.assertTrue(
+                np.allclose(
+                    like.get_ll(params_in.T, **waveform_kwargs),
+                    like_mmap.get_ll(params_in.T, **waveform_kwargs),
+                    rtol=1e-8,
+                )
+            )
+
+            like_het = HeterodynedLikelihood(
+                wave_gen, data_freqs, data_channels, params, 128, use_gpu=gpu_available
+            )
+            like_het_mmap = HeterodynedLikelihood(
+                wave_gen,
+                data_freqs,
+                data_path,
+                params,
+                128,
+                use_gpu=gpu_available,
+                chunk_size=100000,
+            )
+
+            self.assertTrue(
+                np.allclose(like_het.data_constants, like_het_mmap.data_constants)
+            )
+            self.assertTrue(
+                np.allclose(
+                    like_het.get_ll(params_in.T, **waveform_kwargs),
+                    like_het_mmap.get_ll(params_in.T, **waveform_kwargs),
+                    rtol=1e-8,
+                )
+            )
+
+            del like_mmap, like_het_mmap
+
+    def test_mixed_precision(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+        wave_gen_mixed = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False),
+            interp_kwargs=dict(mixed_precision=True),
+            use_gpu=gpu_available,
+        )
+
+        num_bin = 3
+        params = np.tile(
+            np.array(
+                [
+                    1e6,
+                    5e5,
+                    0.2,
+                    0.4,
+                    18e3 * PC_SI * 1e6,
+                    0.0,
+                    0.0,
+                    np.pi / 3.0,
+                    np.pi / 5.0,
+                    np.pi / 4.0,
+                    np.pi / 6.0,
+                    1.0 * YRSID_SI,
+                ]
+            ),
+            (num_bin, 1),
+        ).T
+        params[0] *= np.array([0.5, 1.0, 2.0])
+
+        n = int(1.2 * YRSID_SI / 10.0)
+        data_freqs = xp.fft.rfftfreq(n, 10.0)[1:]
+
+        waveform_kwargs = dict(freqs=data_freqs, direct=False, fill=True, length=1024)
+
+        h = wave_gen(*params, **waveform_kwargs)
+        h_mixed = wave_gen_mixed(*params, **waveform_kwargs)
+
+        self.assertTrue(h_mixed.dtype == xp.complex128)
+
+        inner = lambda a, b: xp.sum((a.conj() * b).real, axis=(1, 2))
+        mismatch = 1.0 - inner(h, h_mixed) / xp.sqrt(
+            inner(h, h) * inner(h_mixed, h_mixed)
+        )
+
+        self.assertTrue(xp.all(xp.abs(mismatch) < 1e-12))
+
+        # only the split coefficients are kept
+        x = xp.asarray(np.tile(np.logspace(-4, -2, 64), (2, 1)))
+        y = xp.ones((9, 2, 1, 64)) * x[None, :, None, :] ** 2
+        spline = CubicSplineInterpolant(x, y, use_gpu=gpu_available, mixed_precision=True)
+        self.assertIsNone(spline.c1)
+        self.assertEqual(spline.c1_lp.dtype, np.float32)
+        self.assertEqual(spline.c1_hp.shape, (2, 2, 1, 64))
+        with self.assertRaises(ValueError):
+            spline.container
+
+    def test_fisher(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        params = np.array(
+            [
+                1e6,
+                5e5,
+                0.2,
+                0.4,
+                18e3 * PC_SI * 1e6,
+                0.3,
+                0.0,
+                np.pi / 3.0,
+                np.pi / 5.0,
+                np.pi / 4.0,
+                np.pi / 6.0,
+                1.0 * YRSID_SI,
+            ]
+        )
+        points = np.array([params, params * 1.01]).T
+        points[6] = 0.0
+
+        freqs = xp.logspace(-4, -1, 2048)
+        modes = [(2, 2), (3, 3)]
+
+        fisher_gen = FisherMatrixFD(
+            wave_gen, freqs, param_inds=[0, 4, 8, 11], use_gpu=gpu_available
+        )
+
+        fisher = fisher_gen.get_fisher(points, modes=modes)
+        self.assertEqual(fisher.shape, (2, 4, 4))
+
+        # compare to one perturbation at a time
+        steps = fisher_gen.get_step_sizes(points[:, 1])[:, 0]
+        dh = []
+        for ind, step in zip(fisher_gen.param_inds, steps):
+            params_plus = points[:, 1].copy()
+            params_minus = points[:, 1].copy()
+            params_plus[ind] += step
+            params_minus[ind] -= step
+            h_plus = wave_gen(
+                *params_plus, freqs=freqs, direct=True, compress=False, modes=modes
+            )[0]
+            h_minus = wave_gen(
+                *params_minus, freqs=freqs, direct=True, compress=False, modes=modes
+            )[0]
+            dh.append((h_plus - h_minus) / (2 * step))
+
+        dh = xp.asarray(dh)
+        fisher_check = xp.einsum(
+            "icms,jcms,cs->ij", dh.conj(), dh, fisher_gen.weights
+        ).real
+
+        try:
+            fisher_check = fisher_check.get()
+        except AttributeError:
+            pass
+
+        self.assertTrue(np.allclose(fisher[1], fisher_check, rtol=1e-8))
+
+        cov = fisher_gen.get_covariance(points, modes=modes)
+        self.assertTrue(np.all(np.diagonal(cov, axis1=1, axis2=2) > 0.0))
+
+        # cross terms between harmonics from the summed derivatives on a dense grid
+        dense_freqs = xp.linspace(1e-4, 1e-2, 2**14)
+        fisher_dense = FisherMatrixFD(
+            wave_gen, dense_freqs, param_inds=[0, 4, 8, 11], use_gpu=gpu_available
+        )
+        fisher_cross = fisher_dense.get_fisher(
+            points[:, 1], modes=modes, cross_terms=True
+        )
+        dh_sum = []
+        for ind, step in zip(fisher_dense.param_inds, steps):
+            params_plus = points[:, 1].copy()
+            params_minus = points[:, 1].copy()
+            params_plus[ind] += step
+            params_minus[ind] -= step
+            h_plus = wave_gen(
+                *params_plus, freqs=dense_freqs, direct=True, modes=modes
+            )[0]
+            h_minus = wave_gen(
+                *params_minus, freqs=dense_freqs, direct=True, modes=modes
+            )[0]
+            dh_sum.append((h_plus - h_minus) / (2 * step))
+
+        dh_sum = xp.asarray(dh_sum)
+        fisher_cross_check = xp.einsum(
+            "ics,jcs,cs->ij", dh_sum.conj(), dh_sum, fisher_dense.weights
+        ).real
+
+        try:
+            fisher_cross_check = fisher_cross_check.get()
+        except AttributeError:
+            pass
+
+        self.assertTrue(np.allclose(fisher_cross[0], fisher_cross_check, rtol=1e-8))
+        self.assertFalse(
+            np.allclose(
+                fisher_cross[0],
+                fisher_dense.get_fisher(points[:, 1], modes=modes)[0],
+                rtol=1e-8,
+            )
+        )
+
+        # no cross terms with a single harmonic
+        self.assertTrue(
+            np.allclose(
+                fisher_dense.get_fisher(points[:, 1], modes=[(2, 2)], cross_terms=True),
+                fisher_dense.get_fisher(points[:, 1], modes=[(2, 2)]),
+                rtol=1e-8,
+            )
+        )
+
+        # a parameter the waveform does not depend on
+        fisher_zero = FisherMatrixFD(
+            wave_gen, freqs, param_inds=[0, 4, 8, 11], use_gpu=gpu_available
+        )
+        fisher_zero.get_fisher = lambda points, **kwargs: np.zeros((1, 4, 4))
+        with self.assertRaises(ValueError):
+            fisher_zero.get_covariance(points[:, :1])
+
+        # log-Likelihood gradients in one batched call
+        data_freqs = xp.fft.rfftfreq(int(0.1 * YRSID_SI / 10.0), 10.0)[1:]
+        waveform_kwargs = dict(modes=modes, length=1024, t_obs_start=0.09)
+        data_channels = wave_gen(
+            *params, freqs=data_freqs, direct=False, fill=True, **waveform_kwargs
+        )[0]
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = xp.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+        like = Likelihood(
+            wave_gen, data_freqs, data_channels, psd, use_gpu=gpu_available
+        )
+
+        grad = fisher_gen.get_gradient(like, points, **waveform_kwargs)
+        self.assertEqual(grad.shape, (2, 4))
+
+        step = fisher_gen.get_step_sizes(points[:, 1])[0, 0]
+        params_plus = points[:, 1].copy()
+        params_minus = points[:, 1].copy()
+        params_plus[0] += step
+        params_minus[0] -= step
+        ll = like.get_ll(np.array([params_plus, params_minus]).T, **waveform_kwargs)
+        self.assertTrue(np.allclose(grad[1, 0], (ll[0] - ll[1]) / (2 * step)))
+
+    def test_direct_modes(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        params = np.tile(
+            np.array(
+                [
+                    1e6,
+                    5e5,
+                    0.2,
+                    0.4,
+                    18e3 * PC_SI * 1e6,
+                    0.0,
+                    0.0,
+                    np.pi / 3.0,
+                    np.pi / 5.0,
+                    np.pi / 4.0,
+                    np.pi / 6.0,
+                    1.0 * YRSID_SI,
+                ]
+            ),
+            (4, 1),
+        ).T
+        params[0] *= np.array([0.5, 1.0, 1.5, 2.0])
+
+        freqs = xp.logspace(-4, -1, 1024)
+        modes = [(2, 2), (2, 1), (3, 3), (4, 4)]
+
+        h_modes = wave_gen(
+            *params, freqs=freqs, modes=modes, direct=True, compress=False
+        )
+        h = wave_gen(*params, freqs=freqs, modes=modes, direct=True, compress=True)
+
+        self.assertEqual(h_modes.shape, (4, 3, len(modes), len(freqs)))
+        self.assertTrue(xp.allclose(h_modes.sum(axis=2), h, rtol=1e-12, atol=0.0))
+
+        # each harmonic matches generating it alone
+        h_33 = wave_gen(
+            *params, freqs=freqs, modes=[(3, 3)], direct=True, compress=True
+        )
+        self.assertTrue(xp.allclose(h_modes[:, :, 2], h_33, rtol=1e-12, atol=0.0))
+
+    def test_tabulated_orbits(self):
+
+        phenomhm = PhenomHMAmpPhase(use_gpu=gpu_available, run_phenomd=False)
+        m1 = 1e6
+        m2 = 5e5
+        a1 = 0.2
+        a2 = 0.4
+        dist = 18e3 * PC_SI * 1e6  # 3e3 in Mpc
+        t_ref = 1.0 * YRSID_SI
+
+        phenomhm(m1, m2, a1, a2, dist, 0.0, 0.0, t_ref, 1024)
+
+        freqs = phenomhm.freqs.copy()
+        phase = phenomhm.phase.copy()
+        tf = phenomhm.tf.copy()
+        modes = phenomhm.modes
+        length = freqs.shape[-1]
+
+        # sample the analytic equal-arm orbits once per day
+        t = np.arange(-1.0 * YRSID_SI, 3.0 * YRSID_SI, 86400.0)
+        alpha = Omega0 * t
+        c = np.cos(alpha)
+        s = np.sin(alpha)
+        ae = AU_SI * eorbit
+        p0 = np.array([AU_SI * c, AU_SI * s, 0.0 * t]).T
+        pL = np.array(
+            [
+                [-ae * (1 + s * s), ae * c * s, -ae * np.sqrt(3) * c],
+                [
+                    ae / 2 * (np.sqrt(3) * c * s + (1 + s * s)),
+                    ae / 2 * (-c * s - np.sqrt(3) * (1 + c * c)),
+                    -ae * np.sqrt(3) / 2 * (np.sqrt(3) * s - c),
+                ],
+                [
+                    ae / 2 * (-np.sqrt(3) * c * s + (1 + s * s)),
+                    ae / 2 * (-c * s + np.sqrt(3) * (1 + c * c)),
+                    -ae * np.sqrt(3) / 2 * (-np.sqrt(3) * s - c),
+                ],
+            ]
+        ).transpose(2, 0, 1)
+        x = p0[:, np.newaxis, :] + pL
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fp = os.path.join(tmpdir, "orbits.npz")
+            np.savez(fp, t=t, x=x)
+
+            orbits = load_orbits(fp, use_gpu=gpu_available)
+            self.assertTrue(orbits is load_orbits(fp, use_gpu=gpu_available))
+
+            response_tab = LISATDIResponse(orbits=fp, use_gpu=gpu_available)
+
+        self.assertTrue(response_tab.orbits is orbits)
+
+        response = LISATDIResponse(use_gpu=gpu_available)
+
+        out = []
+        for resp in [response, response_tab]:
+            resp(
+                freqs,
+                np.pi / 4,
+                np.pi / 6,
+                np.pi / 5,
+                np.pi / 7,
+                0.0,
+                length,
+                phase=phase.copy(),
+                tf=tf.copy(),
+                modes=modes,
+            )
+            out.append(
+                xp.asarray([resp.transferL1, resp.transferL2, resp.transferL3])
+            )
+
+        # compare where the signal is within the table
+        inside = (tf > t[0]) & (tf < t[-1])
+        self.assertTrue(xp.any(inside))
+        self.assertTrue(
+            xp.allclose(out[0][:, inside], out[1][:, inside], rtol=1e-6, atol=1e-8)
+        )
+
+    def test_sampler_transform(self):
+
+        num_bin = 100
+        params = np.array(
+            [
+                np.log(np.random.uniform(1e5, 1e7, num_bin)),
+                np.random.uniform(0.1, 1.0, num_bin),
+                np.random.uniform(-0.9, 0.9, num_bin),
+                np.random.uniform(-0.9, 0.9, num_bin),
+                np.log(np.random.uniform(1.0, 50.0, num_bin)),
+                np.random.uniform(-np.pi, 3 * np.pi, num_bin),
+                np.random.uniform(-1.0, 1.0, num_bin),
+                np.random.uniform(0.0, 2 * np.pi, num_bin),
+                np.random.uniform(-1.0, 1.0, num_bin),
+                np.random.uniform(0.0, np.pi, num_bin),
+                np.random.uniform(0.0, 2.0 * YRSID_SI, num_bin),
+            ]
+        )
+
+        transform = SamplerTransform(f_ref=0.0)
+        out = transform(params)
+
+        # python reference
+        m1, m2 = mT_q(np.exp(params[0]), params[1])
+        tSSB, lam, beta, psi = LISA_to_SSB(
+            params[10], params[7], np.arcsin(params[8]), params[9]
+        )
+        check = np.array(
+            [
+                m1,
+                m2,
+                params[2],
+                params[3],
+                np.exp(params[4]) * PC_SI * 1e9,
+                mod2pi(params[5]),
+                np.zeros(num_bin),
+                np.arccos(params[6]),
+                lam,
+                beta,
+                psi,
+                tSSB,
+            ]
+        )
+
+        self.assertEqual(out.shape, (12, num_bin))
+        self.assertTrue(np.allclose(out, check, rtol=1e-12, atol=1e-12))
+        self.assertTrue(np.allclose(transform(params[:, 0])[:, 0], out[:, 0]))
+
+        # plugged into the waveform generator
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False),
+            use_gpu=gpu_available,
+            param_transform=SamplerTransform(f_ref=0.0, use_gpu=gpu_available),
+        )
+        freqs = xp.logspace(-4, -1, 64)
+        waveform_kwargs = dict(freqs=freqs, modes=[(2, 2)], direct=True)
+        h = wave_gen.call_params(params[:, :2], **waveform_kwargs)
+        h_check = wave_gen(*out[:, :2], **waveform_kwargs)
+        self.assertTrue(xp.allclose(h, h_check))
+
+    def test_residual_likelihood(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        params = np.array(
+            [
+                [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+                + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 0.5 * YRSID_SI],
+                [3e6, 2e6, -0.1, 0.3, 25e3 * PC_SI * 1e6, 1.0, 0.0]
+                + [np.pi / 4.0, np.pi / 2.0, -np.pi / 5.0, np.pi / 3.0, 0.6 * YRSID_SI],
+            ]
+        ).T
+
+        dt = 10.0
+        n = int(0.7 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        waveform_kwargs = dict(modes=[(2, 2), (3, 3)], length=1024)
+
+        injector = CatalogInjectionFD(wave_gen, data_freqs)
+        data = injector(params, **waveform_kwargs)
+        data_2 = injector(params[:, 1:], **waveform_kwargs)
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = xp.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        res = ResidualLikelihood(
+            wave_gen, data_freqs, data, psd, use_gpu=gpu_available
+        )
+        d_d_start = res.d_d
+        residual_start = res.residual.copy()
+
+        # subtract the first source
+        key = res.add_source(params[:, 0], **waveform_kwargs)
+
+        like_2 = Likelihood(wave_gen, data_freqs, data_2, psd, use_gpu=gpu_available)
+        self.assertTrue(np.isclose(res.d_d, like_2.d_d, rtol=1e-8))
+        self.assertTrue(xp.allclose(res.data_channels, like_2.data_channels))
+
+        # swap to a slightly different source and back
+        params_new = params[:, 0].copy()
+        params_new[0] *= 1.001
+        res.swap_source(key, params_new)
+        self.assertTrue(np.isclose(res.d_d, res.recompute_d_d(), rtol=1e-8))
+        res.swap_source(key, params[:, 0])
+        self.assertTrue(np.isclose(res.d_d, like_2.d_d, rtol=1e-8))
+
+        # add it back in
+        res.remove_source(key)
+        self.assertEqual(len(res.sources), 0)
+        self.assertTrue(np.isclose(res.d_d, d_d_start, rtol=1e-8))
+        self.assertTrue(xp.allclose(res.residual, residual_start))
+
+    def test_multi_source_likelihood(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        # two sources overlapping in frequency
+        params = np.array(
+            [
+                [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+                + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 0.5 * YRSID_SI],
+                [8e5, 6e5, -0.1, 0.3, 25e3 * PC_SI * 1e6, 1.0, 0.0]
+                + [np.pi / 4.0, np.pi / 2.0, -np.pi / 5.0, np.pi / 3.0, 0.5 * YRSID_SI],
+            ]
+        ).T
+
+        dt = 10.0
+        n = int(0.7 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        waveform_kwargs = dict(modes=[(2, 2), (3, 3)], length=1024)
+
+        data = CatalogInjectionFD(wave_gen, data_freqs)(params, **waveform_kwargs)
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = xp.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        # walkers: truth, perturbed source 0, perturbed source 1
+        num_walkers = 3
+        walkers = np.repeat(params[:, np.newaxis, :], num_walkers, axis=1)
+        walkers[0, 1, 0] *= 1.0001
+        walkers[0, 2, 1] *= 1.0001
+
+        like = MultiSourceLikelihood(
+            wave_gen, data_freqs, data, psd, use_gpu=gpu_available
+        )
+        ll = like.get_ll(walkers, **waveform_kwargs)
+
+        self.assertEqual(ll.shape, (num_walkers,))
+        self.assertTrue(np.all(np.abs(like.h_i_h_j[:, 0, 1]) > 0.0))
+
+        # check against subtracting the sources from the data
+        def ll_residual(walker_params):
+            res = ResidualLikelihood(
+                wave_gen, data_freqs, data, psd, use_gpu=gpu_available
+            )
+            for source_params in walker_params.T:
+                res.add_source(source_params, **waveform_kwargs)
+            return -1 / 2 * res.d_d
+
+        check = np.array([ll_residual(walkers[:, i]) for i in range(num_walkers)])
+        self.assertTrue(np.allclose(ll, check, rtol=1e-6, atol=1e-8 * like.d_d))
+
+        # update a single source
+        new_source = walkers[:, :, 0].copy()
+        new_source[0] *= 1.0 + 1e-5 * np.arange(num_walkers)
+        ll_update = like.update_source(new_source, 0)
+
+        walkers[:, :, 0] = new_source
+        ll_full = MultiSourceLikelihood(
+            wave_gen, data_freqs, data, psd, use_gpu=gpu_available
+        ).get_ll(walkers, **waveform_kwargs)
+        self.assertTrue(np.allclose(ll_update, ll_full, rtol=1e-10, atol=0.0))
+
+    def test_external_amp_phase(self):
+
+        phenomhm = PhenomHMAmpPhase(run_phenomd=False, use_gpu=gpu_available)
+
+        # external models return arrays shaped (num_bin_all, num_modes, length)
+        def model(m1, m2, chi1z, chi2z, distance, phi_ref, f_ref, freqs, modes):
+            phenomhm(
+                m1,
+                m2,
+                chi1z,
+                chi2z,
+                distance,
+                phi_ref,
+                f_ref,
+                np.zeros_like(m1),
+                freqs.shape[1],
+                freqs=xp.asarray(freqs),
+                modes=modes,
+            )
+            return phenomhm.amp.copy(), phenomhm.phase.copy(), phenomhm.tf.copy()
+
+        def model_no_tf(*args):
+            return model(*args)[:2]
+
+        allowable_modes = phenomhm.allowable_modes
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+        wave_gen_ext = BBHWaveformFD(
+            use_gpu=gpu_available,
+            amp_phase_gen=ExternalAmpPhase(
+                model, allowable_modes, use_gpu=gpu_available
+            ),
+        )
+
+        params = np.array(
+            [
+                [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+                + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI],
+                [2e6, 4e5, -0.1, 0.3, 25e3 * PC_SI * 1e6, 1.0, 0.0]
+                + [np.pi / 4.0, np.pi / 2.0, -np.pi / 5.0, np.pi / 3.0, 1.0 * YRSID_SI],
+            ]
+        ).T
+
+        n = int(1.2 * YRSID_SI / 10.0)
+        data_freqs = xp.fft.rfftfreq(n, 10.0)[1:]
+
+        waveform_kwargs = dict(freqs=data_freqs, direct=False, fill=True, length=1024)
+
+        h = wave_gen(*params, **waveform_kwargs)
+        h_ext = wave_gen_ext(*params, **waveform_kwargs)
+
+        inner = lambda a, b: xp.sum((a.conj() * b).real, axis=(1, 2))
+        mismatch = 1.0 - inner(h, h_ext) / xp.sqrt(inner(h, h) * inner(h_ext, h_ext))
+        self.assertTrue(xp.all(xp.abs(mismatch) < 1e-12))
+
+        # tf from finite differences of the phase
+        ext = ExternalAmpPhase(model, allowable_modes, use_gpu=gpu_available)
+        ext_no_tf = ExternalAmpPhase(model_no_tf, allowable_modes, use_gpu=gpu_available)
+
+        ext(*params[:7], params[11], 4096, modes=[(2, 2)])
+        ext_no_tf(*params[:7], params[11], 4096, modes=[(2, 2)])
+
+        self.assertTrue(xp.allclose(ext.phase, ext_no_tf.phase))
+
+        # time to merger from the reference time (zero point in PhenomHM)
+        t_ref = xp.asarray(params[11])[:, None, None]
+        dt_true = ext.tf - t_ref
+        dt_diff = ext_no_tf.tf - t_ref
+        rel = xp.abs(dt_diff - dt_true) / (xp.abs(dt_true) + 1.0)
+        self.assertTrue(float(xp.median(rel)) < 1e-4)
+
+    def test_log_uniform_interp_index(self):
+
+        params = np.array(
+            [
+                [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+                + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI],
+                [3e5, 1e5, -0.1, 0.3, 25e3 * PC_SI * 1e6, 1.0, 0.0]
+                + [np.pi / 4.0, np.pi / 2.0, -np.pi / 5.0, np.pi / 3.0, 0.5 * YRSID_SI],
+            ]
+        ).T
+
+        n = int(1.2 * YRSID_SI / 10.0)
+        data_freqs = xp.fft.rfftfreq(n, 10.0)[1:]
+
+        waveform_kwargs = dict(freqs=data_freqs, direct=False, fill=True, length=1024)
+
+        for mixed_precision in [False, True]:
+            wave_gen = BBHWaveformFD(
+                amp_phase_kwargs=dict(run_phenomd=False),
+                interp_kwargs=dict(mixed_precision=mixed_precision),
+                use_gpu=gpu_available,
+            )
+            wave_gen_search = BBHWaveformFD(
+                amp_phase_kwargs=dict(run_phenomd=False),
+                interp_kwargs=dict(
+                    mixed_precision=mixed_precision, always_search=True
+                ),
+                use_gpu=gpu_available,
+            )
+
+            h = wave_gen(*params, **waveform_kwargs)
+            h_search = wave_gen_search(*params, **waveform_kwargs)
+
+            self.assertTrue(np.all(wave_gen.interp_response.log_uniform))
+            self.assertFalse(np.any(wave_gen_search.interp_response.log_uniform))
+            self.assertTrue(xp.all(h == h_search))
+
+        # the cached log of the frequencies follows in-place changes
+        freqs_inplace = data_freqs.copy()
+        wave_gen(*params, **{**waveform_kwargs, "freqs": freqs_inplace})
+        freqs_inplace *= 1.01
+        h_inplace = wave_gen(*params, **{**waveform_kwargs, "freqs": freqs_inplace})
+        self.assertTrue(
+            xp.all(wave_gen.interp_response._log_data_freqs == xp.log(freqs_inplace))
+        )
+
+        h_new = wave_gen(*params, **{**waveform_kwargs, "freqs": freqs_inplace.copy()})
+        self.assertTrue(xp.all(h_inplace == h_new))
+
+        # grids that are not log-uniform fall back to the search
+        interp = TemplateInterpFD(use_gpu=gpu_available)
+        x = xp.asarray([np.linspace(1e-4, 1e-2, 256), np.logspace(-4, -2, 256)])
+        y = xp.ones((9, 2, 1, 256)) * x[None, :, None, :] ** 2
+        spline = CubicSplineInterpolant(x, y, use_gpu=gpu_available)
+        templates = interp(
+            data_freqs, spline.container, xp.zeros(2), xp.zeros(2), 256, 1, 3
+        )
+        self.assertTrue(np.all(interp.log_uniform == np.array([False, True])))
+
+        for i in range(2):
+            f = data_freqs[interp.start_inds[i] : interp.start_inds[i] + interp.lengths[i]]
+            check = (1 - 1j) * f**4 * xp.exp(-1j * f**2)
+            self.assertTrue(xp.allclose(templates[i][0], check, rtol=1e-8))
+
+    def test_blocked_layout(self):
+
+        params = np.array(
+            [
+                [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+                + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI],
+                [3e5, 1e5, -0.1, 0.3, 25e3 * PC_SI * 1e6, 1.0, 0.0]
+                + [np.pi / 4.0, np.pi / 2.0, -np.pi / 5.0, np.pi / 3.0, 0.5 * YRSID_SI],
+            ]
+        ).T
+
+        n = int(1.2 * YRSID_SI / 10.0)
+        data_freqs = xp.fft.rfftfreq(n, 10.0)[1:]
+
+        waveform_kwargs = dict(freqs=data_freqs, direct=False, fill=True, length=1024)
+
+        wave_gen_blocked = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False),
+            interp_kwargs=dict(blocked=True),
+            use_gpu=gpu_available,
+        )
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False),
+            interp_kwargs=dict(blocked=False),
+            use_gpu=gpu_available,
+        )
+
+        h_blocked = wave_gen_blocked(*params, **waveform_kwargs)
+        h = wave_gen(*params, **waveform_kwargs)
+        self.assertTrue(xp.allclose(h_blocked, h, rtol=1e-12, atol=0.0))
+
+        # the packed copy is opt-in
+        self.assertFalse(TemplateInterpFD().blocked)
+        self.assertIsNone(wave_gen.interp_response.spline_blocked)
+
+        # check the packed layout against the spline coefficients
+        interp = wave_gen_blocked.interp_response
+        blocked = interp.spline_blocked.reshape(2, 1024, interp.num_modes, 9, 4)
+        spline = CubicSplineInterpolant(
+            wave_gen_blocked.amp_phase_gen.freqs.reshape(2, -1),
+            wave_gen_blocked.out_buffer_final,
+            use_gpu=gpu_available,
+        )
+        self.assertTrue(
+            xp.all(blocked[..., 1] == spline.c1_shaped.transpose(1, 3, 2, 0))
+        )
+
+        with self.assertRaises(ValueError):
+            TemplateInterpFD(mixed_precision=True, blocked=True)
+
+    def test_prepared_call(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        params = np.array(
+            [
+                [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+                + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI],
+            ]
+        ).T
+
+        data_freqs = xp.logspace(-4, -1, 1000)
+        wave_gen(
+            *params, freqs=data_freqs, direct=False, fill=False, length=256
+        )
+
+        interp = wave_gen.interp_response
+        check = xp.zeros((3, len(data_freqs)), dtype=xp.complex128)
+        interp.inject(check)
+
+        data_out = xp.zeros((3, len(data_freqs)), dtype=xp.complex128)
+        prepared = PreparedCall(
+            interp.inject_gen,
+            data_out,
+            interp.template_carrier_ptrs,
+            interp.start_inds,
+            interp.lengths,
+            interp.lengths,
+            len(data_freqs),
+            1,
+            3,
+        )
+
+        # repeated calls keep adding into the same buffer
+        prepared()
+        self.assertTrue(xp.all(data_out == check))
+        prepared()
+        self.assertTrue(xp.all(data_out == 2 * check))
+
+        # swap the output buffer
+        data_out_2 = xp.zeros_like(data_out)
+        prepared.set_arg(0, data_out_2)
+        prepared()
+        self.assertTrue(xp.all(data_out_2 == check))
+
+        with self.assertRaises(ValueError):
+            prepared.set_arg(0, xp.zeros((len(data_freqs), 3), dtype=xp.complex128).T)
+
+        # the pointers carry no type information
+        with self.assertRaises(ValueError):
+            prepared.set_arg(2, interp.start_inds.astype(xp.int64))
+        with self.assertRaises(ValueError):
+            prepared.set_arg(0, xp.zeros((3, len(data_freqs) + 1), dtype=xp.complex128))
+        with self.assertRaises(ValueError):
+            PreparedCall(
+                interp.inject_gen,
+                data_out,
+                interp.template_carrier_ptrs,
+                interp.start_inds.astype(xp.int64),
+                interp.lengths,
+                interp.lengths,
+                len(data_freqs),
+                1,
+                3,
+                dtypes=[xp.complex128, xp.int64] + [xp.int32] * 3 + [None] * 3,
+            )
+
+    def test_delayed_acceptance(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(1.2 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        waveform_kwargs = dict(modes=[(2, 2), (3, 3)], length=1024)
+
+        data = wave_gen(
+            *truth, freqs=data_freqs, direct=False, fill=True, **waveform_kwargs
+        )[0]
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = xp.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        fine = Likelihood(wave_gen, data_freqs, data, psd, use_gpu=gpu_available)
+        coarse = HeterodynedLikelihood(
+            wave_gen,
+            data_freqs,
+            data,
+            truth,
+            32,
+            template_gen_kwargs=dict(modes=[(2, 2)], length=1024),
+            use_gpu=gpu_available,
+        )
+
+        da_like = DelayedAcceptanceLikelihood(
+            coarse, fine, fine_kwargs=waveform_kwargs, seed=42
+        )
+
+        num_walkers = 6
+        current = np.tile(truth, (num_walkers, 1)).T
+        current[0] *= 1 + 1e-5 * np.arange(num_walkers)
+
+        ll, ll_coarse = da_like.get_ll(current)
+        self.assertTrue(
+            np.allclose(ll, fine.get_ll(current, **waveform_kwargs), rtol=1e-12)
+        )
+
+        proposal = current.copy()
+        proposal[0] *= 1 + 1e-5 * np.random.randn(num_walkers)
+
+        # every walker passes the screen
+        log_u = np.array([np.full(num_walkers, -np.inf), np.full(num_walkers, np.log(0.5))])
+        accepted, ll_new, ll_coarse_new, escalated, correction = da_like.step(
+            proposal, ll, ll_coarse, log_u=log_u
+        )
+
+        ll_prop = fine.get_ll(proposal, **waveform_kwargs)
+        self.assertTrue(np.all(escalated))
+        self.assertTrue(np.allclose(da_like.ll_prop, ll_prop, rtol=1e-12))
+        self.assertTrue(
+            np.allclose(correction, ll_coarse - da_like.ll_coarse_prop, rtol=1e-12)
+        )
+
+        check = log_u[1] < np.minimum(0.0, ll_prop - ll + correction)
+        self.assertTrue(np.all(accepted == check))
+        self.assertTrue(np.allclose(ll_new, np.where(check, ll_prop, ll), rtol=1e-12))
+
+        # proposals far from the data are rejected by the screen alone
+        far = current.copy()
+        far[0] *= 1.01
+        accepted, ll_new, ll_coarse_new, escalated, correction = da_like.step(
+            far, ll, ll_coarse
+        )
+        self.assertFalse(np.any(escalated))
+        self.assertFalse(np.any(accepted))
+        self.assertTrue(np.all(ll_new == ll))
+
+        self.assertEqual(da_like.num_proposed, 2 * num_walkers)
+        self.assertEqual(da_like.num_escalated, num_walkers)
+        self.assertAlmostEqual(da_like.escalation_fraction, 0.5)
+
+    def test_mode_mask(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        params = np.tile(
+            np.array(
+                [
+                    1e6,
+                    5e5,
+                    0.2,
+                    0.4,
+                    18e3 * PC_SI * 1e6,
+                    0.0,
+                    0.0,
+                    np.pi / 3.0,
+                    np.pi / 5.0,
+                    np.pi / 4.0,
+                    np.pi / 6.0,
+                    1.0 * YRSID_SI,
+                ]
+            ),
+            (3, 1),
+        ).T
+        params[0] *= np.array([1.0, 1.5, 2.0])
+
+        modes = [(2, 2), (3, 3), (4, 4), (2, 1)]
+        kept = [modes, [(2, 2), (3, 3)], [(2, 2)]]
+        mode_mask = np.array([[mode in keep for mode in modes] for keep in kept])
+
+        freqs = xp.logspace(-4, -1, 1024)
+        data_freqs = xp.logspace(-4, -1, 4096)
+
+        for kwargs in [
+            dict(freqs=freqs, direct=True),
+            dict(freqs=data_freqs, length=256, direct=False, fill=True),
+        ]:
+            h = wave_gen(*params, modes=modes, mode_mask=mode_mask, **kwargs)
+
+            # masked binaries match generating only the kept harmonics
+            for bin_i, keep in enumerate(kept):
+                h_keep = wave_gen(*params[:, bin_i], modes=keep, **kwargs)[0]
+                self.assertTrue(
+                    xp.allclose(
+                        h[bin_i], h_keep, rtol=1e-10, atol=1e-10 * xp.abs(h_keep).max()
+                    )
+                )
+
+        # mass ratio, spin, and inclination criteria
+        params_sym = params.copy()
+        params_sym[1] = params_sym[0]
+        params_sym[7] = np.array([0.0, np.pi / 3.0, np.pi])
+        mask = mode_mask_from_params(
+            params_sym[0], params_sym[1], 0.3, 0.3, params_sym[7], modes
+        )
+        self.assertTrue(np.all(mask == np.array([[1, 0, 0, 0], [1, 0, 1, 0], [1, 0, 0, 0]])))
+
+        # (2,1) has a spin-difference term that survives for equal masses
+        mask = mode_mask_from_params(*params_sym[:4], params_sym[7], modes)
+        self.assertTrue(np.all(mask == np.array([[1, 0, 0, 0], [1, 0, 1, 1], [1, 0, 0, 0]])))
+
+        # estimated SNR fraction evaluated on the sparse grid
+        power_mask = functools.partial(mode_mask_from_power, threshold=1e-2)
+        h = wave_gen(
+            *params_sym, freqs=freqs, modes=modes, mode_mask=power_mask, direct=True
+        )
+        self.assertTrue(np.all(wave_gen.mode_mask[:, 0]))
+        self.assertFalse(np.any(wave_gen.mode_mask[:, 1]))
+
+        h_22 = wave_gen(*params_sym, freqs=freqs, modes=[(2, 2)], direct=True)
+        self.assertTrue(xp.allclose(h[0], h_22[0], rtol=1e-10, atol=0.0))
+
+        # masked harmonics have zero splines (the last point starts no interval)
+        container, _, _ = wave_gen(
+            *params_sym, modes=modes, mode_mask=power_mask, length=256
+        )
+        masked = ~xp.asarray(wave_gen.mode_mask, dtype=bool)
+        self.assertTrue(xp.any(masked))
+        for coeffs in container[1:]:
+            coeffs = coeffs.reshape(9, len(params_sym[0]), len(modes), 256)[..., :-1]
+            self.assertTrue(xp.all(coeffs[:, masked] == 0.0))
+            self.assertTrue(xp.any(coeffs[:, ~masked] != 0.0))
+
+    def test_harmonic_het_likelihood(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(1.2 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        modes = [(2, 2), (3, 3), (4, 4), (2, 1)]
+        waveform_kwargs = dict(modes=modes, length=1024)
+
+        data = wave_gen(
+            *truth, freqs=data_freqs, direct=False, fill=True, **waveform_kwargs
+        )[0]
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = xp.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        like = Likelihood(wave_gen, data_freqs, data, psd, use_gpu=gpu_available)
+
+        num_bins = 6
+        params_in = np.tile(truth, (num_bins, 1)).T
+        params_in[0] *= 1 + 1e-4 * np.random.randn(num_bins)
+        params_in[7] += 0.05 * np.random.randn(num_bins)
+
+        ll = like.get_ll(params_in, **waveform_kwargs)
+
+        length_f_het = 64
+        het_kwargs = dict(
+            template_gen_kwargs=dict(modes=modes),
+            reference_gen_kwargs=dict(modes=modes),
+            use_gpu=gpu_available,
+        )
+        like_het = HeterodynedLikelihood(
+            wave_gen, data_freqs, data, truth, length_f_het, **het_kwargs
+        )
+        like_het_modes = HarmonicHeterodynedLikelihood(
+            wave_gen, data_freqs, data, truth, length_f_het, **het_kwargs
+        )
+
+        self.assertEqual(like_het_modes.modes, modes)
+
+        ll_het = like_het.get_ll(params_in)
+        ll_het_modes = like_het_modes.get_ll(params_in)
+        self.assertEqual(like_het_modes.h_sparse.shape, (num_bins, 3, 4, length_f_het))
+
+        err = np.abs(ll_het - ll).max()
+        err_modes = np.abs(ll_het_modes - ll).max()
+        self.assertLess(err_modes, 1.0)
+        self.assertLess(err_modes, 0.1 * err)
+
+    def test_het_likelihood_order(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(1.2 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        modes = [(2, 2)]
+        data = wave_gen(
+            *truth, freqs=data_freqs, direct=False, fill=True, modes=modes, length=1024
+        )[0]
+
+        num_bins = 6
+        params_in = np.tile(truth, (num_bins, 1)).T
+        params_in[0] *= 1 + 1e-4 * np.random.randn(num_bins)
+        params_in[7] += 0.05 * np.random.randn(num_bins)
+
+        het_kwargs = dict(
+            template_gen_kwargs=dict(modes=modes),
+            reference_gen_kwargs=dict(modes=modes),
+            use_gpu=gpu_available,
+        )
+
+        # converged reference
+        ll = HeterodynedLikelihood(
+            wave_gen, data_freqs, data, truth, 1025, **het_kwargs
+        ).get_ll(params_in)
+
+        length_f_het = 129
+        err = []
+        for order in [1, 2]:
+            like_het = HeterodynedLikelihood(
+                wave_gen, data_freqs, data, truth, length_f_het, order=order, **het_kwargs
+            )
+            err.append(np.abs(like_het.get_ll(params_in) - ll).max())
+
+        # 64 quadratic bins with 3 and 6 weights per channel
+        self.assertEqual(like_het.data_constants.shape, (3 * 64 * (3 + 6),))
+        self.assertLess(err[1], 0.5 * err[0])
+
+        with self.assertRaises(ValueError):
+            HeterodynedLikelihood(
+                wave_gen, data_freqs, data, truth, 128, order=2, **het_kwargs
+            )
+
+    def test_heterodyne_cache(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(0.5 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        modes = [(2, 2)]
+        data = wave_gen(
+            *truth, freqs=data_freqs, direct=False, fill=True, modes=modes, length=1024
+        )[0]
+
+        params_in = np.tile(truth, (3, 1)).T
+        params_in[0] *= 1 + 1e-5 * np.arange(3)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            het_kwargs = dict(
+                template_gen_kwargs=dict(modes=modes),
+                reference_gen_kwargs=dict(modes=modes),
+                use_gpu=gpu_available,
+                cache=tmpdir,
+            )
+
+            like_het = HeterodynedLikelihood(
+                wave_gen, data_freqs, data, truth, 128, **het_kwargs
+            )
+            like_het_cached = HeterodynedLikelihood(
+                wave_gen, data_freqs, data, truth, 128, **het_kwargs
+            )
+
+            self.assertFalse(like_het.cache_hit)
+            self.assertTrue(like_het_cached.cache_hit)
+            self.assertTrue(
+                np.all(like_het.data_constants == like_het_cached.data_constants)
+            )
+            self.assertEqual(len(like_het.f_dense), len(like_het_cached.f_dense))
+            self.assertEqual(like_het.reference_ll, like_het_cached.reference_ll)
+            self.assertTrue(
+                np.all(
+                    like_het.get_ll(params_in) == like_het_cached.get_ll(params_in)
+                )
+            )
+
+            # a different reference is a new entry
+            truth_new = truth.copy()
+            truth_new[0] *= 1 + 1e-5
+            like_het_new = HeterodynedLikelihood(
+                wave_gen, data_freqs, data, truth_new, 128, **het_kwargs
+            )
+            self.assertFalse(like_het_new.cache_hit)
+
+            cache = like_het.cache
+            self.assertIsInstance(cache, DiskCache)
+            self.assertEqual(len(cache.entries()), 2)
+
+            # least recently used entries are removed first
+            cache.max_bytes = 1
+            cache.evict()
+            self.assertEqual(len(cache.entries()), 1)
+
+            cache.clear()
+            self.assertEqual(cache.size, 0)
+
+    def test_banded_likelihood(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(0.5 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        waveform_kwargs = dict(modes=[(2, 2), (3, 3)], length=1024)
+        data = wave_gen(
+            *truth, freqs=data_freqs, direct=False, fill=True, **waveform_kwargs
+        )[0]
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = np.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        band_edges = np.logspace(-4, -1, 9)
+        like = BandedLikelihood(
+            wave_gen, data_freqs, data, xp.asarray(psd), band_edges, use_gpu=gpu_available
+        )
+        like_direct = Likelihood(
+            wave_gen, data_freqs, data, xp.asarray(psd), use_gpu=gpu_available
+        )
+
+        num_bins = 4
+        params_in = np.tile(truth, (num_bins, 1)).T
+        params_in[0] *= 1 + 1e-5 * np.arange(num_bins)
+
+        # compare relative to <d|d> because of the cancellation in the log-Likelihood
+        atol = 1e-10 * like.d_d
+
+        ll = like.get_ll(params_in, **waveform_kwargs)
+        self.assertTrue(
+            np.allclose(
+                ll, like_direct.get_ll(params_in, **waveform_kwargs), rtol=0, atol=atol
+            )
+        )
+        self.assertEqual(like.d_h_bands.shape, (num_bins, 3, 8))
+        self.assertEqual(like.num_freqs_bands.sum(), len(data_freqs_cpu))
+
+        # piecewise-constant PSD change without regenerating templates
+        psd_scale = 1.0 + np.random.rand(3, 8)
+        band = np.clip(np.searchsorted(band_edges, data_freqs_cpu, "right") - 1, 0, 7)
+        like_scaled = Likelihood(
+            wave_gen,
+            data_freqs,
+            data,
+            xp.asarray(psd * psd_scale[:, band]),
+            use_gpu=gpu_available,
+        )
+
+        ll_scaled = like.get_noise_ll(psd_scale, normalize=False)
+        self.assertTrue(
+            np.allclose(
+                ll_scaled,
+                like_scaled.get_ll(params_in, **waveform_kwargs),
+                rtol=0,
+                atol=atol,
+            )
+        )
+
+        # normalization and a separate PSD for each binary
+        psd_scale_all = np.tile(psd_scale, (num_bins, 1, 1))
+        psd_scale_all[1] *= 2.0
+        ll_all = like.get_noise_ll(psd_scale_all)
+        self.assertTrue(
+            np.allclose(
+                ll_all[0],
+                ll_scaled[0] + like.log_det_change(psd_scale),
+                rtol=0,
+                atol=atol,
+            )
+        )
+
+        # same normalization convention when the templates are regenerated
+        self.assertTrue(
+            np.allclose(
+                like.get_ll(params_in, psd_scale=psd_scale, **waveform_kwargs),
+                like.get_noise_ll(psd_scale),
+                rtol=0,
+                atol=atol,
+            )
+        )
+        self.assertAlmostEqual(
+            like.log_det_change(psd_scale_all)[1] - like.log_det_change(psd_scale),
+            -3 * len(data_freqs_cpu) * np.log(2.0),
+            places=4,
+        )
+
+    def test_autotune(self):
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+        rel = np.array([1e-5, 1e-5] + [1e-3] * 9 + [1e-7])
+        lower, upper = truth * (1 - rel), truth * (1 + rel)
+
+        dt = 10.0
+        n = int(0.5 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        modes = [(2, 2)]
+        tuner = Autotuner(
+            lower,
+            upper,
+            data_freqs,
+            num_test=2,
+            generator_kwargs=dict(amp_phase_kwargs=dict(run_phenomd=False)),
+            number=1,
+            use_gpu=gpu_available,
+            seed=42,
+        )
+
+        best = tuner.tune_waveform(
+            candidates=dict(length=[32, 1024], order_fresnel_stencil=[0, 1]),
+            max_mismatch=1e-6,
+            reference_modes=modes,
+        )
+
+        # the Fresnel stencil is not implemented
+        self.assertTrue(
+            all("error" in res for res in tuner.results["waveform"][1::2])
+        )
+        self.assertFalse(tuner.results["waveform"][0]["accepted"])
+        self.assertEqual(best["settings"]["length"], 1024)
+        self.assertLess(best["mismatch"], 1e-6)
+
+        best_het = tuner.tune_heterodyne(
+            truth,
+            candidates=dict(length_f_het=[16, 65], order=[2]),
+            max_ll_error=1.0,
+        )
+        self.assertIn("error", tuner.results["heterodyne"][0])
+        self.assertEqual(best_het["settings"]["length_f_het"], 65)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "profile.json")
+            save_profile(tuner.profile, path)
+            profile = load_profile(path)
+
+        self.assertEqual(profile["waveform_kwargs"], dict(length=1024, modes=modes))
+        self.assertEqual(profile["heterodyne_kwargs"]["order"], 2)
+
+        wave_gen = BBHWaveformFD.from_profile(profile, use_gpu=gpu_available)
+        self.assertEqual(wave_gen.profile_kwargs["length"], 1024)
+
+        # the profile settings are the call defaults
+        self.assertTrue(
+            xp.allclose(
+                wave_gen(*truth, freqs=data_freqs, fill=True),
+                wave_gen(*truth, freqs=data_freqs, fill=True, length=1024, modes=modes),
+            )
+        )
+        self.assertEqual(wave_gen.length, 1024)
+        self.assertEqual(wave_gen.num_modes, len(modes))
+
+        data = wave_gen(
+            *truth, freqs=data_freqs, direct=True, fill=True, modes=modes
+        )[0]
+        like_het = HeterodynedLikelihood.from_profile(
+            profile, wave_gen, data_freqs, data, truth, use_gpu=gpu_available
+        )
+        self.assertEqual(like_het.length_f_het, 65)
+        self.assertEqual(like_het.order, 2)
+        self.assertEqual(like_het.template_gen_kwargs["modes"], modes)
+        self.assertAlmostEqual(like_het.get_ll(truth)[0], 0.0, places=5)
+
+        # no heterodyne settings in the profile
+        with self.assertRaises(ValueError):
+            HeterodynedLikelihood.from_profile(
+                {**profile, "heterodyne_kwargs": {}},
+                wave_gen,
+                data_freqs,
+                data,
+                truth,
+                use_gpu=gpu_available,
+            )
+
+    def test_memory_budget(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(0.5 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        waveform_kwargs = dict(modes=[(2, 2), (3, 3)], length=1024)
+        data = wave_gen(
+            *truth, freqs=data_freqs, direct=False, fill=True, **waveform_kwargs
+        )[0]
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = xp.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        num_bins = 7
+        params_in = np.tile(truth, (num_bins, 1)).T
+        params_in[0] *= 1 + 1e-5 * np.arange(num_bins)
+
+        like = Likelihood(wave_gen, data_freqs, data, psd, use_gpu=gpu_available)
+
+        # room for about 3 binaries: chunks of 3, 3, and 1
+        per_binary = 10 * 9 * 1024 * 2 * 8 + 96 * len(data_freqs)
+        like_chunked = Likelihood(
+            wave_gen,
+            data_freqs,
+            data,
+            psd,
+            use_gpu=gpu_available,
+            memory_budget=3.5 * per_binary,
+        )
+        self.assertEqual(like.get_batch_size(num_bins, **waveform_kwargs), num_bins)
+        self.assertEqual(like_chunked.get_batch_size(num_bins, **waveform_kwargs), 3)
+        self.assertLessEqual(like_chunked.get_batch_size(num_bins, length=1024), 3)
+        # 4 binaries are split evenly instead of 3 + 1
+        self.assertEqual(like_chunked.get_batch_size(4, **waveform_kwargs), 2)
+
+        ll = like.get_ll(params_in, **waveform_kwargs)
+        ll_chunked = like_chunked.get_ll(params_in, **waveform_kwargs)
+        self.assertTrue(np.allclose(ll, ll_chunked, rtol=0.0, atol=1e-10 * like.d_d))
+
+        # last chunk
+        self.assertEqual(
+            wave_gen.out_buffer_final.shape, (9, 1, 2, 1024)
+        )
+
+        # the generator's templates are not noise-weighted by the likelihood
+        templates, _, _ = wave_gen(
+            *params_in[:, -1:], freqs=data_freqs, **waveform_kwargs
+        )
+        templates = [tc.copy() for tc in templates]
+        like.get_ll(params_in[:, -1:], **waveform_kwargs)
+        for tc, tc_check in zip(
+            wave_gen.interp_response.template_channels, templates
+        ):
+            self.assertTrue(xp.all(tc == tc_check))
+
+        like_bands = BandedLikelihood(
+            wave_gen,
+            data_freqs,
+            data,
+            psd,
+            np.logspace(-4, -1, 5),
+            use_gpu=gpu_available,
+            memory_budget=3.5 * per_binary,
+        )
+        ll_bands = like_bands.get_ll(params_in, **waveform_kwargs)
+        self.assertEqual(like_bands.d_h_bands.shape, (num_bins, 3, 4))
+        self.assertTrue(np.allclose(ll, ll_bands, rtol=0.0, atol=1e-10 * like.d_d))
+
+        # a single binary
+        self.assertAlmostEqual(
+            like_chunked.get_ll(truth, **waveform_kwargs)[0], ll[0], places=5
+        )
+
+    def test_spline_bank(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(0.5 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        num_bins = 3
+        params_in = np.tile(truth, (num_bins, 1)).T
+        params_in[0] *= 1 + 1e-3 * np.arange(num_bins)
+
+        waveform_kwargs = dict(modes=[(2, 2), (3, 3)])
+        h = wave_gen(
+            *params_in, freqs=data_freqs, length=256, fill=True, **waveform_kwargs
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for float32 in [False, True]:
+                path = os.path.join(tmpdir, f"bank_{float32}")
+                bank = SplineBank.from_generator(
+                    path,
+                    wave_gen,
+                    params_in,
+                    256,
+                    batch_size=2,
+                    float32=float32,
+                    **waveform_kwargs,
+                )
+
+                self.assertEqual(len(bank), num_bins)
+                self.assertEqual(bank.modes, [(2, 2), (3, 3)])
+                self.assertTrue(np.all(bank.params == params_in.T))
+
+                h_bank = bank.interpolate(data_freqs, fill=True)
+                rel_err = xp.abs(h_bank - h).max() / xp.abs(h).max()
+                self.assertLess(rel_err, 1e-6 if float32 else 1e-12)
+
+                # a subset in double precision from a single-precision bank
+                interp = TemplateInterpFD(use_gpu=gpu_available)
+                h_sub = bank.interpolate(
+                    data_freqs, start=1, end=2, interp_response=interp, fill=True
+                )
+                rel_err = xp.abs(h_sub[0] - h[1]).max() / xp.abs(h[1]).max()
+                self.assertLess(rel_err, 1e-6 if float32 else 1e-12)
+
+            del bank
+            with open(os.path.join(path, "header.json"), "r") as f:
+                header = json.load(f)
+            header["spline_bank_version"] += 1
+            with open(os.path.join(path, "header.json"), "w") as f:
+                json.dump(header, f)
+
+            with self.assertRaises(ValueError):
+                SplineBank(path)
+
+    def test_matched_filter_search(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        t_ref = 0.15 * YRSID_SI
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.3, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, t_ref + 3000.0]
+        )
+
+        dt = 10.0
+        n = int(0.25 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        try:
+            data_freqs_cpu = data_freqs.get()
+        except AttributeError:
+            data_freqs_cpu = data_freqs
+
+        psd = xp.asarray(
+            [
+                get_sensitivity(data_freqs_cpu, sens_fn=sens_fn)
+                for sens_fn in ["A1TDISens", "E1TDISens", "T1TDISens"]
+            ]
+        )
+
+        waveform_kwargs = dict(length=256, modes=[(2, 2)])
+        data = wave_gen(
+            *truth[:, None], freqs=data_freqs, fill=True, **waveform_kwargs
+        )[0]
+        like = Likelihood(wave_gen, data_freqs, data, psd, use_gpu=gpu_available)
+
+        search = MatchedFilterSearch(like, intrinsic_inds=(0,))
+
+        # bank at the wrong time and distance
+        bank = np.tile(truth, (3, 1)).T
+        bank[11] = t_ref
+        bank[4] *= 2.0
+        bank[0] *= np.array([0.96, 1.0, 1.04])
+
+        candidates = search.search(bank, num_keep=2, **waveform_kwargs)
+        self.assertEqual(candidates["index"][0], 1)
+        self.assertLess(abs(candidates["time_shift"][0] - 3000.0), 2 * dt)
+        self.assertTrue(np.isclose(candidates["snr"][0], np.sqrt(like.d_d), rtol=1e-4))
+        self.assertTrue(np.isclose(candidates["params"][4, 0], truth[4], rtol=1e-2))
+        self.assertEqual(len(search.search(bank, snr_threshold=1e6, **waveform_kwargs)["snr"]), 0)
+
+        # bank in log distance, maximized in the waveform parameters
+        def log_dist_transform(x):
+            x = np.array(x, copy=True)
+            x[4] = np.exp(x[4])
+            return x
+
+        like_transform = Likelihood(
+            wave_gen,
+            data_freqs,
+            data,
+            psd,
+            use_gpu=gpu_available,
+            param_transform=log_dist_transform,
+        )
+        search_transform = MatchedFilterSearch(like_transform, intrinsic_inds=(0,))
+        bank_log = bank.copy()
+        bank_log[4] = np.log(bank[4])
+        candidates_transform = search_transform.search(
+            bank_log, num_keep=2, **waveform_kwargs
+        )
+        self.assertTrue(np.allclose(candidates_transform["snr"], candidates["snr"]))
+        self.assertTrue(
+            np.allclose(candidates_transform["params"], candidates["params"])
+        )
+
+        # the coarse bank misses the true mass
+        bank = bank[:, [0, 2]]
+        candidates = search.hierarchical_search(
+            bank, [4e4], num_levels=2, num_keep=1, **waveform_kwargs
+        )
+        self.assertEqual(candidates["level"][0], 1)
+        self.assertTrue(np.isclose(candidates["params"][0, 0], truth[0]))
+        self.assertTrue(np.isclose(candidates["snr"][0], np.sqrt(like.d_d), rtol=1e-4))
+
+    def test_time_domain(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.3, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 0.035 * YRSID_SI]
+        )
+        params_in = np.array([truth, truth]).T
+        params_in[0, 1] *= 1.1
+        params_in[11, 1] *= 0.9
+
+        dt = 10.0
+        n = int(0.05 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+        waveform_kwargs = dict(length=1024, t_obs_start=0.03)
+
+        # single irfft of the frequency-domain templates
+        h = wave_gen(*params_in, freqs=data_freqs, fill=True, **waveform_kwargs)
+        h = xp.concatenate([xp.zeros((2, 3, 1), dtype=h.dtype), h], axis=-1)
+        h_ref = xp.fft.irfft(h, n, axis=-1) / dt
+
+        full = BBHWaveformTD(wave_gen, dt, n)(params_in, **waveform_kwargs)
+        self.assertLess(xp.abs(full - h_ref).max() / xp.abs(h_ref).max(), 1e-10)
+
+        # overlapping segments
+        td = BBHWaveformTD(wave_gen, dt, n, chunk_length=n // 8, taper_bins=4)
+        chunked = td(params_in, **waveform_kwargs)
+        self.assertLess(xp.abs(chunked - h_ref).max() / xp.abs(h_ref).max(), 1e-3)
+
+        # blocks are consecutive
+        starts = [a for a, block in td.stream(params_in, **waveform_kwargs)]
+        self.assertTrue(np.all(np.asarray(starts) == td.segment_starts))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = np.lib.format.open_memmap(
+                os.path.join(tmpdir, "td.npy"), mode="w+", dtype=np.float64, shape=(3, n)
+            )
+            for i in range(2):
+                td(params_in[:, i : i + 1], out=out, combine=True, **waveform_kwargs)
+
+            combined = td(params_in, combine=True, **waveform_kwargs)
+            try:
+                combined = combined.get()
+            except AttributeError:
+                pass
+
+            self.assertLess(np.abs(out - combined).max() / np.abs(combined).max(), 1e-12)
+            del out
+
+        with self.assertRaises(ValueError):
+            td(params_in, out=xp.zeros((3, n)), **waveform_kwargs)
+
+    def test_bank_pipeline(self):
+
+        wave_gen = BBHWaveformFD(
+            amp_phase_kwargs=dict(run_phenomd=False), use_gpu=gpu_available
+        )
+
+        truth = np.array(
+            [1e6, 5e5, 0.2, 0.4, 18e3 * PC_SI * 1e6, 0.0, 0.0]
+            + [np.pi / 3.0, np.pi / 5.0, np.pi / 4.0, np.pi / 6.0, 1.0 * YRSID_SI]
+        )
+
+        dt = 10.0
+        n = int(0.25 * YRSID_SI / dt)
+        data_freqs = xp.fft.rfftfreq(n, dt)[1:]
+
+        num_bins = 5
+        params_in = np.tile(truth, (num_bins, 1)).T
+        params_in[0] *= 1 + 1e-3 * np.arange(num_bins)
+
+        waveform_kwargs = dict(modes=[(2, 2), (3, 3)])
+        h = wave_gen(
+            *params_in, freqs=data_freqs, length=256, fill=True, **waveform_kwargs
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            params_path = os.path.join(tmpdir, "params.npy")
+            np.save(params_path, params_in)
+
+            path = os.path.join(tmpdir, "spline")
+            pipeline = BankPipeline(
+                wave_gen,
+                path,
+                shard_size=2,
+                float32=False,
+                queue_size=1,
+                **waveform_kwargs,
+            )
+            stats = pipeline.run(params_path)
+            self.assertEqual(stats["num_shards"], 3)
+            self.assertEqual(stats["num_generated"], num_bins)
+            self.assertGreater(stats["templates_per_sec"], 0.0)
+
+            for shard_i in range(3):
+                bank = pipeline.load(shard_i)
+                start = 2 * shard_i
+                self.assertTrue(
+                    np.all(bank.params == params_in[:, start : start + 2].T)
+                )
+                h_bank = bank.interpolate(data_freqs, fill=True)
+                h_true = h[start : start + 2]
+                rel_err = xp.abs(h_bank - h_true).max() / xp.abs(h_true).max()
+                self.assertLess(rel_err, 1e-12)
+                del bank
+
+            # resume after losing the last shard and an unfinished one
+            shutil.rmtree(pipeline.shard_path(2))
+            os.makedirs(pipeline.shard_path(1) + ".tmp")
+            stats = pipeline.run(params_path)
+            self.assertEqual(stats["num_generated"], 1)
+            self.assertEqual(stats["num_skipped"], 4)
+            self.assertFalse(os.path.exists(pipeline.shard_path(1) + ".tmp"))
+
+            # settings must match the started bank
+            with self.assertRaises(ValueError):
+                BankPipeline(wave_gen, path, shard_size=3, **waveform_kwargs).run(
+                    params_in
+                )
+            with self.assertRaises(ValueError):
+                BankPipeline(
+                    wave_gen, path, shard_size=2, t_obs_start=0.5, **waveform_kwargs
+                ).run(params_in)
+
+            with open(os.path.join(path, "manifest.json"), "r") as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest["waveform_kwargs"], dict(modes=[[2, 2], [3, 3]]))
+
+            pipeline = BankPipeline(
+                wave_gen,
+                os.path.join(tmpdir, "dense"),
+                shard_size=3,
+                form="dense",
+                data_freqs=data_freqs,
+                float32=False,
+                **waveform_kwargs,
+            )
+            pipeline.run(params_in)
+            h_dense = np.concatenate([pipeline.load(i)[0] for i in range(2)])
+            try:
+                h_host = h.get()
+            except AttributeError:
+                h_host = h
+            self.assertTrue(np.allclose(h_dense, h_host, rtol=0.0, atol=0.0))
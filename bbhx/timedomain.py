@@ -0,0 +1,404 @@
+# Time-domain synthesis of TDI streams
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+try:
+    import cupy as xp
+    import cupyx.scipy.fft as cufft
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+try:
+    import scipy.fft as fft_cpu
+
+except (ImportError, ModuleNotFoundError) as e:
+    fft_cpu = None
+
+from .utils.transform import tSSBfromLframe
+from .utils.constants import *
+from .utils.citations import *
+
+
+class BBHWaveformTD:
+    """Time-domain TDI streams from :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`
+
+    The sparse splines of each batch of binaries are generated once. They are
+    interpolated into a half-spectrum buffer and transformed with a batched
+    ``irfft``. The time series has ``num_samples`` samples with spacing ``dt``
+    starting at :math:`t=0`, using the same frequency grid as
+    ``np.fft.rfftfreq(num_samples, dt)``.
+
+    If ``chunk_length`` is ``None``, the whole stream is one ``irfft``. It is
+    periodic, so signals outside of :math:`[0, T)` wrap around.
+
+    If ``chunk_length`` is given, the stream is built in segments of
+    ``chunk_length`` samples. Neighbouring segments overlap by ``overlap``
+    samples and are combined with complementary :math:`\\sin^2` windows. Each
+    segment is evaluated on the coarser grid of an ``irfft`` covering the
+    segment and ``pad`` samples on both sides. The templates are restricted to
+    frequencies with :math:`t_f` in the segment and half of the padding.
+    This is the stationary-phase mapping of time to frequency, so ``pad``
+    must cover the time-frequency spread of the signal (it is largest at
+    low frequencies). Memory is bounded by the segment size and the sparse
+    splines, so multi-year streams can be written into an ``np.memmap``
+    or consumed with :meth:`stream`. Signals outside of :math:`[0, T)` are
+    not wrapped around.
+
+    The FFT uses ``scipy.fft`` with ``workers`` threads if it is installed,
+    otherwise ``np.fft``. ``scipy.fft`` caches its plans, and all segments
+    have the same length, so the plan is reused. On the GPU, the cuFFT plan
+    of each buffer shape is stored in :attr:`plans`.
+
+    This class has GPU capabilities.
+
+    Args:
+        wave_gen (obj): :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>` object.
+        dt (double): Sampling interval in seconds.
+        num_samples (int): Number of samples of the output streams.
+        chunk_length (int, optional): Number of samples per segment. If ``None``,
+            the whole stream is generated at once. (Default: ``None``)
+        overlap (int, optional): Number of samples where neighbouring segments
+            overlap. If ``None``, ``chunk_length // 8``. (Default: ``None``)
+        pad (int, optional): Number of samples on each side of a segment in its
+            ``irfft``. If ``None``, ``chunk_length // 2``. (Default: ``None``)
+        taper_bins (int, optional): Number of frequency bins of the cosine taper
+            at the start and end of each template. (Default: ``0``)
+        batch_size (int, optional): Number of binaries interpolated and
+            transformed at once. (Default: ``100``)
+        workers (int, optional): Number of threads for ``scipy.fft``. ``-1`` uses
+            all cores. (Default: ``-1``)
+
+    Attributes:
+        batch_size (int): Number of binaries interpolated and transformed at once.
+        chunk_length (int): Number of samples per segment.
+        dt (double): Sampling interval in seconds.
+        freqs (double xp.ndarray): Positive frequencies of the segment ``irfft``.
+        num_fft (int): Length of the segment ``irfft``.
+        num_samples (int): Number of samples of the output streams.
+        overlap (int): Number of samples where neighbouring segments overlap.
+        pad (int): Number of samples on each side of a segment.
+        plans (dict): cuFFT plans by buffer shape (GPU only).
+        taper_bins (int): Number of frequency bins of the template taper.
+        use_gpu (bool): If ``True``, use GPU.
+        wave_gen (obj): Waveform generator.
+        workers (int): Number of threads for ``scipy.fft``.
+        xp (obj): Numpy or Cupy.
+
+    Raises:
+        ValueError: Inputs are not correct.
+
+    """
+
+    def __init__(
+        self,
+        wave_gen,
+        dt,
+        num_samples,
+        chunk_length=None,
+        overlap=None,
+        pad=None,
+        taper_bins=0,
+        batch_size=100,
+        workers=-1,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer.")
+
+        self.wave_gen = wave_gen
+        self.use_gpu = wave_gen.use_gpu
+        self.xp = xp if self.use_gpu else np
+        self.dt = dt
+        self.num_samples = num_samples
+        self.taper_bins = taper_bins
+        self.batch_size = batch_size
+        self.workers = workers
+
+        if chunk_length is None or chunk_length >= num_samples:
+            self.chunk_length = num_samples
+            self.overlap = 0
+            self.pad = 0
+            self.num_fft = num_samples
+
+        else:
+            self.chunk_length = chunk_length
+            self.overlap = chunk_length // 8 if overlap is None else overlap
+            self.pad = chunk_length // 2 if pad is None else pad
+
+            if self.overlap > chunk_length:
+                raise ValueError("overlap must not be larger than chunk_length.")
+
+            num_fft = self.chunk_length + self.overlap + 2 * self.pad
+            if fft_cpu is not None:
+                num_fft = fft_cpu.next_fast_len(num_fft, real=True)
+            self.num_fft = num_fft
+
+        self.freqs = self.xp.fft.rfftfreq(self.num_fft, dt)[1:]
+
+        # complementary windows of the overlap regions
+        x = (np.arange(self.overlap) + 0.5) / max(self.overlap, 1)
+        self._ramp_up = self.xp.asarray(np.sin(np.pi / 2.0 * x) ** 2)
+        self._ramp_down = self.xp.asarray(np.cos(np.pi / 2.0 * x) ** 2)
+
+        x = (np.arange(taper_bins) + 0.5) / max(taper_bins, 1)
+        self._taper = self.xp.asarray(np.sin(np.pi / 2.0 * x) ** 2)
+
+        self.plans = {}
+
+    @property
+    def citation(self):
+        """Citations for this class"""
+        return self.wave_gen.citation
+
+    @property
+    def chunked(self):
+        """If ``True``, the stream is built in segments."""
+        return self.chunk_length < self.num_samples
+
+    @property
+    def segment_starts(self):
+        """First sample of each segment."""
+        return np.arange(0, self.num_samples, self.chunk_length)
+
+    def _irfft(self, buffer):
+        """Batched ``irfft`` along the last axis with cached plans."""
+        if self.use_gpu:
+            key = buffer.shape
+            if key not in self.plans:
+                self.plans[key] = cufft.get_fft_plan(
+                    buffer, shape=(self.num_fft,), axes=-1, value_type="C2R"
+                )
+            return cufft.irfft(buffer, n=self.num_fft, axis=-1, plan=self.plans[key])
+
+        if fft_cpu is not None:
+            return fft_cpu.irfft(buffer, n=self.num_fft, axis=-1, workers=self.workers)
+
+        return np.fft.irfft(buffer, n=self.num_fft, axis=-1)
+
+    def _generate_splines(self, params, waveform_kwargs):
+        """Sparse splines of all batches (only the sparse arrays are kept)."""
+        waveform_kwargs["freqs"] = None
+        waveform_kwargs["direct"] = False
+
+        splines = []
+        for start in range(0, params.shape[1], self.batch_size):
+            end = min(start + self.batch_size, params.shape[1])
+            container, t_start, t_end = self.wave_gen(
+                *params[:, start:end], **waveform_kwargs
+            )
+            splines.append((slice(start, end), container, t_start, t_end))
+
+        return splines
+
+    def _segment_limits(self, a, params, t_start, t_end):
+        """Limit the support of templates to the times of a segment."""
+        margin = self.pad // 2
+        lam, beta = params[8], params[9]
+        t_lo = tSSBfromLframe((a - margin) * self.dt, lam, beta, 0.0)
+        t_hi = tSSBfromLframe(
+            (a + self.chunk_length + self.overlap + margin) * self.dt, lam, beta, 0.0
+        )
+
+        t_start = np.maximum(t_start, t_lo)
+        t_end = np.where(t_end > 0.0, np.minimum(t_end, t_hi), t_hi)
+        return t_start, t_end
+
+    def _segment(self, a, params, splines, combine, num_modes, length):
+        """Windowed time series of one segment
+
+        Returns:
+            xp.ndarray: Shape ``(num_out, 3, chunk_length + overlap)``.
+
+        """
+        interp_response = self.wave_gen.interp_response
+        num_bin_all = params.shape[1]
+        num_freqs = self.num_fft // 2 + 1
+
+        # move the time origin of the segment irfft to the start of the padding
+        if self.chunked:
+            shift = self.xp.exp(
+                2j * np.pi * self.freqs * ((a - self.pad) * self.dt)
+            )
+        else:
+            shift = None
+
+        seg_length = self.chunk_length + self.overlap
+        out = self.xp.zeros(
+            (1 if combine else num_bin_all, 3, seg_length), dtype=self.xp.float64
+        )
+
+        buffer = None
+        for inds, container, t_start, t_end in splines:
+            num_bin = inds.stop - inds.start
+            if self.chunked:
+                t_start, t_end = self._segment_limits(a, params[:, inds], t_start, t_end)
+
+            templates = interp_response(
+                self.freqs,
+                container,
+                np.ascontiguousarray(t_start),
+                np.ascontiguousarray(t_end),
+                length,
+                num_modes,
+                3,
+            )
+
+            buffer_shape = (1 if combine else num_bin, 3, num_freqs)
+            if buffer is None or buffer.shape != buffer_shape:
+                buffer = self.xp.zeros(buffer_shape, dtype=self.xp.complex128)
+            elif not combine:
+                buffer[:] = 0.0
+
+            for bin_i, (temp, s, n) in enumerate(
+                zip(templates, interp_response.start_inds, interp_response.lengths)
+            ):
+                s = int(s)
+                n = int(n)
+                if n == 0:
+                    continue
+
+                temp = self._apply_taper(temp)
+                if shift is not None:
+                    temp = temp * shift[s : s + n]
+
+                # index 0 of the buffer is f = 0
+                buffer[0 if combine else bin_i, :, 1 + s : 1 + s + n] += temp
+
+            if not combine:
+                time_series = self._irfft(buffer) / self.dt
+                out[inds] = time_series[:, :, self.pad : self.pad + seg_length]
+
+        if combine:
+            time_series = self._irfft(buffer) / self.dt
+            out[:] = time_series[:, :, self.pad : self.pad + seg_length]
+
+        return out
+
+    def _apply_taper(self, temp):
+        """Cosine taper at the ends of the non-zero part of a template."""
+        if self.taper_bins == 0:
+            return temp
+
+        nonzero = self.xp.flatnonzero(self.xp.any(temp != 0.0, axis=0))
+        if len(nonzero) == 0:
+            return temp
+
+        s0 = int(nonzero[0])
+        s1 = int(nonzero[-1]) + 1
+        taper_length = min(self.taper_bins, (s1 - s0) // 2)
+        if taper_length == 0:
+            return temp
+
+        temp = temp.copy()
+        temp[:, s0 : s0 + taper_length] *= self._taper[:taper_length]
+        temp[:, s1 - taper_length : s1] *= self._taper[:taper_length][::-1]
+        return temp
+
+    def stream(self, params, combine=True, **waveform_kwargs):
+        """Generate the time series in consecutive blocks
+
+        Each block is complete: all segments that overlap it have been added.
+
+        Args:
+            params (double np.ndarray): Parameters for ``wave_gen`` with shape
+                ``(num_params, num_bin_all)``.
+            combine (bool, optional): If ``True``, sum all binaries into one
+                stream. (Default: ``True``)
+            **waveform_kwargs (dict, optional): Keyword arguments for ``wave_gen``.
+                ``length`` must be given. ``freqs`` and ``direct`` are set internally.
+                ``t_obs_start`` and ``t_obs_end`` are combined with the segment limits.
+
+        Yields:
+            tuple: (first sample, block). The block has shape ``(3, num)`` if
+                ``combine`` is ``True``, otherwise ``(num_bin_all, 3, num)``.
+
+        Raises:
+            ValueError: ``length`` is not given.
+
+        """
+        if waveform_kwargs.get("length", None) is None:
+            raise ValueError("length must be given.")
+
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        splines = self._generate_splines(params, waveform_kwargs)
+        num_modes = self.wave_gen.num_modes
+        length = waveform_kwargs["length"]
+
+        starts = self.segment_starts
+        pending = None
+        for seg_i, a in enumerate(starts):
+            segment = self._segment(a, params, splines, combine, num_modes, length)
+
+            if self.overlap > 0:
+                if seg_i > 0:
+                    segment[:, :, : self.overlap] *= self._ramp_up
+                    segment[:, :, : self.overlap] += pending
+                if seg_i < len(starts) - 1:
+                    segment[:, :, self.chunk_length :] *= self._ramp_down
+                pending = segment[:, :, self.chunk_length :].copy()
+
+            end = min(a + self.chunk_length, self.num_samples)
+            block = segment[:, :, : end - a]
+            yield a, block[0] if combine else block
+
+    def __call__(self, params, out=None, combine=False, **waveform_kwargs):
+        """Generate the time series
+
+        Args:
+            params (double np.ndarray): Parameters for ``wave_gen`` with shape
+                ``(num_params, num_bin_all)``.
+            out (double array-like, optional): Buffer that the time series are
+                added into with shape ``(3, num_samples)`` if ``combine`` is
+                ``True``, otherwise ``(num_bin_all, 3, num_samples)``. It can be
+                an ``np.memmap``. If ``None``, a zero-initialized xp.ndarray is
+                created. (Default: ``None``)
+            combine (bool, optional): If ``True``, sum all binaries into one
+                stream, e.g. to inject a catalog. (Default: ``False``)
+            **waveform_kwargs (dict, optional): Keyword arguments for ``wave_gen``.
+                See :meth:`stream`.
+
+        Returns:
+            array-like: ``out`` with the time series added in.
+
+        Raises:
+            ValueError: ``out`` has the wrong shape.
+
+        """
+        params = np.atleast_2d(params)
+        shape = (
+            (3, self.num_samples)
+            if combine
+            else (params.shape[1], 3, self.num_samples)
+        )
+
+        if out is None:
+            out = self.xp.zeros(shape)
+
+        if tuple(out.shape) != shape:
+            raise ValueError(f"out must have shape {shape}. Current shape is {out.shape}.")
+
+        host_out = not isinstance(out, self.xp.ndarray) or isinstance(out, np.memmap)
+        for a, block in self.stream(params, combine=combine, **waveform_kwargs):
+            if host_out and self.use_gpu:
+                block = block.get()
+            out[..., a : a + block.shape[-1]] += block
+
+        if isinstance(out, np.memmap):
+            out.flush()
+
+        return out
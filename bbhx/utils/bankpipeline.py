@@ -0,0 +1,464 @@
+# Overlapped generation and writing of large waveform banks
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import functools
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from bbhx.utils.splinebank import SplineBank
+
+# increase when the pipeline layout changes
+BANK_PIPELINE_VERSION = 2
+
+
+def _to_manifest(obj):
+    """Convert numpy types and callables in waveform keyword arguments for ``json``"""
+    if isinstance(obj, functools.partial):
+        return dict(func=obj.func, args=list(obj.args), keywords=obj.keywords)
+    if callable(obj):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    try:
+        obj = obj.get()
+    except AttributeError:
+        pass
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj)} cannot be stored in a manifest.")
+
+# signals the end of a queue
+_DONE = None
+
+
+class _Stop(Exception):
+    """Raised in a stage when another stage failed."""
+
+
+class BankPipeline:
+    """Generate a large waveform bank with overlapped compute and I/O
+
+    The bank is split into shards of ``shard_size`` waveforms. Three stages
+    run concurrently and are connected by bounded queues of ``queue_size``
+    shards: a reader thread loads the parameters of each shard, the calling
+    thread generates the waveforms with ``wave_gen``, and a writer thread
+    compresses and writes each shard to disk. When a queue is full, the stage
+    feeding it waits, so at most about ``2 * queue_size + 2`` shards are held
+    in memory. The C/CUDA kernels release the GIL, so writing overlaps with
+    waveform generation.
+
+    Shards are stored in the directory ``path`` next to a ``manifest.json``
+    file with the settings of the bank, including ``waveform_kwargs``. With
+    ``form="spline"``, each shard is a
+    :class:`SplineBank <bbhx.utils.splinebank.SplineBank>`. With ``form="dense"``,
+    each shard holds ``templates.npy`` with shape ``(num_bin, 3, data_length)``
+    on ``data_freqs`` and ``params.npy`` with shape ``(num_bin, num_params)``.
+    A shard is written to a temporary directory and renamed when it is complete,
+    so an interrupted run is resumed by calling :meth:`run` again: completed
+    shards are skipped.
+
+    Args:
+        wave_gen (obj): :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>` object.
+        path (str): Directory of the bank.
+        shard_size (int, optional): Number of waveforms in each shard. Each shard
+            is generated with one call to ``wave_gen``. (Default: ``1000``)
+        form (str, optional): ``"spline"`` or ``"dense"``. (Default: ``"spline"``)
+        length (int, optional): Number of sparse frequencies of each waveform.
+            (Default: ``256``)
+        data_freqs (double np.ndarray, optional): Frequencies of the dense templates.
+            Required if ``form="dense"``. (Default: ``None``)
+        float32 (bool, optional): If ``True``, store the amplitude and transfer
+            function coefficients (``form="spline"``) or the templates
+            (``form="dense"``) in single precision. (Default: ``True``)
+        queue_size (int, optional): Maximum number of shards waiting between
+            two stages. (Default: ``2``)
+        verbose (bool, optional): If ``True``, print progress after each shard.
+            (Default: ``False``)
+        **waveform_kwargs (dict, optional): Keyword arguments for ``wave_gen``
+            (e.g. ``modes`` and ``t_obs_start``).
+
+    Attributes:
+        data_freqs (double xp.ndarray): Frequencies of the dense templates.
+        float32 (bool): If ``True``, store in single precision.
+        form (str): ``"spline"`` or ``"dense"``.
+        length (int): Number of sparse frequencies of each waveform.
+        path (str): Directory of the bank.
+        queue_size (int): Maximum number of shards waiting between two stages.
+        shard_size (int): Number of waveforms in each shard.
+        stats (dict): Progress and throughput information from the last call
+            to :meth:`run`. Keys are ``num_generated``, ``num_skipped``,
+            ``num_shards``, ``read_time``, ``generate_time``, ``write_time``,
+            ``total_time``, and ``templates_per_sec``.
+        verbose (bool): If ``True``, print progress after each shard.
+        wave_gen (obj): Waveform generator.
+        waveform_kwargs (dict): Keyword arguments for ``wave_gen``.
+
+    Raises:
+        ValueError: Inputs are not correct.
+
+    """
+
+    def __init__(
+        self,
+        wave_gen,
+        path,
+        shard_size=1000,
+        form="spline",
+        length=256,
+        data_freqs=None,
+        float32=True,
+        queue_size=2,
+        verbose=False,
+        **waveform_kwargs,
+    ):
+        if shard_size < 1:
+            raise ValueError("shard_size must be a positive integer.")
+
+        if queue_size < 1:
+            raise ValueError("queue_size must be a positive integer.")
+
+        if form not in ["spline", "dense"]:
+            raise ValueError("form must be 'spline' or 'dense'.")
+
+        if form == "dense" and data_freqs is None:
+            raise ValueError("data_freqs must be given if form is 'dense'.")
+
+        for key in ["freqs", "length", "direct", "fill", "combine"]:
+            if key in waveform_kwargs:
+                raise ValueError(f"{key} is set by the pipeline.")
+
+        self.wave_gen = wave_gen
+        self.path = path
+        self.shard_size = shard_size
+        self.form = form
+        self.length = length
+        self.data_freqs = (
+            None if data_freqs is None else wave_gen.xp.asarray(data_freqs)
+        )
+        self.float32 = float32
+        self.queue_size = queue_size
+        self.verbose = verbose
+        self.waveform_kwargs = waveform_kwargs
+
+        self.stats = {}
+
+    def shard_path(self, shard_i):
+        """Directory of a shard"""
+        return os.path.join(self.path, f"shard_{shard_i:06d}")
+
+    def _manifest(self, num_params, num_bin_all):
+        """Description of the bank used to check that a resumed run matches."""
+        manifest = dict(
+            bank_pipeline_version=BANK_PIPELINE_VERSION,
+            num_bin_all=num_bin_all,
+            num_params=num_params,
+            shard_size=self.shard_size,
+            num_shards=int(np.ceil(num_bin_all / self.shard_size)),
+            form=self.form,
+            length=self.length,
+            float32=self.float32,
+            data_length=None if self.data_freqs is None else len(self.data_freqs),
+            waveform_kwargs=self.waveform_kwargs,
+        )
+
+        # round trip, so it compares equal to a loaded manifest (e.g. tuples become lists)
+        return json.loads(json.dumps(manifest, default=_to_manifest))
+
+    def _prepare(self, num_params, num_bin_all):
+        """Write or check the manifest and find the completed shards."""
+        os.makedirs(self.path, exist_ok=True)
+        manifest = self._manifest(num_params, num_bin_all)
+        manifest_path = os.path.join(self.path, "manifest.json")
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                old = json.load(f)
+
+            if old != manifest:
+                raise ValueError(
+                    f"The bank in {self.path} was started with different settings: {old}."
+                )
+
+        else:
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+
+        # remove shards that were not finished
+        for name in os.listdir(self.path):
+            if name.startswith("shard_") and name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(self.path, name))
+
+        return [
+            shard_i
+            for shard_i in range(manifest["num_shards"])
+            if not os.path.isdir(self.shard_path(shard_i))
+        ]
+
+    @staticmethod
+    def _put(q, item, stop):
+        """Put into a bounded queue, waiting while it is full."""
+        while True:
+            if stop.is_set():
+                raise _Stop
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    @staticmethod
+    def _get(q, stop):
+        """Get from a queue, waiting while it is empty."""
+        while True:
+            if stop.is_set():
+                raise _Stop
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def _reader(self, params, shards, read_q, stop, errors, times):
+        """Stage 1: read parameter batches."""
+        try:
+            for shard_i in shards:
+                st = time.perf_counter()
+                start = shard_i * self.shard_size
+                end = min(start + self.shard_size, params.shape[1])
+                # copy out of a memory-mapped file
+                batch = np.array(params[:, start:end], dtype=np.float64)
+                times["read"] += time.perf_counter() - st
+
+                self._put(read_q, (shard_i, batch), stop)
+
+            self._put(read_q, _DONE, stop)
+
+        except _Stop:
+            pass
+
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def _writer(self, write_q, stop, errors, times):
+        """Stage 3: compress and write shards."""
+        try:
+            while True:
+                item = self._get(write_q, stop)
+                if item is _DONE:
+                    return
+
+                st = time.perf_counter()
+                self._write_shard(*item)
+                times["write"] += time.perf_counter() - st
+
+                if self.verbose:
+                    shard_i, batch = item[:2]
+                    print(f"Shard {shard_i} written: {batch.shape[1]} templates")
+
+        except _Stop:
+            pass
+
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def _generate(self, batch):
+        """Stage 2: generate the waveforms of one shard."""
+        if self.form == "spline":
+            container, t_start, t_end = self.wave_gen(
+                *batch,
+                freqs=None,
+                length=self.length,
+                direct=False,
+                **self.waveform_kwargs,
+            )
+            return (container, np.array(t_start), np.array(t_end))
+
+        templates = self.wave_gen(
+            *batch,
+            freqs=self.data_freqs,
+            length=self.length,
+            direct=False,
+            fill=True,
+            combine=False,
+            **self.waveform_kwargs,
+        )
+        return (templates,)
+
+    def _write_shard(self, shard_i, batch, out):
+        """Write one shard to a temporary directory and rename it when complete."""
+        final_path = self.shard_path(shard_i)
+        tmp_path = final_path + ".tmp"
+
+        if self.form == "spline":
+            container, t_start, t_end = out
+            bank = SplineBank.create(
+                tmp_path,
+                batch.shape[1],
+                self.wave_gen.amp_phase_gen.modes,
+                self.length,
+                float32=self.float32,
+                num_params=batch.shape[0],
+            )
+            bank.write(0, container, t_start, t_end, params=batch)
+            bank.flush()
+            del bank
+
+        else:
+            (templates,) = out
+            try:
+                templates = templates.get()
+            except AttributeError:
+                pass
+
+            os.makedirs(tmp_path, exist_ok=True)
+            dtype = np.complex64 if self.float32 else np.complex128
+            np.save(os.path.join(tmp_path, "templates.npy"), templates.astype(dtype))
+            np.save(os.path.join(tmp_path, "params.npy"), batch.T)
+
+        os.replace(tmp_path, final_path)
+
+    def run(self, params):
+        """Generate and write all shards that are not completed
+
+        Args:
+            params (double np.ndarray or str): Parameters for ``wave_gen`` with
+                shape ``(num_params, num_bin_all)`` or the path to a ``.npy``
+                file holding them. A file is memory-mapped and read one shard
+                at a time.
+
+        Returns:
+            dict: :attr:`stats`.
+
+        Raises:
+            ValueError: The bank in ``path`` was started with different settings.
+
+        """
+        if isinstance(params, str):
+            params = np.load(params, mmap_mode="r")
+
+        if params.ndim != 2:
+            raise ValueError("params must have shape (num_params, num_bin_all).")
+
+        num_params, num_bin_all = params.shape
+        shards = self._prepare(num_params, num_bin_all)
+
+        read_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        times = dict(read=0.0, generate=0.0, write=0.0)
+
+        reader = threading.Thread(
+            target=self._reader,
+            args=(params, shards, read_q, stop, errors, times),
+            daemon=True,
+        )
+        writer = threading.Thread(
+            target=self._writer, args=(write_q, stop, errors, times), daemon=True
+        )
+
+        num_generated = 0
+        st_all = time.perf_counter()
+        reader.start()
+        writer.start()
+        try:
+            while True:
+                item = self._get(read_q, stop)
+                if item is _DONE:
+                    break
+
+                shard_i, batch = item
+                st = time.perf_counter()
+                out = self._generate(batch)
+                times["generate"] += time.perf_counter() - st
+
+                self._put(write_q, (shard_i, batch, out), stop)
+                num_generated += batch.shape[1]
+
+            self._put(write_q, _DONE, stop)
+
+        except _Stop:
+            pass
+
+        except BaseException:
+            stop.set()
+            raise
+
+        finally:
+            reader.join()
+            writer.join()
+
+        if len(errors) > 0:
+            raise errors[0]
+
+        total_time = time.perf_counter() - st_all
+
+        self.stats = dict(
+            num_generated=num_generated,
+            num_skipped=num_bin_all - num_generated,
+            num_shards=len(shards),
+            read_time=times["read"],
+            generate_time=times["generate"],
+            write_time=times["write"],
+            total_time=total_time,
+            templates_per_sec=(
+                num_generated / total_time if total_time > 0.0 else np.inf
+            ),
+        )
+
+        if self.verbose:
+            print(
+                f"{num_generated} templates in {total_time:.2f} s: {self.stats['templates_per_sec']:.2f} templates/sec"
+            )
+
+        return self.stats
+
+    def load(self, shard_i, mmap_mode="r"):
+        """Open a completed shard
+
+        Args:
+            shard_i (int): Index of the shard.
+            mmap_mode (str, optional): Mode for memory-mapping the arrays
+                (see :func:`np.load`). (Default: ``"r"``)
+
+        Returns:
+            :class:`SplineBank <bbhx.utils.splinebank.SplineBank>` or tuple:
+                The spline bank of the shard or ``(templates, params)``
+                for dense shards.
+
+        Raises:
+            ValueError: The shard is not completed.
+
+        """
+        path = self.shard_path(shard_i)
+        if not os.path.isdir(path):
+            raise ValueError(f"Shard {shard_i} is not completed.")
+
+        if self.form == "spline":
+            return SplineBank(path, mmap_mode=mmap_mode, use_gpu=self.wave_gen.use_gpu)
+
+        return (
+            np.load(os.path.join(path, "templates.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "params.npy"), mmap_mode=mmap_mode),
+        )
@@ -0,0 +1,212 @@
+# On-disk cache for setup products
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+
+import numpy as np
+
+# increase when the cached products change
+CACHE_VERSION = 1
+
+# number of entries hashed at once for large (memory-mapped) arrays
+_HASH_CHUNK = 2**20
+
+
+def _update_hash(h, item):
+    """Add ``item`` to the hash ``h`` recursively"""
+    if isinstance(item, dict):
+        h.update(b"dict")
+        for key in sorted(item.keys(), key=repr):
+            _update_hash(h, key)
+            _update_hash(h, item[key])
+
+    elif isinstance(item, (list, tuple)):
+        h.update(f"list{len(item)}".encode())
+        for tmp in item:
+            _update_hash(h, tmp)
+
+    elif hasattr(item, "shape") and hasattr(item, "dtype"):
+        try:
+            item = item.get()
+        except AttributeError:
+            pass
+
+        item = np.asarray(item)
+        h.update(f"array{item.shape}{item.dtype.str}".encode())
+
+        # hash in chunks so memory-mapped arrays are not read at once
+        flat = item.reshape(-1)
+        for start in range(0, len(flat), _HASH_CHUNK):
+            h.update(np.ascontiguousarray(flat[start : start + _HASH_CHUNK]).tobytes())
+
+    else:
+        h.update(repr(item).encode())
+
+
+def cache_key(*items):
+    """Hash of the inputs for a cached computation
+
+    Args:
+        *items (obj): Arrays (numpy, cupy, or ``np.memmap``), dictionaries,
+            lists, tuples, or objects with a deterministic ``repr``.
+
+    Returns:
+        str: Hexadecimal key.
+
+    """
+    h = hashlib.blake2b(digest_size=20)
+    _update_hash(h, CACHE_VERSION)
+    for item in items:
+        _update_hash(h, item)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """Size-bounded on-disk cache of arrays
+
+    Each entry is a ``.npz`` file named by its key (see :func:`cache_key`).
+    Entries are written to a temporary file and then renamed, so several
+    processes can share one directory. Loading an entry marks it as
+    recently used. When the total size exceeds ``max_bytes``, the least
+    recently used entries are removed.
+
+    Args:
+        directory (str): Directory holding the cache. It is created if needed.
+        max_bytes (int, optional): Maximum total size of the cache in bytes.
+            (Default: ``2**30``)
+
+    Attributes:
+        directory (str): Directory holding the cache.
+        max_bytes (int): Maximum total size of the cache in bytes.
+
+    """
+
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        """Path to the file for ``key``"""
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key):
+        """Load an entry
+
+        Args:
+            key (str): Key of the entry.
+
+        Returns:
+            dict or None: Arrays of the entry or ``None`` if it is not in the cache.
+
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as f:
+                out = {name: f[name] for name in f.files}
+
+        except FileNotFoundError:
+            return None
+
+        except (OSError, ValueError, EOFError):
+            # incomplete or corrupted entry
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return out
+
+    def save(self, key, **arrays):
+        """Store an entry and remove old entries if needed
+
+        Args:
+            key (str): Key of the entry.
+            **arrays (xp.ndarray or scalar): Arrays to store. Cupy arrays
+                are moved to the host.
+
+        """
+        arrays_host = {}
+        for name, arr in arrays.items():
+            try:
+                arr = arr.get()
+            except AttributeError:
+                pass
+            arrays_host[name] = np.asarray(arr)
+
+        path = self.path(key)
+        tmp_path = path + f".{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays_host)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def entries(self):
+        """Cache files sorted from least to most recently used
+
+        Returns:
+            list: ``(path, size)`` for each entry.
+
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, path, stat.st_size))
+
+        return [(path, size) for _, path, size in sorted(entries)]
+
+    @property
+    def size(self):
+        """Total size of the cache in bytes"""
+        return sum(size for _, size in self.entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in ``max_bytes``"""
+        entries = self.entries()
+        total = sum(size for _, size in entries)
+
+        # always keep the most recent entry
+        for path, size in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove all entries"""
+        for path, _ in self.entries():
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -62,6 +62,27 @@ class CubicSplineInterpolant:
             (Default: ``None``)
         use_gpu (bool, optional): If True, prepare arrays for a GPU. Default is
             False.
+        mixed_precision (bool, optional): If ``True``, after the splines are
+            computed in double precision, store the spline coefficients of the
+            amplitude and transfer function parameters in float32. Phase and
+            :math:`t_f` coefficients are kept in float64. This requires
+            ``num_interp_params == 9`` with the parameter ordering of
+            :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`.
+            See :class:`TemplateInterpFD <bbhx.waveformbuild.TemplateInterpFD>`
+            for the associated error. (Default: ``False``)
+
+    Attributes:
+        mixed_precision (bool): If ``True``, mixed-precision coefficients are stored.
+        y_hp, c1_hp, c2_hp, c3_hp (double xp.ndarray): Phase and :math:`t_f` spline
+            coefficients with shape ``(2, num_bin_all, num_modes, length)``.
+            Only available if ``mixed_precision`` is ``True``.
+        y_lp, c1_lp, c2_lp, c3_lp (float32 xp.ndarray): Amplitude and transfer
+            function spline coefficients with shape ``(7, num_bin_all, num_modes, length)``.
+            Only available if ``mixed_precision`` is ``True``.
+        y, c1, c2, c3 (double xp.ndarray): Spline coefficients, flattened from
+            shape ``(num_interp_params, num_bin_all, num_modes, length)``. These are
+            ``None`` if ``mixed_precision`` is ``True``, because only the split
+            coefficients are kept.
 
     Raises:
         ValueError: If input arguments are not correct.
@@ -77,6 +98,7 @@ class CubicSplineInterpolant:
         num_modes=None,
         length=None,
         use_gpu=False,
+        mixed_precision=False,
     ):
 
         # check all inputs
@@ -170,6 +192,32 @@ class CubicSplineInterpolant:
 
         self.x = x.copy()
 
+        self.mixed_precision = mixed_precision
+        if mixed_precision:
+            if num_interp_params != 9:
+                raise ValueError(
+                    "mixed_precision requires 9 interpolation parameters (amp, phase, tf, transfer functions)."
+                )
+
+            hp_inds = self.xp.array([1, 2])
+            lp_inds = self.xp.array([0, 3, 4, 5, 6, 7, 8])
+
+            # the local names also hold the coefficient arrays
+            del B, upper_diag, diag, lower_diag
+
+            # split one coefficient at a time and drop the double arrays,
+            # so only the split coefficients are kept
+            split = {}
+            for name in ["y", "c1", "c2", "c3"]:
+                tmp = getattr(self, name).reshape(self.reshape_shape)
+                split[name + "_hp"] = self.xp.ascontiguousarray(tmp[hp_inds])
+                split[name + "_lp"] = tmp[lp_inds].astype(self.xp.float32)
+                setattr(self, name, None)
+                del tmp
+
+            for name, arr in split.items():
+                setattr(self, name, arr)
+
     @property
     def x_shaped(self):
         """Get shaped x array."""
@@ -198,4 +246,25 @@ class CubicSplineInterpolant:
     @property
     def container(self):
         """Container for easy transit of interpolation information."""
+        if self.mixed_precision:
+            raise ValueError("container is not available with mixed_precision=True. Use mixed_container.")
+
         return [self.x, self.y, self.c1, self.c2, self.c3]
+
+    @property
+    def mixed_container(self):
+        """Container for easy transit of mixed-precision interpolation information."""
+        if not self.mixed_precision:
+            raise ValueError("mixed_container requires mixed_precision=True.")
+
+        return [
+            self.x,
+            self.y_hp,
+            self.c1_hp,
+            self.c2_hp,
+            self.c3_hp,
+            self.y_lp,
+            self.c1_lp,
+            self.c2_lp,
+            self.c3_lp,
+        ]
@@ -0,0 +1,222 @@
+# Per-binary selection of harmonic modes
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from math import factorial
+
+import numpy as np
+
+
+def spin_weighted_harmonic_abs2(ell, mm, inc, s=-2):
+    """Squared magnitude of the spin-weighted spherical harmonic
+
+    :math:`|{}_{s}Y_{\\ell m}(\\iota, \\phi)|^2` does not depend on :math:`\\phi`.
+    It is computed from the Wigner d-matrix
+    :math:`d^\\ell_{m,-s}(\\iota)`.
+
+    Args:
+        ell (int): :math:`\\ell` of the harmonic.
+        mm (int): :math:`m` of the harmonic.
+        inc (double or np.ndarray): Inclination in radians.
+        s (int, optional): Spin weight. (Default: ``-2``)
+
+    Returns:
+        np.ndarray: :math:`|{}_{s}Y_{\\ell m}(\\iota)|^2` with the shape of ``inc``.
+
+    """
+    inc = np.asarray(inc, dtype=np.float64)
+    cos_half = np.cos(inc / 2.0)
+    sin_half = np.sin(inc / 2.0)
+
+    m1 = mm
+    m2 = -s
+    d = np.zeros_like(inc)
+    for k in range(max(0, m2 - m1), min(ell + m2, ell - m1) + 1):
+        coeff = (-1) ** (k - m2 + m1) * np.sqrt(
+            factorial(ell + m2)
+            * factorial(ell - m2)
+            * factorial(ell + m1)
+            * factorial(ell - m1)
+        ) / (
+            factorial(ell + m2 - k)
+            * factorial(k)
+            * factorial(ell - k - m1)
+            * factorial(k - m2 + m1)
+        )
+        d += (
+            coeff
+            * cos_half ** (2 * ell - 2 * k + m2 - m1)
+            * sin_half ** (2 * k - m2 + m1)
+        )
+
+    return (2 * ell + 1) / (4 * np.pi) * d**2
+
+
+def mode_mask_from_params(
+    m1, m2, chi1z, chi2z, inc, modes, q_min=1.05, dchi_min=0.05, sin_inc_min=0.05
+):
+    """Per-binary mode mask from the mass ratio, spins, and inclination
+
+    In PhenomHM, the (3,3) and (4,3) amplitudes scale with
+    :math:`\\delta=(m_1-m_2)/(m_1+m_2)` and vanish for equal masses.
+    The (2,1) amplitude also has a term proportional to
+    :math:`\\chi_a=(\\chi_{1z}-\\chi_{2z})/2`, so it only vanishes for equal
+    masses with equal spins. Harmonics with :math:`m\\neq2` vanish for
+    face-on and face-off systems (:math:`\\sin\\iota=0`). These harmonics
+    are dropped when the mass ratio, spin difference, or :math:`|\\sin\\iota|`
+    is below the given threshold. The (2,2) mode is always kept.
+
+    Args:
+        m1 (double or np.ndarray): Mass 1 in Solar Masses.
+        m2 (double or np.ndarray): Mass 2 in Solar Masses.
+        chi1z (double or np.ndarray): Dimensionless spin 1.
+        chi2z (double or np.ndarray): Dimensionless spin 2.
+        inc (double or np.ndarray): Inclination in radians.
+        modes (list): Harmonic modes ``(l, m)`` in the order used for the waveform.
+        q_min (double, optional): Odd-:math:`m` harmonics are dropped when
+            :math:`q=\\text{max}(m_1,m_2)/\\text{min}(m_1,m_2) < q_\\text{min}`
+            (and, for (2,1), the spins are nearly equal).
+            (Default: ``1.05``)
+        dchi_min (double, optional): The (2,1) harmonic of a nearly equal-mass
+            binary is kept when :math:`|\\chi_{1z}-\\chi_{2z}|\\geq` ``dchi_min``.
+            (Default: ``0.05``)
+        sin_inc_min (double, optional): Harmonics with :math:`m\\neq2` are
+            dropped when :math:`|\\sin\\iota| <` ``sin_inc_min``. (Default: ``0.05``)
+
+    Returns:
+        np.ndarray: Boolean mask with shape ``(num_bin_all, num_modes)``.
+            ``True`` means the harmonic is computed.
+
+    """
+    m1 = np.atleast_1d(m1)
+    m2 = np.atleast_1d(m2)
+    chi1z = np.atleast_1d(chi1z)
+    chi2z = np.atleast_1d(chi2z)
+    inc = np.atleast_1d(inc)
+
+    q = np.maximum(m1, m2) / np.minimum(m1, m2)
+    unequal = q >= q_min
+    unequal_spins = np.abs(chi1z - chi2z) >= dchi_min
+    inclined = np.abs(np.sin(inc)) >= sin_inc_min
+
+    mask = np.ones((len(m1), len(modes)), dtype=bool)
+    for mode_i, (ell, mm) in enumerate(modes):
+        if (ell, mm) == (2, 2):
+            continue
+
+        if (ell, mm) == (2, 1):
+            mask[:, mode_i] &= unequal | unequal_spins
+
+        elif mm % 2 == 1:
+            mask[:, mode_i] &= unequal
+
+        if mm != 2:
+            mask[:, mode_i] &= inclined
+
+    return mask
+
+
+def mode_mask_from_power(freqs, amp, inc, modes, psd=None, threshold=1e-4):
+    """Per-binary mode mask from the estimated SNR fraction of each harmonic
+
+    The squared SNR of each harmonic is estimated on the sparse frequency
+    grid of the amplitude as
+
+    .. math:: \\rho^2_{\\ell m}\\propto\\int \\frac{A_{\\ell m}^2(f)}{S_n(f)}\\left(|{}_{-2}Y_{\\ell m}(\\iota)|^2 + |{}_{-2}Y_{\\ell -m}(\\iota)|^2\\right)df,
+
+    ignoring the response and the overlap between harmonics. Harmonics
+    whose fraction of the total is below ``threshold`` are dropped.
+    The strongest harmonic is always kept.
+
+    This can be passed to :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`
+    as ``mode_mask`` (e.g. with ``functools.partial`` to set ``psd`` and ``threshold``).
+
+    Args:
+        freqs (double xp.ndarray): Sparse frequencies with shape ``(num_bin_all, length)``.
+        amp (double xp.ndarray): Amplitudes with shape ``(num_bin_all, num_modes, length)``.
+        inc (double or np.ndarray): Inclination in radians.
+        modes (list): Harmonic modes ``(l, m)`` matching the second axis of ``amp``.
+        psd (callable, optional): Function of frequency returning the noise PSD
+            :math:`S_n(f)`. If ``None``, white noise is assumed. (Default: ``None``)
+        threshold (double, optional): Minimum fraction of :math:`\\rho^2`
+            for a harmonic to be kept. (Default: ``1e-4``)
+
+    Returns:
+        np.ndarray: Boolean mask with shape ``(num_bin_all, num_modes)``.
+            ``True`` means the harmonic is computed.
+
+    """
+    try:
+        freqs = freqs.get()
+        amp = amp.get()
+    except AttributeError:
+        pass
+
+    inc = np.atleast_1d(inc)
+
+    weight = amp**2
+    if psd is not None:
+        weight = weight / np.asarray(psd(freqs))[:, np.newaxis, :]
+
+    # trapezoidal rule on the (non-uniform) sparse grid
+    df = np.diff(freqs, axis=-1)[:, np.newaxis, :]
+    power = 0.5 * np.sum((weight[:, :, 1:] + weight[:, :, :-1]) * df, axis=-1)
+
+    angular = np.asarray(
+        [
+            spin_weighted_harmonic_abs2(ell, mm, inc)
+            + spin_weighted_harmonic_abs2(ell, -mm, inc)
+            for ell, mm in modes
+        ]
+    ).T
+    power = power * angular
+
+    total = power.sum(axis=1, keepdims=True)
+    fraction = power / np.where(total > 0.0, total, 1.0)
+
+    mask = fraction >= threshold
+    mask[np.arange(len(mask)), np.argmax(power, axis=1)] = True
+    return mask
+
+
+def prepare_mode_mask(mode_mask, num_bin_all, num_modes, xp_module=np):
+    """Prepare a mode mask for the C/CUDA code
+
+    Args:
+        mode_mask (bool array-like or None): Mask with shape
+            ``(num_bin_all, num_modes)``. ``True`` means the harmonic is computed.
+        num_bin_all (int): Number of binaries.
+        num_modes (int): Number of harmonics.
+        xp_module (obj, optional): Either ``numpy`` or ``cupy``. (Default: ``numpy``)
+
+    Returns:
+        int32 xp.ndarray or int: Flat mask for the C/CUDA code, or 0 (NULL pointer)
+            if ``mode_mask`` is ``None`` so all harmonics are computed.
+
+    Raises:
+        ValueError: ``mode_mask`` has the wrong shape.
+
+    """
+    if mode_mask is None:
+        return 0
+
+    mode_mask = xp_module.asarray(mode_mask)
+    if mode_mask.shape != (num_bin_all, num_modes):
+        raise ValueError(
+            f"mode_mask must have shape {(num_bin_all, num_modes)}. Current shape is {mode_mask.shape}."
+        )
+
+    return xp_module.ascontiguousarray(mode_mask.astype(xp_module.int32).flatten())
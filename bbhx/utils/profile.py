@@ -0,0 +1,92 @@
+# Saved settings profiles
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+
+import numpy as np
+
+# increase when the profile layout changes
+PROFILE_VERSION = 1
+
+# groups of settings in a profile and the class they are passed to
+PROFILE_GROUPS = [
+    "amp_phase_kwargs",
+    "response_kwargs",
+    "interp_kwargs",
+    "waveform_kwargs",
+    "heterodyne_kwargs",
+]
+
+
+def _to_json(obj):
+    """Convert numpy types for ``json``"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj)} cannot be stored in a profile.")
+
+
+def save_profile(profile, path):
+    """Save a settings profile as JSON
+
+    Args:
+        profile (dict): Profile, e.g. from :class:`Autotuner <bbhx.autotune.Autotuner>`.
+        path (str): Output file.
+
+    """
+    profile = {**profile, "profile_version": PROFILE_VERSION}
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2, default=_to_json)
+
+
+def load_profile(profile):
+    """Load a settings profile
+
+    Missing groups are filled with empty dictionaries and harmonic modes
+    are converted back to tuples.
+
+    Args:
+        profile (str or dict): Path to a JSON profile or a profile dictionary.
+
+    Returns:
+        dict: Profile with the groups ``amp_phase_kwargs``, ``response_kwargs``,
+            ``interp_kwargs``, ``waveform_kwargs``, and ``heterodyne_kwargs``.
+
+    Raises:
+        ValueError: The profile was written by a newer version.
+
+    """
+    if isinstance(profile, str):
+        with open(profile, "r") as f:
+            profile = json.load(f)
+
+    profile = dict(profile)
+    if profile.get("profile_version", PROFILE_VERSION) > PROFILE_VERSION:
+        raise ValueError(
+            f"Profile version {profile['profile_version']} is newer than the supported version {PROFILE_VERSION}."
+        )
+
+    for group in PROFILE_GROUPS:
+        profile[group] = dict(profile.get(group, {}))
+
+    for group in ["waveform_kwargs", "heterodyne_kwargs"]:
+        modes = profile[group].get("modes", None)
+        if modes is not None:
+            profile[group]["modes"] = [tuple(mode) for mode in modes]
+
+    return profile
@@ -0,0 +1,405 @@
+# Waveform banks stored as spline coefficients
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+
+import numpy as np
+
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+from bbhx.waveformbuild import TemplateInterpFD
+
+# increase when the bank layout changes
+SPLINE_BANK_VERSION = 1
+
+# phase and tf (kept in double) and amplitude and transfer functions
+# in the parameter ordering of BBHWaveformFD
+HP_INDS = [1, 2]
+LP_INDS = [0, 3, 4, 5, 6, 7, 8]
+
+
+class SplineBank:
+    """Bank of waveforms stored as spline coefficients
+
+    The sparse amplitude, phase, :math:`t_f`, and transfer functions of each
+    waveform are stored as the coefficients of their cubic splines from
+    :class:`CubicSplineInterpolant <bbhx.utils.interpolate.CubicSplineInterpolant>`.
+    The waveforms can be reconstructed on any data frequencies with
+    :meth:`interpolate` without running the waveform model or the response.
+    A bank is a directory with a JSON header and one ``.npy`` file per
+    array, so the arrays are memory-mapped and only the requested
+    binaries are read. The arrays are ordered by binary.
+
+    With ``float32=True``, the amplitude and transfer function coefficients
+    are stored in single precision like in the mixed-precision mode of
+    :class:`TemplateInterpFD <bbhx.waveformbuild.TemplateInterpFD>`. The phase
+    and :math:`t_f` coefficients are always stored in double precision.
+
+    Banks are written with :meth:`create` and :meth:`write` or with
+    :meth:`from_generator`.
+
+    This class has GPU capability.
+
+    Args:
+        path (str): Directory of the bank.
+        mmap_mode (str, optional): Mode for memory-mapping the arrays
+            (see :func:`np.load`). If ``None``, the arrays are loaded into memory.
+            (Default: ``"r"``)
+        use_gpu (bool, optional): If ``True``, reconstruct waveforms on the GPU.
+            (Default: ``False``)
+
+    Attributes:
+        coeffs_hp (double np.ndarray): Phase and :math:`t_f` coefficients
+            ``(y, c1, c2, c3)`` with shape ``(num_bin_all, 4, 2, num_modes, length)``.
+        coeffs_lp (np.ndarray): Amplitude and transfer function coefficients
+            with shape ``(num_bin_all, 4, 7, num_modes, length)``.
+        float32 (bool): If ``True``, ``coeffs_lp`` is stored in single precision.
+        freqs (double np.ndarray): Sparse frequencies with shape ``(num_bin_all, length)``.
+        length (int): Number of sparse frequencies of each waveform.
+        modes (list): Harmonic modes ``(l, m)``.
+        num_bin_all (int): Number of waveforms.
+        num_modes (int): Number of harmonic modes.
+        params (double np.ndarray): Parameters with shape ``(num_bin_all, num_params)``
+            or ``None`` if they are not stored.
+        path (str): Directory of the bank.
+        t_limits (double np.ndarray): Start and end times with shape ``(num_bin_all, 2)``.
+        use_gpu (bool): If ``True``, use GPU.
+        xp (obj): Numpy or Cupy.
+
+    Raises:
+        ValueError: The bank was written by a newer version.
+
+    """
+
+    def __init__(self, path, mmap_mode="r", use_gpu=False):
+        self.path = path
+        self.use_gpu = use_gpu
+        self.xp = xp if use_gpu else np
+
+        with open(os.path.join(path, "header.json"), "r") as f:
+            header = json.load(f)
+
+        if header["spline_bank_version"] > SPLINE_BANK_VERSION:
+            raise ValueError(
+                f"Spline bank version {header['spline_bank_version']} is newer than the supported version {SPLINE_BANK_VERSION}."
+            )
+
+        self.num_bin_all = header["num_bin_all"]
+        self.num_modes = header["num_modes"]
+        self.length = header["length"]
+        self.float32 = header["float32"]
+        self.modes = [tuple(mode) for mode in header["modes"]]
+
+        def load(name):
+            return np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+
+        self.freqs = load("freqs")
+        self.coeffs_hp = load("coeffs_hp")
+        self.coeffs_lp = load("coeffs_lp")
+        self.t_limits = load("t_limits")
+        self.params = load("params") if header["num_params"] is not None else None
+
+    def __len__(self):
+        return self.num_bin_all
+
+    @classmethod
+    def create(
+        cls, path, num_bin_all, modes, length, float32=True, num_params=None, **kwargs
+    ):
+        """Create an empty bank for writing
+
+        Args:
+            path (str): Directory of the bank. It is created if needed.
+            num_bin_all (int): Number of waveforms.
+            modes (list): Harmonic modes ``(l, m)``.
+            length (int): Number of sparse frequencies of each waveform.
+            float32 (bool, optional): If ``True``, store the amplitude and transfer
+                function coefficients in single precision. (Default: ``True``)
+            num_params (int, optional): Number of parameters stored for each
+                waveform. If ``None``, no parameters are stored. (Default: ``None``)
+            **kwargs (dict, optional): Keyword arguments for the initialization.
+
+        Returns:
+            :class:`SplineBank`: Bank opened with ``mmap_mode="r+"``.
+
+        """
+        os.makedirs(path, exist_ok=True)
+        num_modes = len(modes)
+
+        shapes = {
+            "freqs": ((num_bin_all, length), np.float64),
+            "coeffs_hp": ((num_bin_all, 4, 2, num_modes, length), np.float64),
+            "coeffs_lp": (
+                (num_bin_all, 4, 7, num_modes, length),
+                np.float32 if float32 else np.float64,
+            ),
+            "t_limits": ((num_bin_all, 2), np.float64),
+        }
+        if num_params is not None:
+            shapes["params"] = ((num_bin_all, num_params), np.float64)
+
+        for name, (shape, dtype) in shapes.items():
+            np.lib.format.open_memmap(
+                os.path.join(path, name + ".npy"), mode="w+", dtype=dtype, shape=shape
+            ).flush()
+
+        header = dict(
+            spline_bank_version=SPLINE_BANK_VERSION,
+            num_bin_all=num_bin_all,
+            num_modes=num_modes,
+            length=length,
+            modes=[list(mode) for mode in modes],
+            float32=float32,
+            num_params=num_params,
+        )
+        with open(os.path.join(path, "header.json"), "w") as f:
+            json.dump(header, f, indent=2)
+
+        kwargs.setdefault("mmap_mode", "r+")
+        return cls(path, **kwargs)
+
+    def write(self, start, interp_container, t_start, t_end, params=None):
+        """Write waveforms into the bank
+
+        Args:
+            start (int): Index of the first waveform.
+            interp_container (list): ``container`` or ``mixed_container`` of
+                :class:`CubicSplineInterpolant <bbhx.utils.interpolate.CubicSplineInterpolant>`,
+                e.g. from :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`
+                called with ``freqs=None``.
+            t_start (double array-like): Start times with shape ``(num_bin,)``.
+            t_end (double array-like): End times with shape ``(num_bin,)``.
+            params (double array-like, optional): Parameters with shape
+                ``(num_params, num_bin)``. (Default: ``None``)
+
+        Raises:
+            ValueError: The container does not match the bank.
+
+        """
+        try:
+            interp_container = [tmp.get() for tmp in interp_container]
+        except AttributeError:
+            pass
+
+        freqs = np.asarray(interp_container[0]).reshape(-1, self.length)
+        num_bin = freqs.shape[0]
+        end = start + num_bin
+        shape = (-1, num_bin, self.num_modes, self.length)
+
+        if len(interp_container) == 5:
+            coeffs = [tmp.reshape(shape) for tmp in interp_container[1:]]
+            coeffs_hp = np.asarray([tmp[HP_INDS] for tmp in coeffs])
+            coeffs_lp = np.asarray([tmp[LP_INDS] for tmp in coeffs])
+
+        elif len(interp_container) == 9:
+            coeffs_hp = np.asarray([tmp.reshape(shape) for tmp in interp_container[1:5]])
+            coeffs_lp = np.asarray([tmp.reshape(shape) for tmp in interp_container[5:]])
+
+        else:
+            raise ValueError("interp_container must have 5 or 9 entries.")
+
+        if coeffs_hp.shape[1] != 2 or coeffs_lp.shape[1] != 7:
+            raise ValueError("interp_container must hold 9 interpolated quantities.")
+
+        self.freqs[start:end] = freqs
+        self.coeffs_hp[start:end] = coeffs_hp.transpose(2, 0, 1, 3, 4)
+        self.coeffs_lp[start:end] = coeffs_lp.transpose(2, 0, 1, 3, 4)
+        self.t_limits[start:end, 0] = t_start
+        self.t_limits[start:end, 1] = t_end
+
+        if params is not None:
+            self.params[start:end] = np.asarray(params).T
+
+    def flush(self):
+        """Write changes of memory-mapped arrays to disk"""
+        for arr in [self.freqs, self.coeffs_hp, self.coeffs_lp, self.t_limits, self.params]:
+            if isinstance(arr, np.memmap):
+                arr.flush()
+
+    @classmethod
+    def from_generator(
+        cls,
+        path,
+        wave_gen,
+        params,
+        length,
+        batch_size=1000,
+        float32=True,
+        **waveform_kwargs
+    ):
+        """Generate a bank with a waveform generator
+
+        Args:
+            path (str): Directory of the bank.
+            wave_gen (obj): :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>` object.
+            params (double np.ndarray): Parameters with shape ``(num_params, num_bin_all)``.
+            length (int): Number of sparse frequencies of each waveform.
+            batch_size (int, optional): Number of waveforms generated at once.
+                (Default: ``1000``)
+            float32 (bool, optional): If ``True``, store the amplitude and transfer
+                function coefficients in single precision. (Default: ``True``)
+            **waveform_kwargs (dict, optional): Keyword arguments for ``wave_gen``
+                (e.g. ``modes`` and ``t_obs_start``).
+
+        Returns:
+            :class:`SplineBank`: Bank opened for reading.
+
+        """
+        params = np.asarray(params)
+        num_params, num_bin_all = params.shape
+
+        bank = None
+        for start in range(0, num_bin_all, batch_size):
+            end = min(start + batch_size, num_bin_all)
+            container, t_start, t_end = wave_gen(
+                *params[:, start:end],
+                freqs=None,
+                length=length,
+                direct=False,
+                **waveform_kwargs,
+            )
+
+            if bank is None:
+                bank = cls.create(
+                    path,
+                    num_bin_all,
+                    wave_gen.amp_phase_gen.modes,
+                    length,
+                    float32=float32,
+                    num_params=num_params,
+                )
+
+            bank.write(start, container, t_start, t_end, params=params[:, start:end])
+
+        bank.flush()
+        del bank
+        return cls(path, use_gpu=wave_gen.use_gpu)
+
+    def container(self, start=0, end=None, mixed_precision=None):
+        """Spline container for :class:`TemplateInterpFD <bbhx.waveformbuild.TemplateInterpFD>`
+
+        Args:
+            start (int, optional): Index of the first waveform. (Default: ``0``)
+            end (int, optional): Index after the last waveform. If ``None``,
+                go to the end of the bank. (Default: ``None``)
+            mixed_precision (bool, optional): If ``True``, return the
+                ``mixed_container`` layout. If ``None``, use ``float32``.
+                (Default: ``None``)
+
+        Returns:
+            list: ``(x, y, c1, c2, c3)`` or the mixed-precision layout on the device.
+
+        """
+        if mixed_precision is None:
+            mixed_precision = self.float32
+
+        end = self.num_bin_all if end is None else end
+
+        # (num_bin, 4, n, num_modes, length) -> 4 x (n, num_bin, num_modes, length)
+        coeffs_hp = np.asarray(self.coeffs_hp[start:end]).transpose(1, 2, 0, 3, 4)
+        coeffs_lp = np.asarray(self.coeffs_lp[start:end]).transpose(1, 2, 0, 3, 4)
+        freqs = self.xp.asarray(np.asarray(self.freqs[start:end]).flatten())
+
+        if mixed_precision:
+            return [freqs] + [
+                self.xp.asarray(np.ascontiguousarray(tmp)) for tmp in coeffs_hp
+            ] + [
+                self.xp.asarray(np.ascontiguousarray(tmp, dtype=np.float32))
+                for tmp in coeffs_lp
+            ]
+
+        coeffs = np.empty((4, 9) + coeffs_hp.shape[2:])
+        coeffs[:, HP_INDS] = coeffs_hp
+        coeffs[:, LP_INDS] = coeffs_lp
+        return [freqs] + [self.xp.asarray(tmp.flatten()) for tmp in coeffs]
+
+    def interpolate(
+        self,
+        data_freqs,
+        start=0,
+        end=None,
+        interp_response=None,
+        fill=False,
+        combine=False,
+    ):
+        """Reconstruct waveforms on data frequencies
+
+        Args:
+            data_freqs (double xp.ndarray): Frequencies to interpolate to.
+            start (int, optional): Index of the first waveform. (Default: ``0``)
+            end (int, optional): Index after the last waveform. If ``None``,
+                go to the end of the bank. (Default: ``None``)
+            interp_response (obj, optional): :class:`TemplateInterpFD <bbhx.waveformbuild.TemplateInterpFD>`
+                object. If ``None``, one is created with ``mixed_precision=float32``.
+                (Default: ``None``)
+            fill (bool, optional): If ``True``, fill data streams. See
+                :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`. (Default: ``False``)
+            combine (bool, optional): If ``True``, sum all waveforms into one
+                data stream. (Default: ``False``)
+
+        Returns:
+            xp.ndarray or tuple: Same as :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>`
+                with ``direct=False``.
+
+        """
+        if interp_response is None:
+            interp_response = TemplateInterpFD(
+                mixed_precision=self.float32, use_gpu=self.use_gpu
+            )
+
+        end = self.num_bin_all if end is None else end
+        container = self.container(
+            start, end, mixed_precision=interp_response.mixed_precision
+        )
+        t_limits = np.asarray(self.t_limits[start:end])
+
+        template_channels = interp_response(
+            data_freqs,
+            container,
+            np.ascontiguousarray(t_limits[:, 0]),
+            np.ascontiguousarray(t_limits[:, 1]),
+            self.length,
+            self.num_modes,
+            3,
+        )
+
+        if not fill:
+            return (
+                template_channels,
+                interp_response.start_inds,
+                interp_response.lengths,
+            )
+
+        if combine:
+            data_out = self.xp.zeros((3, len(data_freqs)), dtype=self.xp.complex128)
+            interp_response.inject(data_out)
+            return data_out
+
+        data_out = self.xp.zeros(
+            (end - start, 3, len(data_freqs)), dtype=self.xp.complex128
+        )
+        for bin_i, (temp, start_i, length_i) in enumerate(
+            zip(template_channels, interp_response.start_inds, interp_response.lengths)
+        ):
+            data_out[bin_i, :, start_i : start_i + length_i] = temp
+
+        return data_out
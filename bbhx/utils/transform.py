@@ -19,6 +19,12 @@
 import numpy as np
 from scipy import constants as ct
 
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
 from .constants import *
 from .citations import *
 
@@ -424,3 +430,138 @@ def mbh_sky_mode_transform(
                 ) % (np.pi)
 
     return coords
+
+
+class SamplerTransform:
+    """Fused transformation from sampler coordinates to waveform parameters
+
+    Maps the sampling basis commonly used for MBHB parameter estimation
+    to the native parameters of
+    :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>` in a single
+    compiled pass. This combines :func:`mT_q`, :func:`LISA_to_SSB`, the
+    distance and inclination conversions, and the angle wrapping
+    (:func:`mod2pi`, :func:`modpi`) without any intermediate arrays. On the CPU,
+    binaries are processed in parallel with OpenMP.
+
+    The input parameters are, in order: :math:`\\ln{M_T}`, :math:`q`,
+    :math:`\\chi_{1z}`, :math:`\\chi_{2z}`, :math:`\\ln{(d_L / \\text{Gpc})}`,
+    :math:`\\phi_\\text{ref}`, :math:`\\cos{\\iota}`, :math:`\\lambda_L`,
+    :math:`\\sin{\\beta_L}`, :math:`\\psi_L`, and :math:`t_L`
+    (all angles, times, and sky quantities in the LISA frame).
+
+    The output parameters are, in order: :math:`m_1`, :math:`m_2`,
+    :math:`\\chi_{1z}`, :math:`\\chi_{2z}`, :math:`d_L` (m),
+    :math:`\\phi_\\text{ref}`, :math:`f_\\text{ref}`, :math:`\\iota`,
+    :math:`\\lambda`, :math:`\\beta`, :math:`\\psi`, and :math:`t_\\text{ref}`
+    (SSB frame). This is the ordering of
+    :meth:`Likelihood.get_ll <bbhx.likelihood.Likelihood.get_ll>`.
+
+    This class has GPU capability.
+
+    Args:
+        f_ref (double, optional): Reference frequency filled into the output.
+            (Default: ``0.0``)
+        t0 (double, optional): Initial start time point away from zero in years.
+            See :func:`LISA_to_SSB`. (Default: ``0.0``)
+        use_gpu (bool, optional): If ``True``, use the GPU. (Default: ``False``)
+
+    Attributes:
+        f_ref (double): Reference frequency filled into the output.
+        num_params_in (int): Number of sampler parameters (11).
+        num_params_out (int): Number of waveform parameters (12).
+        t0 (double): Initial start time point away from zero in years.
+        transform_gen (obj): C/CUDA implementation of the transformation.
+        use_gpu (bool): If ``True``, use the GPU.
+        xp (obj): Either numpy or cupy.
+
+    """
+
+    num_params_in = 11
+    num_params_out = 12
+
+    def __init__(self, f_ref=0.0, t0=0.0, use_gpu=False):
+
+        self.f_ref = f_ref
+        self.t0 = t0
+
+        self.use_gpu = use_gpu
+        # compiled backends are imported here so the rest of this module
+        # stays importable without them
+        if use_gpu:
+            from pyTransform import transform_params_wrap
+
+            self.xp = xp
+
+        else:
+            from pyTransform_cpu import transform_params_wrap
+
+            self.xp = np
+
+        self.transform_gen = transform_params_wrap
+
+    @property
+    def citation(self):
+        """Citations for this class"""
+        return marsat_2
+
+    def __call__(self, params):
+        """Transform sampler coordinates
+
+        Args:
+            params (double xp.ndarray): Sampler coordinates with shape
+                ``(11,)`` or ``(11, num_bin_all)``.
+
+        Returns:
+            double xp.ndarray: Waveform parameters with shape ``(12, num_bin_all)``.
+
+        Raises:
+            ValueError: Input shape is not correct.
+
+        """
+        params = self.xp.ascontiguousarray(
+            self.xp.atleast_2d(self.xp.asarray(params, dtype=self.xp.float64).T).T
+        )
+
+        if params.shape[0] != self.num_params_in:
+            raise ValueError(
+                f"params must have shape ({self.num_params_in}, num_bin_all). Current shape is {params.shape}."
+            )
+
+        num_bin_all = params.shape[1]
+        params_out = self.xp.empty(
+            (self.num_params_out, num_bin_all), dtype=self.xp.float64
+        )
+
+        self.transform_gen(
+            params_out, params, num_bin_all, self.f_ref, self.t0 * YRSID_SI
+        )
+
+        return params_out
+
+
+def apply_param_transform(param_transform, params):
+    """Apply an optional parameter transformation
+
+    Shared by the classes that accept a ``param_transform`` option
+    (e.g. :class:`SamplerTransform`).
+
+    Args:
+        param_transform (obj): Callable mapping ``params`` to the
+            waveform parameters or ``None``.
+        params (double xp.ndarray): Input parameters.
+
+    Returns:
+        double np.ndarray: Transformed parameters on the host. ``params`` is
+            returned unchanged if ``param_transform`` is ``None``.
+
+    """
+    if param_transform is None:
+        return params
+
+    params = param_transform(params)
+    try:
+        params = params.get()
+    except AttributeError:
+        pass
+
+    return params
@@ -22,8 +22,10 @@ This module contains tools used in the Cython CPU/GPU Agnostic framework.
 
 """
 
+import functools
 import os
 import subprocess
+import tracemalloc
 import warnings
 
 import numpy as np
@@ -40,6 +42,37 @@ except (ImportError, ModuleNotFoundError) as e:
     gpu = False
 
 
+def get_ptr(arg):
+    """Convert an array or C/C++ class argument to a pointer
+
+    Cupy and numpy arrays are converted to the address of their data. Cython
+    classes must have a :code:`ptr` attribute. Any other argument is
+    returned unchanged.
+
+    args:
+        arg (obj): Argument for a function.
+
+    returns:
+        obj: Pointer value as an int or the original argument.
+
+    """
+    if gpu:
+        # cupy arrays
+        if isinstance(arg, cp.ndarray):
+            return arg.data.mem.ptr
+
+    # numpy arrays
+    if isinstance(arg, np.ndarray):
+        return arg.__array_interface__["data"][0]
+
+    try:
+        # cython classes
+        return arg.ptr
+    except AttributeError:
+        # regular argument
+        return arg
+
+
 def wrapper(*args, **kwargs):
     """Function to convert array and C/C++ class arguments to ptrs
 
@@ -63,55 +96,26 @@ def wrapper(*args, **kwargs):
             rather than python objects).
 
     """
-    # declare target containers
-    targs = []
-    tkwargs = {}
-
-    # args first
-    for arg in args:
-        if gpu:
-            # cupy arrays
-            if isinstance(arg, cp.ndarray):
-                targs.append(arg.data.mem.ptr)
-                continue
-
-        # numpy arrays
-        if isinstance(arg, np.ndarray):
-            targs.append(arg.__array_interface__["data"][0])
-            continue
-
-        try:
-            # cython classes
-            targs.append(arg.ptr)
-            continue
-        except AttributeError:
-            # regular argument
-            targs.append(arg)
-
-    # kwargs next
-    for key, arg in kwargs.items():
-        if gpu:
-            # cupy arrays
-            if isinstance(arg, cp.ndarray):
-                tkwargs[key] = arg.data.mem.ptr
-                continue
-
-        if isinstance(arg, np.ndarray):
-            # numpy arrays
-            tkwargs[key] = arg.__array_interface__["data"][0]
-            continue
-
-        try:
-            # cython classes
-            tkwargs[key] = arg.ptr
-            continue
-        except AttributeError:
-            # other arguments
-            tkwargs[key] = arg
-
+    targs = [get_ptr(arg) for arg in args]
+    tkwargs = {key: get_ptr(arg) for key, arg in kwargs.items()}
     return (targs, tkwargs)
 
 
+def pointer_array(arrays):
+    """Get an array of pointers to a list of arrays
+
+    Args:
+        arrays (list): List of cupy or numpy arrays.
+
+    Returns:
+        np.ndarray: int64 array of data pointers.
+
+    """
+    return np.fromiter(
+        (get_ptr(arr) for arr in arrays), dtype=np.int64, count=len(arrays)
+    )
+
+
 def pointer_adjust(func):
     """Decorator function for cupy/numpy agnostic cython
 
@@ -124,11 +128,200 @@ def pointer_adjust(func):
     `here <https://github.com/BlackHolePerturbationToolkit/FastEMRIWaveforms/tree/master/src>`_
     for examples.
 
+    The undecorated function, which takes pointers as ints, is available
+    as the :code:`__wrapped__` attribute of the decorated function. See
+    :class:`PreparedCall`.
+
     """
 
+    @functools.wraps(func)
     def func_wrapper(*args, **kwargs):
         # get pointers
         targs, tkwargs = wrapper(*args, **kwargs)
         return func(*targs, **tkwargs)
 
     return func_wrapper
+
+
+class PreparedCall:
+    """Reusable call of a C/CUDA wrapped function with fixed buffers
+
+    Arguments are checked and converted to pointers once. Each call then
+    goes straight to the undecorated Cython function. This removes the Python
+    overhead of :func:`pointer_adjust` for repeated calls with the same
+    buffers, e.g. when analyzing a small number of binaries with low latency.
+
+    The arrays are referenced by this object, so their memory stays valid.
+    Array contents may be changed in place between calls, but the arrays
+    themselves must not be replaced (use :meth:`set_arg` for that).
+
+    The pointers are passed on without any type information. So, the dtype
+    and size of each array argument are recorded and every replacement must
+    match them. The C types cannot be read from the wrapped function, so pass
+    ``dtypes`` to also check the initial arguments (e.g. ``np.int32`` for
+    an ``int*``).
+
+    Args:
+        func (obj): Function decorated with :func:`pointer_adjust`.
+        *args (list): Arguments for ``func``.
+        dtypes (list, optional): Expected dtype for each argument. Entries
+            for non-array arguments, or entries that should not be checked,
+            are ``None``. (Default: ``None``)
+
+    Attributes:
+        args (list): Arguments as given.
+        dtypes (list): Expected dtype for each argument (``None`` for non-arrays).
+        func (obj): Undecorated function.
+        ptr_args (list): Arguments with arrays converted to pointers.
+        sizes (list): Expected size for each argument (``None`` for non-arrays).
+
+    Raises:
+        ValueError: An array argument is not C-contiguous or does not have
+            the expected dtype. ``dtypes`` does not have one entry per argument.
+
+    """
+
+    def __init__(self, func, *args, dtypes=None):
+        self.func = getattr(func, "__wrapped__", func)
+        self.args = [None] * len(args)
+        self.ptr_args = [None] * len(args)
+        self.sizes = [None] * len(args)
+
+        if dtypes is None:
+            self.dtypes = [None] * len(args)
+
+        elif len(dtypes) != len(args):
+            raise ValueError(
+                f"dtypes must have one entry per argument ({len(args)}). It has {len(dtypes)}."
+            )
+
+        else:
+            self.dtypes = [None if dt is None else np.dtype(dt) for dt in dtypes]
+
+        for i, arg in enumerate(args):
+            self.set_arg(i, arg)
+
+    def set_arg(self, index, arg):
+        """Replace one argument
+
+        An array must have the dtype and size of the argument it replaces.
+
+        Args:
+            index (int): Position of the argument.
+            arg (obj): New argument.
+
+        Raises:
+            ValueError: ``arg`` is an array that is not C-contiguous or
+                whose dtype or size does not match. ``arg`` replaces an array,
+                but it is not an array.
+
+        """
+        dtype = getattr(arg, "dtype", None)
+
+        if dtype is None:
+            if self.sizes[index] is not None:
+                raise ValueError(f"Argument {index} must be an array.")
+
+        else:
+            if not arg.flags.c_contiguous:
+                raise ValueError(f"Argument {index} must be C-contiguous.")
+
+            expected_dtype = self.dtypes[index]
+            if expected_dtype is not None and dtype != expected_dtype:
+                raise ValueError(
+                    f"Argument {index} must have dtype {expected_dtype}. It has dtype {dtype}."
+                )
+
+            expected_size = self.sizes[index]
+            if expected_size is not None and arg.size != expected_size:
+                raise ValueError(
+                    f"Argument {index} must have size {expected_size}. It has size {arg.size}."
+                )
+
+            self.dtypes[index] = dtype
+            self.sizes[index] = arg.size
+
+        self.args[index] = arg
+        self.ptr_args[index] = get_ptr(arg)
+
+    def __call__(self):
+        """Call the function with the prepared arguments."""
+        return self.func(*self.ptr_args)
+
+
+def load_array(arr, mmap_mode="r"):
+    """Load an array that may be given as a path to a ``.npy`` file
+
+    If ``arr`` is a path, the file is opened with :func:`np.load` as a memory
+    map so that no data is read until it is accessed. Arrays (including
+    ``np.memmap`` objects) are returned unchanged.
+
+    Args:
+        arr (str, os.PathLike, or array-like): Array or path to a ``.npy`` file.
+        mmap_mode (str, optional): Memory map mode for :func:`np.load`.
+            (Default: ``"r"``)
+
+    Returns:
+        array-like: The array.
+
+    """
+    if isinstance(arr, (str, os.PathLike)):
+        return np.load(arr, mmap_mode=mmap_mode)
+    return arr
+
+
+class MemoryTracker:
+    """Context manager to track peak host memory usage
+
+    This uses :mod:`tracemalloc`, which also tracks NumPy array allocations.
+    It is meant for tracking setup steps, not for use in hot loops.
+    :mod:`tracemalloc` is process-wide and slows down all allocations while
+    tracing. It does not see GPU memory.
+
+    The traced memory is recorded on entry and the results are deltas to it.
+    The peak of an outer :mod:`tracemalloc` session is not reset. If it is
+    not exceeded within the context, the true peak within the context is
+    unknown and :attr:`peak` is the larger of :attr:`current` and zero.
+
+    Args:
+        enabled (bool, optional): If ``False``, nothing is tracked and
+            :attr:`current` and :attr:`peak` are ``None``. (Default: ``True``)
+
+    Attributes:
+        current (int): Bytes still allocated at the end of the context
+            relative to the start.
+        enabled (bool): If ``True``, memory is tracked.
+        peak (int): Peak bytes allocated within the context relative to the start.
+
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.current = 0 if enabled else None
+        self.peak = 0 if enabled else None
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+
+        self._base, self._base_peak = tracemalloc.get_traced_memory()
+        return self
+
+    def __exit__(self, *args):
+        if not self.enabled:
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        self.current = current - self._base
+
+        if peak > self._base_peak:
+            self.peak = peak - self._base
+        else:
+            self.peak = max(self.current, 0)
+
+        if self._started:
+            tracemalloc.stop()
@@ -21,19 +21,32 @@ import numpy as np
 try:
     import cupy as xp
     from pyWaveformBuild import direct_sum_wrap as direct_sum_wrap_gpu
+    from pyWaveformBuild import direct_sum_modes_wrap as direct_sum_modes_wrap_gpu
     from pyWaveformBuild import InterpTDI_wrap as InterpTDI_wrap_gpu
+    from pyWaveformBuild import InterpTDIMixed_wrap as InterpTDIMixed_wrap_gpu
+    from pyWaveformBuild import InterpTDIBlocked_wrap as InterpTDIBlocked_wrap_gpu
+    from pyWaveformBuild import pack_blocked_wrap as pack_blocked_wrap_gpu
+    from pyWaveformBuild import inject_templates_wrap as inject_templates_wrap_gpu
 
 except (ImportError, ModuleNotFoundError) as e:
     print("No CuPy")
     import numpy as xp
 
 from pyWaveformBuild_cpu import direct_sum_wrap as direct_sum_wrap_cpu
+from pyWaveformBuild_cpu import direct_sum_modes_wrap as direct_sum_modes_wrap_cpu
 from pyWaveformBuild_cpu import InterpTDI_wrap as InterpTDI_wrap_cpu
+from pyWaveformBuild_cpu import InterpTDIMixed_wrap as InterpTDIMixed_wrap_cpu
+from pyWaveformBuild_cpu import InterpTDIBlocked_wrap as InterpTDIBlocked_wrap_cpu
+from pyWaveformBuild_cpu import pack_blocked_wrap as pack_blocked_wrap_cpu
+from pyWaveformBuild_cpu import inject_templates_wrap as inject_templates_wrap_cpu
 
 from .waveforms.phenomhm import PhenomHMAmpPhase
 from .response.fastfdresponse import LISATDIResponse
-from .utils.transform import tSSBfromLframe, tLfromSSBframe
+from .utils.transform import tSSBfromLframe, tLfromSSBframe, apply_param_transform
 from .utils.interpolate import CubicSplineInterpolant
+from .utils.utility import get_ptr
+from .utils.modeselect import prepare_mode_mask
+from .utils.profile import load_profile
 from .utils.constants import *
 from .utils.citations import *
 
@@ -44,35 +57,118 @@ class TemplateInterpFD:
     This class wraps :class:`CubicSplineInterpolant <bbhx.utils.interpolate.CubicSplineInterpolant>` so
     that it fits into this specific waveform production method.
 
+    In mixed-precision mode, the amplitude and transfer function spline
+    coefficients are stored in float32 while the phase and :math:`t_f` are kept
+    in float64. Splines are evaluated and harmonics are summed in double, so
+    the output templates are still complex128. The relative error in each
+    template point is at the level of float32 round-off
+    (:math:`\\sim10^{-7}`), which gives a mismatch with the double precision
+    template below :math:`10^{-12}`. The phase is never rounded to single precision
+    because it reaches :math:`\\sim10^5` radians for long signals.
+
+    The spline coefficients come from
+    :class:`CubicSplineInterpolant <bbhx.utils.interpolate.CubicSplineInterpolant>`
+    with shape ``(9, num_bin_all, num_modes, length)`` for each coefficient, so
+    evaluating one segment reads from 36 distant locations. With ``blocked=True``,
+    they are first repacked on the sparse grid into the layout
+    ``(num_bin_all, length, num_modes, 9, 4)``, so each data point reads one
+    contiguous block.
+
+    If a binary's sparse frequency grid is log-uniform (the default grid of
+    :class:`PhenomHMAmpPhase <bbhx.waveforms.phenomhm.PhenomHMAmpPhase>`),
+    the spline segment of each data frequency is computed in the kernel as
+    :math:`\\lfloor(\\ln f - \\ln f_0)/\\Delta\\ln f\\rfloor`. Other grids fall back
+    to a search over the sparse frequencies.
+
     This class has GPU capabilities.
 
     Args:
+        mixed_precision (bool, optional): If ``True``, use mixed-precision
+            spline coefficients. In this case, ``__call__`` expects the
+            ``mixed_container`` of :class:`CubicSplineInterpolant <bbhx.utils.interpolate.CubicSplineInterpolant>`.
+            (Default: ``False``)
+        always_search (bool, optional): If ``True``, always find the spline
+            segment for each data frequency with a search, even for log-uniform
+            sparse grids. (Default: ``False``)
+        log_uniform_rtol (double, optional): Relative tolerance on the log spacing
+            for a sparse grid to be considered log-uniform. (Default: ``1e-6``)
+        blocked (bool, optional): If ``True``, repack the spline coefficients
+            so that all quantities and coefficients of each spline segment are
+            contiguous before interpolating. The packed copy is four times the
+            size of the spline arrays and is only built in this case. Cannot be
+            combined with ``mixed_precision``. (Default: ``False``)
         use_gpu (bool, optional): If ``True``, use GPU.
 
     Attributes:
+        always_search (bool): If ``True``, always search for spline segments.
+        blocked (bool): If ``True``, use the blocked spline layout.
         data_length (int): Length of data. This class interpolates to this length.
         length (int): Length of original frequency array.
+        log_uniform (bool np.ndarray): Which binaries had log-uniform sparse
+            grids in the last call.
+        log_uniform_rtol (double): Relative tolerance for log-uniform grids.
+        mixed_precision (bool): If ``True``, use mixed-precision spline coefficients.
         num_bin_all (int): Number of binaries.
         num_channels (int): Number of channels in data.
         num_modes (int): Number of harmonics.
-        template_carrier (complex128 xp.ndarray): Carrier for output templates.
+        pack_gen (obj): C/CUDA wrapped function for packing the blocked spline layout.
+        spline_blocked (double xp.ndarray): Blocked spline coefficients with shape
+            ``(num_bin_all, length, num_modes, 9, 4)`` from the last call, flattened.
+        template_buffer (complex128 xp.ndarray): Contiguous buffer holding all
+            output templates.
+        template_carrier (list): Views of ``template_buffer`` for each binary.
             Templates can be accessed through the ``template_channels`` property.
+        template_carrier_ptrs (np.ndarray): Pointers to each array in ``template_carrier``.
         template_gen (obj): C/CUDA wrapped function for computing interpolated
             waveforms.
+        inject_gen (obj): C/CUDA wrapped function for adding templates into
+            a combined data stream.
         use_gpu (bool): If True, using GPU.
         xp (obj): Either numpy or cupy.
 
     """
 
-    def __init__(self, use_gpu=False):
+    def __init__(
+        self,
+        mixed_precision=False,
+        always_search=False,
+        log_uniform_rtol=1e-6,
+        blocked=False,
+        use_gpu=False,
+    ):
+
+        if blocked and mixed_precision:
+            raise ValueError("blocked and mixed_precision cannot both be True.")
 
         self.use_gpu = use_gpu
+        self.mixed_precision = mixed_precision
+        self.blocked = blocked
+        self.spline_blocked = None
+        self.always_search = always_search
+        self.log_uniform_rtol = log_uniform_rtol
+
+        # cache of log(data_freqs) for log-uniform segment indices
+        self._log_data_freqs_src = None
+        self._log_data_freqs = None
+
         if use_gpu:
-            self.template_gen = InterpTDI_wrap_gpu
+            self.template_gen = (
+                InterpTDIMixed_wrap_gpu if mixed_precision else InterpTDI_wrap_gpu
+            )
+            if blocked:
+                self.template_gen = InterpTDIBlocked_wrap_gpu
+            self.pack_gen = pack_blocked_wrap_gpu
+            self.inject_gen = inject_templates_wrap_gpu
             self.xp = xp
 
         else:
-            self.template_gen = InterpTDI_wrap_cpu
+            self.template_gen = (
+                InterpTDIMixed_wrap_cpu if mixed_precision else InterpTDI_wrap_cpu
+            )
+            if blocked:
+                self.template_gen = InterpTDIBlocked_wrap_cpu
+            self.pack_gen = pack_blocked_wrap_cpu
+            self.inject_gen = inject_templates_wrap_cpu
             self.xp = np
 
     @property
@@ -88,6 +184,50 @@ class TemplateInterpFD:
         """citations for this class"""
         return katz_citations
 
+    def _get_log_uniform_info(self, freqs_shaped):
+        """Check which sparse frequency grids are log-uniform
+
+        Args:
+            freqs_shaped (double xp.ndarray): Sparse frequencies with shape
+                ``(num_bin_all, length)``.
+
+        Returns:
+            tuple: ``(log_f0, inv_dlogf, log_uniform)`` as host arrays. ``log_f0``
+                is the log of the first frequency, ``inv_dlogf`` is the inverse
+                of the log spacing, and ``log_uniform`` is a boolean array
+                indicating which binaries have log-uniform grids.
+
+        """
+        if self.always_search or freqs_shaped.shape[1] < 2:
+            log_uniform = np.zeros(freqs_shaped.shape[0], dtype=bool)
+            return (
+                np.zeros(freqs_shaped.shape[0]),
+                np.zeros(freqs_shaped.shape[0]),
+                log_uniform,
+            )
+
+        log_f = self.xp.log(freqs_shaped)
+        dlogf = self.xp.diff(log_f, axis=1)
+        dlogf_mean = (log_f[:, -1] - log_f[:, 0]) / (freqs_shaped.shape[1] - 1)
+
+        log_uniform = self.xp.all(
+            self.xp.abs(dlogf - dlogf_mean[:, None])
+            <= self.log_uniform_rtol * self.xp.abs(dlogf_mean[:, None]),
+            axis=1,
+        ) & (dlogf_mean > 0.0)
+
+        out = [
+            log_f[:, 0],
+            1.0 / self.xp.where(log_uniform, dlogf_mean, 1.0),
+            log_uniform,
+        ]
+        try:
+            out = [tmp.get() for tmp in out]
+        except AttributeError:
+            pass
+
+        return tuple(np.ascontiguousarray(tmp) for tmp in out)
+
     def __call__(
         self,
         data_freqs,
@@ -97,6 +237,7 @@ class TemplateInterpFD:
         length,
         num_modes,
         num_channels,
+        mode_mask=None,
     ):
         """Generate frequency domain template via interpolation.
 
@@ -110,11 +251,16 @@ class TemplateInterpFD:
             data_freqs (double xp.ndarray): Frequencies to interpolate to.
             interp_container (obj): ``container`` attribute from the interpolant
                 class: :class:`CubicSplineInterpolant <bbhx.utils.interpolate.CubicSplineInterpolant>`.
+                If ``mixed_precision`` is ``True``, this is the ``mixed_container`` attribute.
             t_start (double xp.ndarray): Array of start times (sec) for each binary.
             t_end (double xp.ndarray): Array of end times (sec) for each binary.
             length (int): Length of original frequency array.
             num_modes (int): Number of harmonics.
             num_channels (int): Number of channels in data.
+            mode_mask (bool array-like, optional): Per-binary mask with shape
+                ``(num_bin_all, num_modes)``. Harmonics where the mask is ``False``
+                are skipped. See :mod:`bbhx.utils.modeselect`. If ``None``,
+                all harmonics are included. (Default: ``None``)
 
         Returns:
             list: List of template arrays for all binaries.
@@ -131,7 +277,30 @@ class TemplateInterpFD:
         self.num_channels = num_channels
 
         # unpack interp_container
-        (freqs, y, c1, c2, c3) = interp_container
+        # (x, y, c1, c2, c3) or (x, y_hp, c1_hp, c2_hp, c3_hp, y_lp, c1_lp, c2_lp, c3_lp)
+        if len(interp_container) != (9 if self.mixed_precision else 5):
+            raise ValueError(
+                "interp_container does not match the mixed_precision setting of TemplateInterpFD."
+            )
+
+        freqs = interp_container[0]
+        spline_arrays = interp_container[1:]
+
+        if self.blocked:
+            # interleave all spline information of each segment
+            # the buffer is reused between calls of the same size
+            y = spline_arrays[0]
+            if self.spline_blocked is None or self.spline_blocked.size != 4 * y.size:
+                self.spline_blocked = self.xp.empty(4 * y.size, dtype=self.xp.float64)
+
+            self.pack_gen(
+                self.spline_blocked,
+                *spline_arrays,
+                self.length,
+                self.num_bin_all,
+                self.num_modes,
+            )
+            spline_arrays = (self.spline_blocked,)
 
         freqs_shaped = freqs.reshape(self.num_bin_all, -1)
 
@@ -149,67 +318,87 @@ class TemplateInterpFD:
             ]
         )
 
-        # find proper interpolation window for each point in data stream
-        inds = [
-            self.xp.searchsorted(
-                freqs_shaped[i], data_freqs[st:et], side="right"
-            ).astype(self.xp.int32)
-            - 1
-            for i, (st, et) in enumerate(inds_start_and_end)
-        ]
-
-        # lengths of the signals in frequency domain
-        self.lengths = lengths = np.asarray(
-            [len(inds_i) for inds_i in inds], dtype=self.xp.int32
-        )
-
         # make sure have this quantity available on CPU
         try:
-            temp_inds = inds_start_and_end[:, 0].get()
+            temp_inds = inds_start_and_end.get()
         except AttributeError:
-            temp_inds = inds_start_and_end[:, 0]
+            temp_inds = inds_start_and_end
 
         # where to start filling waveform
-        self.start_inds = start_inds = (temp_inds.copy()).astype(np.int32)
+        self.start_inds = start_inds = (temp_inds[:, 0].copy()).astype(np.int32)
 
-        # get pointers to all the index arrays of different length
-        try:
-            self.ptrs = ptrs = np.asarray([ind_i.data.ptr for ind_i in inds])
-        except AttributeError:
-            self.ptrs = ptrs = np.asarray(
-                [ind_i.__array_interface__["data"][0] for ind_i in inds]
+        # lengths of the signals in frequency domain
+        self.lengths = lengths = (temp_inds[:, 1] - temp_inds[:, 0]).astype(
+            np.int32
+        )
+
+        # on log-uniform grids the interpolation window is computed in the kernel
+        log_f0, inv_dlogf, self.log_uniform = self._get_log_uniform_info(
+            freqs_shaped
+        )
+
+        # log of the data frequencies is only recomputed when their values change
+        # a copy is kept, so in-place changes to data_freqs are detected
+        if not np.any(self.log_uniform):
+            # not read by the kernel
+            log_data_freqs = data_freqs
+
+        else:
+            src = self._log_data_freqs_src
+            if (
+                src is None
+                or src.shape != data_freqs.shape
+                or not bool(self.xp.array_equal(src, data_freqs))
+            ):
+                self._log_data_freqs = self.xp.log(data_freqs)
+                self._log_data_freqs_src = data_freqs.copy()
+
+            log_data_freqs = self._log_data_freqs
+
+        # find proper interpolation window for each point in data stream
+        # only needed for binaries that do not have log-uniform grids
+        # a NULL pointer tells the kernel to compute the window directly
+        inds = []
+        self.ptrs = ptrs = np.zeros(self.num_bin_all, dtype=np.int64)
+        for i in np.where(~self.log_uniform)[0]:
+            st, et = temp_inds[i]
+            inds_i = (
+                self.xp.searchsorted(
+                    freqs_shaped[i], data_freqs[st:et], side="right"
+                ).astype(self.xp.int32)
+                - 1
             )
+            inds.append(inds_i)
+
+            ptrs[i] = get_ptr(inds_i)
 
         # initialize template information
+        # all templates are stored in one contiguous buffer
+        # so the pointers are offsets from its start
+        offsets = np.zeros(self.num_bin_all, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths[:-1], dtype=np.int64) * self.num_channels
+
+        self.template_buffer = self.xp.zeros(
+            int(self.num_channels * lengths.sum()), dtype=self.xp.complex128
+        )
         self.template_carrier = [
-            self.xp.zeros(
-                int(self.num_channels * temp_length), dtype=self.xp.complex128,
-            )
-            for temp_length in lengths
+            self.template_buffer[start : start + self.num_channels * temp_length]
+            for start, temp_length in zip(offsets, lengths)
         ]
 
         # get pointers to template carriers so they can be run in streams
-        try:
-            template_carrier_ptrs = np.asarray(
-                [temp_carrier.data.ptr for temp_carrier in self.template_carrier]
-            )
-        except AttributeError:
-            template_carrier_ptrs = np.asarray(
-                [
-                    temp_carrier.__array_interface__["data"][0]
-                    for temp_carrier in self.template_carrier
-                ]
-            )
+        self.template_carrier_ptrs = template_carrier_ptrs = (
+            get_ptr(self.template_buffer)
+            + offsets * self.template_buffer.itemsize
+        )
 
         # fill templates
         self.template_gen(
             template_carrier_ptrs,
             data_freqs,
+            log_data_freqs,
             freqs,
-            y,
-            c1,
-            c2,
-            c3,
+            *spline_arrays,
             t_start,
             t_end,
             self.length,
@@ -217,13 +406,65 @@ class TemplateInterpFD:
             self.num_bin_all,
             self.num_modes,
             ptrs,
+            log_f0,
+            inv_dlogf,
             start_inds,
             lengths,
+            prepare_mode_mask(mode_mask, self.num_bin_all, self.num_modes, self.xp),
         )
 
         # return templates in the right shape
         return self.template_channels
 
+    def inject(self, data_out, start_offset=0):
+        """Add the most recently generated templates into a data stream.
+
+        Templates are scatter-added in C/CUDA so overlapping templates
+        accumulate properly in ``data_out``.
+
+        Args:
+            data_out (complex128 xp.ndarray): C-contiguous array of shape
+                ``(self.num_channels, data_length)`` that is added to in place.
+            start_offset (int, optional): Index in the full data stream that
+                corresponds to the first entry in ``data_out``. This allows
+                for injecting into a slab of the full data stream. Templates
+                are clipped to the slab, so only the parts that overlap it
+                are added. (Default: ``0``)
+
+        Raises:
+            ValueError: ``data_out`` has the wrong shape or dtype.
+
+        """
+        if data_out.ndim != 2 or data_out.shape[0] != self.num_channels:
+            raise ValueError(
+                f"data_out must have shape ({self.num_channels}, data_length). Current shape is {data_out.shape}."
+            )
+
+        if data_out.dtype != self.xp.complex128 or not data_out.flags.c_contiguous:
+            raise ValueError("data_out must be a C-contiguous complex128 array.")
+
+        # clip the templates to the slab
+        ind_start = np.maximum(self.start_inds, start_offset)
+        ind_end = np.minimum(
+            self.start_inds + self.lengths, start_offset + data_out.shape[1]
+        )
+        lengths = np.maximum(ind_end - ind_start, 0).astype(np.int32)
+        skip = np.where(lengths > 0, ind_start - self.start_inds, 0)
+
+        start_inds = np.where(lengths > 0, ind_start - start_offset, 0).astype(np.int32)
+        template_ptrs = self.template_carrier_ptrs + skip * self.template_buffer.itemsize
+
+        self.inject_gen(
+            data_out,
+            template_ptrs,
+            start_inds,
+            lengths,
+            self.lengths,
+            data_out.shape[1],
+            self.num_bin_all,
+            self.num_channels,
+        )
+
 
 class BBHWaveformFD:
     """Generate waveforms put through response functions
@@ -236,9 +477,10 @@ class BBHWaveformFD:
     and `arXiv:2111.01064 <https://arxiv.org/abs/2111.01064>`_, as well as the papers
     listed for the waveform and response given just below.
 
-    Right now, it is hard coded to produce the waveform with
+    By default, it produces the waveform with
     :class:`PhenomHMAmpPhase <bbhx.waveforms.phenomhm.PhenomHMAmpPhase>`. This can also be used
-    to produce PhenomD. See the docs for that waveform. The papers describing PhenomHM/PhenomD
+    to produce PhenomD. Other amplitude-phase models can be plugged in with ``amp_phase_gen``
+    (see :class:`ExternalAmpPhase <bbhx.waveforms.external.ExternalAmpPhase>`). See the docs for that waveform. The papers describing PhenomHM/PhenomD
     waveforms are here: `arXiv:1708.00404 <https://arxiv.org/abs/1708.00404>`_,
     `arXiv:1508.07250 <https://arxiv.org/abs/1508.07250>`_, and
     `arXiv:1508.07253 <https://arxiv.org/abs/1508.07253>`_.
@@ -253,58 +495,139 @@ class BBHWaveformFD:
     Args:
         amp_phase_kwargs (dict, optional): Keyword arguments for the
             initialization of the ampltidue-phase waveform class: :class:`PhenomHMAmpPhase <bbhx.waveforms.phenomhm.PhenomHMAmpPhase>`.
+            Ignored if ``amp_phase_gen`` is given.
         response_kwargs (dict, optional): Keyword arguments for the initialization
             of the response class: :class:`LISATDIResponse <bbhx.response.fastfdresponse.LISATDIResponse`.
         interp_kwargs (dict, optional): Keyword arguments for the initialization
-            of the interpolation class: :class:`TemplateInterpFD`.
+            of the interpolation class: :class:`TemplateInterpFD`. Pass
+            ``mixed_precision=True`` here for mixed-precision interpolation.
         use_gpu (bool, optional): If ``True``, use a GPU. (Default: ``False``)
+        amp_phase_gen (obj, optional): Amplitude-phase waveform generator. It
+            must have the same call signature and attributes (``freqs``, ``modes``,
+            ``allowable_modes``, ``citation``) as
+            :class:`PhenomHMAmpPhase <bbhx.waveforms.phenomhm.PhenomHMAmpPhase>` and fill
+            the amplitude, phase, and :math:`t_f` into the first three parameters of
+            ``out_buffer``. If ``None``, use
+            :class:`PhenomHMAmpPhase <bbhx.waveforms.phenomhm.PhenomHMAmpPhase>`.
+            (Default: ``None``)
+        param_transform (obj, optional): Transformation applied to ``params`` in
+            :meth:`call_params` (e.g.
+            :class:`SamplerTransform <bbhx.utils.transform.SamplerTransform>`).
+            It must return the parameters in the order of :meth:`__call__`.
+            If ``None``, ``params`` are passed on directly. (Default: ``None``)
 
     Attributes:
-        amp_phase_gen (obj): Waveform generation class.
+        amp_phase_gen (obj): Waveform generation class. Its output buffer is
+            shared with the response, so after a call its phase includes the
+            response phase delay.
         data_length (int): Length of the final output data.
+        interp_container (list): Spline container from the last interpolated call.
         interp_response (obj): Interpolation class.
         length (int): Length of initial evaluations of waveform and response.
+        mode_mask (np.ndarray): Per-binary mode mask used in the last call
+            with shape ``(num_bin_all, num_modes)`` or ``None`` if all
+            harmonics were computed.
         num_bin_all (int): Total number of binaries analyzed.
         num_interp_params (int): Number of parameters to interpolate (9).
         num_modes (int): Number of harmonic modes.
+        param_transform (obj): Transformation applied to ``params`` in :meth:`call_params`.
+        profile_kwargs (dict): Default ``length`` and ``modes`` for waveform
+            calls from the profile given to :meth:`from_profile`. Empty otherwise.
         out_buffer_final (xp.ndarray): Array with buffer information with shape:
             ``(self.num_interp_params, self.num_bin_all, self.num_modes, self.length)``.
             The order of the parameters is amplitude, phase, t-f, transferL1re, transferL1im,
             transferL2re, transferL2im, transferL3re, transferL3im.
+            It is overwritten by the next call with the same buffer size.
         response_gen (obj): Response generation class.
+        t_end (double np.ndarray): End times from the last interpolated call.
+        t_start (double np.ndarray): Start times from the last interpolated call.
         use_gpu (bool): A GPU is being used if ``use_gpu==True``.
         waveform_gen (obj): Direct summation waveform generation class.
+        waveform_modes_gen (obj): Direct waveform generation class that keeps
+            each harmonic separate.
         xp (obj): Either ``numpy`` or ``cupy``.
 
     """
 
     def __init__(
-        self, amp_phase_kwargs={}, response_kwargs={}, interp_kwargs={}, use_gpu=False,
+        self,
+        amp_phase_kwargs={},
+        response_kwargs={},
+        interp_kwargs={},
+        use_gpu=False,
+        amp_phase_gen=None,
+        param_transform=None,
     ):
 
         # initialize waveform and response funtions
-        self.amp_phase_gen = PhenomHMAmpPhase(**amp_phase_kwargs, use_gpu=use_gpu)
+        if amp_phase_gen is None:
+            amp_phase_gen = PhenomHMAmpPhase(**amp_phase_kwargs, use_gpu=use_gpu)
+
+        elif getattr(amp_phase_gen, "use_gpu", use_gpu) != use_gpu:
+            raise ValueError("amp_phase_gen must use the same device as this class.")
+
+        self.amp_phase_gen = amp_phase_gen
         self.response_gen = LISATDIResponse(**response_kwargs, use_gpu=use_gpu)
 
         self.use_gpu = use_gpu
         if use_gpu:
             self.xp = xp
             self.waveform_gen = direct_sum_wrap_gpu
+            self.waveform_modes_gen = direct_sum_modes_wrap_gpu
         else:
             self.xp = np
             self.waveform_gen = direct_sum_wrap_cpu
+            self.waveform_modes_gen = direct_sum_modes_wrap_cpu
 
         self.num_interp_params = 9
 
         # setup the final interpolant
         self.interp_response = TemplateInterpFD(**interp_kwargs, use_gpu=use_gpu)
+        self.param_transform = param_transform
+        self.profile_kwargs = {}
+        self._out_buffer = None
+
+    @classmethod
+    def from_profile(cls, profile, use_gpu=False, **kwargs):
+        """Initialize from a settings profile
+
+        The initialization keyword arguments are taken from the profile.
+        The keyword arguments for waveform calls (``length`` and ``modes``)
+        are stored in :attr:`profile_kwargs` and used as defaults in each call.
+
+        Args:
+            profile (str or dict): Path to a profile or a profile dictionary
+                (see :class:`Autotuner <bbhx.autotune.Autotuner>`).
+            use_gpu (bool, optional): If ``True``, use a GPU. (Default: ``False``)
+            **kwargs (dict, optional): Other keyword arguments for the initialization.
+
+        Returns:
+            :class:`BBHWaveformFD`: Waveform generator.
+
+        """
+        profile = load_profile(profile)
+        wave_gen = cls(
+            amp_phase_kwargs=profile["amp_phase_kwargs"],
+            response_kwargs=profile["response_kwargs"],
+            interp_kwargs=profile["interp_kwargs"],
+            use_gpu=use_gpu,
+            **kwargs,
+        )
+        wave_gen.profile_kwargs = profile["waveform_kwargs"]
+        return wave_gen
 
     @property
     def citation(self):
         """Citations for this class"""
-        return (
-            katz_citations + marsat_1 + marsat_2 + phenomhm_citation + phenomd_citations
-        )
+        if isinstance(self.amp_phase_gen, PhenomHMAmpPhase):
+            return (
+                katz_citations
+                + marsat_1
+                + marsat_2
+                + phenomhm_citation
+                + phenomd_citations
+            )
+        return self.amp_phase_gen.citation + marsat_1 + marsat_2
 
     def __call__(
         self,
@@ -331,6 +654,7 @@ class BBHWaveformFD:
         squeeze=False,
         fill=False,
         combine=False,
+        mode_mask=None,
     ):
         """Generate the binary black hole frequency-domain TDI waveforms
 
@@ -367,10 +691,14 @@ class BBHWaveformFD:
                 If ``length`` is also given, the interpolants interpolate to these
                 frequencies. If ``length`` is not given, the waveform amplitude, phase,
                 and response will be directly evaluated at these frequencies. In this case,
-                a 2D np.ndarray can also be provided. (Default: ``None``)
+                a 2D np.ndarray can also be provided. If ``None`` and ``direct`` is ``False``,
+                the splines are returned without interpolation (see :class:`SplineBank <bbhx.utils.splinebank.SplineBank>`).
+                (Default: ``None``)
             length (int, optional): Number of frequencies to use in sparse array for
-                interpolation.
-            modes (list, optional): Harmonic modes to use. If not given, they will
+                interpolation. If not given, the value in :attr:`profile_kwargs`
+                is used (if any).
+            modes (list, optional): Harmonic modes to use. If not given, the modes
+                in :attr:`profile_kwargs` are used. Otherwise, they will
                 default to those available in the waveform model. For PhenomHM:
                 [(2,2), (3,3), (4,4), (2,1), (3,2), (4,3)]. For PhenomD: [(2,2)].
                 (Default: ``None``)
@@ -386,15 +714,28 @@ class BBHWaveformFD:
             fill (bool, optional): If ``True``, fill data streams according to the ``combine``
                 keyword argument. If ``False, returns information for the fast likelihood functions.
             combine (bool, optional): If ``True``, combine all waveforms into the same output
-                data stream. (Default: ``False``)
+                data stream. Overlapping waveforms are summed. For large catalogs, see
+                :class:`CatalogInjectionFD <bbhx.injection.CatalogInjectionFD>`. (Default: ``False``)
+            mode_mask (bool array-like or callable, optional): Per-binary harmonic
+                selection. A boolean array with shape ``(num_bin_all, num_modes)``
+                is applied in every stage: harmonics where it is ``False`` are
+                skipped in the amplitude-phase generation, the response, and the
+                template construction. A callable is evaluated after the
+                amplitude-phase generation as
+                ``mode_mask(freqs, amp, inc, modes)`` with the sparse frequencies
+                and amplitudes and must return such an array, which is then applied
+                in the response and template construction
+                (e.g. :func:`mode_mask_from_power <bbhx.utils.modeselect.mode_mask_from_power>`).
+                In both cases, the sparse arrays and splines of masked harmonics are zero.
+                If ``None``, all harmonics are computed. (Default: ``None``)
 
 
         Returns:
             xp.ndarray: Shape ``(3, self.length, self.num_bin_all)``.
                 Final waveform for each binary. If ``direct==True`` and ``compress==True``.
                 # TODO: switch dimensions?
-            xp.ndarray:  Shape ``(3, self.num_modes, self.length, self.num_bin_all)``.
-                Final waveform for each binary. If ``direct==True`` and ``compress==False``.
+            xp.ndarray:  Shape ``(self.num_bin_all, 3, self.num_modes, self.length)``.
+                Final waveform for each binary and harmonic. If ``direct==True`` and ``compress==False``.
             xp.ndarray:  Shape ``(3, self.data_length)``.
                 Final waveform of all binaries in the same data stream.
                 If ``fill==True`` and ``combine==True``.
@@ -405,6 +746,10 @@ class BBHWaveformFD:
                 First entry is ``template_channels`` property from :class:`TemplateInterpFD`.
                 Second entry is ``start_inds`` attribute from ``self.interp_response``.
                 Third entry is ``lengths`` attribute from ``self.interp_response``.
+            tuple: Spline information if ``freqs`` is ``None`` and ``direct`` is ``False``.
+                First entry is the ``container`` (or ``mixed_container``) of
+                :class:`CubicSplineInterpolant <bbhx.utils.interpolate.CubicSplineInterpolant>`.
+                Second and third entries are the start and end times with shape ``(num_bin_all,)``.
 
         Raises:
             ValueError: ``length`` and ``freqs`` not given. Modes are given but not in a list.
@@ -412,6 +757,13 @@ class BBHWaveformFD:
 
         """
 
+        # tuned settings from a profile are the defaults
+        if length is None:
+            length = self.profile_kwargs.get("length", None)
+
+        if modes is None:
+            modes = self.profile_kwargs.get("modes", None)
+
         # make sure everything is at least a 1D array
         m1 = np.atleast_1d(m1)
         m2 = np.atleast_1d(m2)
@@ -470,7 +822,8 @@ class BBHWaveformFD:
 
         # this means the frequencies are what needs to be interpolated to
         elif direct is False:
-            self.data_length = len(freqs)
+            if freqs is not None:
+                self.data_length = len(freqs)
             if length is None:
                 raise ValueError("If direct is False, length parameter must be given.")
 
@@ -487,14 +840,23 @@ class BBHWaveformFD:
 
         self.num_bin_all = len(m1)
 
-        out_buffer = self.xp.zeros(
-            (self.num_interp_params * self.length * self.num_modes * self.num_bin_all)
-        )
+        # the sparse buffer is reused by calls of the same size (e.g. chunked batches)
+        buffer_size = self.num_interp_params * self.length * self.num_modes * self.num_bin_all
+        if self._out_buffer is None or len(self._out_buffer) != buffer_size:
+            self._out_buffer = self.xp.zeros(buffer_size)
+        else:
+            self._out_buffer[:] = 0.0
+
+        out_buffer = self._out_buffer
 
         freqs_temp = freqs if direct else None
 
         phi_ref_amp_phase = np.zeros_like(m1)
 
+        # a callable mode mask needs the amplitudes
+        # so it is only applied after the amplitude-phase generation
+        mode_mask_amp_phase = None if callable(mode_mask) else mode_mask
+
         self.amp_phase_gen(
             m1,
             m2,
@@ -508,15 +870,22 @@ class BBHWaveformFD:
             freqs=freqs_temp,
             out_buffer=out_buffer,
             modes=modes,
+            mode_mask=mode_mask_amp_phase,
         )
 
+        if callable(mode_mask):
+            mode_mask = mode_mask(
+                self.amp_phase_gen.freqs_shaped,
+                self.amp_phase_gen.amp,
+                inc,
+                self.amp_phase_gen.modes,
+            )
+
+        self.mode_mask = mode_mask
+
         # setup buffer to carry around all the quantities of interest
         # params are amp, phase, tf, transferL1re, transferL1im, transferL2re, transferL2im, transferL3re, transferL3im
-        out_buffer = out_buffer.reshape(
-            self.num_interp_params, self.num_bin_all, self.num_modes, self.length
-        )
-
-        out_buffer = out_buffer.flatten().copy()
+        # it is already flat with shape (num_interp_params, num_bin_all, num_modes, length)
 
         # compute response function
         self.response_gen(
@@ -529,9 +898,18 @@ class BBHWaveformFD:
             length,
             out_buffer=out_buffer,  # fill into this buffer
             modes=self.amp_phase_gen.modes,
+            mode_mask=mode_mask,
         )
 
-        # for checking
+        # masked harmonics skip the response, so clear everything else computed
+        # for them (e.g. the amplitudes for a callable mask) before the spline solve
+        if mode_mask is not None:
+            keep = self.xp.asarray(mode_mask, dtype=bool)
+            out_buffer.reshape(9, self.num_bin_all, self.num_modes, self.length)[
+                :, ~keep
+            ] = 0.0
+
+        # for checking (copy, the sparse buffer is reused by the next call)
         self.out_buffer_final = out_buffer.reshape(
             9, self.num_bin_all, self.num_modes, self.length
         ).copy()
@@ -554,6 +932,7 @@ class BBHWaveformFD:
                 self.num_modes,
                 self.xp.asarray(t_start),
                 self.xp.asarray(t_end),
+                prepare_mode_mask(mode_mask, self.num_bin_all, self.num_modes, self.xp),
             )
 
             out = templateChannels.reshape(self.num_bin_all, 3, self.length)
@@ -564,34 +943,28 @@ class BBHWaveformFD:
             return out
 
         elif direct:
-            out = self.xp.zeros(
-                (self.num_bin_all, 3, self.num_modes, self.length),
+            # setup template
+            templateChannels = self.xp.zeros(
+                (self.num_bin_all * 3 * self.num_modes * self.length),
                 dtype=self.xp.complex128,
             )
-            for mode_i in range(self.num_modes):
-                # setup template
-                templateChannels = self.xp.zeros(
-                    (self.num_bin_all * 3 * self.length), dtype=self.xp.complex128
-                )
 
-                out_buffer_temp = (
-                    self.out_buffer_final[:, :, mode_i, :].copy().flatten()
-                )
-                # direct computation of 3 channel waveform
-                self.waveform_gen(
-                    templateChannels,
-                    out_buffer_temp,
-                    self.num_bin_all,
-                    self.length,
-                    3,
-                    1,  # num_modes
-                    self.xp.asarray(t_start),
-                    self.xp.asarray(t_end),
-                )
+            # direct computation of 3 channel waveform for each harmonic
+            self.waveform_modes_gen(
+                templateChannels,
+                out_buffer,
+                self.num_bin_all,
+                self.length,
+                3,
+                self.num_modes,
+                self.xp.asarray(t_start),
+                self.xp.asarray(t_end),
+                prepare_mode_mask(mode_mask, self.num_bin_all, self.num_modes, self.xp),
+            )
 
-                out[:, :, mode_i, :] += templateChannels.reshape(
-                    self.num_bin_all, 3, self.length
-                )
+            out = templateChannels.reshape(
+                self.num_bin_all, 3, self.num_modes, self.length
+            )
 
             if squeeze:
                 out = out.squeeze()
@@ -609,25 +982,44 @@ class BBHWaveformFD:
                 num_modes=self.num_modes,
                 num_bin_all=self.num_bin_all,
                 use_gpu=self.use_gpu,
+                mixed_precision=self.interp_response.mixed_precision,
+            )
+
+            interp_container = (
+                spline.mixed_container
+                if self.interp_response.mixed_precision
+                else spline.container
             )
 
+            self.interp_container = interp_container
+            self.t_start = t_start
+            self.t_end = t_end
+
+            # splines only
+            # copies, because the sparse buffer is reused by the next call
+            if freqs is None:
+                return [tmp.copy() for tmp in interp_container], t_start, t_end
+
             # TODO: try single block reduction for likelihood (will probably be worse for smaller batch, but maybe better for larger batch)?
 
             template_channels = self.interp_response(
-                freqs, spline.container, t_start, t_end, self.length, self.num_modes, 3,
+                freqs,
+                interp_container,
+                t_start,
+                t_end,
+                self.length,
+                self.num_modes,
+                3,
+                mode_mask=mode_mask,
             )
 
             # fill the data stream
             if fill:
                 if combine:
                     # combine into one data stream
+                    # overlapping templates are summed
                     data_out = self.xp.zeros((3, len(freqs)), dtype=self.xp.complex128)
-                    for temp, start_i, length_i in zip(
-                        template_channels,
-                        self.interp_response.start_inds,
-                        self.interp_response.lengths,
-                    ):
-                        data_out[:, start_i : start_i + length_i] = temp
+                    self.interp_response.inject(data_out)
 
                     if squeeze:
                         return data_out.squeeze()
@@ -656,3 +1048,23 @@ class BBHWaveformFD:
                     self.interp_response.start_inds,
                     self.interp_response.lengths,
                 )
+
+    def call_params(self, params, **kwargs):
+        """Generate waveforms from a parameter array
+
+        ``params`` are first mapped with :attr:`param_transform` (if given),
+        so sampler coordinates can be passed directly.
+
+        Args:
+            params (double xp.ndarray): Parameters with shape
+                ``(num_params, num_bin_all)``. With :attr:`param_transform`
+                set, these are its input parameters. Otherwise, they are the
+                positional arguments of :meth:`__call__` in order.
+            **kwargs (dict, optional): Keyword arguments for :meth:`__call__`.
+
+        Returns:
+            See :meth:`__call__`.
+
+        """
+        params = apply_param_transform(self.param_transform, params)
+        return self(*params, **kwargs)
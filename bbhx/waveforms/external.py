@@ -0,0 +1,288 @@
+# Adapter for external amplitude-phase waveform models
+
+# Copyright (C) 2021 Michael L. Katz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+try:
+    import cupy as xp
+
+except (ImportError, ModuleNotFoundError) as e:
+    import numpy as xp
+
+from ..utils.constants import *
+from ..utils.citations import *
+from ..utils.modeselect import prepare_mode_mask
+
+
+class ExternalAmpPhase:
+    """Use an external amplitude-phase model in the waveform pipeline
+
+    This class wraps any batched frequency-domain model that returns the
+    amplitude and phase of each harmonic (e.g. an EOB model) and packs
+    the output into the same amplitude/phase/:math:`t_f` layout produced by
+    :class:`PhenomHMAmpPhase <bbhx.waveforms.phenomhm.PhenomHMAmpPhase>`.
+    It can therefore be passed to
+    :class:`BBHWaveformFD <bbhx.waveformbuild.BBHWaveformFD>` as
+    ``amp_phase_gen``, and the response, interpolation, and likelihood
+    classes work unchanged.
+
+    ``model`` is called once per batch as
+    ``model(m1, m2, chi1z, chi2z, distance, phi_ref, f_ref, freqs, modes)``.
+    Masses are in Solar masses (with :math:`m_1\\geq m_2`), the distance is in m,
+    and ``freqs`` has shape ``(num_bin_all, length)``. It must return
+    ``(amp, phase)`` or ``(amp, phase, tf)`` with each array having shape
+    ``(num_bin_all, num_modes, length)``. The waveform should be referenced to
+    :math:`t=0`, i.e. :math:`t_f=\\frac{1}{2\\pi}\\frac{d\\Phi}{df}` is the time
+    relative to the reference time. ``t_ref`` is added afterwards like in
+    :class:`PhenomHMAmpPhase <bbhx.waveforms.phenomhm.PhenomHMAmpPhase>`.
+    If ``tf`` is not returned, it is computed from the phase
+    with second-order finite differences.
+
+    This class has GPU capability (the output is moved to the GPU).
+
+    Args:
+        model (callable): Batched amplitude-phase model.
+        allowable_modes (list): Harmonic modes ``(l, m)`` available from ``model``.
+        use_gpu (bool, optional): If ``True``, store the output on the GPU.
+            (Default: ``False``)
+        mf_min (double, optional): Dimensionless minimum frequency used when
+            ``freqs`` are not given. (Default: ``1e-4``)
+        mf_max (double, optional): Dimensionless maximum frequency used when
+            ``freqs`` are not given. (Default: ``6e-1``)
+        citation (str, optional): Citation for ``model``. (Default: ``""``)
+
+    Attributes:
+        allowable_modes (list): Harmonic modes available from ``model``.
+        length (int): Length of the frequency array for each binary.
+        mf_max (double): Dimensionless maximum frequency used when ``freqs`` are not given.
+        mf_min (double): Dimensionless minimum frequency used when ``freqs`` are not given.
+        model (callable): Batched amplitude-phase model.
+        modes (list): Harmonic modes from the last call.
+        num_bin_all (int): Number of binaries from the last call.
+        num_modes (int): Number of harmonic modes from the last call.
+        use_gpu (bool): If ``True``, use the GPU.
+        waveform_carrier (xp.ndarray): Carrier for amplitude, phase, and tf information.
+        xp (obj): numpy or cupy
+
+    """
+
+    def __init__(
+        self,
+        model,
+        allowable_modes,
+        use_gpu=False,
+        mf_min=1e-4,
+        mf_max=0.6,
+        citation="",
+    ):
+
+        self.model = model
+        self.allowable_modes = list(allowable_modes)
+        self.mf_min = mf_min
+        self.mf_max = mf_max
+        self._citation = citation
+
+        self.use_gpu = use_gpu
+        self.xp = xp if use_gpu else np
+
+    @property
+    def citation(self):
+        """Return citations for this class"""
+        return katz_citations + self._citation
+
+    @property
+    def freqs(self):
+        """Get the flat freqs array"""
+        return self._freqs
+
+    @property
+    def freqs_shaped(self):
+        """Get the freqs array with shape ``(num_bin_all, length)``"""
+        return self._freqs.reshape(self.num_bin_all, self.length)
+
+    @property
+    def amp(self):
+        """Get the amplitude array with shape ``(num_bin_all, num_modes, length)``"""
+        return self.waveform_carrier[: self.num_per_param].reshape(
+            self.num_bin_all, self.num_modes, self.length
+        )
+
+    @property
+    def phase(self):
+        """Get the phase array with shape ``(num_bin_all, num_modes, length)``"""
+        return self.waveform_carrier[
+            self.num_per_param : 2 * self.num_per_param
+        ].reshape(self.num_bin_all, self.num_modes, self.length)
+
+    @property
+    def tf(self):
+        """Get the tf array with shape ``(num_bin_all, num_modes, length)``"""
+        return self.waveform_carrier[
+            2 * self.num_per_param : 3 * self.num_per_param
+        ].reshape(self.num_bin_all, self.num_modes, self.length)
+
+    def _gradient(self, y, x):
+        """Derivative along the last axis on non-uniform grids
+
+        Second-order accurate in the interior and first-order at the edges.
+
+        Args:
+            y (xp.ndarray): Values with shape ``(num_bin_all, num_modes, length)``.
+            x (xp.ndarray): Grid with shape ``(num_bin_all, length)``.
+
+        Returns:
+            xp.ndarray: Derivative with the same shape as ``y``.
+
+        """
+        x = x[:, self.xp.newaxis, :]
+        out = self.xp.empty_like(y)
+
+        h1 = x[:, :, 1:-1] - x[:, :, :-2]
+        h2 = x[:, :, 2:] - x[:, :, 1:-1]
+        out[:, :, 1:-1] = (
+            h1**2 * y[:, :, 2:] - h2**2 * y[:, :, :-2] + (h2**2 - h1**2) * y[:, :, 1:-1]
+        ) / (h1 * h2 * (h1 + h2))
+
+        out[:, :, 0] = (y[:, :, 1] - y[:, :, 0]) / (x[:, :, 1] - x[:, :, 0])
+        out[:, :, -1] = (y[:, :, -1] - y[:, :, -2]) / (x[:, :, -1] - x[:, :, -2])
+        return out
+
+    def __call__(
+        self,
+        m1,
+        m2,
+        chi1z,
+        chi2z,
+        distance,
+        phi_ref,
+        f_ref,
+        t_ref,
+        length,
+        freqs=None,
+        out_buffer=None,
+        modes=None,
+        mode_mask=None,
+    ):
+        """Generate waveforms with the external model
+
+        The arguments are the same as for
+        :meth:`PhenomHMAmpPhase.__call__ <bbhx.waveforms.phenomhm.PhenomHMAmpPhase.__call__>`.
+        ``model`` is evaluated for all harmonics, and harmonics masked
+        with ``mode_mask`` are set to zero.
+
+        Raises:
+            ValueError: Inputs or model output are not correct.
+
+        """
+
+        m1 = np.atleast_1d(m1).astype(np.float64)
+        m2 = np.atleast_1d(m2).astype(np.float64)
+        chi1z = np.atleast_1d(chi1z).astype(np.float64)
+        chi2z = np.atleast_1d(chi2z).astype(np.float64)
+        distance = np.atleast_1d(distance)
+        phi_ref = np.atleast_1d(phi_ref)
+        f_ref = np.atleast_1d(f_ref)
+        t_ref = np.atleast_1d(t_ref)
+
+        # ensure m1 > m2
+        switch = m1 < m2
+        m1[switch], m2[switch] = m2[switch], m1[switch].copy()
+        chi1z[switch], chi2z[switch] = chi2z[switch], chi1z[switch].copy()
+
+        if modes is None:
+            modes = self.allowable_modes
+
+        for mode in modes:
+            if tuple(mode) not in self.allowable_modes:
+                raise ValueError(
+                    f"Requested mode {mode} is not available. Allowable modes include {self.allowable_modes}."
+                )
+
+        self.modes = modes
+        self.length = length
+        self.num_modes = len(modes)
+        self.num_bin_all = len(m1)
+        self.num_per_param = length * self.num_modes * self.num_bin_all
+
+        # frequencies
+        if freqs is None:
+            M_tot_sec = (m1 + m2) * MTSUN_SI
+            base_freqs = np.logspace(
+                np.log10(self.mf_min), np.log10(self.mf_max), length
+            )
+            freqs_in = base_freqs[np.newaxis, :] / M_tot_sec[:, np.newaxis]
+
+        else:
+            try:
+                freqs_in = freqs.get()
+            except AttributeError:
+                freqs_in = np.asarray(freqs)
+
+            if freqs_in.ndim == 1:
+                freqs_in = np.tile(freqs_in, (self.num_bin_all, 1))
+
+        freqs_in = freqs_in.reshape(self.num_bin_all, length)
+        self._freqs = self.xp.asarray(freqs_in).flatten()
+
+        output = self.model(
+            m1, m2, chi1z, chi2z, distance, phi_ref, f_ref, freqs_in, modes
+        )
+
+        if len(output) not in [2, 3]:
+            raise ValueError("model must return (amp, phase) or (amp, phase, tf).")
+
+        shape = (self.num_bin_all, self.num_modes, length)
+        amp = self.xp.asarray(output[0], dtype=self.xp.float64)
+        phase = self.xp.asarray(output[1], dtype=self.xp.float64)
+
+        for arr in [amp, phase] + list(output[2:]):
+            if arr.shape != shape:
+                raise ValueError(
+                    f"model output must have shape {shape}. Current shape is {arr.shape}."
+                )
+
+        if len(output) == 3:
+            tf = self.xp.asarray(output[2], dtype=self.xp.float64)
+
+        else:
+            # tf = 1/(2 pi) dphi/df
+            tf = self._gradient(phase, self.xp.asarray(freqs_in)) / (2 * np.pi)
+
+        # shift to t_ref
+        freqs_shaped = self.xp.asarray(freqs_in)[:, np.newaxis, :]
+        t_ref_in = self.xp.asarray(t_ref)[:, np.newaxis, np.newaxis]
+        phase = phase + 2 * np.pi * freqs_shaped * t_ref_in
+        tf = tf + t_ref_in
+
+        if mode_mask is not None:
+            keep = prepare_mode_mask(
+                mode_mask, self.num_bin_all, self.num_modes, self.xp
+            ).reshape(self.num_bin_all, self.num_modes, 1)
+            amp, phase, tf = amp * keep, phase * keep, tf * keep
+
+        if out_buffer is None:
+            self.waveform_carrier = self.xp.zeros(
+                3 * self.num_per_param, dtype=self.xp.float64
+            )
+
+        else:
+            self.waveform_carrier = out_buffer
+
+        self.waveform_carrier[: 3 * self.num_per_param] = self.xp.concatenate(
+            [amp.flatten(), phase.flatten(), tf.flatten()]
+        )
@@ -47,6 +47,7 @@ from pyPhenomHM_cpu import (
 )
 
 from ..utils.constants import *
+from ..utils.modeselect import prepare_mode_mask
 from ..waveforms.ringdownphenomd import *
 
 
@@ -280,6 +281,7 @@ class PhenomHMAmpPhase:
         freqs=None,
         out_buffer=None,
         modes=None,
+        mode_mask=None,
     ):
         """Generate PhenomHM/D waveforms
 
@@ -311,6 +313,11 @@ class PhenomHMAmpPhase:
                 default to those available in the waveform model. For PhenomHM:
                 [(2,2), (3,3), (4,4), (2,1), (3,2), (4,3)]. For PhenomD: [(2,2)].
                 (Default: ``None``)
+            mode_mask (bool array-like, optional): Per-binary mask with shape
+                ``(num_bin_all, num_modes)``. Harmonics where the mask is ``False``
+                are not computed and are filled with zeros.
+                See :mod:`bbhx.utils.modeselect`. If ``None``, all
+                harmonics are computed. (Default: ``None``)
 
         """
 
@@ -455,6 +462,10 @@ class PhenomHMAmpPhase:
                 .copy()
             )
 
+        mode_mask_in = prepare_mode_mask(
+            mode_mask, num_bin_all, num_modes, self.xp
+        )
+
         # inside this code, t_ref is zero and phi_ref is zero
         self.waveform_gen(
             self.waveform_carrier,
@@ -473,6 +484,7 @@ class PhenomHMAmpPhase:
             self.fringdown,
             self.fdamp,
             self.run_phenomd,
+            mode_mask_in,
         )
 
         # adjust phases based on shift from t_ref
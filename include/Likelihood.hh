@@ -8,8 +8,23 @@ void hdyn(cmplx* likeOut1, cmplx* likeOut2,
                     double* dataFreqs,
                     int numBinAll, int data_length, int nChannels);
 
+void hdyn_modes(cmplx* likeOut1, cmplx* likeOut2,
+                    cmplx* templateChannels, cmplx* dataConstants,
+                    double* dataFreqs,
+                    int numBinAll, int data_length, int nChannels, int numModes);
+
+void hdyn_order(cmplx* likeOut1, cmplx* likeOut2,
+                    cmplx* templateChannels, cmplx* dataConstants,
+                    int numBinAll, int data_length, int nChannels, int order);
+
 void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weight_times_df, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int data_stream_length, int numBinAll);
 
+void direct_like_bands(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weight_times_df, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int* band_inds, int data_stream_length, int numBinAll, int numBands);
+
 void prep_hdyn_wrap(cmplx* A0_in, cmplx* A1_in, cmplx* B0_in, cmplx* B1_in, cmplx* d_arr, cmplx* h0_arr, double* S_n_arr, double df, int* bins, double* f_dense, double* f_m_arr, int data_length, int nchannels, int length_f_rel);
 
+void update_residual(cmplx* residual, double* noise_factors, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, double* factors, double* d_d_change, int data_stream_length, int numBinAll, int nChannels);
+
+void cross_terms(cmplx* h_i_h_j, long* templateChannels_ptrs_i, long* templateChannels_ptrs_j, int* inds_start_i, int* ind_lengths_i, int* inds_start_j, int* ind_lengths_j, int numPairs, int nChannels);
+
 #endif // __LIKELIHOOD_HH__
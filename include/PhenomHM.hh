@@ -367,7 +367,8 @@ void waveform_amp_phase(
     int numBinAll,
     double* Mf_RD_lm_all,
     double* Mf_DM_lm_all,
-    int run_phenomd
+    int run_phenomd,
+    int* modeMask
 );
 
 #endif // __PHENOMHM__
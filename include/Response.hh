@@ -20,6 +20,20 @@ typedef struct tagd_transferL_holder{
 } d_transferL_holder;
 
 
+// cubic spline coefficients of tabulated orbits on a uniform time grid
+// coeffs has shape (num_t - 1, NUM_ORBIT_COMPONENTS, 4) with increasing polynomial order
+// components are p0 (3), p1L (3), p2L (3), p3L (3), n1 (3), n2 (3), n3 (3)
+// if num_t == 0, the analytic equal-arm orbits are used
+#define NUM_ORBIT_COMPONENTS 21
+
+typedef struct tagd_orbits_holder{
+    double* coeffs;
+    double t0;
+    double dt;
+    int num_t;
+} d_orbits_holder;
+
+
 void LISA_response(
     double* response_out,
     int* ells_in,
@@ -34,7 +48,12 @@ void LISA_response(
     int numModes,
     int length,
     int numBinAll,
-    int includesAmps
+    int includesAmps,
+    double* orbit_coeffs,
+    double orbit_t0,
+    double orbit_dt,
+    int orbit_num_t,
+    int* modeMask
 );
 
 
@@ -0,0 +1,11 @@
+#ifndef __TRANSFORM_HH__
+#define __TRANSFORM_HH__
+
+#include "global.h"
+
+#define NUM_SAMPLER_PARAMS 11
+#define NUM_NATIVE_PARAMS 12
+
+void transform_params(double* params_out, double* params_in, int numBinAll, double f_ref, double t0);
+
+#endif // __TRANSFORM_HH__
@@ -3,10 +3,22 @@
 
 #include "global.h"
 
-void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* freqs, double* propArrays, double* c1, double* c2, double* c3, double* t_start, double* t_end, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, int* inds_start, int* ind_lengths);
+void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* propArrays, double* c1, double* c2, double* c3, double* t_start, double* t_end, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0, double* inv_dlogf, int* inds_start, int* ind_lengths, int* modeMask);
+
+void InterpTDIMixed(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* propArraysHP, double* c1HP, double* c2HP, double* c3HP, float* propArraysLP, float* c1LP, float* c2LP, float* c3LP, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0, double* inv_dlogf, int* inds_start, int* ind_lengths, int* modeMask);
+
+void pack_blocked(double* splineBlocked, double* propArrays, double* c1, double* c2, double* c3, int length, int numBinAll, int numModes);
+
+void InterpTDIBlocked(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* splineBlocked, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0, double* inv_dlogf, int* inds_start, int* ind_lengths, int* modeMask);
 
 void direct_sum(cmplx* templateChannels,
                 double* bbh_buffer,
-                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end);
+                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask);
+
+void direct_sum_modes(cmplx* templateChannels,
+                double* bbh_buffer,
+                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask);
+
+void inject_templates(cmplx* dataOut, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int* template_strides, int data_length, int numBinAll, int nChannels);
 
 #endif // __WAVEFORM_BUILD_HH__
@@ -0,0 +1,96 @@
+"""Microbenchmark of the Python overhead at the Cython kernel boundary
+
+Compares, for a single binary (num_bin_all=1):
+
+* calling a wrapped kernel through ``pointer_adjust`` (pointer lookup per call),
+* the same kernel through a ``PreparedCall`` (pointers resolved once),
+* a full ``BBHWaveformFD`` call with a short data stream.
+
+The kernel is ``inject_templates`` with a very short template, so its
+run time is negligible and the measured time is the call overhead.
+
+Usage: python scripts/benchmark_call_overhead.py [--number N]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from pyWaveformBuild_cpu import inject_templates_wrap
+
+from bbhx.waveformbuild import BBHWaveformFD
+from bbhx.utils.constants import *
+from bbhx.utils.utility import PreparedCall, pointer_array
+
+
+def best_time(func, number, repeat=5):
+    """Best time per call in microseconds."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def main(number):
+
+    # kernel boundary only
+    num_channels = 3
+    template_length = 16
+    data_length = 64
+    data_out = np.zeros((num_channels, data_length), dtype=np.complex128)
+    template = np.zeros(num_channels * template_length, dtype=np.complex128)
+    template_ptrs = pointer_array([template])
+    inds_start = np.zeros(1, dtype=np.int32)
+    ind_lengths = np.full(1, template_length, dtype=np.int32)
+
+    args = (
+        data_out,
+        template_ptrs,
+        inds_start,
+        ind_lengths,
+        ind_lengths,
+        data_length,
+        1,
+        num_channels,
+    )
+
+    prepared = PreparedCall(inject_templates_wrap, *args)
+
+    t_adjust = best_time(lambda: inject_templates_wrap(*args), number)
+    t_prepared = best_time(prepared, number)
+
+    print(f"kernel call with pointer_adjust: {t_adjust:8.2f} us")
+    print(f"kernel call with PreparedCall:   {t_prepared:8.2f} us")
+
+    # full waveform for one binary
+    wave_gen = BBHWaveformFD(amp_phase_kwargs=dict(run_phenomd=False))
+    params = np.array(
+        [
+            1e6,
+            5e5,
+            0.2,
+            0.4,
+            18e3 * PC_SI * 1e6,
+            0.0,
+            0.0,
+            np.pi / 3.0,
+            np.pi / 5.0,
+            np.pi / 4.0,
+            np.pi / 6.0,
+            1.0 * YRSID_SI,
+        ]
+    )[:, np.newaxis]
+
+    data_freqs = np.logspace(-4, -1, 1000)
+    waveform_kwargs = dict(
+        freqs=data_freqs, direct=False, fill=False, length=256, modes=[(2, 2)]
+    )
+
+    t_waveform = best_time(
+        lambda: wave_gen(*params, **waveform_kwargs), max(number // 100, 1)
+    )
+    print(f"BBHWaveformFD call (1 binary):   {t_waveform:8.2f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=10000)
+    main(parser.parse_args().number)
@@ -8,8 +8,16 @@ fps_cu_to_cpp = [
     "Interpolate",
     "WaveformBuild",
     "Likelihood",
+    "Transform",
+]
+fps_pyx = [
+    "phenomhm",
+    "response",
+    "interpolate",
+    "waveformbuild",
+    "likelihood",
+    "transform",
 ]
-fps_pyx = ["phenomhm", "response", "interpolate", "waveformbuild", "likelihood"]
 
 for fp in fps_cu_to_cpp:
     shutil.copy("src/" + fp + ".cu", "src/" + fp + ".cpp")
@@ -268,6 +268,11 @@ if run_cuda_install:
         sources=["src/Likelihood.cu", "src/likelihood.pyx"],
         **gpu_extension,
     )
+    pyTransform_ext = Extension(
+        "pyTransform",
+        sources=["src/Transform.cu", "src/transform.pyx"],
+        **gpu_extension,
+    )
 
     # gpu_extensions.append(Extension(extension_name, **temp_dict))
 
@@ -313,6 +318,12 @@ pyLikelihood_cpu_ext = Extension(
     **cpu_extension,
 )
 
+pyTransform_cpu_ext = Extension(
+    "pyTransform_cpu",
+    sources=["src/Transform.cpp", "src/transform_cpu.pyx"],
+    **cpu_extension,
+)
+
 
 extensions = [
     pyPhenomHM_cpu_ext,
@@ -320,6 +331,7 @@ extensions = [
     pyInterpolate_cpu_ext,
     pyWaveformBuild_cpu_ext,
     pyLikelihood_cpu_ext,
+    pyTransform_cpu_ext,
 ]
 
 if run_cuda_install:
@@ -329,6 +341,7 @@ if run_cuda_install:
         pyInterpolate_ext,
         pyWaveformBuild_ext,
         pyLikelihood_ext,
+        pyTransform_ext,
     ] + extensions
 
 setup(
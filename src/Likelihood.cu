@@ -200,6 +200,196 @@ void hdyn(cmplx* likeOut1, cmplx* likeOut2,
     #endif
 }
 
+#define MAX_MODES_HDYN 6
+
+// heterodyned likelihood with a separate reference for each harmonic
+// templateChannels holds the per-harmonic ratios h_lm / h0_lm with shape (data_length, nChannels, numModes, numBinAll)
+// dataConstants holds A0, A1 with shape (numModes, nChannels, data_length)
+// followed by B0, B1 with shape (numPairs, nChannels, data_length) for all pairs (mode_i <= mode_j)
+// one thread per binary on the GPU
+CUDA_KERNEL
+void hdynLikelihoodModes(cmplx* likeOut1, cmplx* likeOut2,
+                    cmplx* templateChannels, cmplx* dataConstants,
+                    double* dataFreqsIn,
+                    int numBinAll, int data_length, int nChannels, int numModes)
+{
+    int numPairs = (numModes * (numModes + 1)) / 2;
+
+    cmplx* A0_all = &dataConstants[0];
+    cmplx* A1_all = &dataConstants[numModes * nChannels * data_length];
+    cmplx* B0_all = &dataConstants[2 * numModes * nChannels * data_length];
+    cmplx* B1_all = &dataConstants[(2 * numModes + numPairs) * nChannels * data_length];
+
+    int start, increment;
+    #ifdef __CUDACC__
+    start = threadIdx.x + blockDim.x * blockIdx.x;
+    increment = blockDim.x * gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int binNum = start; binNum < numBinAll; binNum += increment)
+    {
+        cmplx r0[MAX_MODES_HDYN];
+        cmplx r1[MAX_MODES_HDYN];
+        cmplx trans_complex, prev_trans_complex, term;
+
+        cmplx tempLike1(0.0, 0.0);
+        cmplx tempLike2(0.0, 0.0);
+
+        for (int channel = 0; channel < nChannels; channel += 1)
+        {
+            // constants at index jj belong to the bin between jj - 1 and jj
+            for (int jj = 1; jj < data_length; jj += 1)
+            {
+                double freq = dataFreqsIn[jj];
+                double prevFreq = dataFreqsIn[jj - 1];
+                double midFreq = (freq + prevFreq) / 2.0;
+
+                for (int mode_i = 0; mode_i < numModes; mode_i += 1)
+                {
+                    trans_complex = templateChannels[((jj * nChannels + channel) * numModes + mode_i) * numBinAll + binNum];
+                    prev_trans_complex = templateChannels[(((jj - 1) * nChannels + channel) * numModes + mode_i) * numBinAll + binNum];
+
+                    // slope and intercept of the ratio in this bin
+                    r1[mode_i] = (trans_complex - prev_trans_complex) / (freq - prevFreq);
+                    r0[mode_i] = trans_complex - r1[mode_i] * (freq - midFreq);
+
+                    int ind = (mode_i * nChannels + channel) * data_length + jj;
+                    tempLike1 += A0_all[ind] * gcmplx::conj(r0[mode_i]) + A1_all[ind] * gcmplx::conj(r1[mode_i]);
+                }
+
+                // all harmonic pairs including cross terms
+                int pair_i = 0;
+                for (int mode_i = 0; mode_i < numModes; mode_i += 1)
+                {
+                    for (int mode_j = mode_i; mode_j < numModes; mode_j += 1)
+                    {
+                        int ind = (pair_i * nChannels + channel) * data_length + jj;
+                        term = B0_all[ind] * r0[mode_i] * gcmplx::conj(r0[mode_j])
+                            + B1_all[ind] * (r1[mode_i] * gcmplx::conj(r0[mode_j]) + r0[mode_i] * gcmplx::conj(r1[mode_j]));
+
+                        // (j, i) is the complex conjugate of (i, j)
+                        if (mode_j == mode_i) tempLike2 += term;
+                        else tempLike2 += term + gcmplx::conj(term);
+
+                        pair_i += 1;
+                    }
+                }
+            }
+        }
+
+        likeOut1[binNum] = tempLike1;
+        likeOut2[binNum] = tempLike2;
+    }
+}
+
+
+void hdyn_modes(cmplx* likeOut1, cmplx* likeOut2,
+                    cmplx* templateChannels, cmplx* dataConstants,
+                    double* dataFreqs,
+                    int numBinAll, int data_length, int nChannels, int numModes)
+{
+
+    int nblocks4 = std::ceil((numBinAll + NUM_THREADS_LIKE -1)/NUM_THREADS_LIKE);
+    #ifdef __CUDACC__
+    hdynLikelihoodModes <<<nblocks4, NUM_THREADS_LIKE>>> (likeOut1, likeOut2, templateChannels, dataConstants, dataFreqs, numBinAll, data_length, nChannels, numModes);
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+    #else
+    hdynLikelihoodModes(likeOut1, likeOut2, templateChannels, dataConstants, dataFreqs, numBinAll, data_length, nChannels, numModes);
+    #endif
+}
+
+#define MAX_ORDER_HDYN 4
+
+// heterodyned likelihood with a polynomial of degree order for the ratio in each bin
+// each bin spans order + 1 consecutive sparse points (shared at the bin edges)
+// the polynomial coefficients are linear in the ratio at these points, so they are folded into the constants
+// dataConstants holds weights for <d|h> with shape (nChannels, numBins, order + 1)
+// followed by weights for <h|h> with shape (nChannels, numBins, numPairs) for all point pairs (i <= j)
+// one thread per binary on the GPU
+CUDA_KERNEL
+void hdynLikelihoodOrder(cmplx* likeOut1, cmplx* likeOut2,
+                    cmplx* templateChannels, cmplx* dataConstants,
+                    int numBinAll, int data_length, int nChannels, int order)
+{
+    int numBins = (data_length - 1) / order;
+    int numPoints = order + 1;
+    int numPairs = (numPoints * (numPoints + 1)) / 2;
+
+    cmplx* A_all = &dataConstants[0];
+    cmplx* B_all = &dataConstants[nChannels * numBins * numPoints];
+
+    int start, increment;
+    #ifdef __CUDACC__
+    start = threadIdx.x + blockDim.x * blockIdx.x;
+    increment = blockDim.x * gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int binNum = start; binNum < numBinAll; binNum += increment)
+    {
+        cmplx r[MAX_ORDER_HDYN + 1];
+        cmplx term;
+
+        cmplx tempLike1(0.0, 0.0);
+        cmplx tempLike2(0.0, 0.0);
+
+        for (int channel = 0; channel < nChannels; channel += 1)
+        {
+            for (int bin_i = 0; bin_i < numBins; bin_i += 1)
+            {
+                for (int point_i = 0; point_i < numPoints; point_i += 1)
+                {
+                    r[point_i] = templateChannels[((bin_i * order + point_i) * nChannels + channel) * numBinAll + binNum];
+
+                    int ind = (channel * numBins + bin_i) * numPoints + point_i;
+                    tempLike1 += A_all[ind] * gcmplx::conj(r[point_i]);
+                }
+
+                int pair_i = 0;
+                for (int point_i = 0; point_i < numPoints; point_i += 1)
+                {
+                    for (int point_j = point_i; point_j < numPoints; point_j += 1)
+                    {
+                        int ind = (channel * numBins + bin_i) * numPairs + pair_i;
+                        term = B_all[ind] * r[point_i] * gcmplx::conj(r[point_j]);
+
+                        // the weights are symmetric in (i, j)
+                        if (point_j == point_i) tempLike2 += term;
+                        else tempLike2 += term + B_all[ind] * r[point_j] * gcmplx::conj(r[point_i]);
+
+                        pair_i += 1;
+                    }
+                }
+            }
+        }
+
+        likeOut1[binNum] = tempLike1;
+        likeOut2[binNum] = tempLike2;
+    }
+}
+
+
+void hdyn_order(cmplx* likeOut1, cmplx* likeOut2,
+                    cmplx* templateChannels, cmplx* dataConstants,
+                    int numBinAll, int data_length, int nChannels, int order)
+{
+
+    int nblocks4 = std::ceil((numBinAll + NUM_THREADS_LIKE -1)/NUM_THREADS_LIKE);
+    #ifdef __CUDACC__
+    hdynLikelihoodOrder <<<nblocks4, NUM_THREADS_LIKE>>> (likeOut1, likeOut2, templateChannels, dataConstants, numBinAll, data_length, nChannels, order);
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+    #else
+    hdynLikelihoodOrder(likeOut1, likeOut2, templateChannels, dataConstants, numBinAll, data_length, nChannels, order);
+    #endif
+}
+
 #ifdef __CUDACC__
 __device__ double atomicAddDouble(double* address, double val)
 {
@@ -383,11 +573,12 @@ void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weig
 {
 
     // initialize everything
-    cudaStream_t streams[numBinAll];
+    // heap allocated so large batches do not overflow the stack
+    cudaStream_t* streams = new cudaStream_t[numBinAll];
     cublasHandle_t handle;
 
-    cuDoubleComplex result_d_h[numBinAll];
-    cuDoubleComplex result_h_h[numBinAll];
+    cuDoubleComplex result_d_h;
+    cuDoubleComplex result_h_h;
 
     cublasStatus_t stat = cublasCreate(&handle);
     if (stat != CUBLAS_STATUS_SUCCESS)
@@ -425,15 +616,15 @@ void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weig
             stat = cublasZdotc(handle, length_bin_i,
                               (cuDoubleComplex*)&dataChannels[j * data_stream_length + ind_start], 1,
                               (cuDoubleComplex*)&templateChannels[j * length_bin_i], 1,
-                              &result_d_h[bin_i]);
+                              &result_d_h);
             cudaStreamSynchronize(streams[bin_i]);
             if (stat != CUBLAS_STATUS_SUCCESS)
             {
                 exit(0);
             }
 
-            temp_real = cuCreal(result_d_h[bin_i]);
-            temp_imag = cuCimag(result_d_h[bin_i]);
+            temp_real = cuCreal(result_d_h);
+            temp_imag = cuCimag(result_d_h);
             cmplx temp_d_h(temp_real, temp_imag);
             d_h[bin_i] += 4.0 * temp_d_h;
 
@@ -442,15 +633,15 @@ void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weig
             stat = cublasZdotc(handle, length_bin_i,
                               (cuDoubleComplex*)&templateChannels[j * length_bin_i], 1,
                               (cuDoubleComplex*)&templateChannels[j * length_bin_i], 1,
-                              &result_h_h[bin_i]);
+                              &result_h_h);
             cudaStreamSynchronize(streams[bin_i]);
             if (stat != CUBLAS_STATUS_SUCCESS)
             {
                 exit(0);
             }
 
-            temp_real = cuCreal(result_h_h[bin_i]);
-            temp_imag = cuCimag(result_h_h[bin_i]);
+            temp_real = cuCreal(result_h_h);
+            temp_imag = cuCimag(result_h_h);
             cmplx temp_h_h(temp_real, temp_imag);
             h_h[bin_i] += 4.0 * temp_h_h;
 
@@ -467,6 +658,7 @@ void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weig
         cudaStreamDestroy(streams[bin_i]);
     }
     cublasDestroy(handle);
+    delete[] streams;
 
 }
 
@@ -474,9 +666,6 @@ void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weig
 void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weight_times_df, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int data_stream_length, int numBinAll)
 {
 
-    cmplx result_d_h[numBinAll];
-    cmplx result_h_h[numBinAll];
-
     #pragma omp parallel for
     for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
     {
@@ -488,25 +677,303 @@ void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weig
         noiseweight_template
         (templateChannels, noise_weight_times_df, ind_start, length_bin_i, data_stream_length);
 
+        // per-thread results (no stack arrays of size numBinAll)
+        cmplx result_d_h;
+        cmplx result_h_h;
         for (int j = 0; j < 3; j += 1)
         {
 
             cblas_zdotc_sub(length_bin_i,
                               (void*)&dataChannels[j * data_stream_length + ind_start], 1,
                               (void*)&templateChannels[j * length_bin_i], 1,
-                              (void*)&result_d_h[bin_i]);
+                              (void*)&result_d_h);
 
-            d_h[bin_i] += 4.0 * result_d_h[bin_i];
+            d_h[bin_i] += 4.0 * result_d_h;
 
             cblas_zdotc_sub(length_bin_i,
                               (void*)&templateChannels[j * length_bin_i], 1,
                               (void*)&templateChannels[j * length_bin_i], 1,
-                              (void*)&result_h_h[bin_i]);
+                              (void*)&result_h_h);
 
-            h_h[bin_i] += 4.0 * result_h_h[bin_i];
-            //printf("%e %e\n", cuCreal(result_h_h[bin_i]), cuCreal(result_d_h[bin_i]));
+            h_h[bin_i] += 4.0 * result_h_h;
 
         }
     }
 }
 #endif
+
+
+// direct inner products split into frequency bands
+// bands are contiguous index ranges [band_inds[band], band_inds[band + 1]) of the data stream
+// d_h and h_h have shape (numBinAll, 3, numBands)
+#ifdef __CUDACC__
+void direct_like_bands(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weight_times_df, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int* band_inds, int data_stream_length, int numBinAll, int numBands)
+{
+    cublasHandle_t handle;
+    cuDoubleComplex result;
+
+    cublasStatus_t stat = cublasCreate(&handle);
+    if (stat != CUBLAS_STATUS_SUCCESS)
+    {
+      printf ("CUBLAS initialization failed\n");
+      exit(0);
+    }
+
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        int length_bin_i = ind_lengths[bin_i];
+        int ind_start = inds_start[bin_i];
+
+        cmplx* templateChannels = (cmplx*) templateChannels_ptrs[bin_i];
+
+        int nblocks = std::ceil((length_bin_i + NUM_THREADS_LIKE -1)/NUM_THREADS_LIKE);
+        noiseweight_template<<<nblocks, NUM_THREADS_LIKE>>>(templateChannels, noise_weight_times_df, ind_start, length_bin_i, data_stream_length);
+        cudaDeviceSynchronize();
+        gpuErrchk(cudaGetLastError());
+
+        for (int j = 0; j < 3; j += 1)
+        {
+            for (int band = 0; band < numBands; band += 1)
+            {
+                // overlap of the band and the template support
+                int start_band = (band_inds[band] > ind_start) ? band_inds[band] : ind_start;
+                int end_band = (band_inds[band + 1] < ind_start + length_bin_i) ? band_inds[band + 1] : ind_start + length_bin_i;
+                if (end_band <= start_band) continue;
+
+                int out_ind = (bin_i * 3 + j) * numBands + band;
+
+                stat = cublasZdotc(handle, end_band - start_band,
+                                  (cuDoubleComplex*)&dataChannels[j * data_stream_length + start_band], 1,
+                                  (cuDoubleComplex*)&templateChannels[j * length_bin_i + start_band - ind_start], 1,
+                                  &result);
+                if (stat != CUBLAS_STATUS_SUCCESS)
+                {
+                    exit(0);
+                }
+                d_h[out_ind] = 4.0 * cmplx(cuCreal(result), cuCimag(result));
+
+                stat = cublasZdotc(handle, end_band - start_band,
+                                  (cuDoubleComplex*)&templateChannels[j * length_bin_i + start_band - ind_start], 1,
+                                  (cuDoubleComplex*)&templateChannels[j * length_bin_i + start_band - ind_start], 1,
+                                  &result);
+                if (stat != CUBLAS_STATUS_SUCCESS)
+                {
+                    exit(0);
+                }
+                h_h[out_ind] = 4.0 * cmplx(cuCreal(result), cuCimag(result));
+            }
+        }
+    }
+
+    cublasDestroy(handle);
+}
+
+#else
+void direct_like_bands(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weight_times_df, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int* band_inds, int data_stream_length, int numBinAll, int numBands)
+{
+
+    #pragma omp parallel for
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        int length_bin_i = ind_lengths[bin_i];
+        int ind_start = inds_start[bin_i];
+
+        cmplx* templateChannels = (cmplx*) templateChannels_ptrs[bin_i];
+
+        noiseweight_template
+        (templateChannels, noise_weight_times_df, ind_start, length_bin_i, data_stream_length);
+
+        cmplx result;
+        for (int j = 0; j < 3; j += 1)
+        {
+            for (int band = 0; band < numBands; band += 1)
+            {
+                // overlap of the band and the template support
+                int start_band = (band_inds[band] > ind_start) ? band_inds[band] : ind_start;
+                int end_band = (band_inds[band + 1] < ind_start + length_bin_i) ? band_inds[band + 1] : ind_start + length_bin_i;
+                if (end_band <= start_band) continue;
+
+                int out_ind = (bin_i * 3 + j) * numBands + band;
+
+                cblas_zdotc_sub(end_band - start_band,
+                                  (void*)&dataChannels[j * data_stream_length + start_band], 1,
+                                  (void*)&templateChannels[j * length_bin_i + start_band - ind_start], 1,
+                                  (void*)&result);
+
+                d_h[out_ind] = 4.0 * result;
+
+                cblas_zdotc_sub(end_band - start_band,
+                                  (void*)&templateChannels[j * length_bin_i + start_band - ind_start], 1,
+                                  (void*)&templateChannels[j * length_bin_i + start_band - ind_start], 1,
+                                  (void*)&result);
+
+                h_h[out_ind] = 4.0 * result;
+            }
+        }
+    }
+}
+#endif
+
+
+// add factor * noise-weighted template into the noise-weighted residual
+// only over the support of the template. The change in <r|r> is accumulated
+// into d_d_change.
+CUDA_KERNEL
+void update_residual_kernel(cmplx* residual, double* noise_factors, cmplx* templateChannels, double factor, double* d_d_change, int ind_start, int ind_length, int data_stream_length, int nChannels)
+{
+    double d_d_change_temp = 0.0;
+
+    int start, increment;
+    #ifdef __CUDACC__
+    CUDA_SHARED double d_d_change_shared[NUM_THREADS_LIKE];
+    start = blockIdx.x * blockDim.x + threadIdx.x;
+    increment = blockDim.x * gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for reduction(+:d_d_change_temp)
+    #endif
+    for (int i = start; i < ind_length; i += increment)
+    {
+        for (int chan = 0; chan < nChannels; chan += 1)
+        {
+            int ind = chan * data_stream_length + ind_start + i;
+            cmplx r_old = residual[ind];
+            cmplx r_new = r_old + factor * noise_factors[ind] * templateChannels[chan * ind_length + i];
+            residual[ind] = r_new;
+
+            d_d_change_temp += gcmplx::norm(r_new) - gcmplx::norm(r_old);
+        }
+    }
+
+    #ifdef __CUDACC__
+    d_d_change_shared[threadIdx.x] = d_d_change_temp;
+    CUDA_SYNC_THREADS
+
+    for (int s = blockDim.x / 2; s > 0; s >>= 1)
+    {
+        if (threadIdx.x < s) d_d_change_shared[threadIdx.x] += d_d_change_shared[threadIdx.x + s];
+        CUDA_SYNC_THREADS
+    }
+
+    if (THREAD_ZERO) atomicAddDouble(d_d_change, 4.0 * d_d_change_shared[0]);
+    #else
+    *d_d_change += 4.0 * d_d_change_temp;
+    #endif
+}
+
+void update_residual(cmplx* residual, double* noise_factors, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, double* factors, double* d_d_change, int data_stream_length, int numBinAll, int nChannels)
+{
+    // binaries are applied one after the other so overlapping templates
+    // give the correct residual and change in <r|r>
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        int length_bin_i = ind_lengths[bin_i];
+        int ind_start = inds_start[bin_i];
+
+        if (length_bin_i <= 0) continue;
+
+        cmplx* templateChannels = (cmplx*) templateChannels_ptrs[bin_i];
+
+        #ifdef __CUDACC__
+        int nblocks = std::ceil((length_bin_i + NUM_THREADS_LIKE -1)/NUM_THREADS_LIKE);
+        update_residual_kernel<<<nblocks, NUM_THREADS_LIKE>>>(residual, noise_factors, templateChannels, factors[bin_i], d_d_change, ind_start, length_bin_i, data_stream_length, nChannels);
+        #else
+        update_residual_kernel(residual, noise_factors, templateChannels, factors[bin_i], d_d_change, ind_start, length_bin_i, data_stream_length, nChannels);
+        #endif
+    }
+
+    #ifdef __CUDACC__
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+    #endif
+}
+
+
+// noise-weighted inner products <h_i|h_j> computed only over the
+// intersection of the supports of each pair of templates
+// parallel method here is one block per pair
+CUDA_KERNEL
+void cross_terms_kernel(cmplx* h_i_h_j, long* templateChannels_ptrs_i, long* templateChannels_ptrs_j, int* inds_start_i, int* ind_lengths_i, int* inds_start_j, int* ind_lengths_j, int numPairs, int nChannels)
+{
+    int start, increment;
+    #ifdef __CUDACC__
+    CUDA_SHARED double sum_re_shared[NUM_THREADS_LIKE];
+    CUDA_SHARED double sum_im_shared[NUM_THREADS_LIKE];
+    start = blockIdx.x;
+    increment = gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int pair_i = start; pair_i < numPairs; pair_i += increment)
+    {
+        int start_i = inds_start_i[pair_i];
+        int length_i = ind_lengths_i[pair_i];
+        int start_j = inds_start_j[pair_i];
+        int length_j = ind_lengths_j[pair_i];
+
+        cmplx* templateChannels_i = (cmplx*) templateChannels_ptrs_i[pair_i];
+        cmplx* templateChannels_j = (cmplx*) templateChannels_ptrs_j[pair_i];
+
+        // intersection of the supports
+        int overlap_start = (start_i > start_j) ? start_i : start_j;
+        int overlap_end = (start_i + length_i < start_j + length_j) ? start_i + length_i : start_j + length_j;
+
+        double sum_re = 0.0;
+        double sum_im = 0.0;
+
+        int start2, increment2;
+        #ifdef __CUDACC__
+        start2 = overlap_start + threadIdx.x;
+        increment2 = blockDim.x;
+        #else
+        start2 = overlap_start;
+        increment2 = 1;
+        #endif
+        for (int k = start2; k < overlap_end; k += increment2)
+        {
+            for (int chan = 0; chan < nChannels; chan += 1)
+            {
+                cmplx temp = gcmplx::conj(templateChannels_i[chan * length_i + k - start_i]) * templateChannels_j[chan * length_j + k - start_j];
+                sum_re += temp.real();
+                sum_im += temp.imag();
+            }
+        }
+
+        #ifdef __CUDACC__
+        sum_re_shared[threadIdx.x] = sum_re;
+        sum_im_shared[threadIdx.x] = sum_im;
+        CUDA_SYNC_THREADS
+
+        for (int s = blockDim.x / 2; s > 0; s >>= 1)
+        {
+            if (threadIdx.x < s)
+            {
+                sum_re_shared[threadIdx.x] += sum_re_shared[threadIdx.x + s];
+                sum_im_shared[threadIdx.x] += sum_im_shared[threadIdx.x + s];
+            }
+            CUDA_SYNC_THREADS
+        }
+
+        if (THREAD_ZERO) h_i_h_j[pair_i] = 4.0 * cmplx(sum_re_shared[0], sum_im_shared[0]);
+        CUDA_SYNC_THREADS
+        #else
+        h_i_h_j[pair_i] = 4.0 * cmplx(sum_re, sum_im);
+        #endif
+    }
+}
+
+void cross_terms(cmplx* h_i_h_j, long* templateChannels_ptrs_i, long* templateChannels_ptrs_j, int* inds_start_i, int* ind_lengths_i, int* inds_start_j, int* ind_lengths_j, int numPairs, int nChannels)
+{
+    if (numPairs == 0) return;
+
+    #ifdef __CUDACC__
+    cross_terms_kernel<<<numPairs, NUM_THREADS_LIKE>>>(h_i_h_j, templateChannels_ptrs_i, templateChannels_ptrs_j, inds_start_i, ind_lengths_i, inds_start_j, ind_lengths_j, numPairs, nChannels);
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+    #else
+    cross_terms_kernel(h_i_h_j, templateChannels_ptrs_i, templateChannels_ptrs_j, inds_start_i, ind_lengths_i, inds_start_j, ind_lengths_j, numPairs, nChannels);
+    #endif
+}
@@ -2822,6 +2822,29 @@ void calculate_modes_phenomd(int binNum, double* amps, double* phases, double* t
 
 
 
+// fill a masked (binary, mode) pair with zeros so stale buffer values are never used
+CUDA_CALLABLE_MEMBER
+void zero_mode(int binNum, int mode_i, double* amps, double* phases, double* tf, int length, int numModes)
+{
+    int start, increment;
+    #ifdef __CUDACC__
+    start = threadIdx.x;
+    increment = blockDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int i = start; i < length; i += increment)
+    {
+        int mode_index = (binNum * numModes + mode_i) * length + i;
+        amps[mode_index] = 0.0;
+        phases[mode_index] = 0.0;
+        tf[mode_index] = 0.0;
+    }
+}
+
+
 /**
  * Michael Katz added this function.
  * Main function for calculating PhenomHM in the form used by Michael Katz
@@ -2849,7 +2872,8 @@ void IMRPhenomHMCore(
     double cshift[],
     double* Mf_RD_lm,
     double* Mf_DM_lm,
-    int run_phenomd
+    int run_phenomd,
+    int* modeMask
 )
 {
 
@@ -2961,7 +2985,11 @@ void IMRPhenomHMCore(
    amp0 = PhenomUtilsFDamp0(Mtot, distance); // TODO check if this is right units
     double M_tot_sec = (pHM->m1 + pHM->m2)*MTSUN_SI;
 
-    if (run_phenomd)
+    if ((run_phenomd) && (modeMask != NULL) && (modeMask[binNum] == 0))
+    {
+        zero_mode(binNum, 0, amps, phases, tf, length, numModes);
+    }
+    else if (run_phenomd)
     {
         calculate_modes_phenomd(binNum, amps, phases, tf, freqs,  &(pDPreComp22.pAmp), pDPreComp22.amp_prefactors, pDPreComp22, amp0, t0, phi0, length, numBinAll, M_tot_sec, pHM->Mf_ref, cshift);
     }
@@ -2977,6 +3005,13 @@ void IMRPhenomHMCore(
 
         for (int mode_i=0; mode_i<numModes; mode_i++)
         {
+            // masked (binary, mode) pairs are not computed
+            if ((modeMask != NULL) && (modeMask[binNum * numModes + mode_i] == 0))
+            {
+                zero_mode(binNum, mode_i, amps, phases, tf, length, numModes);
+                continue;
+            }
+
             ell = ells[mode_i];
             mm = mms[mode_i];
 
@@ -3076,7 +3111,8 @@ void IMRPhenomHMCore(
      int numBinAll,
      double* Mf_RD_lm_all,
      double* Mf_DM_lm_all,
-     int run_phenomd
+     int run_phenomd,
+     int* modeMask
 )
 {
 
@@ -3161,7 +3197,7 @@ void IMRPhenomHMCore(
         }
         CUDA_SYNC_THREADS;
 
-        IMRPhenomHMCore(ells, mms, amps, phases, tf, freqs, m1_SI[binNum], m2_SI[binNum], chi1z[binNum], chi2z[binNum], distance[binNum], f_ref[binNum], length, numModes, binNum, numBinAll, cShift, Mf_RD_lm, Mf_DM_lm, run_phenomd);
+        IMRPhenomHMCore(ells, mms, amps, phases, tf, freqs, m1_SI[binNum], m2_SI[binNum], chi1z[binNum], chi2z[binNum], distance[binNum], f_ref[binNum], length, numModes, binNum, numBinAll, cShift, Mf_RD_lm, Mf_DM_lm, run_phenomd, modeMask);
     }
 }
 
@@ -3182,7 +3218,8 @@ void waveform_amp_phase(
     int numBinAll,
     double* Mf_RD_lm_all,
     double* Mf_DM_lm_all,
-    int run_phenomd
+    int run_phenomd,
+    int* modeMask
 )
 {
 
@@ -3218,7 +3255,8 @@ void waveform_amp_phase(
         numBinAll,
         Mf_RD_lm_all,
         Mf_DM_lm_all,
-        run_phenomd
+        run_phenomd,
+        modeMask
     );
 
     cudaDeviceSynchronize();
@@ -3243,7 +3281,8 @@ void waveform_amp_phase(
         numBinAll,
         Mf_RD_lm_all,
         Mf_DM_lm_all,
-        run_phenomd
+        run_phenomd,
+        modeMask
     );
     #endif
 
@@ -39,17 +39,43 @@ double d_sinc(double x){
 }
 
 
+/*
+Evaluate all tabulated orbit components at time t
+*/
+CUDA_CALLABLE_MEMBER
+void d_evaluate_orbits(double* orb, double t, d_orbits_holder orbits){
+    // times outside the table are held at the table edges
+    double t_end = orbits.t0 + (orbits.num_t - 1) * orbits.dt;
+    if (t < orbits.t0) t = orbits.t0;
+    if (t > t_end) t = t_end;
+
+    // locate the interval on the uniform grid
+    int ind = (int)floor((t - orbits.t0) / orbits.dt);
+    if (ind < 0) ind = 0;
+    if (ind > orbits.num_t - 2) ind = orbits.num_t - 2;
+
+    double x = t - (orbits.t0 + ind * orbits.dt);
+    double x2 = x * x;
+    double x3 = x * x2;
+
+    double* coeffs = &orbits.coeffs[ind * NUM_ORBIT_COMPONENTS * 4];
+    for (int i = 0; i < NUM_ORBIT_COMPONENTS; i += 1)
+    {
+        orb[i] = coeffs[i * 4 + 0] + coeffs[i * 4 + 1] * x + coeffs[i * 4 + 2] * x2 + coeffs[i * 4 + 3] * x3;
+    }
+}
+
+
 /* # Single-link response
 # 'full' does include the orbital-delay term, 'constellation' does not
  */
 CUDA_CALLABLE_MEMBER
-d_Gslr_holder d_EvaluateGslr(double t, double f, cmplx *H, double* k, int response, double* p0){
+d_Gslr_holder d_EvaluateGslr(double t, double f, cmplx *H, double* k, int response, double* p0, double* orb){
     // response == 1 is full, response anything else is constellation
     // Trajectories, p0 used only for the full response
+    // if orb is not NULL, it holds the tabulated orbit components at t
     cmplx I(0.0, 1.0);
     cmplx m_I(0.0, -1.0);
-    double alpha = Omega0*t; double c = cos(alpha); double s = sin(alpha);
-    double a = AU_SI; double e = eorbit;
 
     #ifdef __CUDACC__
     CUDA_SHARED double p1L_all[NUM_THREADS_RESPONSE * 3];
@@ -71,6 +97,37 @@ d_Gslr_holder d_EvaluateGslr(double t, double f, cmplx *H, double* k, int respon
     double* n = &n_all[0];
 
     #endif
+
+    double kn1, kn2, kn3;
+    cmplx n1Hn1, n2Hn2, n3Hn3;
+
+    if (orb != NULL)
+    {
+        // tabulated orbits
+        for (int i=0; i<3; i++)
+        {
+            p1L[i] = orb[3 + i];
+            p2L[i] = orb[6 + i];
+            p3L[i] = orb[9 + i];
+        }
+
+        // n1 = (p3 - p2) / L
+        kn1 = d_dot_product_1d(k, &orb[12]);
+        n1Hn1 = d_vec_H_vec_product(&orb[12], H, &orb[12]);
+
+        // n2 = (p1 - p3) / L
+        kn2 = d_dot_product_1d(k, &orb[15]);
+        n2Hn2 = d_vec_H_vec_product(&orb[15], H, &orb[15]);
+
+        // n3 = (p2 - p1) / L
+        kn3 = d_dot_product_1d(k, &orb[18]);
+        n3Hn3 = d_vec_H_vec_product(&orb[18], H, &orb[18]);
+    }
+    else
+    {
+    double alpha = Omega0*t; double c = cos(alpha); double s = sin(alpha);
+    double a = AU_SI; double e = eorbit;
+
     p1L[0] = - a*e*(1 + s*s);
     p1L[1] = a*e*c*s;
     p1L[2] = -a*e*SQRT3*c;
@@ -90,8 +147,8 @@ d_Gslr_holder d_EvaluateGslr(double t, double f, cmplx *H, double* k, int respon
     n[1] = 1./2*(1 + c*c);
     n[2] = SQRT3/2*s;
 
-    double kn1= d_dot_product_1d(k, n);
-    cmplx n1Hn1 = d_vec_H_vec_product(n, H, n); //np.dot(n1, np.dot(H, n1))
+    kn1= d_dot_product_1d(k, n);
+    n1Hn1 = d_vec_H_vec_product(n, H, n); //np.dot(n1, np.dot(H, n1))
 
     // n2
     n[0] = c*s - SQRT3*(1 + s*s);
@@ -100,8 +157,8 @@ d_Gslr_holder d_EvaluateGslr(double t, double f, cmplx *H, double* k, int respon
 
     for (int i=0; i<3; i++) n[i] = n[i]*1./4.;
 
-    double kn2= d_dot_product_1d(k, n);
-    cmplx n2Hn2 = d_vec_H_vec_product(n, H, n); //np.dot(n1, np.dot(H, n1))
+    kn2= d_dot_product_1d(k, n);
+    n2Hn2 = d_vec_H_vec_product(n, H, n); //np.dot(n1, np.dot(H, n1))
 
     // n3
 
@@ -111,8 +168,9 @@ d_Gslr_holder d_EvaluateGslr(double t, double f, cmplx *H, double* k, int respon
 
     for (int i=0; i<3; i++) n[i] = n[i]*1./4.;
 
-    double kn3= d_dot_product_1d(k, n);
-    cmplx n3Hn3 = d_vec_H_vec_product(n, H, n); //np.dot(n1, np.dot(H, n1))
+    kn3= d_dot_product_1d(k, n);
+    n3Hn3 = d_vec_H_vec_product(n, H, n); //np.dot(n1, np.dot(H, n1))
+    }
 
 
     // # Compute intermediate scalar products
@@ -216,7 +274,7 @@ d_transferL_holder d_TDICombinationFD(d_Gslr_holder Gslr, double f, int TDItag,
 
 
 CUDA_CALLABLE_MEMBER
-d_transferL_holder d_JustLISAFDresponseTDI(cmplx *H, double f, double t, double lam, double beta, int TDItag, int order_fresnel_stencil){
+d_transferL_holder d_JustLISAFDresponseTDI(cmplx *H, double f, double t, double lam, double beta, int TDItag, int order_fresnel_stencil, d_orbits_holder orbits){
 
     //funck
     CUDA_SHARED double kvec_all[3];
@@ -233,6 +291,21 @@ d_transferL_holder d_JustLISAFDresponseTDI(cmplx *H, double f, double t, double
     kvec[1] = -cos(beta)*sin(lam);
     kvec[2] = -sin(beta);
 
+    double orb_all[NUM_ORBIT_COMPONENTS];
+    double* orb = NULL;
+
+    if (orbits.num_t > 0)
+    {
+        // tabulated orbits: spline lookup instead of trigonometry
+        orb = &orb_all[0];
+        d_evaluate_orbits(orb, t, orbits);
+
+        p0[0] = orb[0];
+        p0[1] = orb[1];
+        p0[2] = orb[2];
+    }
+    else
+    {
     // funcp0
     double alpha = Omega0*t; double c = cos(alpha); double s = sin(alpha); double a = AU_SI;
 
@@ -240,6 +313,7 @@ d_transferL_holder d_JustLISAFDresponseTDI(cmplx *H, double f, double t, double
     p0[0] = a*c;
     p0[1] = a*s;
     p0[2] = 0.*t;
+    }
 
     // dot kvec with p0
     double kR = d_dot_product_1d(kvec, p0);
@@ -247,7 +321,7 @@ d_transferL_holder d_JustLISAFDresponseTDI(cmplx *H, double f, double t, double
     double phaseRdelay = 2.*PI/C_SI *f*kR;
 
     // going to assume order_fresnel_stencil == 0 for now
-    d_Gslr_holder Gslr = d_EvaluateGslr(t, f, H, kvec, 1, p0); // assumes full response
+    d_Gslr_holder Gslr = d_EvaluateGslr(t, f, H, kvec, 1, p0, orb); // assumes full response
     d_Gslr_holder Tslr; // use same struct because its the same setup
     cmplx m_I(0.0, -1.0); // -1.0 -> mu_I
 
@@ -272,7 +346,7 @@ d_transferL_holder d_JustLISAFDresponseTDI(cmplx *H, double f, double t, double
   */
  CUDA_CALLABLE_MEMBER
  void response_modes(double* phases, double* response_out, int binNum, int mode_i, double* tf, double* freqs, double phi_ref, int ell, int mm, int length, int numBinAll, int numModes,
- cmplx* H, double lam, double beta, int TDItag, int order_fresnel_stencil)
+ cmplx* H, double lam, double beta, int TDItag, int order_fresnel_stencil, d_orbits_holder orbits)
  {
 
          double eps = 1e-9;
@@ -295,7 +369,7 @@ d_transferL_holder d_JustLISAFDresponseTDI(cmplx *H, double f, double t, double
 
              double t_wave_frame = tf[mode_index];
 
-             d_transferL_holder transferL = d_JustLISAFDresponseTDI(H, freq, t_wave_frame, lam, beta, TDItag, order_fresnel_stencil);
+             d_transferL_holder transferL = d_JustLISAFDresponseTDI(H, freq, t_wave_frame, lam, beta, TDItag, order_fresnel_stencil, orbits);
 
              // transferL1_re
              int start_ind = 0 * numBinAll * numModes * length;
@@ -420,7 +494,9 @@ void responseCore(
     int numModes,
     int binNum,
     int numBinAll,
-    int TDItag, int order_fresnel_stencil
+    int TDItag, int order_fresnel_stencil,
+    d_orbits_holder orbits,
+    int* modeMask
 )
 {
 
@@ -516,6 +592,9 @@ void responseCore(
     double trans1, trans2;
     for (int mode_i=0; mode_i<numModes; mode_i++){
 
+        // skip masked (binary, mode) pairs (same for the whole block)
+        if ((modeMask != NULL) && (modeMask[binNum * numModes + mode_i] == 0)) continue;
+
         ell = ells[mode_i];
         mm = mms[mode_i];
 
@@ -543,7 +622,7 @@ void responseCore(
 
          //if (threadIdx.x == 0) printf("CHECK: %.18e %.18e %.18e\n", inc, phi_ref, psi);
         response_modes(phases, response_out, binNum, mode_i, tf, freqs, phi_ref, ell, mm, length, numBinAll, numModes,
-        H_mat, lam, beta, TDItag, order_fresnel_stencil);
+        H_mat, lam, beta, TDItag, order_fresnel_stencil, orbits);
 
     }
 }
@@ -572,7 +651,9 @@ void responseCore(
      int TDItag, int order_fresnel_stencil,
      int numModes,
      int length,
-     int numBinAll
+     int numBinAll,
+     d_orbits_holder orbits,
+     int* modeMask
 )
 {
 
@@ -607,7 +688,7 @@ void responseCore(
     for (int binNum = start; binNum < numBinAll; binNum += increment)
     {
         responseCore(phases, response_out, ells, mms, tf, freqs, phi_ref[binNum], inc[binNum], lam[binNum], beta[binNum], psi[binNum], length, numModes, binNum, numBinAll,
-        TDItag, order_fresnel_stencil);
+        TDItag, order_fresnel_stencil, orbits, modeMask);
     }
 }
 
@@ -627,12 +708,24 @@ void LISA_response(
     int numModes,
     int length,
     int numBinAll,
-    int includesAmps
+    int includesAmps,
+    double* orbit_coeffs,
+    double orbit_t0,
+    double orbit_dt,
+    int orbit_num_t,
+    int* modeMask
 )
 {
 
     int start_param = includesAmps;  // if it has amps, start_param is 1, else 0
 
+    // orbit information (analytic orbits if orbit_num_t == 0)
+    d_orbits_holder orbits;
+    orbits.coeffs = orbit_coeffs;
+    orbits.t0 = orbit_t0;
+    orbits.dt = orbit_dt;
+    orbits.num_t = orbit_num_t;
+
     // get arrays out of main holder
     double* phases = &response_out[start_param * numBinAll * numModes * length];
     double* tf = &response_out[(start_param + 1) * numBinAll * numModes * length];
@@ -659,7 +752,9 @@ void LISA_response(
         TDItag, order_fresnel_stencil,
         numModes,
         length,
-        numBinAll
+        numBinAll,
+        orbits,
+        modeMask
    );
     cudaDeviceSynchronize();
     gpuErrchk(cudaGetLastError());
@@ -680,7 +775,9 @@ void LISA_response(
         TDItag, order_fresnel_stencil,
         numModes,
         length,
-        numBinAll
+        numBinAll,
+        orbits,
+        modeMask
    );
     #endif
 }
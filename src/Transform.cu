@@ -0,0 +1,170 @@
+#include "global.h"
+#include "constants.h"
+#include "Transform.hh"
+
+#define NUM_THREADS_TRANSFORM 256
+
+// modulus with period pi (from Sylvain Marsat)
+CUDA_CALLABLE_MEMBER
+double d_modpi(double phase)
+{
+    return phase - floor(phase / PI) * PI;
+}
+
+// modulus with period 2pi (from Sylvain Marsat)
+CUDA_CALLABLE_MEMBER
+double d_mod2pi(double phase)
+{
+    return phase - floor(phase / (2. * PI)) * 2. * PI;
+}
+
+// convert time, sky location, and polarization from the LISA frame to the SSB frame
+// t0 is in seconds, the LISA-frame latitude is given by its sine and cosine
+// Same fixed-point iteration as LISA_to_SSB in python. Inside the iteration, the SSB sky
+// position is only needed through its sines and cosines, so these are taken directly
+// from the rotated direction vector and the inverse trig functions are evaluated once.
+CUDA_CALLABLE_MEMBER
+void d_LISA_to_SSB(double* tSSB, double* lambdaSSB, double* betaSSB, double* psiSSB,
+                   double tL, double lambdaL, double sinbetaL, double cosbetaL, double psiL, double t0)
+{
+    double ConstPhi0 = ConstOmega * t0;
+    double RoC = AU_SI / C_SI;
+    double coszeta = cos(PI / 3.0);
+    double sinzeta = sin(PI / 3.0);
+    double coslambdaL = cos(lambdaL);
+    double sinlambdaL = sin(lambdaL);
+
+    // orbital phase at tL used in the SSB time conversion
+    double phaseL = ConstOmega * tL + ConstPhi0;
+    double cosphaseL = cos(phaseL);
+    double sinphaseL = sin(phaseL);
+
+    double x = 1.0, y = 0.0, sinbeta = 0.0;
+    double cosalpha = 0.0;
+    double sinalpha = 0.0;
+
+    // Initially, approximate alpha using tL instead of tSSB - then iterate
+    double tSSB_approx = tL;
+    for (int k = 0; k < 3; k += 1)
+    {
+        double alpha = ConstOmega * tSSB_approx + ConstPhi0;
+        cosalpha = cos(alpha);
+        sinalpha = sin(alpha);
+
+        // lambdaSSB = atan2(y, x)
+        y = cosalpha * cosalpha * cosbetaL * sinlambdaL
+            - sinalpha * sinbetaL * sinzeta
+            + cosbetaL * coszeta * sinalpha * sinalpha * sinlambdaL
+            - cosalpha * cosbetaL * coslambdaL * sinalpha
+            + cosalpha * cosbetaL * coszeta * coslambdaL * sinalpha;
+        x = cosbetaL * coslambdaL * sinalpha * sinalpha
+            - cosalpha * sinbetaL * sinzeta
+            + cosalpha * cosalpha * cosbetaL * coszeta * coslambdaL
+            - cosalpha * cosbetaL * sinalpha * sinlambdaL
+            + cosalpha * cosbetaL * coszeta * sinalpha * sinlambdaL;
+
+        // betaSSB = asin(sinbeta)
+        sinbeta = coszeta * sinbetaL
+            + cosalpha * cosbetaL * coslambdaL * sinzeta
+            + cosbetaL * sinalpha * sinzeta * sinlambdaL;
+        if (sinbeta > 1.0) sinbeta = 1.0;
+        if (sinbeta < -1.0) sinbeta = -1.0;
+
+        double r = sqrt(x * x + y * y);
+        double coslambda = 1.0, sinlambda = 0.0;
+        if (r > 0.0)
+        {
+            coslambda = x / r;
+            sinlambda = y / r;
+        }
+        double cosbeta = sqrt(1.0 - sinbeta * sinbeta);
+
+        // tSSBfromLframe with phase = phaseL - lambdaSSB
+        double cosphase = cosphaseL * coslambda + sinphaseL * sinlambda;
+        double sinphase = sinphaseL * coslambda - cosphaseL * sinlambda;
+        double RoCcosbeta = RoC * cosbeta;
+        tSSB_approx = tL + RoCcosbeta * cosphase - ConstOmega * RoCcosbeta * RoCcosbeta * sinphase * cosphase;
+    }
+
+    *tSSB = tSSB_approx;
+    *lambdaSSB = d_mod2pi(atan2(y, x));
+    *betaSSB = asin(sinbeta);
+
+    // Polarization
+    *psiSSB = d_modpi(
+        psiL
+        + atan2(
+            cosalpha * sinzeta * sinlambdaL - coslambdaL * sinalpha * sinzeta,
+            cosbetaL * coszeta
+            - cosalpha * coslambdaL * sinbetaL * sinzeta
+            - sinalpha * sinbetaL * sinzeta * sinlambdaL
+        )
+    );
+}
+
+// map sampler parameters to the native parameters of the waveform generator
+// input: (NUM_SAMPLER_PARAMS, numBinAll)
+// ln(mT), q, chi1z, chi2z, ln(dist / Gpc), phi_ref, cos(inc), lambdaL, sin(betaL), psiL, tL
+// output: (NUM_NATIVE_PARAMS, numBinAll)
+// m1, m2, chi1z, chi2z, dist, phi_ref, f_ref, inc, lambdaSSB, betaSSB, psiSSB, tSSB
+CUDA_KERNEL
+void transform_params_kernel(double* params_out, double* params_in, int numBinAll, double f_ref, double t0)
+{
+    int start, increment;
+    #ifdef __CUDACC__
+    start = blockIdx.x * blockDim.x + threadIdx.x;
+    increment = blockDim.x * gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int bin_i = start; bin_i < numBinAll; bin_i += increment)
+    {
+        double mT = exp(params_in[0 * numBinAll + bin_i]);
+        double q = params_in[1 * numBinAll + bin_i];
+        double chi1z = params_in[2 * numBinAll + bin_i];
+        double chi2z = params_in[3 * numBinAll + bin_i];
+        double dist = exp(params_in[4 * numBinAll + bin_i]) * PC_SI * 1e9;
+        double phi_ref = params_in[5 * numBinAll + bin_i];
+        double cos_inc = params_in[6 * numBinAll + bin_i];
+        double lambdaL = params_in[7 * numBinAll + bin_i];
+        double sin_betaL = params_in[8 * numBinAll + bin_i];
+        double psiL = params_in[9 * numBinAll + bin_i];
+        double tL = params_in[10 * numBinAll + bin_i];
+
+        // keep inverse trig functions in their domain
+        if (cos_inc > 1.0) cos_inc = 1.0;
+        if (cos_inc < -1.0) cos_inc = -1.0;
+        if (sin_betaL > 1.0) sin_betaL = 1.0;
+        if (sin_betaL < -1.0) sin_betaL = -1.0;
+
+        double tSSB, lambdaSSB, betaSSB, psiSSB;
+        d_LISA_to_SSB(&tSSB, &lambdaSSB, &betaSSB, &psiSSB, tL, lambdaL, sin_betaL, sqrt(1.0 - sin_betaL * sin_betaL), psiL, t0);
+
+        params_out[0 * numBinAll + bin_i] = mT / (1. + q);
+        params_out[1 * numBinAll + bin_i] = mT * q / (1. + q);
+        params_out[2 * numBinAll + bin_i] = chi1z;
+        params_out[3 * numBinAll + bin_i] = chi2z;
+        params_out[4 * numBinAll + bin_i] = dist;
+        params_out[5 * numBinAll + bin_i] = d_mod2pi(phi_ref);
+        params_out[6 * numBinAll + bin_i] = f_ref;
+        params_out[7 * numBinAll + bin_i] = acos(cos_inc);
+        params_out[8 * numBinAll + bin_i] = lambdaSSB;
+        params_out[9 * numBinAll + bin_i] = betaSSB;
+        params_out[10 * numBinAll + bin_i] = psiSSB;
+        params_out[11 * numBinAll + bin_i] = tSSB;
+    }
+}
+
+void transform_params(double* params_out, double* params_in, int numBinAll, double f_ref, double t0)
+{
+    #ifdef __CUDACC__
+    int nblocks = std::ceil((numBinAll + NUM_THREADS_TRANSFORM - 1) / NUM_THREADS_TRANSFORM);
+    transform_params_kernel<<<nblocks, NUM_THREADS_TRANSFORM>>>(params_out, params_in, numBinAll, f_ref, t0);
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+    #else
+    transform_params_kernel(params_out, params_in, numBinAll, f_ref, t0);
+    #endif
+}
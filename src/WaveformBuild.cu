@@ -64,9 +64,30 @@ void combine_information(cmplx* channel1, cmplx* channel2, cmplx* channel3, doub
 
 #define  MAX_NUM_COEFF_TERMS 1200
 
+// find the spline segment for frequency f (largest j with freqs[j] <= f)
+// if inds is given, it holds the segments precomputed with a search
+// otherwise, the sparse grid is log-uniform and the segment is computed directly from log(f)
+CUDA_CALLABLE_MEMBER
+int get_segment_index(double f, double log_f, double* freqs, int old_length, int* inds, int i, double log_f0, double inv_dlogf)
+{
+    if (inds != NULL) return inds[i];
+
+    // data frequencies are above freqs[0], so truncation is the floor
+    int ind = (int) ((log_f - log_f0) * inv_dlogf);
+
+    if (ind < 0) ind = 0;
+    if (ind > old_length - 1) ind = old_length - 1;
+
+    // correct for round-off at the segment edges
+    while ((ind > 0) && (freqs[ind] > f)) ind -= 1;
+    while ((ind < old_length - 1) && (freqs[ind + 1] <= f)) ind += 1;
+
+    return ind;
+}
+
 // interpolate to TDI channels
 CUDA_KERNEL
-void TDI(cmplx* templateChannels, double* dataFreqsIn, double* freqsOld, double* propArrays, double* c1In, double* c2In, double* c3In, int old_length, int data_length, int numBinAll, int numModes, double t_obs_start, double t_obs_end, int* inds, int ind_start, int ind_length, int bin_i)
+void TDI(cmplx* templateChannels, double* dataFreqsIn, double* logDataFreqsIn, double* freqsOld, double* propArrays, double* c1In, double* c2In, double* c3In, int old_length, int data_length, int numBinAll, int numModes, double t_obs_start, double t_obs_end, int* inds, double log_f0, double inv_dlogf, int ind_start, int ind_length, int bin_i, int* modeMask)
 {
 
     int start, increment;
@@ -83,7 +104,7 @@ void TDI(cmplx* templateChannels, double* dataFreqsIn, double* freqsOld, double*
         // get x information for this spline evaluation
         double f = dataFreqsIn[i + ind_start];
 
-        int ind_here = inds[i];
+        int ind_here = get_segment_index(f, logDataFreqsIn[i + ind_start], &freqsOld[bin_i * old_length], old_length, inds, i, log_f0, inv_dlogf);
 
         double f_old = freqsOld[bin_i * old_length + ind_here];
 
@@ -95,6 +116,9 @@ void TDI(cmplx* templateChannels, double* dataFreqsIn, double* freqsOld, double*
 
         for (int mode_i = 0; mode_i < numModes; mode_i += 1)
         {
+            // skip masked (binary, mode) pairs
+            if ((modeMask != NULL) && (modeMask[bin_i * numModes + mode_i] == 0)) continue;
+
             // evaluate all spline quantities
 
             int int_shared = ((0 * numBinAll + bin_i) * numModes + mode_i) * old_length + ind_here;
@@ -143,10 +167,10 @@ void TDI(cmplx* templateChannels, double* dataFreqsIn, double* freqsOld, double*
 }
 
 
-void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* freqs, double* propArrays, double* c1, double* c2, double* c3, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, int* inds_start, int* ind_lengths)
+void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* propArrays, double* c1, double* c2, double* c3, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0_in, double* inv_dlogf_in, int* inds_start, int* ind_lengths, int* modeMask)
 {
     #ifdef __CUDACC__
-    cudaStream_t streams[numBinAll];
+    cudaStream_t* streams = new cudaStream_t[numBinAll];
     #endif
 
     // interpolation is done in streams on GPU
@@ -157,6 +181,8 @@ void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* freqs, do
         int length_bin_i = ind_lengths[bin_i];
         int ind_start = inds_start[bin_i];
         int* inds = (int*) inds_ptrs[bin_i];
+        double log_f0 = log_f0_in[bin_i];
+        double inv_dlogf = inv_dlogf_in[bin_i];
 
         double t_start = t_start_in[bin_i];
         double t_end = t_end_in[bin_i];
@@ -168,9 +194,9 @@ void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* freqs, do
         #ifdef __CUDACC__
         dim3 gridDim(nblocks3, 1);
         cudaStreamCreate(&streams[bin_i]);
-        TDI<<<gridDim, NUM_THREADS_BUILD, 0, streams[bin_i]>>>(templateChannels, dataFreqs, freqs, propArrays, c1, c2, c3, length, data_length, numBinAll, numModes, t_start, t_end, inds, ind_start, length_bin_i, bin_i);
+        TDI<<<gridDim, NUM_THREADS_BUILD, 0, streams[bin_i]>>>(templateChannels, dataFreqs, logDataFreqs, freqs, propArrays, c1, c2, c3, length, data_length, numBinAll, numModes, t_start, t_end, inds, log_f0, inv_dlogf, ind_start, length_bin_i, bin_i, modeMask);
         #else
-        TDI(templateChannels, dataFreqs, freqs, propArrays, c1, c2, c3, length, data_length, numBinAll, numModes, t_start, t_end, inds, ind_start, length_bin_i, bin_i);
+        TDI(templateChannels, dataFreqs, logDataFreqs, freqs, propArrays, c1, c2, c3, length, data_length, numBinAll, numModes, t_start, t_end, inds, log_f0, inv_dlogf, ind_start, length_bin_i, bin_i, modeMask);
         #endif
 
     }
@@ -185,6 +211,128 @@ void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* freqs, do
         //destroy the streams
         cudaStreamDestroy(streams[bin_i]);
     }
+    delete[] streams;
+    #endif
+}
+
+
+// interpolate to TDI channels with mixed-precision spline coefficients
+// phase and tf (propArraysHP) are kept in double
+// amplitude and transfer functions (propArraysLP) are stored in float
+// all evaluation and accumulation is done in double
+CUDA_KERNEL
+void TDI_mixed(cmplx* templateChannels, double* dataFreqsIn, double* logDataFreqsIn, double* freqsOld, double* propArraysHP, double* c1HP, double* c2HP, double* c3HP, float* propArraysLP, float* c1LP, float* c2LP, float* c3LP, int old_length, int data_length, int numBinAll, int numModes, double t_obs_start, double t_obs_end, int* inds, double log_f0, double inv_dlogf, int ind_start, int ind_length, int bin_i, int* modeMask)
+{
+
+    int start, increment;
+    #ifdef __CUDACC__
+    start = blockIdx.x * blockDim.x + threadIdx.x;
+    increment = blockDim.x *gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int i = start; i < ind_length; i += increment)
+    {
+        // get x information for this spline evaluation
+        double f = dataFreqsIn[i + ind_start];
+
+        int ind_here = get_segment_index(f, logDataFreqsIn[i + ind_start], &freqsOld[bin_i * old_length], old_length, inds, i, log_f0, inv_dlogf);
+
+        double f_old = freqsOld[bin_i * old_length + ind_here];
+
+        double x = f - f_old;
+        double x2 = x * x;
+        double x3 = x * x2;
+
+        cmplx trans_complex1 = 0.0; cmplx trans_complex2 = 0.0; cmplx trans_complex3 = 0.0;
+
+        for (int mode_i = 0; mode_i < numModes; mode_i += 1)
+        {
+            // skip masked (binary, mode) pairs
+            if ((modeMask != NULL) && (modeMask[bin_i * numModes + mode_i] == 0)) continue;
+
+            // evaluate double precision spline quantities
+            int int_shared = ((0 * numBinAll + bin_i) * numModes + mode_i) * old_length + ind_here;
+            double phase = propArraysHP[int_shared] + c1HP[int_shared] * x + c2HP[int_shared] * x2 + c3HP[int_shared] * x3;
+
+            int_shared = ((1 * numBinAll + bin_i) * numModes + mode_i) * old_length + ind_here;
+            double tf = propArraysHP[int_shared] + c1HP[int_shared] * x + c2HP[int_shared] * x2 + c3HP[int_shared] * x3;
+
+            // evaluate single precision spline quantities
+            // order is amp, transferL1re, transferL1im, transferL2re, transferL2im, transferL3re, transferL3im
+            double lp_vals[7];
+            for (int param_i = 0; param_i < 7; param_i += 1)
+            {
+                int_shared = ((param_i * numBinAll + bin_i) * numModes + mode_i) * old_length + ind_here;
+                lp_vals[param_i] = (double)propArraysLP[int_shared] + (double)c1LP[int_shared] * x + (double)c2LP[int_shared] * x2 + (double)c3LP[int_shared] * x3;
+            }
+
+            cmplx channel1(0.0, 0.0);
+            cmplx channel2(0.0, 0.0);
+            cmplx channel3(0.0, 0.0);
+
+            combine_information(&channel1, &channel2, &channel3, lp_vals[0], phase, tf, cmplx(lp_vals[1], lp_vals[2]), cmplx(lp_vals[3], lp_vals[4]), cmplx(lp_vals[5], lp_vals[6]), t_obs_start, t_obs_end);
+
+            // add all modes together directly
+            trans_complex1 += channel1;
+            trans_complex2 += channel2;
+            trans_complex3 += channel3;
+        }
+
+        templateChannels[0 * ind_length + i] = trans_complex1;
+        templateChannels[1 * ind_length + i] = trans_complex2;
+        templateChannels[2 * ind_length + i] = trans_complex3;
+    }
+}
+
+
+void InterpTDIMixed(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* propArraysHP, double* c1HP, double* c2HP, double* c3HP, float* propArraysLP, float* c1LP, float* c2LP, float* c3LP, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0_in, double* inv_dlogf_in, int* inds_start, int* ind_lengths, int* modeMask)
+{
+    #ifdef __CUDACC__
+    cudaStream_t* streams = new cudaStream_t[numBinAll];
+    #endif
+
+    // interpolation is done in streams on GPU
+    #pragma omp parallel for
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        // get all information ready included casting pointers properly
+        int length_bin_i = ind_lengths[bin_i];
+        int ind_start = inds_start[bin_i];
+        int* inds = (int*) inds_ptrs[bin_i];
+        double log_f0 = log_f0_in[bin_i];
+        double inv_dlogf = inv_dlogf_in[bin_i];
+
+        double t_start = t_start_in[bin_i];
+        double t_end = t_end_in[bin_i];
+
+        cmplx* templateChannels = (cmplx*) templateChannels_ptrs[bin_i];
+
+        int nblocks3 = std::ceil((length_bin_i + NUM_THREADS_BUILD -1)/NUM_THREADS_BUILD);
+
+        #ifdef __CUDACC__
+        dim3 gridDim(nblocks3, 1);
+        cudaStreamCreate(&streams[bin_i]);
+        TDI_mixed<<<gridDim, NUM_THREADS_BUILD, 0, streams[bin_i]>>>(templateChannels, dataFreqs, logDataFreqs, freqs, propArraysHP, c1HP, c2HP, c3HP, propArraysLP, c1LP, c2LP, c3LP, length, data_length, numBinAll, numModes, t_start, t_end, inds, log_f0, inv_dlogf, ind_start, length_bin_i, bin_i, modeMask);
+        #else
+        TDI_mixed(templateChannels, dataFreqs, logDataFreqs, freqs, propArraysHP, c1HP, c2HP, c3HP, propArraysLP, c1LP, c2LP, c3LP, length, data_length, numBinAll, numModes, t_start, t_end, inds, log_f0, inv_dlogf, ind_start, length_bin_i, bin_i, modeMask);
+        #endif
+
+    }
+
+    #ifdef __CUDACC__
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+
+    #pragma omp parallel for
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        //destroy the streams
+        cudaStreamDestroy(streams[bin_i]);
+    }
+    delete[] streams;
     #endif
 }
 
@@ -194,7 +342,7 @@ void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* freqs, do
 CUDA_KERNEL
 void fill_waveform(cmplx* templateChannels,
                 double* bbh_buffer,
-                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end)
+                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask)
 {
 
     cmplx I(0.0, 1.0);
@@ -231,6 +379,7 @@ void fill_waveform(cmplx* templateChannels,
             cmplx temp_channel3 = 0.0;
             for (int mode_i = 0; mode_i < numModes; mode_i += 1)
             {
+                if ((modeMask != NULL) && (modeMask[bin_i * numModes + mode_i] == 0)) continue;
 
                 // get each value directly out of the holder arrays
 
@@ -282,17 +431,350 @@ void fill_waveform(cmplx* templateChannels,
 
 void direct_sum(cmplx* templateChannels,
                 double* bbh_buffer,
-                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end)
+                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask)
 {
 
     // block per binary
     int nblocks5 = numBinAll;
 
     #ifdef __CUDACC__
-    fill_waveform<<<nblocks5, NUM_THREADS_BUILD>>>(templateChannels, bbh_buffer, numBinAll, data_length, nChannels, numModes, t_start, t_end);
+    fill_waveform<<<nblocks5, NUM_THREADS_BUILD>>>(templateChannels, bbh_buffer, numBinAll, data_length, nChannels, numModes, t_start, t_end, modeMask);
     cudaDeviceSynchronize();
     gpuErrchk(cudaGetLastError());
     #else
-    fill_waveform(templateChannels, bbh_buffer, numBinAll, data_length, nChannels, numModes, t_start, t_end);
+    fill_waveform(templateChannels, bbh_buffer, numBinAll, data_length, nChannels, numModes, t_start, t_end, modeMask);
+    #endif
+}
+
+
+// directly fill waveform with no interpolation keeping each harmonic separate
+// output has shape (numBinAll, nChannels, numModes, data_length)
+// parallel method here is one block per binary
+CUDA_KERNEL
+void fill_waveform_modes(cmplx* templateChannels,
+                double* bbh_buffer,
+                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask)
+{
+    int start, increment;
+    #ifdef __CUDACC__
+    start = blockIdx.x;
+    increment = gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int bin_i = start; bin_i < numBinAll; bin_i += increment)
+    {
+
+        double t_start_bin = t_start[bin_i];
+        double t_end_bin = t_end[bin_i];
+
+        int start2, increment2;
+        #ifdef __CUDACC__
+        start2 = threadIdx.x;
+        increment2 = blockDim.x;
+        #else
+        start2 = 0;
+        increment2 = 1;
+        #pragma omp parallel for
+        #endif
+        for (int i = start2; i < data_length; i += increment2)
+        {
+            for (int mode_i = 0; mode_i < numModes; mode_i += 1)
+            {
+                // masked harmonics are zero
+                if ((modeMask != NULL) && (modeMask[bin_i * numModes + mode_i] == 0))
+                {
+                    templateChannels[((bin_i * nChannels + 0) * numModes + mode_i) * data_length + i] = 0.0;
+                    templateChannels[((bin_i * nChannels + 1) * numModes + mode_i) * data_length + i] = 0.0;
+                    templateChannels[((bin_i * nChannels + 2) * numModes + mode_i) * data_length + i] = 0.0;
+                    continue;
+                }
+
+                // get each value directly out of the holder arrays
+
+                int ind = ((0 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double amp = bbh_buffer[ind];
+
+                ind = ((1 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double phase = bbh_buffer[ind];
+
+                ind = ((2 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double tf = bbh_buffer[ind];
+
+                ind = ((3 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double transferL1_re = bbh_buffer[ind];
+
+                ind = ((4 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double transferL1_im = bbh_buffer[ind];
+
+                ind = ((5 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double transferL2_re = bbh_buffer[ind];
+
+                ind = ((6 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double transferL2_im = bbh_buffer[ind];
+
+                ind = ((7 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double transferL3_re = bbh_buffer[ind];
+
+                ind = ((8 * numBinAll + bin_i) * numModes + mode_i) * data_length + i;
+                double transferL3_im = bbh_buffer[ind];
+
+                cmplx channel1(0.0, 0.0);
+                cmplx channel2(0.0, 0.0);
+                cmplx channel3(0.0, 0.0);
+
+                combine_information(&channel1, &channel2, &channel3, amp, phase, tf, cmplx(transferL1_re, transferL1_im), cmplx(transferL2_re, transferL2_im), cmplx(transferL3_re, transferL3_im), t_start_bin, t_end_bin);
+
+                templateChannels[((bin_i * nChannels + 0) * numModes + mode_i) * data_length + i] = channel1;
+                templateChannels[((bin_i * nChannels + 1) * numModes + mode_i) * data_length + i] = channel2;
+                templateChannels[((bin_i * nChannels + 2) * numModes + mode_i) * data_length + i] = channel3;
+            }
+        }
+    }
+}
+
+void direct_sum_modes(cmplx* templateChannels,
+                double* bbh_buffer,
+                int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask)
+{
+
+    // block per binary
+    int nblocks5 = numBinAll;
+
+    #ifdef __CUDACC__
+    fill_waveform_modes<<<nblocks5, NUM_THREADS_BUILD>>>(templateChannels, bbh_buffer, numBinAll, data_length, nChannels, numModes, t_start, t_end, modeMask);
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+    #else
+    fill_waveform_modes(templateChannels, bbh_buffer, numBinAll, data_length, nChannels, numModes, t_start, t_end, modeMask);
+    #endif
+}
+
+
+// blocked spline layout
+// all quantities and coefficients of one spline segment are contiguous:
+// (numBinAll, length, numModes, NUM_INTERPS, NUM_TERMS)
+// packed from the parameter-major layout (NUM_INTERPS, numBinAll, numModes, length)
+CUDA_KERNEL
+void pack_blocked_kernel(double* splineBlocked, double* propArrays, double* c1In, double* c2In, double* c3In, int length, int numBinAll, int numModes)
+{
+    int start, increment;
+    #ifdef __CUDACC__
+    start = blockIdx.x * blockDim.x + threadIdx.x;
+    increment = blockDim.x * gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int seg_i = start; seg_i < numBinAll * numModes * length; seg_i += increment)
+    {
+        // seg_i runs over (bin_i, mode_i, ind) in the input ordering
+        int ind = seg_i % length;
+        int mode_i = (seg_i / length) % numModes;
+        int bin_i = seg_i / (length * numModes);
+
+        double* out = &splineBlocked[((bin_i * length + ind) * numModes + mode_i) * NUM_INTERPS * NUM_TERMS];
+
+        for (int param_i = 0; param_i < NUM_INTERPS; param_i += 1)
+        {
+            int int_shared = ((param_i * numBinAll + bin_i) * numModes + mode_i) * length + ind;
+            out[param_i * NUM_TERMS + 0] = propArrays[int_shared];
+            out[param_i * NUM_TERMS + 1] = c1In[int_shared];
+            out[param_i * NUM_TERMS + 2] = c2In[int_shared];
+            out[param_i * NUM_TERMS + 3] = c3In[int_shared];
+        }
+    }
+}
+
+void pack_blocked(double* splineBlocked, double* propArrays, double* c1, double* c2, double* c3, int length, int numBinAll, int numModes)
+{
+    #ifdef __CUDACC__
+    int nblocks = std::ceil((numBinAll * numModes * length + NUM_THREADS_BUILD -1)/NUM_THREADS_BUILD);
+    pack_blocked_kernel<<<nblocks, NUM_THREADS_BUILD>>>(splineBlocked, propArrays, c1, c2, c3, length, numBinAll, numModes);
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+    #else
+    pack_blocked_kernel(splineBlocked, propArrays, c1, c2, c3, length, numBinAll, numModes);
+    #endif
+}
+
+// interpolate to TDI channels with the blocked spline layout
+CUDA_KERNEL
+void TDI_blocked(cmplx* templateChannels, double* dataFreqsIn, double* logDataFreqsIn, double* freqsOld, double* splineBlocked, int old_length, int data_length, int numBinAll, int numModes, double t_obs_start, double t_obs_end, int* inds, double log_f0, double inv_dlogf, int ind_start, int ind_length, int bin_i, int* modeMask)
+{
+
+    int start, increment;
+    #ifdef __CUDACC__
+    start = blockIdx.x * blockDim.x + threadIdx.x;
+    increment = blockDim.x *gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int i = start; i < ind_length; i += increment)
+    {
+        // get x information for this spline evaluation
+        double f = dataFreqsIn[i + ind_start];
+
+        int ind_here = get_segment_index(f, logDataFreqsIn[i + ind_start], &freqsOld[bin_i * old_length], old_length, inds, i, log_f0, inv_dlogf);
+
+        double f_old = freqsOld[bin_i * old_length + ind_here];
+
+        double x = f - f_old;
+        double x2 = x * x;
+        double x3 = x * x2;
+
+        cmplx trans_complex1 = 0.0; cmplx trans_complex2 = 0.0; cmplx trans_complex3 = 0.0;
+
+        // all harmonics of this segment are contiguous
+        double* segment = &splineBlocked[(bin_i * old_length + ind_here) * numModes * NUM_INTERPS * NUM_TERMS];
+
+        for (int mode_i = 0; mode_i < numModes; mode_i += 1)
+        {
+            // skip masked (binary, mode) pairs
+            if ((modeMask != NULL) && (modeMask[bin_i * numModes + mode_i] == 0)) continue;
+
+            // evaluate all spline quantities
+            // order is amp, phase, tf, transferL1re, transferL1im, transferL2re, transferL2im, transferL3re, transferL3im
+            double* coeffs = &segment[mode_i * NUM_INTERPS * NUM_TERMS];
+            double vals[NUM_INTERPS];
+            for (int param_i = 0; param_i < NUM_INTERPS; param_i += 1)
+            {
+                vals[param_i] = coeffs[param_i * NUM_TERMS] + coeffs[param_i * NUM_TERMS + 1] * x + coeffs[param_i * NUM_TERMS + 2] * x2 + coeffs[param_i * NUM_TERMS + 3] * x3;
+            }
+
+            cmplx channel1(0.0, 0.0);
+            cmplx channel2(0.0, 0.0);
+            cmplx channel3(0.0, 0.0);
+
+            combine_information(&channel1, &channel2, &channel3, vals[0], vals[1], vals[2], cmplx(vals[3], vals[4]), cmplx(vals[5], vals[6]), cmplx(vals[7], vals[8]), t_obs_start, t_obs_end);
+
+            // add all modes together directly
+            trans_complex1 += channel1;
+            trans_complex2 += channel2;
+            trans_complex3 += channel3;
+        }
+
+        templateChannels[0 * ind_length + i] = trans_complex1;
+        templateChannels[1 * ind_length + i] = trans_complex2;
+        templateChannels[2 * ind_length + i] = trans_complex3;
+    }
+}
+
+
+void InterpTDIBlocked(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* splineBlocked, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0_in, double* inv_dlogf_in, int* inds_start, int* ind_lengths, int* modeMask)
+{
+    #ifdef __CUDACC__
+    cudaStream_t* streams = new cudaStream_t[numBinAll];
+    #endif
+
+    // interpolation is done in streams on GPU
+    #pragma omp parallel for
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        // get all information ready included casting pointers properly
+        int length_bin_i = ind_lengths[bin_i];
+        int ind_start = inds_start[bin_i];
+        int* inds = (int*) inds_ptrs[bin_i];
+        double log_f0 = log_f0_in[bin_i];
+        double inv_dlogf = inv_dlogf_in[bin_i];
+
+        double t_start = t_start_in[bin_i];
+        double t_end = t_end_in[bin_i];
+
+        cmplx* templateChannels = (cmplx*) templateChannels_ptrs[bin_i];
+
+        int nblocks3 = std::ceil((length_bin_i + NUM_THREADS_BUILD -1)/NUM_THREADS_BUILD);
+
+        #ifdef __CUDACC__
+        dim3 gridDim(nblocks3, 1);
+        cudaStreamCreate(&streams[bin_i]);
+        TDI_blocked<<<gridDim, NUM_THREADS_BUILD, 0, streams[bin_i]>>>(templateChannels, dataFreqs, logDataFreqs, freqs, splineBlocked, length, data_length, numBinAll, numModes, t_start, t_end, inds, log_f0, inv_dlogf, ind_start, length_bin_i, bin_i, modeMask);
+        #else
+        TDI_blocked(templateChannels, dataFreqs, logDataFreqs, freqs, splineBlocked, length, data_length, numBinAll, numModes, t_start, t_end, inds, log_f0, inv_dlogf, ind_start, length_bin_i, bin_i, modeMask);
+        #endif
+
+    }
+
+    #ifdef __CUDACC__
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+
+    #pragma omp parallel for
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        //destroy the streams
+        cudaStreamDestroy(streams[bin_i]);
+    }
+    delete[] streams;
+    #endif
+}
+
+// scatter-add a template into a combined data stream
+// on the GPU, templates from different binaries can overlap so atomics are used
+// template_stride is the full template length, so a part of a template can be added
+CUDA_KERNEL
+void add_template(cmplx* dataOut, cmplx* templateChannels, int ind_start, int ind_length, int template_stride, int data_length, int nChannels)
+{
+    int start, increment;
+    #ifdef __CUDACC__
+    start = blockIdx.x * blockDim.x + threadIdx.x;
+    increment = blockDim.x * gridDim.x;
+    #else
+    start = 0;
+    increment = 1;
+    #pragma omp parallel for
+    #endif
+    for (int i = start; i < ind_length; i += increment)
+    {
+        for (int chan = 0; chan < nChannels; chan += 1)
+        {
+            #ifdef __CUDACC__
+            atomicAddComplex(&dataOut[chan * data_length + ind_start + i], templateChannels[chan * template_stride + i]);
+            #else
+            dataOut[chan * data_length + ind_start + i] += templateChannels[chan * template_stride + i];
+            #endif
+        }
+    }
+}
+
+void inject_templates(cmplx* dataOut, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int* template_strides, int data_length, int numBinAll, int nChannels)
+{
+    #ifdef __CUDACC__
+    cudaStream_t* streams = new cudaStream_t[numBinAll];
+    #endif
+
+    // on the CPU, binaries are added one after the other so overlapping
+    // templates accumulate properly. Each template is added in parallel.
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        int length_bin_i = ind_lengths[bin_i];
+        int ind_start = inds_start[bin_i];
+
+        cmplx* templateChannels = (cmplx*) templateChannels_ptrs[bin_i];
+
+        #ifdef __CUDACC__
+        int nblocks = std::ceil((length_bin_i + NUM_THREADS_BUILD -1)/NUM_THREADS_BUILD);
+        if (nblocks == 0) continue;
+        cudaStreamCreate(&streams[bin_i]);
+        add_template<<<nblocks, NUM_THREADS_BUILD, 0, streams[bin_i]>>>(dataOut, templateChannels, ind_start, length_bin_i, template_strides[bin_i], data_length, nChannels);
+        #else
+        add_template(dataOut, templateChannels, ind_start, length_bin_i, template_strides[bin_i], data_length, nChannels);
+        #endif
+    }
+
+    #ifdef __CUDACC__
+    cudaDeviceSynchronize();
+    gpuErrchk(cudaGetLastError());
+
+    for (int bin_i = 0; bin_i < numBinAll; bin_i += 1)
+    {
+        if (ind_lengths[bin_i] > 0) cudaStreamDestroy(streams[bin_i]);
+    }
+    delete[] streams;
     #endif
 }
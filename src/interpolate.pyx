@@ -5,7 +5,7 @@ from bbhx.utils.utility import pointer_adjust
 
 assert sizeof(int) == sizeof(np.int32_t)
 
-cdef extern from "Interpolate.hh":
+cdef extern from "Interpolate.hh" nogil:
     void interpolate(double* freqs, double* propArrays,
                      double* B, double* upper_diag, double* diag, double* lower_diag,
                      int length, int numInterpParams, int numModes, int numBinAll);
@@ -14,7 +14,7 @@ cdef extern from "Interpolate.hh":
 @pointer_adjust
 def interpolate_wrap(freqs, propArrays,
                      B, upper_diag, diag, lower_diag,
-                     length, numInterpParams, numModes, numBinAll):
+                     int length, int numInterpParams, int numModes, int numBinAll):
 
     cdef size_t freqs_in = freqs
     cdef size_t propArrays_in = propArrays
@@ -23,6 +23,7 @@ def interpolate_wrap(freqs, propArrays,
     cdef size_t diag_in = diag
     cdef size_t lower_diag_in = lower_diag
 
-    interpolate(<double*>freqs_in, <double*>propArrays_in,
-              <double*>B_in, <double*>upper_diag_in, <double*>diag_in, <double*>lower_diag_in,
-              length, numInterpParams, numModes, numBinAll)
+    with nogil:
+        interpolate(<double*>freqs_in, <double*>propArrays_in,
+                  <double*>B_in, <double*>upper_diag_in, <double*>diag_in, <double*>lower_diag_in,
+                  length, numInterpParams, numModes, numBinAll)
@@ -14,8 +14,23 @@ cdef extern from "Likelihood.hh":
                         double* dataFreqs,
                         int numBinAll, int data_length, int nChannels);
 
+    void hdyn_modes(cmplx* likeOut1, cmplx* likeOut2,
+                        cmplx* templateChannels, cmplx* dataConstants,
+                        double* dataFreqs,
+                        int numBinAll, int data_length, int nChannels, int numModes);
+
+    void hdyn_order(cmplx* likeOut1, cmplx* likeOut2,
+                        cmplx* templateChannels, cmplx* dataConstants,
+                        int numBinAll, int data_length, int nChannels, int order);
+
     void direct_like(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weight_times_df, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int data_stream_length, int numBinAll);
 
+    void direct_like_bands(cmplx* d_h, cmplx* h_h, cmplx* dataChannels, double* noise_weight_times_df, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int* band_inds, int data_stream_length, int numBinAll, int numBands);
+
+    void update_residual(cmplx* residual, double* noise_factors, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, double* factors, double* d_d_change, int data_stream_length, int numBinAll, int nChannels);
+
+    void cross_terms(cmplx* h_i_h_j, long* templateChannels_ptrs_i, long* templateChannels_ptrs_j, int* inds_start_i, int* ind_lengths_i, int* inds_start_j, int* ind_lengths_j, int numPairs, int nChannels);
+
     void prep_hdyn_wrap(cmplx* A0_in, cmplx* A1_in, cmplx* B0_in, cmplx* B1_in, cmplx* d_arr, cmplx* h0_arr, double* S_n_arr, double df, int* bins, double* f_dense, double* f_m_arr, int data_length, int nchannels, int length_f_rel);
 
 @pointer_adjust
@@ -35,6 +50,37 @@ def hdyn_wrap(likeOut1, likeOut2,
             <double*> dataFreqs_in,
             numBinAll, data_length, nChannels);
 
+@pointer_adjust
+def hdyn_modes_wrap(likeOut1, likeOut2,
+                    templateChannels, dataConstants,
+                    dataFreqs,
+                    numBinAll, data_length, nChannels, numModes):
+
+    cdef size_t likeOut1_in = likeOut1
+    cdef size_t likeOut2_in = likeOut2
+    cdef size_t templateChannels_in = templateChannels
+    cdef size_t dataConstants_in = dataConstants
+    cdef size_t dataFreqs_in = dataFreqs
+
+    hdyn_modes(<cmplx*> likeOut1_in, <cmplx*> likeOut2_in,
+            <cmplx*> templateChannels_in, <cmplx*> dataConstants_in,
+            <double*> dataFreqs_in,
+            numBinAll, data_length, nChannels, numModes);
+
+@pointer_adjust
+def hdyn_order_wrap(likeOut1, likeOut2,
+                    templateChannels, dataConstants,
+                    numBinAll, data_length, nChannels, order):
+
+    cdef size_t likeOut1_in = likeOut1
+    cdef size_t likeOut2_in = likeOut2
+    cdef size_t templateChannels_in = templateChannels
+    cdef size_t dataConstants_in = dataConstants
+
+    hdyn_order(<cmplx*> likeOut1_in, <cmplx*> likeOut2_in,
+            <cmplx*> templateChannels_in, <cmplx*> dataConstants_in,
+            numBinAll, data_length, nChannels, order);
+
 @pointer_adjust
 def direct_like_wrap(d_h, h_h, dataChannels, noise_weight_times_df, templateChannels_ptrs, inds_start, ind_lengths, data_stream_length, numBinAll):
 
@@ -49,6 +95,21 @@ def direct_like_wrap(d_h, h_h, dataChannels, noise_weight_times_df, templateChan
     direct_like(<cmplx*> d_h_in, <cmplx*> h_h_in, <cmplx*> dataChannels_in, <double*> noise_weight_times_df_in, <long*> templateChannels_ptrs_in, <int*> inds_start_in, <int*> ind_lengths_in, data_stream_length, numBinAll)
 
 
+@pointer_adjust
+def direct_like_bands_wrap(d_h, h_h, dataChannels, noise_weight_times_df, templateChannels_ptrs, inds_start, ind_lengths, band_inds, data_stream_length, numBinAll, numBands):
+
+    cdef size_t d_h_in = d_h
+    cdef size_t h_h_in = h_h
+    cdef size_t dataChannels_in = dataChannels
+    cdef size_t noise_weight_times_df_in = noise_weight_times_df
+    cdef size_t templateChannels_ptrs_in = templateChannels_ptrs
+    cdef size_t inds_start_in = inds_start
+    cdef size_t ind_lengths_in = ind_lengths
+    cdef size_t band_inds_in = band_inds
+
+    direct_like_bands(<cmplx*> d_h_in, <cmplx*> h_h_in, <cmplx*> dataChannels_in, <double*> noise_weight_times_df_in, <long*> templateChannels_ptrs_in, <int*> inds_start_in, <int*> ind_lengths_in, <int*> band_inds_in, data_stream_length, numBinAll, numBands)
+
+
 @pointer_adjust
 def prep_hdyn(A0_in, A1_in, B0_in, B1_in, d_arr, h0_arr, S_n_arr, df, bins, f_dense, f_m_arr, data_length, nchannels, length_f_rel):
 
@@ -64,3 +125,31 @@ def prep_hdyn(A0_in, A1_in, B0_in, B1_in, d_arr, h0_arr, S_n_arr, df, bins, f_de
     cdef size_t bins_in = bins
 
     prep_hdyn_wrap(<cmplx*> A0_in_in, <cmplx*> A1_in_in, <cmplx*> B0_in_in, <cmplx*> B1_in_in, <cmplx*> d_arr_in, <cmplx*> h0_arr_in, <double*> S_n_arr_in, df, <int*> bins_in, <double*> f_dense_in, <double*> f_m_arr_in, data_length, nchannels, length_f_rel)
+
+
+@pointer_adjust
+def update_residual_wrap(residual, noise_factors, templateChannels_ptrs, inds_start, ind_lengths, factors, d_d_change, data_stream_length, numBinAll, nChannels):
+
+    cdef size_t residual_in = residual
+    cdef size_t noise_factors_in = noise_factors
+    cdef size_t templateChannels_ptrs_in = templateChannels_ptrs
+    cdef size_t inds_start_in = inds_start
+    cdef size_t ind_lengths_in = ind_lengths
+    cdef size_t factors_in = factors
+    cdef size_t d_d_change_in = d_d_change
+
+    update_residual(<cmplx*> residual_in, <double*> noise_factors_in, <long*> templateChannels_ptrs_in, <int*> inds_start_in, <int*> ind_lengths_in, <double*> factors_in, <double*> d_d_change_in, data_stream_length, numBinAll, nChannels)
+
+
+@pointer_adjust
+def cross_terms_wrap(h_i_h_j, templateChannels_ptrs_i, templateChannels_ptrs_j, inds_start_i, ind_lengths_i, inds_start_j, ind_lengths_j, numPairs, nChannels):
+
+    cdef size_t h_i_h_j_in = h_i_h_j
+    cdef size_t templateChannels_ptrs_i_in = templateChannels_ptrs_i
+    cdef size_t templateChannels_ptrs_j_in = templateChannels_ptrs_j
+    cdef size_t inds_start_i_in = inds_start_i
+    cdef size_t ind_lengths_i_in = ind_lengths_i
+    cdef size_t inds_start_j_in = inds_start_j
+    cdef size_t ind_lengths_j_in = ind_lengths_j
+
+    cross_terms(<cmplx*> h_i_h_j_in, <long*> templateChannels_ptrs_i_in, <long*> templateChannels_ptrs_j_in, <int*> inds_start_i_in, <int*> ind_lengths_i_in, <int*> inds_start_j_in, <int*> ind_lengths_j_in, numPairs, nChannels)
@@ -5,7 +5,7 @@ from bbhx.utils.utility import pointer_adjust
 
 assert sizeof(int) == sizeof(np.int32_t)
 
-cdef extern from "PhenomHM.hh":
+cdef extern from "PhenomHM.hh" nogil:
     void waveform_amp_phase(
         double* waveformOut,
         int* ells_in,
@@ -22,7 +22,8 @@ cdef extern from "PhenomHM.hh":
         int numBinAll,
         double* Mf_RD_lm_all,
         double* Mf_DM_lm_all,
-        int run_phenomd
+        int run_phenomd,
+        int* modeMask
     )
 
     void get_phenomhm_ringdown_frequencies_wrap(
@@ -69,12 +70,13 @@ def waveform_amp_phase_wrap(
     chi2z,
     distance,
     f_ref,
-    numModes,
-    length,
-    numBinAll,
+    int numModes,
+    int length,
+    int numBinAll,
     Mf_RD_lm_all,
     Mf_DM_lm_all,
-    run_phenomd
+    int run_phenomd,
+    modeMask
 ):
 
     cdef size_t waveformOut_in = waveformOut
@@ -89,26 +91,29 @@ def waveform_amp_phase_wrap(
     cdef size_t f_ref_in = f_ref
     cdef size_t Mf_RD_lm_all_in = Mf_RD_lm_all
     cdef size_t Mf_DM_lm_all_in = Mf_DM_lm_all
-
-
-    waveform_amp_phase(
-        <double*> waveformOut_in,
-        <int*> ells_in,
-        <int*> mms_in,
-        <double*> freqs_in,
-        <double*> m1_SI_in,
-        <double*> m2_SI_in,
-        <double*> chi1z_in,
-        <double*> chi2z_in,
-        <double*> distance_in,
-        <double*> f_ref_in,
-        numModes,
-        length,
-        numBinAll,
-        <double*> Mf_RD_lm_all_in,
-        <double*> Mf_DM_lm_all_in,
-        run_phenomd
-    )
+    cdef size_t modeMask_in = modeMask
+
+
+    with nogil:
+        waveform_amp_phase(
+            <double*> waveformOut_in,
+            <int*> ells_in,
+            <int*> mms_in,
+            <double*> freqs_in,
+            <double*> m1_SI_in,
+            <double*> m2_SI_in,
+            <double*> chi1z_in,
+            <double*> chi2z_in,
+            <double*> distance_in,
+            <double*> f_ref_in,
+            numModes,
+            length,
+            numBinAll,
+            <double*> Mf_RD_lm_all_in,
+            <double*> Mf_DM_lm_all_in,
+            run_phenomd,
+            <int*> modeMask_in
+        )
 
     return
 
@@ -5,7 +5,7 @@ from bbhx.utils.utility import pointer_adjust
 
 assert sizeof(int) == sizeof(np.int32_t)
 
-cdef extern from "Response.hh":
+cdef extern from "Response.hh" nogil:
     ctypedef void* cmplx 'cmplx'
 
     void LISA_response(
@@ -22,7 +22,12 @@ cdef extern from "Response.hh":
         int numModes,
         int length,
         int numBinAll,
-        int includesAmps
+        int includesAmps,
+        double* orbit_coeffs,
+        double orbit_t0,
+        double orbit_dt,
+        int orbit_num_t,
+        int* modeMask
     );
 
 @pointer_adjust
@@ -36,11 +41,16 @@ def LISA_response_wrap(
      lam,
      beta,
      psi,
-    TDItag, order_fresnel_stencil,
-    numModes,
-    length,
-    numBinAll,
-    includesAmps
+    int TDItag, int order_fresnel_stencil,
+    int numModes,
+    int length,
+    int numBinAll,
+    int includesAmps,
+    orbit_coeffs,
+    double orbit_t0,
+    double orbit_dt,
+    int orbit_num_t,
+    modeMask
 ):
 
     cdef size_t response_out_in = response_out
@@ -52,20 +62,28 @@ def LISA_response_wrap(
     cdef size_t beta_in = beta
     cdef size_t psi_in = psi
     cdef size_t phi_ref_in = phi_ref
+    cdef size_t orbit_coeffs_in = orbit_coeffs
+    cdef size_t modeMask_in = modeMask
 
-    LISA_response(
-        <double*> response_out_in,
-        <int*> ells_in,
-        <int*> mms_in,
-        <double*> freqs_in,
-        <double*> phi_ref_in,
-        <double*> inc_in,
-        <double*> lam_in,
-        <double*> beta_in,
-        <double*> psi_in,
-        TDItag, order_fresnel_stencil,
-        numModes,
-        length,
-        numBinAll,
-        includesAmps
-    )
+    with nogil:
+        LISA_response(
+            <double*> response_out_in,
+            <int*> ells_in,
+            <int*> mms_in,
+            <double*> freqs_in,
+            <double*> phi_ref_in,
+            <double*> inc_in,
+            <double*> lam_in,
+            <double*> beta_in,
+            <double*> psi_in,
+            TDItag, order_fresnel_stencil,
+            numModes,
+            length,
+            numBinAll,
+            includesAmps,
+            <double*> orbit_coeffs_in,
+            orbit_t0,
+            orbit_dt,
+            orbit_num_t,
+            <int*> modeMask_in
+        )
@@ -0,0 +1,17 @@
+import numpy as np
+cimport numpy as np
+
+from bbhx.utils.utility import pointer_adjust
+
+assert sizeof(int) == sizeof(np.int32_t)
+
+cdef extern from "Transform.hh":
+    void transform_params(double* params_out, double* params_in, int numBinAll, double f_ref, double t0);
+
+@pointer_adjust
+def transform_params_wrap(params_out, params_in, numBinAll, f_ref, t0):
+
+    cdef size_t params_out_in = params_out
+    cdef size_t params_in_in = params_in
+
+    transform_params(<double*> params_out_in, <double*> params_in_in, numBinAll, f_ref, t0)
@@ -5,44 +5,151 @@ from bbhx.utils.utility import pointer_adjust
 
 assert sizeof(int) == sizeof(np.int32_t)
 
-cdef extern from "WaveformBuild.hh":
+cdef extern from "WaveformBuild.hh" nogil:
     ctypedef void* cmplx 'cmplx'
 
-    void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* freqs, double* propArrays, double* c1, double* c2, double* c3, double* t_start, double* t_end, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, int* inds_start, int* ind_lengths);
+    void InterpTDI(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* propArrays, double* c1, double* c2, double* c3, double* t_start, double* t_end, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0, double* inv_dlogf, int* inds_start, int* ind_lengths, int* modeMask);
+
+    void InterpTDIMixed(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* propArraysHP, double* c1HP, double* c2HP, double* c3HP, float* propArraysLP, float* c1LP, float* c2LP, float* c3LP, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0, double* inv_dlogf, int* inds_start, int* ind_lengths, int* modeMask);
+
+    void pack_blocked(double* splineBlocked, double* propArrays, double* c1, double* c2, double* c3, int length, int numBinAll, int numModes);
+
+    void InterpTDIBlocked(long* templateChannels_ptrs, double* dataFreqs, double* logDataFreqs, double* freqs, double* splineBlocked, double* t_start_in, double* t_end_in, int length, int data_length, int numBinAll, int numModes, long* inds_ptrs, double* log_f0, double* inv_dlogf, int* inds_start, int* ind_lengths, int* modeMask);
 
     void direct_sum(cmplx* templateChannels,
                     double* bbh_buffer,
-                    int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end)
+                    int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask)
+
+    void direct_sum_modes(cmplx* templateChannels,
+                    double* bbh_buffer,
+                    int numBinAll, int data_length, int nChannels, int numModes, double* t_start, double* t_end, int* modeMask)
+
+    void inject_templates(cmplx* dataOut, long* templateChannels_ptrs, int* inds_start, int* ind_lengths, int* template_strides, int data_length, int numBinAll, int nChannels)
 
 
 @pointer_adjust
-def InterpTDI_wrap(templateChannels_ptrs, dataFreqs, freqs, propArrays, c1, c2, c3, t_start, t_end, length, data_length, numBinAll, numModes, inds_ptrs, inds_start, ind_lengths):
+def InterpTDI_wrap(templateChannels_ptrs, dataFreqs, logDataFreqs, freqs, propArrays, c1, c2, c3, t_start, t_end, int length, int data_length, int numBinAll, int numModes, inds_ptrs, log_f0, inv_dlogf, inds_start, ind_lengths, modeMask):
 
     cdef size_t freqs_in = freqs
     cdef size_t propArrays_in = propArrays
     cdef size_t templateChannels_ptrs_in = templateChannels_ptrs
     cdef size_t dataFreqs_in = dataFreqs
+    cdef size_t logDataFreqs_in = logDataFreqs
+    cdef size_t c1_in = c1
+    cdef size_t c2_in = c2
+    cdef size_t c3_in = c3
+    cdef size_t t_start_in = t_start
+    cdef size_t t_end_in = t_end
+    cdef size_t inds_ptrs_in = inds_ptrs
+    cdef size_t log_f0_in = log_f0
+    cdef size_t inv_dlogf_in = inv_dlogf
+    cdef size_t inds_start_in = inds_start
+    cdef size_t ind_lengths_in = ind_lengths
+    cdef size_t modeMask_in = modeMask
+
+    with nogil:
+        InterpTDI(<long*> templateChannels_ptrs_in, <double*> dataFreqs_in, <double*> logDataFreqs_in, <double*> freqs_in, <double*> propArrays_in, <double*> c1_in, <double*> c2_in, <double*> c3_in, <double*> t_start_in, <double*> t_end_in, length, data_length, numBinAll, numModes, <long*> inds_ptrs_in, <double*> log_f0_in, <double*> inv_dlogf_in, <int*> inds_start_in, <int*> ind_lengths_in, <int*> modeMask_in);
+
+@pointer_adjust
+def InterpTDIMixed_wrap(templateChannels_ptrs, dataFreqs, logDataFreqs, freqs, propArraysHP, c1HP, c2HP, c3HP, propArraysLP, c1LP, c2LP, c3LP, t_start, t_end, int length, int data_length, int numBinAll, int numModes, inds_ptrs, log_f0, inv_dlogf, inds_start, ind_lengths, modeMask):
+
+    cdef size_t freqs_in = freqs
+    cdef size_t propArraysHP_in = propArraysHP
+    cdef size_t c1HP_in = c1HP
+    cdef size_t c2HP_in = c2HP
+    cdef size_t c3HP_in = c3HP
+    cdef size_t propArraysLP_in = propArraysLP
+    cdef size_t c1LP_in = c1LP
+    cdef size_t c2LP_in = c2LP
+    cdef size_t c3LP_in = c3LP
+    cdef size_t templateChannels_ptrs_in = templateChannels_ptrs
+    cdef size_t dataFreqs_in = dataFreqs
+    cdef size_t logDataFreqs_in = logDataFreqs
+    cdef size_t t_start_in = t_start
+    cdef size_t t_end_in = t_end
+    cdef size_t inds_ptrs_in = inds_ptrs
+    cdef size_t log_f0_in = log_f0
+    cdef size_t inv_dlogf_in = inv_dlogf
+    cdef size_t inds_start_in = inds_start
+    cdef size_t ind_lengths_in = ind_lengths
+    cdef size_t modeMask_in = modeMask
+
+    with nogil:
+        InterpTDIMixed(<long*> templateChannels_ptrs_in, <double*> dataFreqs_in, <double*> logDataFreqs_in, <double*> freqs_in, <double*> propArraysHP_in, <double*> c1HP_in, <double*> c2HP_in, <double*> c3HP_in, <float*> propArraysLP_in, <float*> c1LP_in, <float*> c2LP_in, <float*> c3LP_in, <double*> t_start_in, <double*> t_end_in, length, data_length, numBinAll, numModes, <long*> inds_ptrs_in, <double*> log_f0_in, <double*> inv_dlogf_in, <int*> inds_start_in, <int*> ind_lengths_in, <int*> modeMask_in);
+
+@pointer_adjust
+def pack_blocked_wrap(splineBlocked, propArrays, c1, c2, c3, int length, int numBinAll, int numModes):
+
+    cdef size_t splineBlocked_in = splineBlocked
+    cdef size_t propArrays_in = propArrays
     cdef size_t c1_in = c1
     cdef size_t c2_in = c2
     cdef size_t c3_in = c3
+
+    with nogil:
+        pack_blocked(<double*> splineBlocked_in, <double*> propArrays_in, <double*> c1_in, <double*> c2_in, <double*> c3_in, length, numBinAll, numModes)
+
+@pointer_adjust
+def InterpTDIBlocked_wrap(templateChannels_ptrs, dataFreqs, logDataFreqs, freqs, splineBlocked, t_start, t_end, int length, int data_length, int numBinAll, int numModes, inds_ptrs, log_f0, inv_dlogf, inds_start, ind_lengths, modeMask):
+
+    cdef size_t freqs_in = freqs
+    cdef size_t splineBlocked_in = splineBlocked
+    cdef size_t templateChannels_ptrs_in = templateChannels_ptrs
+    cdef size_t dataFreqs_in = dataFreqs
+    cdef size_t logDataFreqs_in = logDataFreqs
     cdef size_t t_start_in = t_start
     cdef size_t t_end_in = t_end
     cdef size_t inds_ptrs_in = inds_ptrs
+    cdef size_t log_f0_in = log_f0
+    cdef size_t inv_dlogf_in = inv_dlogf
     cdef size_t inds_start_in = inds_start
     cdef size_t ind_lengths_in = ind_lengths
+    cdef size_t modeMask_in = modeMask
 
-    InterpTDI(<long*> templateChannels_ptrs_in, <double*> dataFreqs_in, <double*> freqs_in, <double*> propArrays_in, <double*> c1_in, <double*> c2_in, <double*> c3_in, <double*> t_start_in, <double*> t_end_in, length, data_length, numBinAll, numModes, <long*> inds_ptrs_in, <int*> inds_start_in, <int*> ind_lengths_in);
+    with nogil:
+        InterpTDIBlocked(<long*> templateChannels_ptrs_in, <double*> dataFreqs_in, <double*> logDataFreqs_in, <double*> freqs_in, <double*> splineBlocked_in, <double*> t_start_in, <double*> t_end_in, length, data_length, numBinAll, numModes, <long*> inds_ptrs_in, <double*> log_f0_in, <double*> inv_dlogf_in, <int*> inds_start_in, <int*> ind_lengths_in, <int*> modeMask_in);
 
 @pointer_adjust
 def direct_sum_wrap(templateChannels,
                 bbh_buffer,
-                numBinAll, data_length, nChannels, numModes, t_start, t_end):
+                int numBinAll, int data_length, int nChannels, int numModes, t_start, t_end, modeMask):
+
+    cdef size_t templateChannels_in = templateChannels
+    cdef size_t bbh_buffer_in = bbh_buffer
+    cdef size_t t_start_in = t_start
+    cdef size_t t_end_in = t_end
+    cdef size_t modeMask_in = modeMask
+
+    with nogil:
+        direct_sum(<cmplx*> templateChannels_in,
+                        <double*> bbh_buffer_in,
+                        numBinAll, data_length, nChannels, numModes, <double*> t_start_in, <double*> t_end_in, <int*> modeMask_in)
+
+
+@pointer_adjust
+def direct_sum_modes_wrap(templateChannels,
+                bbh_buffer,
+                int numBinAll, int data_length, int nChannels, int numModes, t_start, t_end, modeMask):
 
     cdef size_t templateChannels_in = templateChannels
     cdef size_t bbh_buffer_in = bbh_buffer
     cdef size_t t_start_in = t_start
     cdef size_t t_end_in = t_end
+    cdef size_t modeMask_in = modeMask
+
+    with nogil:
+        direct_sum_modes(<cmplx*> templateChannels_in,
+                        <double*> bbh_buffer_in,
+                        numBinAll, data_length, nChannels, numModes, <double*> t_start_in, <double*> t_end_in, <int*> modeMask_in)
+
+
+@pointer_adjust
+def inject_templates_wrap(dataOut, templateChannels_ptrs, inds_start, ind_lengths, template_strides, data_length, numBinAll, nChannels):
+
+    cdef size_t dataOut_in = dataOut
+    cdef size_t templateChannels_ptrs_in = templateChannels_ptrs
+    cdef size_t inds_start_in = inds_start
+    cdef size_t ind_lengths_in = ind_lengths
+    cdef size_t template_strides_in = template_strides
 
-    direct_sum(<cmplx*> templateChannels_in,
-                    <double*> bbh_buffer_in,
-                    numBinAll, data_length, nChannels, numModes, <double*> t_start_in, <double*> t_end_in)
+    inject_templates(<cmplx*> dataOut_in, <long*> templateChannels_ptrs_in, <int*> inds_start_in, <int*> ind_lengths_in, <int*> template_strides_in, data_length, numBinAll, nChannels)